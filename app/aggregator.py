@@ -4,12 +4,13 @@ Convierte datos diarios en velas semanales y calcula MA30
 """
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import List, Optional, Callable
 import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
 
 from app.database import Stock, DailyData, WeeklyData, SessionLocal
+from app.perf import timed
 from app.config import MIN_WEEKS_FOR_ANALYSIS
 
 # Configurar logging
@@ -78,6 +79,17 @@ class WeeklyAggregator:
             )
         ).order_by(DailyData.date.asc()).all()
         
+        return self.aggregate_days(daily_data)
+    
+    def aggregate_days(self, daily_data: list) -> Optional[dict]:
+        """
+        Vela semanal de una lista de días (orden cronológico).
+        No toca la BD: acepta DailyData o cualquier objeto con date, open,
+        high, low, close y volume (el replay del backtest usa filas en memoria).
+        
+        Returns:
+            Dict con OHLCV semanal o None si no hay días
+        """
         if not daily_data:
             return None
         
@@ -93,7 +105,9 @@ class WeeklyAggregator:
             'high': weekly_high,
             'low': weekly_low,
             'close': weekly_close,
-            'volume': weekly_volume
+            'volume': weekly_volume,
+            'days': len(daily_data),            # Sesiones incluidas (semana parcial < 5)
+            'last_date': daily_data[-1].date    # Último día diario agregado
         }
     
     def calculate_ma30(self, stock_id: int, current_week_end: datetime, periods: int = 30) -> Optional[float]:
@@ -119,8 +133,10 @@ class WeeklyAggregator:
         if len(weekly_data) < periods:
             return None
         
-        # Calcular media de los cierres
-        closes = [w.close for w in weekly_data]
+        return self.moving_average([w.close for w in weekly_data])
+    
+    def moving_average(self, closes: list) -> float:
+        """Media de los cierres (Decimal de la BD: suma exacta)."""
         ma = sum(closes) / len(closes)
         
         return float(ma)
@@ -159,10 +175,10 @@ class WeeklyAggregator:
         if not previous_week or previous_week.ma30 is None:
             return None
         
-        # Calcular pendiente
-        ma30_current = float(current_week.ma30)
-        ma30_previous = float(previous_week.ma30)
-        
+        return self.ma30_slope(float(current_week.ma30), float(previous_week.ma30))
+    
+    def ma30_slope(self, ma30_current: float, ma30_previous: float) -> Optional[float]:
+        """Pendiente entre dos MA30 consecutivas (None si la anterior es 0)."""
         if ma30_previous == 0:
             return None
         
@@ -170,6 +186,19 @@ class WeeklyAggregator:
         
         return float(slope)
     
+    def get_last_week_end(self, today=None):
+        """
+        Viernes de la última semana completa: el que acaba de pasar en
+        sábado/domingo; de lunes a viernes, el de la semana anterior.
+        """
+        today = today or datetime.now().date()
+        if today.weekday() >= 5:
+            # Sábado/domingo: la semana que acaba de terminar (viernes pasado)
+            return self.get_week_end_date(today)
+        # Lunes a viernes: la semana anterior completa
+        return self.get_week_end_date(today - timedelta(days=7))
+    
+    @timed('aggregate')
     def aggregate_stock_weekly_data(self, stock_id: int, weeks_back: int = 4) -> int:
         """
         Agregar datos semanales de una acción
@@ -182,14 +211,7 @@ class WeeklyAggregator:
             Número de semanas procesadas
         """
         # Obtener fecha de fin de la última semana completa
-        today = datetime.now().date()
-        weekday = today.weekday()  # 0=lun, 4=vie, 5=sab, 6=dom
-        if weekday >= 5:
-            # Sábado/domingo: la semana que acaba de terminar (viernes pasado)
-            last_week_end = self.get_week_end_date(today)
-        else:
-            # Lunes a viernes: la semana anterior completa
-            last_week_end = self.get_week_end_date(today - timedelta(days=7))
+        last_week_end = self.get_last_week_end()
         
         # Obtener ticker para logs
         stock = self.db.query(Stock).filter(Stock.id == stock_id).first()
@@ -300,12 +322,13 @@ class WeeklyAggregator:
         
         return processed
     
-    def aggregate_all_stocks(self, weeks_back: int = 4) -> dict:
+    def aggregate_all_stocks(self, weeks_back: int = 4, progress: Optional[Callable] = None) -> dict:
         """
         Agregar datos semanales de todas las acciones activas
         
         Args:
             weeks_back: Número de semanas hacia atrás
+            progress: Callback opcional progress(hechas, total, ticker) tras cada acción
         
         Returns:
             Dict con estadísticas de la agregación
@@ -319,7 +342,7 @@ class WeeklyAggregator:
         success = 0
         failed = []
         
-        for stock in stocks:
+        for idx, stock in enumerate(stocks, 1):
             try:
                 processed = self.aggregate_stock_weekly_data(stock.id, weeks_back)
                 if processed > 0:
@@ -329,6 +352,8 @@ class WeeklyAggregator:
             except Exception as e:
                 logger.error(f"✗ Error procesando {stock.ticker}: {e}")
                 failed.append(stock.ticker)
+            if progress:
+                progress(idx, total, stock.ticker)
         
         return {
             'total': total,
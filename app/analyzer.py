@@ -3,12 +3,13 @@ Analizador Weinstein - Detección de las 4 etapas del precio
 Basado en la metodología de Stan Weinstein
 """
 import logging
-from typing import Optional, List
+from typing import Optional, List, Callable
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_
 
-from app.database import Stock, WeeklyData, SessionLocal
+from app.database import Stock, WeeklyData, StockLatest, SessionLocal
+from app.perf import timed
 from app.config import MA30_SLOPE_THRESHOLD, MA30_SLOPE_ENTRY_THRESHOLD, VOLUME_SPIKE_THRESHOLD
 
 # Configurar logging
@@ -142,6 +143,7 @@ class WeinsteinAnalyzer:
         # Default: Etapa 1
         return 1
     
+    @timed('analyze')
     def analyze_stock_stages(self, stock_id: int, weeks_back: int = 10) -> int:
         """
         Analizar etapas de una acción
@@ -176,9 +178,36 @@ class WeinsteinAnalyzer:
             previous_stage = weekly_data[-(weeks_back + 1)].stage
             weekly_data = weekly_data[-weeks_back:]
 
+        processed = self.analyze_weeks(weekly_data, previous_stage)
+        
+        # Commit cambios
+        try:
+            self.db.commit()
+            if processed > 0:
+                logger.info(f"✓ {ticker}: {processed} etapas actualizadas")
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"✗ Error guardando etapas de {ticker}: {e}")
+            return 0
+        
+        return processed
+    
+    def analyze_weeks(self, weeks: list, previous_stage: Optional[int] = None) -> int:
+        """
+        Recalcular la etapa de una secuencia de semanas (orden cronológico).
+        No toca la BD: acepta WeeklyData o cualquier objeto con close, ma30,
+        ma30_slope y stage (el backtest usa filas en memoria).
+        
+        Args:
+            weeks: Semanas con MA30, de la más antigua a la más reciente
+            previous_stage: Etapa de la semana anterior al bloque (contexto)
+        
+        Returns:
+            Número de semanas cuya etapa cambió
+        """
         processed = 0
         
-        for week in weekly_data:
+        for week in weeks:
             # Detectar etapa
             current_stage = self.detect_stage(week, previous_stage)
             
@@ -189,24 +218,15 @@ class WeinsteinAnalyzer:
             
             previous_stage = current_stage
         
-        # Commit cambios
-        try:
-            self.db.commit()
-            if processed > 0:
-                logger.info(f"✓ {ticker}: {processed} etapas actualizadas")
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"✗ Error guardando etapas de {ticker}: {e}")
-            return 0
-        
         return processed
     
-    def analyze_all_stocks(self, weeks_back: int = 10) -> dict:
+    def analyze_all_stocks(self, weeks_back: int = 10, progress: Optional[Callable] = None) -> dict:
         """
         Analizar etapas de todas las acciones activas
         
         Args:
             weeks_back: Número de semanas hacia atrás (0 = todas)
+            progress: Callback opcional progress(hechas, total, ticker) tras cada acción
         
         Returns:
             Dict con estadísticas
@@ -219,7 +239,7 @@ class WeinsteinAnalyzer:
         success = 0
         failed = []
         
-        for stock in stocks:
+        for idx, stock in enumerate(stocks, 1):
             try:
                 processed = self.analyze_stock_stages(stock.id, weeks_back)
                 if processed >= 0:  # >= 0 porque puede no haber cambios
@@ -227,6 +247,8 @@ class WeinsteinAnalyzer:
             except Exception as e:
                 logger.error(f"✗ Error analizando {stock.ticker}: {e}")
                 failed.append(stock.ticker)
+            if progress:
+                progress(idx, total, stock.ticker)
         
         return {
             'total': total,
@@ -300,35 +322,26 @@ class WeinsteinAnalyzer:
         Returns:
             Lista de dicts con info de las acciones
         """
-        # Subconsulta para obtener la semana más reciente de cada acción
-        subq = self.db.query(
-            WeeklyData.stock_id,
-            func.max(WeeklyData.week_end_date).label('max_date')
-        ).group_by(WeeklyData.stock_id).subquery()
-        
-        # Obtener acciones en la etapa solicitada
-        results = self.db.query(Stock, WeeklyData).join(
-            WeeklyData, Stock.id == WeeklyData.stock_id
-        ).join(
-            subq,
-            and_(
-                WeeklyData.stock_id == subq.c.stock_id,
-                WeeklyData.week_end_date == subq.c.max_date
-            )
+        # Estado actual desde el snapshot stock_latest (una fila por acción)
+        results = self.db.query(Stock, StockLatest).join(
+            StockLatest, Stock.id == StockLatest.stock_id
         ).filter(
-            WeeklyData.stage == stage
+            StockLatest.stage == stage
         ).all()
         
         stocks = []
-        for stock, weekly in results:
+        for stock, latest in results:
             stocks.append({
                 'ticker': stock.ticker,
                 'name': stock.name,
-                'stage': weekly.stage,
-                'week_end_date': weekly.week_end_date,
-                'close': float(weekly.close),
-                'ma30': float(weekly.ma30) if weekly.ma30 else None,
-                'slope': float(weekly.ma30_slope) if weekly.ma30_slope else None
+                'stage': latest.stage,
+                'week_end_date': latest.week_end_date,
+                'close': float(latest.close),
+                'ma30': float(latest.ma30) if latest.ma30 else None,
+                'slope': float(latest.ma30_slope) if latest.ma30_slope else None,
+                'mrs': float(latest.mrs) if latest.mrs is not None else None,
+                'weeks_in_stage': latest.weeks_in_stage,
+                'rs_rank': float(latest.rs_rank) if latest.rs_rank is not None else None
             })
         
         return stocks
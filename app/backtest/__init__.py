@@ -0,0 +1,14 @@
+"""
+Backtest del Sistema Weinstein
+Universo cargado una vez en arrays (data), señales con las reglas de
+producción (engine) y métricas de operaciones y capital (metrics).
+
+    python -m app.backtest run --start 2015-01-01 --stop 8 --trailing 15
+"""
+from app.backtest.data import Universe, WeekRow, load_universe
+from app.backtest.engine import BacktestEngine, BacktestResult, RecordingSignalGenerator
+
+__all__ = [
+    'Universe', 'WeekRow', 'load_universe',
+    'BacktestEngine', 'BacktestResult', 'RecordingSignalGenerator',
+]
@@ -0,0 +1,579 @@
+"""
+Línea de comandos del backtest
+
+Uso:
+    python -m app.backtest run
+    python -m app.backtest run --start 2015-01-01 --end 2024-12-31 --stop 8 --trailing 15
+    python -m app.backtest run --recompute-stages --csv resultados.csv
+    python -m app.backtest run --time-stop 180 --target 40
+    python -m app.backtest run --verify        # comparar señales con la tabla signals
+    python -m app.backtest grid --stop 5:12:1 --trailing 10,15,20,25 --time-stop none,180
+    python -m app.backtest grid --stop 4:15:0.5 --trailing 8:30:1 --random 200 --workers 8
+    python -m app.backtest walkforward --slope-entry 0.02,0.025,0.03 --max-dist 0.10,0.15,0.20
+    python -m app.backtest portfolio --start 2023-01-01 --capital 100000 --max-positions 10 --sizing risk
+    python -m app.backtest replay --start 2024-06-01 --end 2026-02-14 --csv emitidas.csv
+    python -m app.backtest run --no-cache      # ignorar la caché de resultados
+    python -m app.backtest cache --clear
+"""
+import sys
+import csv
+import time
+import argparse
+import logging
+from datetime import date
+from typing import List, Optional
+
+from app.cache import MISSING
+from app.database import SessionLocal, Signal
+from app.backtest.cache import ResultCache, dataset_fingerprint
+from app.backtest.data import load_universe
+from app.backtest.engine import BacktestEngine, BacktestResult
+from app.backtest.metrics import yearly_stats, summarize_trades
+from app.backtest.simulator import default_exit_rules
+from app.backtest.grid import (
+    build_grid, expand_values, run_grid, rank_results, save_results, RESULT_COLUMNS, GRID_PARAMS,
+)
+from app.backtest.walkforward import WalkForward, save_walkforward
+from app.backtest.portfolio import PortfolioSimulator, SIZING_METHODS, SERIES_COLUMNS
+from app.backtest.replay import ProductionReplay, load_replay_universe
+from app.config import BACKTEST_WORKERS
+
+logger = logging.getLogger('app.backtest')
+
+# Opciones de walkforward → parámetro barrido (valores con expand_values)
+SWEEP_OPTIONS = (
+    ('slope_exit', 'ma30_slope_threshold', float),
+    ('slope_entry', 'ma30_slope_entry_threshold', float),
+    ('price_band', 'price_ma30_threshold', float),
+    ('resistance', 'buy_resistance_weeks', int),
+    ('base_weeks', 'buy_min_base_weeks', int),
+    ('base_slope', 'buy_max_base_slope', float),
+    ('max_dist', 'buy_max_dist_entry', float),
+    ('volume', 'volume_spike_threshold', float),
+    ('min_rs_rank', 'buy_min_rs_rank', float),
+    ('stop', 'initial_stop_pct', float),
+    ('trailing', 'trailing_stop_pct', float),
+    ('time_stop', 'max_days', int),
+    ('target', 'target_pct', float),
+)
+
+CSV_FIELDS = [
+    'ticker', 'name', 'entry_date', 'entry_price', 'ma30_entry',
+    'exit_date', 'exit_price', 'return_pct', 'days_held',
+    'exit_reason', 'winner', 'highest_price', 'initial_stop', 'final_stop'
+]
+PORTFOLIO_CSV_FIELDS = CSV_FIELDS + ['quantity', 'position_value', 'pnl']
+REPLAY_CSV_FIELDS = ['emitted_week', 'ticker', 'week_end_date', 'signal_type',
+                     'stage_from', 'stage_to', 'price', 'ma30']
+
+# Argumentos que no cambian el resultado (fuera de la clave de la caché)
+CACHE_IGNORED = ('csv', 'trades_csv', 'verify', 'no_cache', 'workers', 'top', 'sort')
+
+
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+def _open_cache(args, db) -> tuple:
+    """Caché de resultados y huella de los datos ((None, None) con --no-cache)."""
+    if args.no_cache:
+        return None, None
+    return ResultCache(), dataset_fingerprint(db)
+
+
+def _cache_params(args) -> dict:
+    return {k: v for k, v in vars(args).items() if k not in CACHE_IGNORED}
+
+
+def _print_result(result: BacktestResult) -> None:
+    m = result.metrics
+    p = result.params
+    print("=" * 65)
+    print("BACKTEST SISTEMA WEINSTEIN")
+    print(f"Rango:          {p['start'] or 'inicio'} → {p['end'] or 'fin'}")
+    print(f"Stop inicial:   {p['initial_stop_pct']}%   Trailing: {p['trailing_stop_pct']}%")
+    print(f"Etapas:         {'recalculadas' if p['recompute_stages'] else 'guardadas en BD'}")
+    print(f"Salidas:        {', '.join(p['exit_rules'])}")
+    print("=" * 65)
+
+    counts = result.signals_by_type()
+    print("\nSeñales: " + ('  '.join(f"{t} {n}" for t, n in sorted(counts.items())) or 'ninguna'))
+    if not m.get('trades'):
+        print("Sin operaciones.")
+        return
+
+    print(f"\n  Total operaciones:       {m['trades']}")
+    print(f"  Ganadoras:               {m['winners']:4d}  ({m['win_rate_pct']:.1f}%)")
+    print(f"  Perdedoras:              {m['losers']:4d}  ({100 - m['win_rate_pct']:.1f}%)")
+    print(f"  Retorno promedio:        {m['avg_return_pct']:+.2f}%")
+    print(f"  Retorno mediano:         {m['median_return_pct']:+.2f}%")
+    print(f"  Promedio ganadoras:      {m['avg_winner_pct']:+.2f}%")
+    print(f"  Promedio perdedoras:     {m['avg_loser_pct']:+.2f}%")
+    print(f"  Ratio ganancia/pérdida:  {m['profit_factor']:.2f}:1")
+    print(f"  Duración media:          {m['avg_days_held']:.0f} días")
+    print(f"  CAGR ({p['allocation']:.0%} por op.):     {m['cagr_pct']:+.2f}%")
+    print(f"  Drawdown máximo:         {m['max_drawdown_pct']:.2f}%")
+
+    print("\n  Razones de salida:")
+    for reason, count in m['exit_reasons'].items():
+        print(f"    {reason:22s}: {count:4d}  ({count / m['trades'] * 100:5.1f}%)")
+
+    print(f"\n  {'Año':>5}  {'Ops':>5}  {'Win%':>7}  {'Avg':>8}  {'Max':>8}  {'Min':>8}")
+    for year, y in yearly_stats(result.trades).items():
+        print(f"  {year:>5}  {y['trades']:>5}  {y['win_rate_pct']:>7.1f}%  {y['avg_return_pct']:>+8.2f}%  "
+              f"{y['max_return_pct']:>+8.2f}%  {y['min_return_pct']:>+8.2f}%")
+
+    t = result.timings
+    print(f"\nTiempo: señales {t['signals_s']}s, operaciones {t['trades_s']}s")
+
+
+def _write_csv(trades: List[dict], path: str, fields: List[str] = CSV_FIELDS) -> None:
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(trades)
+    print(f"\n📄 Operaciones exportadas a: {path}")
+
+
+def _verify(db, engine: BacktestEngine, result: BacktestResult) -> int:
+    """Comparar las señales del backtest con la tabla signals en el mismo rango."""
+    query = db.query(Signal.stock_id, Signal.signal_date, Signal.signal_type).filter(
+        Signal.stock_id.in_(engine.universe.stock_ids.tolist())
+    )
+    if engine.start:
+        query = query.filter(Signal.signal_date >= engine.start)
+    if engine.end:
+        query = query.filter(Signal.signal_date <= engine.end)
+    stored = {(s, d, t) for s, d, t in query.all()}
+    computed = {(s['stock_id'], s['week_end_date'], s['signal_type']) for s in result.signals}
+
+    tickers = dict(zip(engine.universe.stock_ids.tolist(), engine.universe.tickers))
+    only_backtest = sorted(computed - stored, key=lambda k: (k[1], k[0]))
+    only_db = sorted(stored - computed, key=lambda k: (k[1], k[0]))
+    print(f"\nVerificación contra signals: {len(computed & stored)} coinciden, "
+          f"{len(only_backtest)} solo en backtest, {len(only_db)} solo en BD")
+    for label, keys in (('solo backtest', only_backtest), ('solo BD', only_db)):
+        for stock_id, day, signal_type in keys[:20]:
+            print(f"  {label:13s} {tickers.get(stock_id, stock_id):8s} {day} {signal_type}")
+    return 0 if not (only_backtest or only_db) else 1
+
+
+def _print_grid(rows: List[dict], top: int) -> None:
+    headers = {
+        'initial_stop_pct': 'Stop', 'trailing_stop_pct': 'Trail', 'max_days': 'Días',
+        'target_pct': 'Obj', 'trades': 'Ops', 'cagr_pct': 'CAGR%', 'win_rate_pct': 'Win%',
+        'max_drawdown_pct': 'DD%', 'avg_days_held': 'Dur', 'avg_return_pct': 'Avg%',
+        'profit_factor': 'G/P', 'total_return_pct': 'Total%',
+    }
+    print("  " + "".join(f"{headers[c]:>8}" for c in RESULT_COLUMNS))
+    for row in rows[:top]:
+        cells = []
+        for column in RESULT_COLUMNS:
+            value = row.get(column)
+            if value is None:
+                cells.append(f"{'-':>8}")
+            elif isinstance(value, float):
+                cells.append(f"{value:>8.2f}")
+            else:
+                cells.append(f"{value:>8}")
+        print("  " + "".join(cells))
+
+
+def _run_grid(args, db) -> int:
+    space = {
+        'initial_stop_pct': expand_values(args.stop),
+        'trailing_stop_pct': expand_values(args.trailing),
+        'max_days': expand_values(args.time_stop, int),
+        'target_pct': expand_values(args.target),
+    }
+    grid = build_grid(space, args.random, args.seed)
+    if not grid:
+        print("Sin combinaciones")
+        return 1
+
+    # Cada combinación se guarda por separado: solo se simulan las que faltan
+    started = time.perf_counter()
+    cache, fingerprint = _open_cache(args, db)
+    base = {'command': 'grid', 'start': args.start, 'end': args.end,
+            'recompute_stages': args.recompute_stages, 'allocation': args.allocation}
+    keys = [cache.key(fingerprint, {**base, **params}) for params in grid] if cache else [None] * len(grid)
+    cached = [cache.get(key) for key in keys] if cache else [MISSING] * len(grid)
+    missing = [params for params, row in zip(grid, cached) if row is MISSING]
+
+    rows = [row for row in cached if row is not MISSING]
+    if missing:
+        universe = load_universe(db, daily_start=args.start)
+        engine = BacktestEngine(universe, args.start, args.end, recompute_stages=args.recompute_stages)
+        signals = engine.generate_signals()
+        print(f"Señales BUY: {sum(1 for s in signals if s['signal_type'] == 'BUY')}  |  "
+              f"Combinaciones: {len(missing)} de {len(grid)} (resto en caché)  |  Procesos: {args.workers}\n")
+        computed = run_grid(universe, engine.stage, signals, missing, args.start, args.allocation,
+                            args.workers, sort_by=args.sort)
+        if cache:
+            by_params = {tuple(row[p] for p in GRID_PARAMS): row for row in computed}
+            for params, key, row in zip(grid, keys, cached):
+                if row is MISSING:
+                    cache.set(key, by_params[tuple(params.get(p) for p in GRID_PARAMS)], evict=False)
+            cache.evict()
+        rows += computed
+    else:
+        print(f"Combinaciones: {len(grid)} (todas en caché)\n")
+
+    rows = rank_results(rows, args.sort)
+    _print_grid(rows, args.top)
+
+    meta = {
+        'start': args.start, 'end': args.end, 'recompute_stages': args.recompute_stages,
+        'allocation': args.allocation, 'sort_by': args.sort, 'random': args.random, 'seed': args.seed,
+        'space': space, 'combinations': len(grid), 'duration_s': round(time.perf_counter() - started, 1),
+    }
+    path = save_results(rows, meta)
+    print(f"\n📄 Resultados: {path}")
+    return 0
+
+
+def _format(value) -> str:
+    if value is None:
+        return '-'
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def _run_walkforward(args, db) -> int:
+    space = {}
+    for option, name, cast in SWEEP_OPTIONS:
+        spec = getattr(args, option)
+        if spec is not None:
+            space[name] = expand_values(spec, cast)
+
+    cache, fingerprint = _open_cache(args, db)
+    key = cache.key(fingerprint, _cache_params(args)) if cache else None
+    result = cache.get(key) if cache else MISSING
+    if result is MISSING:
+        universe = load_universe(db)
+        wf = WalkForward(universe, space, args.train_months, args.test_months, args.step_months,
+                         args.anchored, args.start, args.end, args.metric, args.min_trades, args.allocation)
+        result = wf.run()
+        if cache:
+            cache.set(key, result)
+    else:
+        print("(resultado en caché)")
+
+    swept = [name for name, values in result.params['space'].items() if len(values) > 1]
+    combinations = 1
+    for values in result.params['space'].values():
+        combinations *= len(values)
+    print(f"Ventanas: {len(result.windows)}  |  Combinaciones: {combinations}  |  "
+          f"Métrica: {args.metric}{' (anclado)' if args.anchored else ''}\n")
+
+    print(f"  {'Entrenamiento':23s}  {'Prueba':23s}  {'Train':>8}  {'Ops':>5}  {'Test':>8}  Parámetros")
+    for w in result.windows:
+        chosen = '  '.join(f"{name}={_format(w.get(name))}" for name in swept) if 'test_trades' in w else 'sin combinación'
+        print(f"  {w['train_start']} → {w['train_end']}  {w['test_start']} → {w['test_end']}  "
+              f"{_format(w['train_score']):>8}  {w.get('test_trades', 0):>5}  {_format(w.get('test_score')):>8}  {chosen}")
+
+    m = result.metrics
+    print("\nFuera de muestra (ventanas de prueba encadenadas):")
+    if not m.get('trades'):
+        print("  Sin operaciones.")
+    else:
+        print(f"  Operaciones:          {m['trades']}")
+        print(f"  Win rate:             {m['win_rate_pct']:.1f}%")
+        print(f"  Retorno promedio:     {m['avg_return_pct']:+.2f}%")
+        print(f"  Duración media:       {m['avg_days_held']:.0f} días")
+        print(f"  CAGR:                 {m['cagr_pct']:+.2f}%")
+        print(f"  Drawdown máximo:      {m['max_drawdown_pct']:.2f}%")
+        print(f"  {args.metric} OOS / entrenamiento (media): "
+              f"{_format(m.get(args.metric))} / {_format(m['train_score_avg'])}")
+
+    path = save_walkforward(result)
+    print(f"\n📄 Ventanas: {path}  ({result.timings['total_s']}s)")
+    if args.csv:
+        _write_csv(result.trades, args.csv)
+    return 0
+
+
+def _run_portfolio(args, db) -> int:
+    started = time.perf_counter()
+    cache, fingerprint = _open_cache(args, db)
+    key = cache.key(fingerprint, _cache_params(args)) if cache else None
+    result = cache.get(key) if cache else MISSING
+    loaded = finished = None
+    if result is MISSING:
+        universe = load_universe(db, daily_start=args.start)
+        loaded = time.perf_counter()
+        engine = BacktestEngine(universe, args.start, args.end, recompute_stages=args.recompute_stages)
+        rules = default_exit_rules(args.stop, args.trailing, args.time_stop, args.target)
+        trades = engine.simulate_trades(engine.generate_signals(), rules, end=args.end)
+        portfolio = PortfolioSimulator(universe, args.capital, args.max_positions, args.sizing,
+                                       args.position_pct, args.risk_pct, args.max_position_pct)
+        result = portfolio.run(trades, args.start, args.end)
+        finished = time.perf_counter()
+        if cache:
+            cache.set(key, result)
+
+    m = result.metrics
+    p = result.params
+    sizing = (f"{p['position_pct']}% del capital" if p['sizing'] == 'fixed'
+              else f"riesgo {p['risk_pct']}% hasta el stop (máx. {p['max_position_pct']}% por posición)")
+    print("=" * 65)
+    print("BACKTEST DE CARTERA")
+    print(f"Rango:          {p['start'] or 'inicio'} → {p['end'] or 'fin'}")
+    print(f"Capital:        {p['capital']:,.0f}   Posiciones máx.: {p['max_positions']}")
+    print(f"Tamaño:         {sizing}")
+    print(f"Stop inicial:   {args.stop}%   Trailing: {args.trailing}%")
+    print("=" * 65)
+    if not m['trades']:
+        print("\nSin operaciones.")
+        return 0
+
+    skipped = result.skipped
+    print(f"\n  Señales BUY con operación: {m['candidates']}")
+    print(f"  Ejecutadas:                {m['trades']}")
+    print(f"  Descartadas:               {m['skipped']}  (sin hueco {skipped['max_positions']}, "
+          f"ya en cartera {skipped['held']}, sin liquidez {skipped['size']})")
+    print(f"  Win rate:                  {m['win_rate_pct']:.1f}%")
+    print(f"  Capital final:             {m['final_equity']:,.0f}  ({m['total_return_pct']:+.2f}%)")
+    print(f"  CAGR:                      {m['cagr_pct']:+.2f}%")
+    print(f"  Drawdown máximo:           {m['max_drawdown_pct']:.2f}%")
+    print(f"  Exposición media:          {m['avg_exposure_pct']:.1f}%")
+    print(f"  Posiciones simultáneas:    {m['max_positions_held']} máx.")
+    if finished is None:
+        print(f"\nTiempo: {time.perf_counter() - started:.2f}s (resultado en caché)")
+    else:
+        print(f"\nTiempo: carga {loaded - started:.1f}s, simulación {finished - loaded:.2f}s")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=SERIES_COLUMNS)
+            writer.writeheader()
+            writer.writerows(result.rows())
+        print(f"\n📄 Serie diaria exportada a: {args.csv}")
+    if args.trades_csv:
+        _write_csv(result.trades, args.trades_csv, PORTFOLIO_CSV_FIELDS)
+    return 0
+
+
+def _run_replay(args, db) -> int:
+    started = time.perf_counter()
+    universe = load_replay_universe(db, args.start)
+    loaded = time.perf_counter()
+    result = ProductionReplay(universe, args.start, args.end).run()
+    p = result.params
+    if not p['weeks']:
+        print("Sin semanas en el rango")
+        return 1
+
+    st = result.stats
+    print("=" * 65)
+    print("REPLAY DEL PROCESO SEMANAL")
+    print(f"Crons:          {p['start']} → {p['end']} ({p['weeks']} semanas)")
+    print(f"weeks_back:     agregación {p['aggregate_weeks_back']}, análisis {p['analyze_weeks_back']}, "
+          f"señales {p['signals_weeks_back']}")
+    print("=" * 65)
+    counts = result.signals_by_type()
+    print("\nSeñales emitidas: " + ('  '.join(f"{t} {n}" for t, n in sorted(counts.items())) or 'ninguna'))
+    print(f"Reproceso:        {st['steps']} acción-semana con filas nuevas ({st['skipped']} sin cambios), "
+          f"{st['aggregated']} velas, {st['analyzed']} etapas analizadas")
+    print(f"Etapas distintas de las guardadas: {st['stage_mismatches']} de {st['stage_rows']} semanas")
+
+    # Lo que ve el backtest sobre el histórico final en el mismo rango
+    engine = BacktestEngine(universe, p['start'], p['end'])
+    backtest = {(s['stock_id'], s['week_end_date'], s['signal_type']) for s in engine.generate_signals()}
+    emitted = {(s['stock_id'], s['week_end_date'], s['signal_type']): s for s in result.signals}
+    tickers = dict(zip(universe.stock_ids.tolist(), universe.tickers))
+    only_replay = sorted(set(emitted) - backtest, key=lambda k: (k[1], k[0]))
+    only_backtest = sorted(backtest - set(emitted), key=lambda k: (k[1], k[0]))
+    print(f"\nFrente al backtest (run): {len(backtest & set(emitted))} coinciden, "
+          f"{len(only_replay)} solo en producción, {len(only_backtest)} solo en backtest")
+    for label, keys in (('solo producción', only_replay), ('solo backtest', only_backtest)):
+        for stock_id, day, signal_type in keys[:20]:
+            print(f"  {label:15s} {tickers.get(stock_id, stock_id):8s} {day} {signal_type}")
+
+    rules = default_exit_rules(args.stop, args.trailing, args.time_stop, args.target)
+    trades = engine.simulate_trades(result.signals, rules)
+    if trades:
+        m = summarize_trades(trades)
+        print(f"\nOperaciones de las BUY emitidas (stop {args.stop}%, trailing {args.trailing}%):")
+        print(f"  {m['trades']} operaciones, win rate {m['win_rate_pct']:.1f}%, "
+              f"retorno promedio {m['avg_return_pct']:+.2f}%, duración media {m['avg_days_held']:.0f} días")
+    print(f"\nTiempo: carga {loaded - started:.1f}s, replay {result.timings['replay_s']}s")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=REPLAY_CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(result.signals)
+        print(f"\n📄 Señales emitidas exportadas a: {args.csv}")
+    return 0
+
+
+def _run_cache(args) -> int:
+    cache = ResultCache()
+    if args.clear:
+        print(f"Caché vaciada: {cache.clear()} entradas")
+        return 0
+    s = cache.stats()
+    print(f"Caché: {s['directory']}")
+    print(f"  Entradas: {s['entries']}  |  Tamaño: {s['bytes'] / 1024 / 1024:.1f} MB "
+          f"de {s['max_bytes'] / 1024 / 1024:.0f} MB")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Backtest en memoria - Sistema Weinstein')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Señales, operaciones y métricas')
+    run_parser.add_argument('--start', type=_parse_date, help='Primera fecha de señal (YYYY-MM-DD)')
+    run_parser.add_argument('--end', type=_parse_date, help='Última fecha de señal (YYYY-MM-DD)')
+    run_parser.add_argument('--stop', type=float, default=8.0, help='Stop loss inicial en %% (default: 8)')
+    run_parser.add_argument('--trailing', type=float, default=15.0,
+                            help='Trailing stop en %% desde máximo (default: 15)')
+    run_parser.add_argument('--time-stop', type=int, metavar='DIAS',
+                            help='Salida tras N días naturales en cartera')
+    run_parser.add_argument('--target', type=float, metavar='PCT',
+                            help='Objetivo de beneficio en %% sobre la entrada')
+    run_parser.add_argument('--allocation', type=float, default=0.10,
+                            help='Fracción del capital por operación en la curva (default: 0.10)')
+    run_parser.add_argument('--recompute-stages', action='store_true',
+                            help='Recalcular etapas con el analizador en vez de usar las de la BD')
+    run_parser.add_argument('--csv', help='Exportar operaciones a CSV')
+    run_parser.add_argument('--verify', action='store_true',
+                            help='Comparar las señales con la tabla signals (código 1 si difieren)')
+    run_parser.add_argument('--no-cache', action='store_true', help='No leer ni guardar en la caché de resultados')
+
+    grid_parser = commands.add_parser('grid', help='Búsqueda de parámetros de salida en paralelo')
+    grid_parser.add_argument('--start', type=_parse_date, help='Primera fecha de señal (YYYY-MM-DD)')
+    grid_parser.add_argument('--end', type=_parse_date, help='Última fecha de señal (YYYY-MM-DD)')
+    grid_parser.add_argument('--stop', default='5,8,10', help="Stops iniciales en %% ('5,8,10' o '4:12:1')")
+    grid_parser.add_argument('--trailing', default='10,15,20,25', help='Trailing stops en %%')
+    grid_parser.add_argument('--time-stop', default='none', help="Días máximos en cartera ('none' = sin límite)")
+    grid_parser.add_argument('--target', default='none', help="Objetivos de beneficio en %% ('none' = sin objetivo)")
+    grid_parser.add_argument('--random', type=int, metavar='N', help='Evaluar N combinaciones al azar del grid')
+    grid_parser.add_argument('--seed', type=int, default=0, help='Semilla de la búsqueda aleatoria')
+    grid_parser.add_argument('--workers', type=int, default=BACKTEST_WORKERS,
+                             help=f'Procesos (default: {BACKTEST_WORKERS})')
+    grid_parser.add_argument('--sort', default='cagr_pct',
+                             choices=[c for c in RESULT_COLUMNS if c not in GRID_PARAMS],
+                             help='Métrica de ordenación (default: cagr_pct)')
+    grid_parser.add_argument('--top', type=int, default=20, help='Filas a mostrar (default: 20)')
+    grid_parser.add_argument('--allocation', type=float, default=0.10,
+                             help='Fracción del capital por operación en la curva (default: 0.10)')
+    grid_parser.add_argument('--recompute-stages', action='store_true',
+                             help='Recalcular etapas con el analizador en vez de usar las de la BD')
+    grid_parser.add_argument('--no-cache', action='store_true', help='No leer ni guardar en la caché de resultados')
+
+    wf_parser = commands.add_parser('walkforward', help='Optimización walk-forward (fuera de muestra)')
+    wf_parser.add_argument('--start', type=_parse_date, help='Inicio del histórico (YYYY-MM-DD)')
+    wf_parser.add_argument('--end', type=_parse_date, help='Fin del histórico (YYYY-MM-DD)')
+    wf_parser.add_argument('--train-months', type=int, default=36, help='Meses de entrenamiento (default: 36)')
+    wf_parser.add_argument('--test-months', type=int, default=12, help='Meses de prueba (default: 12)')
+    wf_parser.add_argument('--step-months', type=int, help='Avance entre ventanas (default: --test-months)')
+    wf_parser.add_argument('--anchored', action='store_true',
+                           help='Entrenar siempre desde el inicio (ventana creciente)')
+    wf_parser.add_argument('--metric', default='cagr_pct',
+                           choices=[c for c in RESULT_COLUMNS if c not in GRID_PARAMS and c != 'trades'],
+                           help='Métrica a optimizar (default: cagr_pct)')
+    wf_parser.add_argument('--min-trades', type=int, default=5,
+                           help='Operaciones mínimas en entrenamiento (default: 5)')
+    wf_parser.add_argument('--allocation', type=float, default=0.10,
+                           help='Fracción del capital por operación en la curva (default: 0.10)')
+    sweep = wf_parser.add_argument_group('valores a barrer', "lista '0.02,0.025' o rango 'inicio:fin:paso'; "
+                                         'sin indicar = valor de config')
+    sweep.add_argument('--slope-exit', help='Analizador: umbral de slope para mantenerse en etapa 2/4')
+    sweep.add_argument('--slope-entry', help='Analizador: umbral de slope para entrar en etapa 2/4')
+    sweep.add_argument('--price-band', help='Analizador: distancia a MA30 considerada "cerca"')
+    sweep.add_argument('--resistance', help='BUY: semanas de resistencia')
+    sweep.add_argument('--base-weeks', help='BUY: semanas de base')
+    sweep.add_argument('--base-slope', help='BUY: slope máximo en la base')
+    sweep.add_argument('--max-dist', help='BUY: distancia máxima precio-MA30')
+    sweep.add_argument('--volume', help='BUY: volumen mínimo frente a la media de la base')
+    sweep.add_argument('--min-rs-rank', help='BUY: percentil mínimo de RS')
+    sweep.add_argument('--stop', help='Salida: stop inicial en %%')
+    sweep.add_argument('--trailing', help='Salida: trailing stop en %%')
+    sweep.add_argument('--time-stop', help="Salida: días máximos ('none' = sin límite)")
+    sweep.add_argument('--target', help="Salida: objetivo en %% ('none' = sin objetivo)")
+    wf_parser.add_argument('--csv', help='Exportar las operaciones fuera de muestra a CSV')
+    wf_parser.add_argument('--no-cache', action='store_true', help='No leer ni guardar en la caché de resultados')
+
+    pf_parser = commands.add_parser('portfolio', help='Cartera con capital, tamaño y posiciones simultáneas')
+    pf_parser.add_argument('--start', type=_parse_date, help='Primera fecha de entrada (YYYY-MM-DD)')
+    pf_parser.add_argument('--end', type=_parse_date, help='Última fecha (YYYY-MM-DD)')
+    pf_parser.add_argument('--stop', type=float, default=8.0, help='Stop loss inicial en %% (default: 8)')
+    pf_parser.add_argument('--trailing', type=float, default=15.0,
+                           help='Trailing stop en %% desde máximo (default: 15)')
+    pf_parser.add_argument('--time-stop', type=int, metavar='DIAS', help='Salida tras N días naturales')
+    pf_parser.add_argument('--target', type=float, metavar='PCT', help='Objetivo de beneficio en %%')
+    pf_parser.add_argument('--capital', type=float, default=100000.0, help='Capital inicial (default: 100000)')
+    pf_parser.add_argument('--max-positions', type=int, default=10, help='Posiciones abiertas máx. (default: 10)')
+    pf_parser.add_argument('--sizing', choices=SIZING_METHODS, default='fixed',
+                           help='fixed = %% fijo del capital; risk = riesgo fijo hasta el stop (default: fixed)')
+    pf_parser.add_argument('--position-pct', type=float, default=10.0,
+                           help='Con fixed: %% del capital por posición (default: 10)')
+    pf_parser.add_argument('--risk-pct', type=float, default=1.0,
+                           help='Con risk: %% del capital arriesgado hasta el stop (default: 1)')
+    pf_parser.add_argument('--max-position-pct', type=float, default=25.0,
+                           help='Con risk: tope por posición en %% del capital (default: 25)')
+    pf_parser.add_argument('--recompute-stages', action='store_true',
+                           help='Recalcular etapas con el analizador en vez de usar las de la BD')
+    pf_parser.add_argument('--csv', help='Exportar la serie diaria (capital, exposición, drawdown) a CSV')
+    pf_parser.add_argument('--trades-csv', help='Exportar las operaciones ejecutadas a CSV')
+    pf_parser.add_argument('--no-cache', action='store_true', help='No leer ni guardar en la caché de resultados')
+
+    rp_parser = commands.add_parser('replay', help='Señales que habría emitido el cron semanal, semana a semana')
+    rp_parser.add_argument('--start', type=_parse_date, help='Primer cron (YYYY-MM-DD; default: inicio del histórico)')
+    rp_parser.add_argument('--end', type=_parse_date, help='Último cron (YYYY-MM-DD)')
+    rp_parser.add_argument('--stop', type=float, default=8.0, help='Stop loss inicial en %% (default: 8)')
+    rp_parser.add_argument('--trailing', type=float, default=15.0,
+                           help='Trailing stop en %% desde máximo (default: 15)')
+    rp_parser.add_argument('--time-stop', type=int, metavar='DIAS', help='Salida tras N días naturales')
+    rp_parser.add_argument('--target', type=float, metavar='PCT', help='Objetivo de beneficio en %%')
+    rp_parser.add_argument('--csv', help='Exportar las señales emitidas (con la semana del cron) a CSV')
+
+    cache_parser = commands.add_parser('cache', help='Estado de la caché de resultados')
+    cache_parser.add_argument('--clear', action='store_true', help='Vaciar la caché')
+
+    args = parser.parse_args(argv)
+    if args.command == 'cache':
+        return _run_cache(args)
+
+    db = SessionLocal()
+    try:
+        if args.command == 'grid':
+            return _run_grid(args, db)
+        if args.command == 'walkforward':
+            return _run_walkforward(args, db)
+        if args.command == 'portfolio':
+            return _run_portfolio(args, db)
+        if args.command == 'replay':
+            return _run_replay(args, db)
+
+        start = time.perf_counter()
+        # --verify necesita el motor: siempre se ejecuta
+        cache, fingerprint = (None, None) if args.verify else _open_cache(args, db)
+        key = cache.key(fingerprint, _cache_params(args)) if cache else None
+        result = cache.get(key) if cache else MISSING
+        if result is MISSING:
+            universe = load_universe(db, daily_start=args.start)
+            engine = BacktestEngine(universe, args.start, args.end, recompute_stages=args.recompute_stages)
+            rules = default_exit_rules(args.stop, args.trailing, args.time_stop, args.target)
+            result = engine.run(args.stop, args.trailing, args.allocation, rules)
+            if cache:
+                cache.set(key, result)
+            _print_result(result)
+            print(f"Total (con carga): {time.perf_counter() - start:.1f}s")
+        else:
+            _print_result(result)
+            print(f"Total: {time.perf_counter() - start:.2f}s (resultado en caché)")
+
+        if args.csv:
+            _write_csv(result.trades, args.csv)
+        if args.verify:
+            return _verify(db, engine, result)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+Caché en disco de resultados del backtest
+Cada resultado (operaciones, métricas, filas de la búsqueda...) se guarda en
+data/backtest/cache/<clave>.pkl. La clave es un sha256 de:
+  - la huella de los datos: filas, última fecha y última modificación o
+    suma de columnas de weekly_data, daily_data y weekly_rs_rank, acciones
+    activas y la versión de datos que publica el pipeline (data_version)
+  - la huella del código: fuentes de las reglas y del backtest y los
+    umbrales de config que usan
+  - todos los parámetros de la ejecución
+Si nada de eso cambia, repetir un backtest no vuelve a leer la BD. El
+directorio tiene un tamaño máximo: al superarlo se borran las entradas
+usadas hace más tiempo (la fecha de modificación se actualiza en cada
+acierto).
+"""
+import os
+import json
+import pickle
+import hashlib
+import logging
+from typing import Any, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import app.config as config
+from app.cache import MISSING
+from app.database import Stock, DailyData, WeeklyData, WeeklyRsRank
+from app.data_version import get_data_version
+from app.backtest.grid import BACKTEST_DIR
+from app.config import BACKTEST_CACHE_MB
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(BACKTEST_DIR, 'cache')
+
+# Subir al cambiar el formato de lo que se guarda
+CACHE_FORMAT = 1
+
+# Código del que dependen los resultados (rutas relativas a la raíz del proyecto)
+CODE_FILES = (
+    'app/analyzer.py', 'app/signals.py', 'app/benchmarks.py', 'app/aggregator.py',
+    'app/pipeline.py',
+    'app/backtest/data.py', 'app/backtest/engine.py', 'app/backtest/simulator.py',
+    'app/backtest/metrics.py', 'app/backtest/grid.py', 'app/backtest/walkforward.py',
+    'app/backtest/portfolio.py', 'app/backtest/replay.py',
+)
+
+# Constantes de config que usan las reglas (prefijos)
+CONFIG_PREFIXES = ('BUY_', 'SHORT_', 'MA30_', 'MIN_WEEKS', 'VOLUME_', 'BENCHMARK')
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+_code_fingerprint: Optional[str] = None
+
+
+class ResultCache:
+    """
+    Resultados en disco direccionados por contenido, con expulsión LRU por tamaño.
+
+    Uso:
+        cache = ResultCache()
+        key = cache.key(dataset_fingerprint(db), {'command': 'run', 'stop': 8.0, ...})
+        result = cache.get(key)
+        if result is MISSING:
+            result = engine.run(...)
+            cache.set(key, result)
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_mb: float = BACKTEST_CACHE_MB):
+        """
+        Args:
+            directory: Directorio de la caché
+            max_mb: Tamaño máximo en MB (0 = no guardar nada)
+        """
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, fingerprint: dict, params: dict) -> str:
+        """Clave de un resultado: datos + código + parámetros."""
+        payload = json.dumps(
+            {'format': CACHE_FORMAT, 'code': code_fingerprint(), 'data': fingerprint, 'params': params},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Any:
+        """Resultado guardado o MISSING."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return MISSING
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            # Entrada ilegible (escrita por otra versión del código): descartarla
+            logger.warning(f"Entrada de caché ilegible {key[:12]}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return MISSING
+
+        try:
+            os.utime(path)   # uso reciente para la expulsión LRU
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, evict: bool = True) -> None:
+        """
+        Guardar un resultado (escritura atómica) y recortar la caché.
+        Con evict=False se recorta después con evict() (muchas escrituras seguidas).
+        """
+        if self.max_bytes <= 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        if evict:
+            self.evict()
+
+    def _entries(self) -> list:
+        """[(mtime, tamaño, ruta)] de las entradas, de la menos a la más reciente."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return sorted(entries)
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> int:
+        """Borrar las entradas usadas hace más tiempo hasta quedar bajo el tamaño máximo."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Caché de backtest: {removed} entradas expulsadas")
+        return removed
+
+    def clear(self) -> int:
+        """Vaciar la caché; devuelve las entradas borradas."""
+        entries = self._entries()
+        for _, _, path in entries:
+            self._remove(path)
+        return len(entries)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            'directory': self.directory,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def dataset_fingerprint(db: Session) -> dict:
+    """
+    Huella de los datos de entrada: unas pocas consultas agregadas, mucho
+    más baratas que cargar el universo.
+    """
+    weekly = db.query(
+        func.count(WeeklyData.id), func.max(WeeklyData.week_end_date), func.max(WeeklyData.updated_at)
+    ).one()
+    # daily_data y weekly_rs_rank no tienen updated_at y se corrigen en su sitio
+    # (data_collector, rs_rank): las sumas de columnas detectan esos cambios
+    daily = db.query(
+        func.count(DailyData.id), func.max(DailyData.date), func.max(DailyData.created_at),
+        func.sum(DailyData.open), func.sum(DailyData.high), func.sum(DailyData.low),
+        func.sum(DailyData.close), func.sum(DailyData.volume)
+    ).one()
+    rs_rank = db.query(
+        func.count(WeeklyRsRank.id), func.max(WeeklyRsRank.week_end_date), func.sum(WeeklyRsRank.rs_rank)
+    ).one()
+    stocks = db.query(func.count(Stock.id), func.sum(Stock.id)).filter(Stock.active == True).one()
+    return {
+        'weekly_data': list(weekly),
+        'daily_data': list(daily),
+        'weekly_rs_rank': list(rs_rank),
+        'stocks': [stocks[0], stocks[1]],
+        'data_version': get_data_version()['version'],
+    }
+
+
+def code_fingerprint() -> str:
+    """sha256 de las fuentes de CODE_FILES y de los umbrales de config (una vez por proceso)."""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        digest = hashlib.sha256()
+        for name in CODE_FILES:
+            with open(os.path.join(_ROOT, name), 'rb') as f:
+                digest.update(f.read())
+        thresholds = {
+            name: getattr(config, name) for name in dir(config)
+            if name.startswith(CONFIG_PREFIXES)
+        }
+        digest.update(json.dumps(thresholds, sort_keys=True, default=str).encode('utf-8'))
+        _code_fingerprint = digest.hexdigest()
+    return _code_fingerprint
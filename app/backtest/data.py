@@ -0,0 +1,239 @@
+"""
+Universo del backtest en memoria (formato columnar)
+Las semanas (y opcionalmente los días) de todas las acciones se cargan con
+una consulta por tabla en arrays NumPy contiguos: las filas de la acción i
+ocupan el tramo [offsets[i], offsets[i+1]) de cada columna. Los valores
+NULL de la BD son NaN (etapa 0). Las reglas de producción reciben filas
+ligeras (WeekRow) con los mismos atributos que WeeklyData.
+"""
+import logging
+import time
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.database import Stock, WeeklyData, DailyData, WeeklyRsRank
+from app.benchmarks import BenchmarkMatrix
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WEEKLY_FLOAT_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'ma30', 'ma30_slope', 'rs_rank')
+DAILY_FLOAT_COLUMNS = ('open', 'high', 'low', 'close')
+
+
+class WeekRow:
+    """
+    Semana en memoria con la interfaz de WeeklyData que usan
+    WeinsteinAnalyzer y SignalGenerator (None = NULL, como en la BD).
+    """
+
+    __slots__ = ('week_end_date', 'open', 'high', 'low', 'close', 'volume', 'ma30', 'ma30_slope', 'stage')
+
+    def __init__(self, week_end_date, open, high, low, close, volume, ma30, ma30_slope, stage):
+        self.week_end_date = week_end_date
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.ma30 = ma30
+        self.ma30_slope = ma30_slope
+        self.stage = stage
+
+    def __repr__(self):
+        return f"<WeekRow({self.week_end_date}, close={self.close}, stage={self.stage})>"
+
+
+class DayRow:
+    """Día en memoria con la interfaz de DailyData que usa WeeklyAggregator.aggregate_days."""
+
+    __slots__ = ('date', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, date, open, high, low, close, volume):
+        self.date = date
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+
+class Universe:
+    """
+    Acciones, semanas y días del backtest.
+
+    Atributos:
+        stock_ids, tickers, names, exchanges: una posición por acción (orden por id)
+        weekly: {'offsets', 'date', 'stage', WEEKLY_FLOAT_COLUMNS...}
+        daily: {'offsets', 'date', DAILY_FLOAT_COLUMNS...} (vacío si no se cargó;
+            'volume' solo si se pidió en daily_columns)
+        benchmarks: BenchmarkMatrix (filtro de mercado y MRS)
+    """
+
+    def __init__(self, stocks: List[tuple], weekly: Dict[str, np.ndarray],
+                 daily: Dict[str, np.ndarray], benchmarks: BenchmarkMatrix):
+        self.stock_ids = np.array([s[0] for s in stocks], dtype=np.int64)
+        self.tickers = [s[1] for s in stocks]
+        self.names = [s[2] or '' for s in stocks]
+        self.exchanges = [s[3] or '' for s in stocks]
+        self.position = {stock_id: i for i, stock_id in enumerate(self.stock_ids.tolist())}
+        self.weekly = weekly
+        self.daily = daily
+        self.benchmarks = benchmarks
+
+    @property
+    def size(self) -> int:
+        return len(self.stock_ids)
+
+    def week_slice(self, i: int) -> slice:
+        offsets = self.weekly['offsets']
+        return slice(int(offsets[i]), int(offsets[i + 1]))
+
+    def day_slice(self, i: int) -> slice:
+        offsets = self.daily['offsets']
+        return slice(int(offsets[i]), int(offsets[i + 1]))
+
+    def week_rows(self, i: int) -> List[WeekRow]:
+        """Todas las semanas de la acción i como WeekRow (orden cronológico)."""
+        sl = self.week_slice(i)
+        w = self.weekly
+        dates = w['date'][sl].astype(object)
+        columns = [_nullable(w[c][sl]) for c in ('open', 'high', 'low', 'close')]
+        volume = [None if v is None else int(v) for v in _nullable(w['volume'][sl])]
+        ma30 = _nullable(w['ma30'][sl])
+        slope = _nullable(w['ma30_slope'][sl])
+        stage = [s or None for s in w['stage'][sl].tolist()]
+        return [
+            WeekRow(*fields)
+            for fields in zip(dates, *columns, volume, ma30, slope, stage)
+        ]
+
+    def day_rows(self, i: int, lo: int, hi: int) -> List[DayRow]:
+        """Días [lo, hi) del tramo de la acción i como DayRow (requiere 'volume')."""
+        base = int(self.daily['offsets'][i])
+        sl = slice(base + lo, base + hi)
+        d = self.daily
+        volume = [None if v is None else int(v) for v in _nullable(d['volume'][sl])]
+        return [
+            DayRow(*fields)
+            for fields in zip(d['date'][sl].astype(object), *(_nullable(d[c][sl]) for c in DAILY_FLOAT_COLUMNS), volume)
+        ]
+
+    def rs_ranks(self, i: int) -> Dict[date, float]:
+        """{semana: rs_rank} de la acción i (mismo resultado que get_rs_ranks_by_week)."""
+        sl = self.week_slice(i)
+        ranks = self.weekly['rs_rank'][sl]
+        valid = ~np.isnan(ranks)
+        return dict(zip(self.weekly['date'][sl][valid].astype(object), ranks[valid].tolist()))
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def _nullable(values: np.ndarray) -> list:
+    """Array float → lista Python con None donde hay NaN."""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _column(values: Sequence, dtype=np.float64) -> np.ndarray:
+    return np.array(values, dtype=dtype) if len(values) else np.empty(0, dtype=dtype)
+
+
+def _offsets(row_stock_ids: np.ndarray, stock_ids: np.ndarray) -> np.ndarray:
+    """Inicio de cada acción en filas ordenadas por stock_id (+ total al final)."""
+    offsets = np.searchsorted(row_stock_ids, stock_ids, side='left')
+    return np.append(offsets, len(row_stock_ids)).astype(np.int64)
+
+
+def _stock_filter(stock_ids: Optional[Sequence[int]]):
+    """Acciones del backtest: las mismas que generate_signals_for_all_stocks."""
+    if stock_ids is not None:
+        return Stock.id.in_(list(stock_ids))
+    return and_(Stock.active == True, Stock.exchange != 'INDEX')
+
+
+def load_universe(db: Session, stock_ids: Optional[Sequence[int]] = None,
+                  daily_start: Optional[date] = None, daily_end: Optional[date] = None,
+                  with_daily: bool = True,
+                  daily_columns: Sequence[str] = DAILY_FLOAT_COLUMNS) -> Universe:
+    """
+    Cargar el universo con una consulta por tabla.
+    Las semanas se cargan completas (las reglas dependen de la posición en
+    el histórico); los días, entre daily_start y daily_end si se indican.
+
+    Args:
+        stock_ids: Acciones concretas (None = activas que no son índices)
+        daily_start, daily_end: Rango de datos diarios (para simular operaciones)
+        with_daily: False para no cargar datos diarios
+        daily_columns: Columnas diarias (DAILY_FLOAT_COLUMNS + ('volume',) para agregar semanas)
+    """
+    start = time.perf_counter()
+    stock_filter = _stock_filter(stock_ids)
+
+    stocks = db.query(Stock.id, Stock.ticker, Stock.name, Stock.exchange).filter(
+        stock_filter
+    ).order_by(Stock.id).all()
+    ids = np.array([s[0] for s in stocks], dtype=np.int64)
+
+    rows = db.query(
+        WeeklyData.stock_id, WeeklyData.week_end_date,
+        WeeklyData.open, WeeklyData.high, WeeklyData.low, WeeklyData.close, WeeklyData.volume,
+        WeeklyData.ma30, WeeklyData.ma30_slope, WeeklyRsRank.rs_rank, WeeklyData.stage
+    ).join(
+        Stock, Stock.id == WeeklyData.stock_id
+    ).outerjoin(
+        WeeklyRsRank, and_(
+            WeeklyRsRank.stock_id == WeeklyData.stock_id,
+            WeeklyRsRank.week_end_date == WeeklyData.week_end_date
+        )
+    ).filter(
+        stock_filter
+    ).order_by(WeeklyData.stock_id, WeeklyData.week_end_date).all()
+
+    columns = list(zip(*rows)) or [()] * 11
+    weekly = {
+        'offsets': _offsets(_column(columns[0], np.int64), ids),
+        'date': _column(columns[1], 'datetime64[D]'),
+        'stage': _column([s or 0 for s in columns[10]], np.int8),
+    }
+    for name, values in zip(WEEKLY_FLOAT_COLUMNS, columns[2:10]):
+        weekly[name] = _column(values)
+    del rows, columns
+
+    daily = {}
+    if with_daily:
+        query = db.query(
+            DailyData.stock_id, DailyData.date, *(getattr(DailyData, c) for c in daily_columns)
+        ).join(
+            Stock, Stock.id == DailyData.stock_id
+        ).filter(stock_filter)
+        if daily_start:
+            query = query.filter(DailyData.date >= daily_start)
+        if daily_end:
+            query = query.filter(DailyData.date <= daily_end)
+        rows = query.order_by(DailyData.stock_id, DailyData.date).all()
+
+        columns = list(zip(*rows)) or [()] * (len(daily_columns) + 2)
+        daily = {
+            'offsets': _offsets(_column(columns[0], np.int64), ids),
+            'date': _column(columns[1], 'datetime64[D]'),
+        }
+        for name, values in zip(daily_columns, columns[2:]):
+            daily[name] = _column(values)
+        del rows, columns
+
+    universe = Universe(stocks, weekly, daily, BenchmarkMatrix.load(db))
+    logger.info(
+        f"Universo cargado: {universe.size} acciones, {len(weekly['date'])} semanas, "
+        f"{len(daily.get('date', ()))} días en {time.perf_counter() - start:.1f}s"
+    )
+    return universe
@@ -0,0 +1,299 @@
+"""
+Motor de backtest en memoria sobre las reglas de producción
+Las señales las generan WeinsteinAnalyzer y SignalGenerator (los mismos
+métodos que el pipeline) a partir del universo columnar; solo cambia el
+almacenamiento: las señales se acumulan en memoria en vez de en la BD.
+
+Un prefiltro vectorizado sobre todo el universo descarta las semanas que
+no cumplen las condiciones necesarias de ruptura (MA30, slope, distancia,
+resistencia/soporte), así las reglas completas solo se evalúan en las
+candidatas. El resultado es idéntico a generate_signals_for_stock con
+weeks_back=0 restringido al rango de fechas.
+"""
+import time
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.analyzer import WeinsteinAnalyzer
+from app.signals import SignalGenerator
+from app.benchmarks import BenchmarkMatrix
+from app.backtest.data import Universe
+from app.backtest.metrics import summarize_trades, equity_curve, curve_stats
+from app.backtest.simulator import TradeSimulator, ExitRule, default_exit_rules, TRADE_MAX_DAYS
+from app.config import MIN_WEEKS_FOR_ANALYSIS
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Holgura del prefiltro (solo descarta semanas que las reglas rechazarían seguro)
+PREFILTER_EPS = 1e-9
+
+# Umbrales que se pueden variar con `params` (atributos del analizador / generador)
+ANALYZER_PARAMS = ('ma30_slope_threshold', 'ma30_slope_entry_threshold', 'price_ma30_threshold')
+SIGNAL_PARAMS = (
+    'buy_resistance_weeks', 'buy_min_base_weeks', 'buy_max_base_slope', 'buy_max_dist_entry',
+    'buy_min_rs_rank', 'short_support_weeks', 'short_min_top_weeks', 'short_max_top_slope',
+    'short_max_dist_entry', 'volume_spike_threshold',
+)
+
+
+class RecordingSignalGenerator(SignalGenerator):
+    """SignalGenerator sin BD: las señales se guardan en self.records."""
+
+    def __init__(self, benchmarks: BenchmarkMatrix):
+        super().__init__(None, benchmarks=benchmarks)
+        self.records: List[dict] = []
+        self._seen = set()
+
+    def _create_signal_record(self, change_info: dict, signal_type: str) -> bool:
+        key = (change_info['stock_id'], change_info['week_end_date'], signal_type)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self.records.append({**change_info, 'signal_type': signal_type})
+        return True
+
+
+class BacktestResult:
+    """Señales, operaciones, curva de capital y métricas de una ejecución."""
+
+    def __init__(self, params: dict, signals: List[dict], trades: List[dict],
+                 equity: List[tuple], metrics: dict, timings: Dict[str, float]):
+        self.params = params
+        self.signals = signals
+        self.trades = trades
+        self.equity = equity
+        self.metrics = metrics
+        self.timings = timings
+
+    def signals_by_type(self) -> Dict[str, int]:
+        counts = {}
+        for s in self.signals:
+            counts[s['signal_type']] = counts.get(s['signal_type'], 0) + 1
+        return counts
+
+
+class BacktestEngine:
+    """
+    Backtest del sistema sobre un Universe cargado una vez.
+
+    Uso:
+        universe = load_universe(db, daily_start=date(2015, 1, 1))
+        engine = BacktestEngine(universe, start=date(2015, 1, 1))
+        result = engine.run(initial_stop_pct=8, trailing_stop_pct=15)
+    """
+
+    def __init__(self, universe: Universe, start: Optional[date] = None,
+                 end: Optional[date] = None, recompute_stages: bool = False,
+                 params: Optional[dict] = None):
+        """
+        Args:
+            universe: Datos cargados con load_universe
+            start, end: Rango de fechas de las señales (None = todo el histórico)
+            recompute_stages: Recalcular las etapas con WeinsteinAnalyzer en vez
+                de usar las guardadas (para probar cambios en los umbrales)
+            params: Umbrales distintos de los de config (ANALYZER_PARAMS y
+                SIGNAL_PARAMS); los del analizador implican recompute_stages
+        """
+        self.params = dict(params or {})
+        unknown = set(self.params) - set(ANALYZER_PARAMS) - set(SIGNAL_PARAMS)
+        if unknown:
+            raise ValueError(f"Parámetros desconocidos: {', '.join(sorted(unknown))}")
+        self.universe = universe
+        self.start = start
+        self.end = end
+        self.recompute_stages = recompute_stages or any(k in ANALYZER_PARAMS for k in self.params)
+        self._start64 = np.datetime64(start or date(1900, 1, 1), 'D')
+        self._end64 = np.datetime64(end or date(2999, 12, 31), 'D')
+        self.stage = universe.weekly['stage'].copy()
+        self.analyzer = WeinsteinAnalyzer(None)
+        self._apply_params(self.analyzer, ANALYZER_PARAMS)
+        self._simulator = None
+
+    def _apply_params(self, target, names: tuple) -> None:
+        for name in names:
+            if name in self.params:
+                setattr(target, name, self.params[name])
+
+    # ------------------------------------------------------------------
+    # Señales
+    # ------------------------------------------------------------------
+
+    def _prefilter(self, generator: SignalGenerator):
+        """
+        Candidatas BUY/SHORT de todo el universo en una pasada vectorizada.
+        Trabaja sobre las semanas con MA30 y slope (la lista weekly_ma30 de
+        producción) y aplica solo condiciones necesarias de las reglas.
+
+        Returns:
+            (first, buy, short): inicio de cada acción en esa lista y máscaras
+        """
+        w = self.universe.weekly
+        rows = np.flatnonzero(~np.isnan(w['ma30']) & ~np.isnan(w['ma30_slope']))
+        first = np.append(np.searchsorted(rows, w['offsets'][:-1]), len(rows))
+        stock_of = np.searchsorted(w['offsets'], rows, side='right') - 1
+        local = np.arange(len(rows)) - first[stock_of]
+
+        close = w['close'][rows]
+        ma30 = w['ma30'][rows]
+        slope = w['ma30_slope'][rows]
+        dates = w['date'][rows]
+        closes = pd.Series(close)
+        # Las ventanas que cruzan de una acción a otra quedan fuera por local >= ...
+        prior_max = closes.rolling(generator.buy_resistance_weeks).max().shift(1).to_numpy()
+        prior_min = closes.rolling(generator.short_support_weeks).min().shift(1).to_numpy()
+
+        in_range = (dates >= self._start64) & (dates <= self._end64) & (ma30 != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist = (close - ma30) / ma30
+
+        buy = (
+            in_range
+            & (local >= MIN_WEEKS_FOR_ANALYSIS + generator.buy_resistance_weeks)
+            & (slope > 0)
+            & (dist <= generator.buy_max_dist_entry + PREFILTER_EPS)
+            & (close > prior_max * 1.01 * (1 - PREFILTER_EPS))
+        )
+        short = (
+            in_range
+            & (local >= MIN_WEEKS_FOR_ANALYSIS + generator.short_support_weeks)
+            & (slope < 0)
+            & (-dist <= generator.short_max_dist_entry + PREFILTER_EPS)
+            & (close < prior_min * 0.99 * (1 + PREFILTER_EPS))
+        )
+        return first, buy, short
+
+    def _recompute(self, i: int, rows: list) -> None:
+        """Etapas de la acción i con el analizador (histórico completo, sin contexto previo)."""
+        with_ma30 = [r for r in rows if r.ma30 is not None]
+        self.analyzer.analyze_weeks(with_ma30)
+        sl = self.universe.week_slice(i)
+        self.stage[sl] = [r.stage or 0 for r in rows]
+
+    def generate_signals(self) -> List[dict]:
+        """
+        Señales BUY/SHORT/SELL/STAGE_CHANGE/COVER del rango, ordenadas por fecha.
+        Cada dict tiene los campos de Signal más ticker.
+        """
+        universe = self.universe
+        w = universe.weekly
+        generator = RecordingSignalGenerator(universe.benchmarks)
+        self._apply_params(generator, SIGNAL_PARAMS)
+        first, buy, short = self._prefilter(generator)
+
+        signals_logger = logging.getLogger('app.signals')
+        level = signals_logger.level
+        signals_logger.setLevel(logging.WARNING)
+        try:
+            for i in range(universe.size):
+                sl = universe.week_slice(i)
+                if sl.start == sl.stop:
+                    continue
+                a, b = first[i], first[i + 1]
+                buy_idx = np.flatnonzero(buy[a:b]).tolist()
+                short_idx = np.flatnonzero(short[a:b]).tolist()
+
+                rows = None
+                if self.recompute_stages:
+                    rows = universe.week_rows(i)
+                    self._recompute(i, rows)
+
+                # SELL: pares de semanas con etapa cuya segunda semana está en el rango
+                stage = self.stage[sl]
+                with_stage = np.flatnonzero(stage)
+                stage_dates = w['date'][sl][with_stage]
+                lo = max(int(np.searchsorted(stage_dates, self._start64, side='left')) - 1, 0)
+                hi = int(np.searchsorted(stage_dates, self._end64, side='right'))
+                stage_pos = with_stage[lo:hi]
+                stage_changes = bool(np.any(np.diff(stage[stage_pos])))
+
+                if not (buy_idx or short_idx or stage_changes):
+                    continue
+                if rows is None:
+                    rows = universe.week_rows(i)
+
+                ma30 = w['ma30'][sl]
+                weekly_ma30 = [rows[p] for p in np.flatnonzero(~np.isnan(ma30) & ~np.isnan(w['ma30_slope'][sl]))]
+                weekly_stage = [rows[p] for p in stage_pos]
+                rs_ranks = universe.rs_ranks(i) if generator.buy_min_rs_rank > 0 else None
+
+                generator.generate_signals_from_weeks(
+                    int(universe.stock_ids[i]), universe.tickers[i], weekly_ma30, weekly_stage,
+                    weeks_back=0, rs_ranks=rs_ranks, buy_indices=buy_idx, short_indices=short_idx
+                )
+        finally:
+            signals_logger.setLevel(level)
+        if self.recompute_stages:
+            self._simulator = None   # el cruce día-semana depende de las etapas
+
+        tickers = dict(zip(universe.stock_ids.tolist(), universe.tickers))
+        for record in generator.records:
+            record['ticker'] = tickers[record['stock_id']]
+        return sorted(generator.records, key=lambda s: (s['week_end_date'], s['ticker'], s['signal_type']))
+
+    # ------------------------------------------------------------------
+    # Operaciones
+    # ------------------------------------------------------------------
+
+    def simulator(self, max_days: int = TRADE_MAX_DAYS) -> TradeSimulator:
+        """Simulador sobre el universo con las etapas del motor (recalculadas o no)."""
+        if self._simulator is None or self._simulator.max_days != max_days:
+            self._simulator = TradeSimulator(self.universe, self.stage, max_days)
+        return self._simulator
+
+    def simulate_trades(self, signals: List[dict], rules: Optional[List[ExitRule]] = None,
+                        end: Optional[date] = None) -> List[dict]:
+        """
+        Una operación por señal BUY (por defecto con las reglas de salida de
+        backtest_v3). Con `end` las abiertas se cierran (HOLD) en esa fecha.
+        """
+        return self.simulator().simulate_signals(signals, rules or default_exit_rules(), end)
+
+    # ------------------------------------------------------------------
+    # Ejecución completa
+    # ------------------------------------------------------------------
+
+    def run(self, initial_stop_pct: float = 8.0, trailing_stop_pct: float = 15.0,
+            allocation: float = 0.10, rules: Optional[List[ExitRule]] = None) -> BacktestResult:
+        """
+        Señales + operaciones + métricas.
+
+        Args:
+            initial_stop_pct: Stop loss inicial (% bajo la entrada)
+            trailing_stop_pct: Trailing stop (% bajo el máximo)
+            allocation: Fracción del capital por operación en la curva de capital
+            rules: Reglas de salida (None = default_exit_rules con los stops indicados)
+        """
+        rules = rules or default_exit_rules(initial_stop_pct, trailing_stop_pct)
+        timings = {}
+        start = time.perf_counter()
+        signals = self.generate_signals()
+        timings['signals_s'] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        trades = self.simulate_trades(signals, rules)
+        timings['trades_s'] = round(time.perf_counter() - start, 3)
+
+        equity = equity_curve(trades, allocation)
+        metrics = summarize_trades(trades)
+        metrics.update(curve_stats(equity, self.start))
+
+        params = {
+            'start': self.start, 'end': self.end, 'recompute_stages': self.recompute_stages,
+            **self.params,
+            'initial_stop_pct': initial_stop_pct, 'trailing_stop_pct': trailing_stop_pct,
+            'allocation': allocation, 'exit_rules': [type(r).__name__ for r in rules],
+        }
+        logger.info(
+            f"Backtest: {len(signals)} señales, {len(trades)} operaciones "
+            f"(señales {timings['signals_s']}s, operaciones {timings['trades_s']}s)"
+        )
+        return BacktestResult(params, signals, trades, equity, metrics, timings)
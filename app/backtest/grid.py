@@ -0,0 +1,220 @@
+"""
+Búsqueda de parámetros de salida en paralelo
+Las señales no dependen de los stops, así que se generan una vez; cada
+combinación de parámetros (stop inicial, trailing, salida por tiempo,
+objetivo) solo vuelve a simular las operaciones. Las combinaciones se
+reparten en un ProcessPoolExecutor; los arrays del universo se escriben
+una vez como .npy y cada proceso los abre con np.load(mmap_mode='r'),
+así no se serializan por tarea y las páginas se comparten entre procesos.
+
+El resultado es una tabla ordenada (CAGR, win rate, drawdown máximo,
+duración media...) que se guarda en data/backtest/.
+"""
+import os
+import csv
+import json
+import time
+import random
+import shutil
+import logging
+import tempfile
+import itertools
+from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.backtest.data import Universe
+from app.backtest.metrics import summarize_trades, equity_curve, curve_stats
+from app.backtest.simulator import TradeSimulator, default_exit_rules, to_trades, TRADE_MAX_DAYS
+from app.config import BACKTEST_WORKERS
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BACKTEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'backtest')
+
+# Parámetros de la búsqueda (argumentos de default_exit_rules)
+GRID_PARAMS = ('initial_stop_pct', 'trailing_stop_pct', 'max_days', 'target_pct')
+
+# Columnas de la tabla de resultados
+RESULT_COLUMNS = GRID_PARAMS + (
+    'trades', 'cagr_pct', 'win_rate_pct', 'max_drawdown_pct', 'avg_days_held',
+    'avg_return_pct', 'profit_factor', 'total_return_pct',
+)
+
+# Arrays del universo que necesita el simulador
+_WEEKLY_ARRAYS = ('offsets', 'date', 'close', 'ma30')
+_DAILY_ARRAYS = ('offsets', 'date', 'close', 'high', 'low')
+
+# Estado de cada proceso del pool (lo fija _init_worker)
+_worker = None
+
+
+class _WorkerState:
+    """Simulador y entradas de un proceso del pool."""
+
+    def __init__(self, simulator: TradeSimulator, entries: List[dict], start: Optional[date],
+                 allocation: float):
+        self.simulator = simulator
+        self.entries = entries
+        self.positions = np.array([simulator.universe.position[e['stock_id']] for e in entries], dtype=np.int64)
+        self.dates = np.array([e['week_end_date'] for e in entries], dtype='datetime64[D]')
+        self.prices = np.array([e['price'] for e in entries], dtype=np.float64)
+        self.start = start
+        self.allocation = allocation
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def expand_values(spec: str, cast=float) -> list:
+    """
+    Valores de un parámetro: lista '5,8,10' o rango 'inicio:fin:paso'
+    (fin incluido). 'none' o 0 desactivan la regla (max_days, target_pct).
+    """
+    values = []
+    for part in spec.split(','):
+        part = part.strip()
+        if part.lower() in ('none', ''):
+            values.append(None)
+        elif ':' in part:
+            lo, hi, step = (float(x) for x in part.split(':'))
+            values += [cast(round(v, 6)) for v in np.arange(lo, hi + step / 2, step)]
+        else:
+            values.append(cast(part))
+    return values
+
+
+def build_grid(space: Dict[str, list], samples: Optional[int] = None, seed: int = 0) -> List[dict]:
+    """
+    Combinaciones del producto cartesiano de `space`; con `samples` se
+    toma una muestra aleatoria de ese tamaño (búsqueda aleatoria).
+    """
+    names = [p for p in GRID_PARAMS if p in space]
+    grid = [dict(zip(names, combo)) for combo in itertools.product(*(space[p] for p in names))]
+    if samples and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+def _share_arrays(universe: Universe, stage: np.ndarray, directory: str) -> None:
+    """Escribir los arrays del simulador como .npy (se abren con mmap en cada proceso)."""
+    for name in _WEEKLY_ARRAYS:
+        np.save(os.path.join(directory, f'weekly_{name}.npy'), universe.weekly[name])
+    np.save(os.path.join(directory, 'weekly_stage.npy'), stage)
+    for name in _DAILY_ARRAYS:
+        np.save(os.path.join(directory, f'daily_{name}.npy'), universe.daily[name])
+
+
+def _load_shared(directory: str, stocks: List[tuple]) -> tuple:
+    weekly = {n: np.load(os.path.join(directory, f'weekly_{n}.npy'), mmap_mode='r') for n in _WEEKLY_ARRAYS}
+    daily = {n: np.load(os.path.join(directory, f'daily_{n}.npy'), mmap_mode='r') for n in _DAILY_ARRAYS}
+    stage = np.load(os.path.join(directory, 'weekly_stage.npy'), mmap_mode='r')
+    return Universe(stocks, weekly, daily, None), stage
+
+
+def _init_worker(directory: str, stocks: List[tuple], entries: List[dict], start: Optional[date],
+                 allocation: float, max_days: int) -> None:
+    global _worker
+    logging.getLogger('app.backtest').setLevel(logging.WARNING)
+    universe, stage = _load_shared(directory, stocks)
+    _worker = _WorkerState(TradeSimulator(universe, stage, max_days), entries, start, allocation)
+
+
+def _evaluate(params: dict) -> dict:
+    """Simular todas las entradas con una combinación (se ejecuta en el pool)."""
+    state = _worker
+    rules = default_exit_rules(**params)
+    result = state.simulator.simulate(state.positions, state.dates, state.prices, rules)
+    trades = to_trades(state.simulator.universe, state.entries, result) if result else []
+    row = {p: params.get(p) for p in GRID_PARAMS}
+    row.update(_score(trades, state.start, state.allocation))
+    return row
+
+
+def _score(trades: List[dict], start: Optional[date], allocation: float) -> dict:
+    if not trades:
+        return {'trades': 0}
+    stats = summarize_trades(trades)
+    stats.update(curve_stats(equity_curve(trades, allocation), start))
+    return {k: stats.get(k) for k in RESULT_COLUMNS if k not in GRID_PARAMS}
+
+
+def run_grid(universe: Universe, stage: np.ndarray, signals: List[dict], grid: List[dict],
+             start: Optional[date] = None, allocation: float = 0.10,
+             workers: int = BACKTEST_WORKERS, max_days: int = TRADE_MAX_DAYS,
+             sort_by: str = 'cagr_pct') -> List[dict]:
+    """
+    Evaluar cada combinación de `grid` sobre las señales BUY.
+
+    Args:
+        universe, stage: Universo y etapas (las del motor, recalculadas o no)
+        signals: Señales del motor (BacktestEngine.generate_signals)
+        grid: Combinaciones (build_grid)
+        start: Inicio del backtest (CAGR)
+        workers: Procesos del pool (1 = en el proceso actual)
+        max_days: Días que se siguen tras la entrada
+
+    Returns:
+        Filas (parámetros + métricas) ordenadas de mejor a peor por sort_by
+    """
+    global _worker
+    entries = [s for s in signals if s['signal_type'] == 'BUY' and s['stock_id'] in universe.position]
+    stocks = list(zip(universe.stock_ids.tolist(), universe.tickers, universe.names, universe.exchanges))
+    started = time.perf_counter()
+
+    if workers <= 1:
+        _worker = _WorkerState(TradeSimulator(universe, stage, max_days), entries, start, allocation)
+        rows = [_evaluate(params) for params in grid]
+    else:
+        os.makedirs(BACKTEST_DIR, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix='shared-', dir=BACKTEST_DIR)
+        try:
+            _share_arrays(universe, stage, directory)
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(directory, stocks, entries, start, allocation, max_days)
+            ) as pool:
+                rows = list(pool.map(_evaluate, grid, chunksize=max(1, len(grid) // (workers * 4))))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    logger.info(f"Búsqueda: {len(grid)} combinaciones × {len(entries)} entradas "
+                f"en {time.perf_counter() - started:.1f}s ({workers} procesos)")
+    return rank_results(rows, sort_by)
+
+
+def rank_results(rows: List[dict], sort_by: str = 'cagr_pct') -> List[dict]:
+    """Ordenar de mejor a peor (el drawdown, de menor a mayor)."""
+    reverse = sort_by != 'max_drawdown_pct'
+    missing = float('-inf') if reverse else float('inf')
+    return sorted(rows, key=lambda r: r.get(sort_by) if r.get(sort_by) is not None else missing,
+                  reverse=reverse)
+
+
+def save_results(rows: List[dict], meta: dict, name: Optional[str] = None) -> str:
+    """
+    Guardar la tabla en data/backtest/<nombre>.csv y los parámetros de la
+    búsqueda en <nombre>.json.
+
+    Returns:
+        Ruta del CSV
+    """
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    name = name or f"grid-{datetime.now():%Y%m%d-%H%M%S}"
+    path = os.path.join(BACKTEST_DIR, f"{name}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: (round(v, 4) if isinstance(v, float) else v) for k, v in row.items()})
+    with open(os.path.join(BACKTEST_DIR, f"{name}.json"), 'w') as f:
+        json.dump(meta, f, indent=1, default=str)
+    return path
@@ -0,0 +1,95 @@
+"""
+Métricas del backtest
+Estadísticas de las operaciones (las mismas que imprime backtest_v3) y
+curva de capital: cada operación se liquida en su fecha de salida con una
+fracción fija del capital, de ahí la CAGR y el drawdown máximo.
+"""
+from datetime import date
+from typing import Dict, List, Optional
+
+
+def summarize_trades(trades: List[dict]) -> dict:
+    """Win rate, retornos medios, ratio ganancia/pérdida, duración y salidas."""
+    if not trades:
+        return {'trades': 0}
+
+    returns = sorted(t['return_pct'] for t in trades)
+    winners = [t['return_pct'] for t in trades if t['winner']]
+    losers = [t['return_pct'] for t in trades if not t['winner']]
+    avg_winner = sum(winners) / len(winners) if winners else 0.0
+    avg_loser = sum(losers) / len(losers) if losers else 0.0
+
+    exits: Dict[str, int] = {}
+    for t in trades:
+        exits[t['exit_reason']] = exits.get(t['exit_reason'], 0) + 1
+
+    return {
+        'trades': len(trades),
+        'winners': len(winners),
+        'losers': len(losers),
+        'win_rate_pct': len(winners) / len(trades) * 100,
+        'avg_return_pct': sum(returns) / len(returns),
+        'median_return_pct': returns[len(returns) // 2],
+        'avg_winner_pct': avg_winner,
+        'avg_loser_pct': avg_loser,
+        'max_return_pct': returns[-1],
+        'min_return_pct': returns[0],
+        'profit_factor': abs(avg_winner / avg_loser) if avg_loser != 0 else float('inf'),
+        'avg_days_held': sum(t['days_held'] for t in trades) / len(trades),
+        'exit_reasons': dict(sorted(exits.items(), key=lambda kv: kv[1], reverse=True)),
+    }
+
+
+def yearly_stats(trades: List[dict]) -> Dict[int, dict]:
+    """Operaciones, win rate y retornos por año de entrada."""
+    by_year: Dict[int, List[float]] = {}
+    for t in trades:
+        by_year.setdefault(t['entry_date'].year, []).append(t['return_pct'])
+    return {
+        year: {
+            'trades': len(rets),
+            'win_rate_pct': sum(1 for r in rets if r > 0) / len(rets) * 100,
+            'avg_return_pct': sum(rets) / len(rets),
+            'max_return_pct': max(rets),
+            'min_return_pct': min(rets),
+        }
+        for year, rets in sorted(by_year.items())
+    }
+
+
+def equity_curve(trades: List[dict], allocation: float = 0.10,
+                 initial: float = 1.0) -> List[tuple]:
+    """
+    Capital tras cada salida [(fecha, capital)] invirtiendo `allocation`
+    del capital en cada operación (las operaciones solapadas no se limitan;
+    el simulador de cartera lo hace con capital y posiciones reales).
+    """
+    equity = initial
+    curve = []
+    for t in sorted(trades, key=lambda t: (t['exit_date'], t['entry_date'])):
+        equity *= 1 + allocation * t['return_pct'] / 100
+        curve.append((t['exit_date'], equity))
+    return curve
+
+
+def curve_stats(curve: List[tuple], start: Optional[date] = None, initial: float = 1.0) -> dict:
+    """CAGR, retorno total y drawdown máximo de una curva de capital."""
+    if not curve:
+        return {'final_equity': initial, 'total_return_pct': 0.0, 'cagr_pct': 0.0, 'max_drawdown_pct': 0.0}
+
+    peak = initial
+    max_dd = 0.0
+    for _, equity in curve:
+        peak = max(peak, equity)
+        max_dd = max(max_dd, (peak - equity) / peak)
+
+    final = curve[-1][1]
+    first = start or curve[0][0]
+    years = (curve[-1][0] - first).days / 365.25
+    cagr = ((final / initial) ** (1 / years) - 1) * 100 if years > 0 and final > 0 else 0.0
+    return {
+        'final_equity': final,
+        'total_return_pct': (final / initial - 1) * 100,
+        'cagr_pct': cagr,
+        'max_drawdown_pct': max_dd * 100,
+    }
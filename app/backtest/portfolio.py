@@ -0,0 +1,286 @@
+"""
+Backtest de cartera
+Las operaciones del simulador (una por señal BUY) se reproducen en orden
+cronológico con un capital inicial, un máximo de posiciones abiertas y un
+tamaño por posición: fracción fija del capital o riesgo fijo según la
+distancia al stop inicial (cantidad × (entrada − stop) = capital × riesgo).
+Las señales sin hueco o sin liquidez se descartan.
+
+Las series diarias (capital, liquidez, exposición, drawdown, posiciones)
+salen de la matriz de cierres días × acciones: las cantidades en cartera
+son otra matriz construida con diferencias acumuladas, así que el valor de
+mercado de cada día es un producto elemento a elemento, sin bucle por día.
+"""
+import heapq
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.backtest.data import Universe
+from app.backtest.metrics import curve_stats
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Métodos de tamaño de posición
+SIZING_METHODS = ('fixed', 'risk')
+
+# Columnas de la serie diaria
+SERIES_COLUMNS = ('date', 'equity', 'cash', 'market_value', 'exposure_pct', 'drawdown_pct', 'positions')
+
+
+class PortfolioResult:
+    """Operaciones ejecutadas, descartadas, series diarias y métricas."""
+
+    def __init__(self, params: dict, trades: List[dict], skipped: Dict[str, int],
+                 series: Dict[str, np.ndarray], metrics: dict):
+        self.params = params
+        self.trades = trades
+        self.skipped = skipped
+        self.series = series
+        self.metrics = metrics
+
+    def rows(self) -> List[dict]:
+        """Serie diaria como filas (CSV)."""
+        columns = {k: self.series[k].tolist() for k in SERIES_COLUMNS if k != 'date'}
+        columns['date'] = self.series['date'].astype(object).tolist()
+        return [dict(zip(SERIES_COLUMNS, values)) for values in zip(*(columns[k] for k in SERIES_COLUMNS))]
+
+
+class PortfolioSimulator:
+    """
+    Cartera con capital, posiciones simultáneas y tamaño por posición.
+
+    Uso:
+        trades = engine.simulate_trades(engine.generate_signals(), end=end)
+        portfolio = PortfolioSimulator(universe, capital=100000, max_positions=10, sizing='risk')
+        result = portfolio.run(trades, start, end)
+    """
+
+    def __init__(self, universe: Universe, capital: float = 100000.0, max_positions: int = 10,
+                 sizing: str = 'fixed', position_pct: float = 10.0, risk_pct: float = 1.0,
+                 max_position_pct: float = 25.0):
+        """
+        Args:
+            universe: Universo con datos diarios
+            capital: Capital inicial
+            max_positions: Posiciones abiertas como máximo
+            sizing: 'fixed' (position_pct % del capital por posición) o
+                'risk' (risk_pct % del capital entre entrada y stop inicial)
+            max_position_pct: Tope de una posición con sizing='risk' (% del capital)
+        """
+        if sizing not in SIZING_METHODS:
+            raise ValueError(f"Sizing desconocido: {sizing} (opciones: {', '.join(SIZING_METHODS)})")
+        if not universe.daily:
+            raise ValueError("El universo no tiene datos diarios (load_universe con with_daily=True)")
+        self.universe = universe
+        self.capital = capital
+        self.max_positions = max_positions
+        self.sizing = sizing
+        self.position_pct = position_pct
+        self.risk_pct = risk_pct
+        self.max_position_pct = max_position_pct
+
+    # ------------------------------------------------------------------
+    # Datos
+    # ------------------------------------------------------------------
+
+    def _calendar(self, first: np.datetime64, last: np.datetime64) -> np.ndarray:
+        """Días con cotización de cualquier acción del universo en [first, last]."""
+        dates = self.universe.daily['date']
+        return np.unique(dates[(dates >= first) & (dates <= last)])
+
+    def _price_matrix(self, positions: np.ndarray, calendar: np.ndarray) -> np.ndarray:
+        """
+        Cierres (días × acciones) de las acciones `positions`; los días sin
+        dato toman el último cierre conocido (NaN antes del primero).
+        """
+        d = self.universe.daily
+        closes = np.full((len(calendar), len(positions)), np.nan)
+        for col, i in enumerate(positions.tolist()):
+            sl = self.universe.day_slice(i)
+            idx = np.searchsorted(calendar, d['date'][sl], side='left')
+            ok = (idx < len(calendar)) & (calendar[np.minimum(idx, len(calendar) - 1)] == d['date'][sl])
+            closes[idx[ok], col] = d['close'][sl][ok]
+        # Arrastrar el último cierre: índice de la última fila con dato en cada columna
+        filled = np.where(~np.isnan(closes), np.arange(len(calendar))[:, None], 0)
+        np.maximum.accumulate(filled, axis=0, out=filled)
+        return closes[filled, np.arange(len(positions))]
+
+    def _rank(self, positions: np.ndarray, entry_dates: np.ndarray) -> np.ndarray:
+        """RS rank de la semana de la señal (NaN si no hay), para priorizar el mismo día."""
+        w = self.universe.weekly
+        key = positions * (1 << 20) + entry_dates.astype(np.int64)
+        stock = np.repeat(np.arange(self.universe.size), np.diff(w['offsets']))
+        week_key = stock * (1 << 20) + w['date'].astype(np.int64)
+        idx = np.minimum(np.searchsorted(week_key, key), len(week_key) - 1)
+        return np.where(week_key[idx] == key, w['rs_rank'][idx], np.nan)
+
+    # ------------------------------------------------------------------
+    # Simulación
+    # ------------------------------------------------------------------
+
+    def _quantity(self, equity: float, cash: float, price: float, stop: Optional[float]) -> int:
+        """Acciones enteras a comprar (0 = no hay liquidez o el tamaño no llega a una acción)."""
+        if self.sizing == 'risk':
+            if stop is None or not stop < price:
+                return 0
+            quantity = equity * self.risk_pct / 100 / (price - stop)
+            quantity = min(quantity, equity * self.max_position_pct / 100 / price)
+        else:
+            quantity = equity * self.position_pct / 100 / price
+        return int(min(quantity, cash / price))
+
+    def run(self, trades: List[dict], start: Optional[date] = None,
+            end: Optional[date] = None) -> PortfolioResult:
+        """
+        Reproducir las operaciones en orden de entrada. Cada día se liquidan
+        primero las salidas y después se abren entradas; entre señales del
+        mismo día tiene prioridad el mayor RS rank (después, el ticker).
+
+        Args:
+            trades: Operaciones del simulador (to_trades / simulate_trades);
+                sizing='risk' necesita initial_stop (regla StopLoss)
+            start, end: Rango de fechas de entrada y de la serie diaria
+        """
+        position = self.universe.position
+        trades = [
+            t for t in trades
+            if t['stock_id'] in position
+            and (start is None or t['entry_date'] >= start)
+            and (end is None or t['entry_date'] <= end)
+        ]
+        if not trades:
+            return self._empty(start, end)
+
+        stock = np.array([position[t['stock_id']] for t in trades], dtype=np.int64)
+        entry_date = np.array([t['entry_date'] for t in trades], dtype='datetime64[D]')
+        exit_date = np.array([t['exit_date'] for t in trades], dtype='datetime64[D]')
+        entry_price = np.array([t['entry_price'] for t in trades], dtype=np.float64)
+        exit_price = np.array([t['exit_price'] for t in trades], dtype=np.float64)
+        stops = [t.get('initial_stop') for t in trades]
+
+        first = np.datetime64(start, 'D') if start else entry_date.min()
+        last = np.datetime64(end, 'D') if end else exit_date.max()
+        calendar = self._calendar(first, max(last, exit_date.max()))
+        columns, column = np.unique(stock, return_inverse=True)
+        closes = self._price_matrix(columns, calendar)
+        entry_day = np.searchsorted(calendar, entry_date, side='right') - 1
+        exit_day = np.searchsorted(calendar, exit_date, side='right') - 1
+
+        priority = np.nan_to_num(self._rank(stock, entry_date), nan=-1.0)
+        tickers = [self.universe.tickers[i] for i in stock.tolist()]
+        order = sorted(range(len(trades)), key=lambda j: (entry_day[j], -priority[j], tickers[j]))
+
+        cash = self.capital
+        held: Dict[int, tuple] = {}      # columna → (operación, cantidad)
+        exits: List[tuple] = []          # heap (día de salida, operación)
+        quantity = np.zeros(len(trades))
+        skipped = {'max_positions': 0, 'held': 0, 'size': 0}
+
+        for j in order:
+            day = entry_day[j]
+            while exits and exits[0][0] <= day:
+                _, k = heapq.heappop(exits)
+                cash += quantity[k] * exit_price[k]
+                del held[column[k]]
+            if day < 0:
+                continue
+            if column[j] in held:
+                skipped['held'] += 1
+                continue
+            if len(held) >= self.max_positions:
+                skipped['max_positions'] += 1
+                continue
+
+            cols = np.fromiter(held, dtype=np.int64, count=len(held))
+            qty = np.array([q for _, q in held.values()])
+            equity = cash + float(np.dot(np.nan_to_num(closes[day, cols]), qty)) if len(held) else cash
+            size = self._quantity(equity, cash, entry_price[j], stops[j])
+            if size <= 0:
+                skipped['size'] += 1
+                continue
+            quantity[j] = size
+            cash -= size * entry_price[j]
+            held[column[j]] = (j, size)
+            heapq.heappush(exits, (exit_day[j], j))
+
+        executed = np.flatnonzero(quantity > 0)
+        series = self._series(calendar, closes, column, entry_day, exit_day,
+                              entry_price, exit_price, quantity, executed)
+        if end is not None:
+            visible = calendar <= np.datetime64(end, 'D')
+            series = {k: v[visible] for k, v in series.items()}
+
+        result_trades = []
+        for j in executed.tolist():
+            t = dict(trades[j])
+            t['quantity'] = int(quantity[j])
+            t['position_value'] = quantity[j] * entry_price[j]
+            t['pnl'] = quantity[j] * (exit_price[j] - entry_price[j])
+            result_trades.append(t)
+        return PortfolioResult(self._params(start, end), result_trades, skipped, series,
+                               self._metrics(series, result_trades, skipped, len(trades)))
+
+    def _series(self, calendar, closes, column, entry_day, exit_day, entry_price, exit_price,
+                quantity, executed) -> Dict[str, np.ndarray]:
+        """Series diarias a partir de las operaciones ejecutadas (cantidades por diferencias)."""
+        days = len(calendar)
+        delta = np.zeros((days + 1, closes.shape[1]))
+        np.add.at(delta, (entry_day[executed], column[executed]), quantity[executed])
+        np.add.at(delta, (exit_day[executed], column[executed]), -quantity[executed])
+        holdings = np.cumsum(delta[:days], axis=0)
+
+        flows = np.zeros(days + 1)
+        np.add.at(flows, entry_day[executed], -quantity[executed] * entry_price[executed])
+        np.add.at(flows, exit_day[executed], quantity[executed] * exit_price[executed])
+        cash = self.capital + np.cumsum(flows[:days])
+
+        market_value = (holdings * np.nan_to_num(closes)).sum(axis=1)
+        equity = cash + market_value
+        return {
+            'date': calendar,
+            'equity': equity,
+            'cash': cash,
+            'market_value': market_value,
+            'exposure_pct': market_value / equity * 100,
+            'drawdown_pct': (1 - equity / np.maximum.accumulate(equity)) * 100,
+            'positions': (holdings > 1e-9).sum(axis=1),
+        }
+
+    def _metrics(self, series: Dict[str, np.ndarray], trades: List[dict],
+                 skipped: Dict[str, int], candidates: int) -> dict:
+        curve = list(zip(series['date'].astype(object), series['equity'].tolist()))
+        start = curve[0][0] if curve else None
+        metrics = curve_stats(curve, start, self.capital)
+        winners = sum(1 for t in trades if t['pnl'] > 0)
+        metrics.update({
+            'candidates': candidates,
+            'trades': len(trades),
+            'skipped': sum(skipped.values()),
+            'win_rate_pct': winners / len(trades) * 100 if trades else 0.0,
+            'avg_return_pct': sum(t['return_pct'] for t in trades) / len(trades) if trades else 0.0,
+            'avg_exposure_pct': float(series['exposure_pct'].mean()) if len(series['date']) else 0.0,
+            'max_positions_held': int(series['positions'].max()) if len(series['date']) else 0,
+        })
+        return metrics
+
+    def _params(self, start: Optional[date], end: Optional[date]) -> dict:
+        return {
+            'start': start, 'end': end, 'capital': self.capital, 'max_positions': self.max_positions,
+            'sizing': self.sizing, 'position_pct': self.position_pct, 'risk_pct': self.risk_pct,
+            'max_position_pct': self.max_position_pct,
+        }
+
+    def _empty(self, start: Optional[date], end: Optional[date]) -> PortfolioResult:
+        series = {k: np.array([]) for k in SERIES_COLUMNS}
+        series['date'] = np.array([], dtype='datetime64[D]')
+        skipped = {'max_positions': 0, 'held': 0, 'size': 0}
+        return PortfolioResult(self._params(start, end), [], skipped, series,
+                               self._metrics(series, [], skipped, 0))
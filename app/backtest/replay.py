@@ -0,0 +1,310 @@
+"""
+Replay incremental del proceso semanal
+Reproduce semana a semana lo que habría hecho el cron del sábado
+(app/pipeline.py en modo weekly, la parte semanal del sábado) sobre un almacén en
+memoria, con el código de producción y los mismos weeks_back:
+  1. WeeklyAggregator: vela de las últimas AGGREGATE_WEEKS_BACK semanas,
+     MA30 y pendiente (aggregate_days, moving_average, ma30_slope), con el
+     redondeo de las columnas DECIMAL de la BD
+  2. WeinsteinAnalyzer.analyze_weeks sobre las últimas ANALYZE_WEEKS_BACK
+     semanas con MA30, con la etapa guardada de la anterior como contexto
+  3. SignalGenerator.generate_signals_from_weeks con SIGNALS_WEEKS_BACK
+Cada señal lleva la semana del cron que la habría emitido. Es lo que
+producción habría publicado, no lo que ve un backtest sobre el histórico
+final (las etapas recientes cambian al reanalizarlas cada semana).
+
+Estado inicial: las semanas guardadas anteriores al primer viernes. Las
+que los crons posteriores volvieron a tocar las reprocesa el primer paso,
+igual que el cron de esa semana. Los datos diarios no tienen historial de
+revisiones: el replay ve los días definitivos hasta el viernes de cada
+paso, así que una semana agregada ya no cambia y los pasos siguientes
+solo agregan la semana nueva. Una acción sin filas nuevas no se reprocesa
+(el análisis y las señales darían lo mismo). El filtro de mercado y el RS
+rank salen de los datos guardados (la semana W solo depende de cierres
+hasta W); como no dependen del replay, cada acción se recorre por separado.
+"""
+import time
+import bisect
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.aggregator import WeeklyAggregator
+from app.analyzer import WeinsteinAnalyzer
+from app.pipeline import AGGREGATE_WEEKS_BACK, ANALYZE_WEEKS_BACK, SIGNALS_WEEKS_BACK
+from app.backtest.data import Universe, WeekRow, DAILY_FLOAT_COLUMNS, load_universe
+from app.backtest.engine import RecordingSignalGenerator
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Semanas de la media (WeeklyAggregator.calculate_ma30)
+MA30_PERIODS = 30
+
+# Decimales de ma30 (DECIMAL(12,4)) y ma30_slope (DECIMAL(8,4)) en weekly_data
+DB_SCALE = 4
+
+# Columnas diarias que necesita la agregación
+REPLAY_DAILY_COLUMNS = DAILY_FLOAT_COLUMNS + ('volume',)
+
+# Contadores del reproceso
+STAT_KEYS = ('steps', 'skipped', 'aggregated', 'ma30', 'analyzed', 'stage_changes',
+             'stage_rows', 'stage_mismatches')
+
+
+class ReplayResult:
+    """Señales que habría emitido el cron, contadores del reproceso y tiempos."""
+
+    def __init__(self, params: dict, signals: List[dict], stats: Dict[str, int],
+                 timings: Dict[str, float]):
+        self.params = params
+        self.signals = signals
+        self.stats = stats
+        self.timings = timings
+
+    def signals_by_type(self) -> Dict[str, int]:
+        counts = {}
+        for s in self.signals:
+            counts[s['signal_type']] = counts.get(s['signal_type'], 0) + 1
+        return counts
+
+
+class ProductionReplay:
+    """
+    Replay del cron semanal sobre un Universe.
+
+    Uso:
+        universe = load_replay_universe(db, start=date(2024, 6, 1))
+        result = ProductionReplay(universe, start=date(2024, 6, 1)).run()
+        for s in result.signals:
+            print(s['emitted_week'], s['ticker'], s['signal_type'], s['week_end_date'])
+    """
+
+    def __init__(self, universe: Universe, start: Optional[date] = None, end: Optional[date] = None):
+        """
+        Args:
+            universe: Datos cargados con load_replay_universe (días con volumen)
+            start, end: Primer y último cron (None = todo el histórico semanal)
+        """
+        self.universe = universe
+        self.aggregator = WeeklyAggregator(None)
+        self.analyzer = WeinsteinAnalyzer(None)
+        self.weeks = self._calendar(start, end)
+
+    def _calendar(self, start: Optional[date], end: Optional[date]) -> List[date]:
+        """Viernes de cada cron entre start y end."""
+        dates = self.universe.weekly['date']
+        if not len(dates):
+            return []
+        first = start or dates.min().astype(object)
+        last = end or dates.max().astype(object)
+        friday = self.aggregator.get_week_end_date(first)
+        if friday < first:
+            friday += timedelta(days=7)
+        weeks = []
+        while friday <= last:
+            weeks.append(friday)
+            friday += timedelta(days=7)
+        return weeks
+
+    # ------------------------------------------------------------------
+    # Fases del cron sobre una acción
+    # ------------------------------------------------------------------
+
+    def _aggregate(self, i: int, store: List[WeekRow], dates: List[date],
+                   day_dates: np.ndarray, weeks: List[date], stats: dict) -> Optional[int]:
+        """
+        Agregar las semanas `weeks` (aggregate_days) y guardar las velas.
+
+        Returns:
+            Primera posición del almacén que cambió (None = ninguna)
+        """
+        changed = None
+        for week_end in weeks:
+            lo = int(np.searchsorted(day_dates, np.datetime64(week_end - timedelta(days=4), 'D'), side='left'))
+            hi = int(np.searchsorted(day_dates, np.datetime64(week_end, 'D'), side='right'))
+            if lo == hi:
+                continue
+            candle = self.aggregator.aggregate_days(self.universe.day_rows(i, lo, hi))
+            stats['aggregated'] += 1
+
+            values = (candle['open'], candle['high'], candle['low'], candle['close'], candle['volume'])
+            pos = bisect.bisect_left(dates, week_end)
+            if pos < len(dates) and dates[pos] == week_end:
+                row = store[pos]
+                if (row.open, row.high, row.low, row.close, row.volume) == values:
+                    continue
+                row.open, row.high, row.low, row.close, row.volume = values
+            else:
+                store.insert(pos, WeekRow(week_end, *values, None, None, None))
+                dates.insert(pos, week_end)
+            changed = pos if changed is None else min(changed, pos)
+        return changed
+
+    def _moving_averages(self, store: List[WeekRow], positions: List[int], stats: dict) -> None:
+        """MA30 y después pendiente de las posiciones (como aggregate_stock_weekly_data)."""
+        for p in positions:
+            ma30 = None
+            if p + 1 >= MA30_PERIODS:
+                window = store[p + 1 - MA30_PERIODS:p + 1]
+                ma30 = self.aggregator.moving_average([Decimal(repr(r.close)) for r in window])
+            store[p].ma30 = _stored(ma30)
+            stats['ma30'] += 1
+        for p in positions:
+            row, previous = store[p], store[p - 1] if p > 0 else None
+            slope = None
+            if row.ma30 is not None and previous is not None and previous.ma30 is not None:
+                slope = self.aggregator.ma30_slope(row.ma30, previous.ma30)
+            row.ma30_slope = _stored(slope)
+
+    def _replay_stock(self, i: int, generator: RecordingSignalGenerator, stats: dict) -> List[WeekRow]:
+        """Todos los crons sobre la acción i; devuelve su almacén al final."""
+        universe = self.universe
+        sl = universe.week_slice(i)
+        first = int(np.searchsorted(universe.weekly['date'][sl], np.datetime64(self.weeks[0], 'D')))
+        store = universe.week_rows(i)[:first]
+        dates = [r.week_end_date for r in store]
+        day_dates = universe.daily['date'][universe.day_slice(i)]
+
+        # Listas de producción: semanas con MA30 (analizador), con MA30 y
+        # slope (BUY/SHORT) y con etapa (SELL); solo se rehace su cola
+        with_ma30 = [r for r in store if r.ma30 is not None]
+        weekly_ma30 = [r for r in with_ma30 if r.ma30_slope is not None]
+        weekly_stage = [r for r in store if r.stage is not None]
+        rs_ranks = universe.rs_ranks(i) if generator.buy_min_rs_rank > 0 else None
+        stock_id, ticker = int(universe.stock_ids[i]), universe.tickers[i]
+
+        for step, week in enumerate(self.weeks):
+            window = [week - timedelta(days=7 * j) for j in range(AGGREGATE_WEEKS_BACK)]
+            changed = self._aggregate(i, store, dates, day_dates, window if step == 0 else window[:1], stats)
+            if step == 0 and store:
+                # Primer cron: MA30 y etapas de toda la ventana, cambien o no
+                oldest = min(bisect.bisect_left(dates, window[-1]), len(store) - 1)
+                changed = oldest if changed is None else min(changed, oldest)
+            if changed is None:
+                stats['skipped'] += 1
+                continue
+            stats['steps'] += 1
+
+            positions = []
+            for week_end in reversed(window):
+                p = bisect.bisect_left(dates, week_end)
+                if p < len(dates) and dates[p] == week_end and p >= changed:
+                    positions.append(p)
+            self._moving_averages(store, positions, stats)
+            cutoff = dates[changed]
+            _refresh(with_ma30, store, changed, cutoff, lambda r: r.ma30 is not None)
+            _refresh(weekly_ma30, store, changed, cutoff,
+                     lambda r: r.ma30 is not None and r.ma30_slope is not None)
+
+            # Análisis: últimas ANALYZE_WEEKS_BACK semanas con MA30 (analyze_stock_stages)
+            previous_stage = None
+            block = with_ma30
+            if len(with_ma30) > ANALYZE_WEEKS_BACK:
+                previous_stage = with_ma30[-(ANALYZE_WEEKS_BACK + 1)].stage
+                block = with_ma30[-ANALYZE_WEEKS_BACK:]
+            stats['stage_changes'] += self.analyzer.analyze_weeks(block, previous_stage)
+            stats['analyzed'] += len(block)
+            if block and block[0].week_end_date < cutoff:
+                cutoff = block[0].week_end_date
+                changed = bisect.bisect_left(dates, cutoff)
+            _refresh(weekly_stage, store, changed, cutoff, lambda r: r.stage is not None)
+
+            # Señales de la última semana (generate_signals_for_stock)
+            before = len(generator.records)
+            generator.generate_signals_from_weeks(
+                stock_id, ticker, weekly_ma30, weekly_stage,
+                weeks_back=SIGNALS_WEEKS_BACK, rs_ranks=rs_ranks
+            )
+            for record in generator.records[before:]:
+                record['emitted_week'] = week
+
+        # Etapas del replay frente a las guardadas en el mismo rango
+        stored = dict(zip(universe.weekly['date'][sl].astype(object), universe.weekly['stage'][sl].tolist()))
+        for row in store[bisect.bisect_left(dates, self.weeks[0]):]:
+            if row.week_end_date > self.weeks[-1] or row.week_end_date not in stored:
+                continue
+            stats['stage_rows'] += 1
+            if (row.stage or 0) != stored[row.week_end_date]:
+                stats['stage_mismatches'] += 1
+        return store
+
+    # ------------------------------------------------------------------
+    # Ejecución completa
+    # ------------------------------------------------------------------
+
+    def run(self) -> ReplayResult:
+        """Reproducir todos los crons del rango en todas las acciones."""
+        started = time.perf_counter()
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        generator = RecordingSignalGenerator(self.universe.benchmarks)
+        params = {
+            'start': self.weeks[0] if self.weeks else None,
+            'end': self.weeks[-1] if self.weeks else None,
+            'weeks': len(self.weeks), 'aggregate_weeks_back': AGGREGATE_WEEKS_BACK,
+            'analyze_weeks_back': ANALYZE_WEEKS_BACK, 'signals_weeks_back': SIGNALS_WEEKS_BACK,
+        }
+        if not self.weeks:
+            return ReplayResult(params, [], stats, {'replay_s': 0.0})
+
+        signals_logger = logging.getLogger('app.signals')
+        level = signals_logger.level
+        signals_logger.setLevel(logging.WARNING)
+        try:
+            for i in range(self.universe.size):
+                self._replay_stock(i, generator, stats)
+        finally:
+            signals_logger.setLevel(level)
+
+        # Las filas anteriores al replay ya las había revisado algún cron previo
+        tickers = dict(zip(self.universe.stock_ids.tolist(), self.universe.tickers))
+        signals = [r for r in generator.records if r['week_end_date'] >= self.weeks[0]]
+        for record in signals:
+            record['ticker'] = tickers[record['stock_id']]
+        signals.sort(key=lambda s: (s['emitted_week'], s['ticker'], s['signal_type']))
+
+        timings = {'replay_s': round(time.perf_counter() - started, 2)}
+        logger.info(
+            f"Replay: {len(self.weeks)} crons × {self.universe.size} acciones, {len(signals)} señales "
+            f"({stats['steps']} reprocesos, {stats['skipped']} sin filas nuevas) en {timings['replay_s']}s"
+        )
+        return ReplayResult(params, signals, stats, timings)
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def _stored(value: Optional[float]) -> Optional[float]:
+    """
+    Valor tal como vuelve de weekly_data: el driver envía repr(float) y
+    MySQL lo redondea a DB_SCALE decimales (mitades hacia arriba).
+    """
+    if value is None:
+        return None
+    return float(Decimal(repr(value)).quantize(Decimal(1).scaleb(-DB_SCALE), rounding=ROUND_HALF_UP))
+
+
+def _refresh(rows: List[WeekRow], store: List[WeekRow], start: int, cutoff: date, keep) -> None:
+    """Rehacer la cola de una lista filtrada desde la posición `start` del almacén (fecha `cutoff`)."""
+    while rows and rows[-1].week_end_date >= cutoff:
+        rows.pop()
+    rows.extend(r for r in store[start:] if keep(r))
+
+
+def load_replay_universe(db: Session, start: Optional[date] = None) -> Universe:
+    """
+    Universo con lo que necesita el replay: días con volumen desde las
+    semanas que reagrega el primer cron (y hasta el final, para simular
+    las operaciones de sus señales).
+    """
+    daily_start = start - timedelta(days=7 * AGGREGATE_WEEKS_BACK + 7) if start else None
+    return load_universe(db, daily_start=daily_start, daily_columns=REPLAY_DAILY_COLUMNS)
@@ -0,0 +1,405 @@
+"""
+Simulador de operaciones sobre el universo en memoria
+Todas las operaciones de una ejecución se simulan a la vez: los días de
+cada operación se recogen en una matriz (operaciones × días) y la semana
+cerrada vigente en cada día sale de un único cruce ordenado (searchsorted)
+de días y semanas de todo el universo. Cada regla de salida devuelve una
+máscara con los días en que se dispara; la salida es el primer día con
+alguna regla activa (a igualdad de día, manda el orden de las reglas).
+
+Reglas disponibles: StopLoss (inicial + trailing), StageExit (etapa 3/4),
+BelowMA30Exit, TimeStop y ProfitTarget. Se pueden añadir más heredando de
+ExitRule.
+"""
+import logging
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.backtest.data import Universe
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Días naturales que se siguen tras la entrada (igual que backtest_v3)
+TRADE_MAX_DAYS = 500
+
+# Operaciones por bloque (limita la memoria de las matrices operaciones × días)
+SIMULATION_CHUNK = 2000
+
+# Clave de ordenación acción+fecha (días desde 1970 < 2^20)
+_DATE_SPAN = 1 << 20
+
+
+class TradeBars:
+    """
+    Días de un bloque de operaciones en matrices (operaciones × días).
+    Las posiciones sin día (operaciones más cortas) tienen valid=False y
+    NaN en los precios.
+
+    Atributos por operación: entry_price, entry_date (datetime64[D])
+    Matrices: date, close, high, low, days (días desde la entrada),
+    highest (máximo de cierres hasta el día), valid y la semana cerrada
+    vigente: week_stage (0 = ninguna), week_close, week_ma30
+    """
+
+    def __init__(self, entry_date: np.ndarray, entry_price: np.ndarray, date: np.ndarray,
+                 close: np.ndarray, high: np.ndarray, low: np.ndarray, valid: np.ndarray,
+                 week_stage: np.ndarray, week_close: np.ndarray, week_ma30: np.ndarray):
+        self.entry_date = entry_date
+        self.entry_price = entry_price
+        self.date = date
+        self.close = close
+        self.high = high
+        self.low = low
+        self.valid = valid
+        self.week_stage = week_stage
+        self.week_close = week_close
+        self.week_ma30 = week_ma30
+        self.days = (date - entry_date[:, None]).astype(np.int64)
+        self.highest = np.fmax.accumulate(close, axis=1)
+
+
+class ExitRule:
+    """
+    Regla de salida. evaluate() devuelve (dispara, precio): máscara y precio
+    de salida por día; precio None = cierre del día.
+    """
+
+    reason = 'EXIT'
+
+    def evaluate(self, bars: TradeBars) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        raise NotImplementedError
+
+    def reasons(self, bars: TradeBars, rows: np.ndarray, cols: np.ndarray) -> List[str]:
+        """Motivo de salida de las operaciones `rows` que salen el día `cols`."""
+        return [self.reason] * len(rows)
+
+    def fields(self, bars: TradeBars, cols: np.ndarray) -> Dict[str, np.ndarray]:
+        """Columnas extra del resultado (cols = día de salida de cada operación)."""
+        return {}
+
+
+class StopLoss(ExitRule):
+    """
+    Stop inicial bajo la entrada y trailing bajo el máximo de cierres; el
+    stop solo sube y se actualiza antes de comprobar el mínimo del día.
+    Sale al precio del stop cuando el mínimo lo toca.
+    """
+
+    reason = 'STOP_LOSS'
+
+    def __init__(self, initial_pct: float = 8.0, trailing_pct: Optional[float] = 15.0):
+        self.initial_pct = initial_pct
+        self.trailing_pct = trailing_pct
+
+    def levels(self, bars: TradeBars) -> np.ndarray:
+        initial = bars.entry_price * (1 - self.initial_pct / 100)
+        stop = np.broadcast_to(initial[:, None], bars.close.shape)
+        if self.trailing_pct is None:
+            return stop
+        # El trailing solo cuenta cuando un cierre supera la entrada
+        trailing = np.where(bars.highest > bars.entry_price[:, None],
+                            bars.highest * (1 - self.trailing_pct / 100), -np.inf)
+        return np.maximum(stop, trailing)
+
+    def evaluate(self, bars: TradeBars):
+        stop = self.levels(bars)
+        return bars.low <= stop, stop
+
+    def fields(self, bars: TradeBars, cols: np.ndarray):
+        stop = self.levels(bars)
+        return {
+            'initial_stop': bars.entry_price * (1 - self.initial_pct / 100),
+            'final_stop': stop[np.arange(len(cols)), cols],
+        }
+
+
+class StageExit(ExitRule):
+    """Salida al cierre cuando la última semana cerrada está en alguna de `stages`."""
+
+    def __init__(self, stages: Sequence[int] = (3, 4), prefix: str = 'STAGE_'):
+        self.stages = tuple(stages)
+        self.prefix = prefix
+
+    def evaluate(self, bars: TradeBars):
+        return np.isin(bars.week_stage, self.stages), None
+
+    def reasons(self, bars: TradeBars, rows: np.ndarray, cols: np.ndarray):
+        return [f"{self.prefix}{s}" for s in bars.week_stage[rows, cols].tolist()]
+
+
+class BelowMA30Exit(ExitRule):
+    """Salida al cierre cuando la última semana cerró bajo MA30 × factor."""
+
+    reason = 'BELOW_MA30'
+
+    def __init__(self, factor: float = 0.97):
+        self.factor = factor
+
+    def evaluate(self, bars: TradeBars):
+        ma30 = bars.week_ma30
+        with np.errstate(invalid='ignore'):
+            return (ma30 > 0) & (bars.week_close < ma30 * self.factor), None
+
+
+class TimeStop(ExitRule):
+    """Salida al cierre tras `max_days` días naturales en cartera."""
+
+    reason = 'TIME_STOP'
+
+    def __init__(self, max_days: int):
+        self.max_days = max_days
+
+    def evaluate(self, bars: TradeBars):
+        return bars.days >= self.max_days, None
+
+
+class ProfitTarget(ExitRule):
+    """Salida al objetivo cuando el máximo del día alcanza entrada × (1 + pct)."""
+
+    reason = 'TARGET'
+
+    def __init__(self, pct: float):
+        self.pct = pct
+
+    def evaluate(self, bars: TradeBars):
+        target = bars.entry_price * (1 + self.pct / 100)
+        target = np.broadcast_to(target[:, None], bars.close.shape)
+        return bars.high >= target, target
+
+
+def default_exit_rules(initial_stop_pct: float = 8.0, trailing_stop_pct: float = 15.0,
+                       max_days: Optional[int] = None,
+                       target_pct: Optional[float] = None) -> List[ExitRule]:
+    """Reglas de backtest_v3 (stop, etapa 3/4, MA30 × 0.97) y, opcionalmente, tiempo y objetivo."""
+    rules = [StopLoss(initial_stop_pct, trailing_stop_pct)]
+    if target_pct:
+        rules.append(ProfitTarget(target_pct))
+    rules += [StageExit(), BelowMA30Exit()]
+    if max_days:
+        rules.append(TimeStop(max_days))
+    return rules
+
+
+class TradeSimulator:
+    """
+    Simulación vectorizada de operaciones largas sobre un Universe.
+
+    Uso:
+        simulator = TradeSimulator(universe)
+        trades = simulator.simulate(positions, entry_dates, entry_prices,
+                                    default_exit_rules(8, 15))
+    """
+
+    def __init__(self, universe: Universe, stage: Optional[np.ndarray] = None,
+                 max_days: int = TRADE_MAX_DAYS, staged_weeks_only: bool = True):
+        """
+        Args:
+            universe: Universo con datos diarios
+            stage: Etapas por semana (por defecto las del universo; el motor
+                pasa las recalculadas)
+            max_days: Días naturales que se siguen tras la entrada
+            staged_weeks_only: Solo cuentan las semanas con etapa (como
+                backtest_v3); False = cualquier semana cerrada
+        """
+        if not universe.daily:
+            raise ValueError("El universo no tiene datos diarios (load_universe con with_daily=True)")
+        self.universe = universe
+        self.stage = universe.weekly['stage'] if stage is None else stage
+        self.max_days = max_days
+        self.staged_weeks_only = staged_weeks_only
+        daily = universe.daily
+        day_stock = np.repeat(np.arange(universe.size), np.diff(daily['offsets']))
+        self._day_key = day_stock * _DATE_SPAN + daily['date'].astype(np.int64)
+        self._day_week = self._join_weeks(day_stock)
+
+    def _join_weeks(self, day_stock: np.ndarray) -> np.ndarray:
+        """
+        Fila semanal (global) de la última semana cerrada de la misma acción
+        en cada día del universo; -1 si no hay ninguna.
+        """
+        w = self.universe.weekly
+        weeks = np.flatnonzero(self.stage != 0) if self.staged_weeks_only else np.arange(len(w['date']))
+        week_stock = np.searchsorted(w['offsets'], weeks, side='right') - 1
+        week_key = week_stock * _DATE_SPAN + w['date'][weeks].astype(np.int64)
+
+        pos = np.searchsorted(week_key, self._day_key, side='right') - 1
+        found = pos >= 0
+        found[found] = week_stock[pos[found]] == day_stock[found]
+        return np.where(found, weeks[np.maximum(pos, 0)], -1)
+
+    def _bars(self, positions: np.ndarray, entry_dates: np.ndarray, entry_prices: np.ndarray,
+              end: Optional[np.datetime64] = None) -> Tuple[TradeBars, np.ndarray]:
+        """Matrices de días de un bloque de operaciones (y número de días de cada una)."""
+        d, w = self.universe.daily, self.universe.weekly
+        day_start = d['offsets'][positions]
+        day_stop = d['offsets'][positions + 1]
+        dates = d['date']
+
+        # Días (entrada, entrada + max_days] de cada operación: búsqueda por clave acción+fecha
+        key = positions * _DATE_SPAN + entry_dates.astype(np.int64)
+        first = np.maximum(np.searchsorted(self._day_key, key, side='right'), day_start)
+        last = np.minimum(np.searchsorted(self._day_key, key + self.max_days, side='right'), day_stop)
+        if end is not None:
+            end_key = positions * _DATE_SPAN + end.astype(np.int64)
+            last = np.minimum(last, np.searchsorted(self._day_key, end_key, side='right'))
+        count = np.maximum(last - first, 0)
+
+        width = max(int(count.max()) if len(count) else 0, 1)
+        rows = first[:, None] + np.arange(width)
+        valid = np.arange(width) < count[:, None]
+        rows = np.where(valid, rows, 0)
+
+        def take(column, fill=np.nan):
+            return np.where(valid, column[rows], fill)
+
+        # Semana vigente: solo las cerradas después de la entrada
+        week = np.where(valid, self._day_week[rows], -1)
+        week_rows = np.maximum(week, 0)
+        week = np.where((week >= 0) & (w['date'][week_rows] > entry_dates[:, None]), week, -1)
+        has_week = week >= 0
+
+        bars = TradeBars(
+            entry_date=entry_dates,
+            entry_price=entry_prices,
+            date=np.where(valid, dates[rows], entry_dates[:, None]),
+            close=take(d['close']),
+            high=take(d['high']),
+            low=take(d['low']),
+            valid=valid,
+            week_stage=np.where(has_week, self.stage[week_rows], 0),
+            week_close=np.where(has_week, w['close'][week_rows], np.nan),
+            week_ma30=np.where(has_week, w['ma30'][week_rows], np.nan),
+        )
+        return bars, count
+
+    def _simulate_chunk(self, positions, entry_dates, entry_prices, rules, end=None) -> dict:
+        bars, count = self._bars(positions, entry_dates, entry_prices, end)
+        n, width = bars.close.shape
+        rows = np.arange(n)
+
+        # Primer día de cada regla (width = no se dispara); empate: la primera regla
+        exit_col = np.full(n, width)
+        exit_rule = np.full(n, -1)
+        prices = []
+        for k, rule in enumerate(rules):
+            fired, price = rule.evaluate(bars)
+            prices.append(price)
+            fired = fired & bars.valid
+            col = np.where(fired.any(axis=1), fired.argmax(axis=1), width)
+            better = col < exit_col
+            exit_col[better] = col[better]
+            exit_rule[better] = k
+
+        # Sin salida: HOLD al último día disponible
+        holding = exit_rule < 0
+        col = np.where(holding, np.maximum(count - 1, 0), exit_col)
+        exit_price = bars.close[rows, col].copy()
+        reasons = np.full(n, 'HOLD', dtype=object)
+        for k, rule in enumerate(rules):
+            hit = np.flatnonzero(exit_rule == k)
+            if not len(hit):
+                continue
+            if prices[k] is not None:
+                exit_price[hit] = prices[k][hit, col[hit]]
+            reasons[hit] = rule.reasons(bars, hit, col[hit])
+
+        result = {
+            'exit_date': bars.date[rows, col],
+            'exit_price': exit_price,
+            'exit_reason': reasons,
+            'highest_price': np.fmax(bars.highest[rows, col], entry_prices),
+            'has_days': count > 0,
+        }
+        for rule in rules:
+            result.update(rule.fields(bars, col))
+        return result
+
+    def simulate(self, positions: Sequence[int], entry_dates: Sequence[date],
+                 entry_prices: Sequence[float], rules: List[ExitRule],
+                 end: Optional[date] = None) -> Dict[str, np.ndarray]:
+        """
+        Simular operaciones largas que entran al cierre de entry_dates.
+
+        Args:
+            positions: Posición de la acción en el universo (universe.position)
+            entry_dates, entry_prices: Entrada de cada operación
+            rules: Reglas de salida en orden de prioridad
+            end: Último día visible; las operaciones abiertas salen como HOLD
+                a su último cierre hasta esa fecha (sin mirar el futuro)
+
+        Returns:
+            Columnas por operación: exit_date, exit_price, exit_reason,
+            highest_price, return_pct, days_held, has_days (False = sin días
+            tras la entrada) y las que añadan las reglas (initial_stop, final_stop)
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        entry_dates = np.asarray(entry_dates, dtype='datetime64[D]')
+        entry_prices = np.asarray(entry_prices, dtype=np.float64)
+        end = np.datetime64(end, 'D') if end is not None else None
+
+        chunks = [
+            self._simulate_chunk(positions[i:i + SIMULATION_CHUNK], entry_dates[i:i + SIMULATION_CHUNK],
+                                 entry_prices[i:i + SIMULATION_CHUNK], rules, end)
+            for i in range(0, len(positions), SIMULATION_CHUNK)
+        ]
+        if not chunks:
+            return {}
+        result = {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+        result['return_pct'] = (result['exit_price'] - entry_prices) / entry_prices * 100
+        result['days_held'] = (result['exit_date'] - entry_dates).astype(np.int64)
+        return result
+
+    def simulate_signals(self, signals: List[dict], rules: List[ExitRule],
+                         end: Optional[date] = None) -> List[dict]:
+        """
+        Una operación por señal BUY (dicts de BacktestEngine.generate_signals
+        o de la tabla signals: stock_id, week_end_date, price). Se descartan
+        las que no tienen días tras la entrada. `end` como en simulate().
+        """
+        buys = [s for s in signals if s['signal_type'] == 'BUY' and s['stock_id'] in self.universe.position]
+        if not buys:
+            return []
+        position = self.universe.position
+        result = self.simulate(
+            [position[s['stock_id']] for s in buys],
+            [s['week_end_date'] for s in buys],
+            [s['price'] for s in buys],
+            rules,
+            end
+        )
+        return to_trades(self.universe, buys, result)
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def to_trades(universe: Universe, signals: List[dict], result: Dict[str, np.ndarray]) -> List[dict]:
+    """Columnas de simulate() → lista de operaciones (formato de backtest_v3)."""
+    columns = {k: v.tolist() for k, v in result.items() if k != 'has_days'}
+    columns['exit_date'] = result['exit_date'].astype(object).tolist()
+    trades = []
+    for j, s in enumerate(signals):
+        if not result['has_days'][j]:
+            continue
+        i = universe.position[s['stock_id']]
+        trade = {
+            'stock_id': s['stock_id'],
+            'ticker': universe.tickers[i],
+            'name': universe.names[i],
+            'entry_date': s['week_end_date'],
+            'entry_price': s['price'],
+            'ma30_entry': s.get('ma30'),
+        }
+        for k, values in columns.items():
+            trade[k] = values[j]
+        trade['winner'] = trade['return_pct'] > 0
+        trades.append(trade)
+    return trades
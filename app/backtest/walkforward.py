@@ -0,0 +1,570 @@
+"""
+Walk-forward del sistema Weinstein
+El histórico se divide en ventanas de entrenamiento y prueba consecutivas
+(móviles o ancladas al inicio). En cada ventana de entrenamiento se barren
+los umbrales del analizador, de la señal BUY y de las salidas, se elige la
+mejor combinación y se evalúa fuera de muestra en la ventana de prueba
+siguiente. Las operaciones de todas las ventanas de prueba forman la
+curva fuera de muestra (OOS).
+
+El barrido es vectorizado: las etapas se recalculan semana a semana para
+todas las acciones y combinaciones del analizador a la vez (sweep_stages)
+y las reglas BUY son máscaras NumPy sobre indicadores precalculados. Los
+indicadores (resistencia, base, volumen, MRS, mercado, etapas) se calculan
+una vez sobre todo el histórico en FeatureCache y cada ventana solo toma su
+rango de fechas: son causales, así que las ventanas solapadas no repiten
+cálculos y el resultado es el mismo que recalcularlos dentro de la ventana.
+"""
+import os
+import csv
+import json
+import time
+import logging
+import itertools
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.analyzer import WeinsteinAnalyzer
+from app.signals import SignalGenerator
+from app.backtest.data import Universe
+from app.backtest.engine import ANALYZER_PARAMS
+from app.backtest.grid import BACKTEST_DIR, GRID_PARAMS
+from app.backtest.metrics import summarize_trades, equity_curve, curve_stats
+from app.backtest.simulator import TradeSimulator, default_exit_rules, to_trades, TRADE_MAX_DAYS
+from app.config import MIN_WEEKS_FOR_ANALYSIS
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Umbrales de la señal BUY que se pueden barrer (atributos de SignalGenerator)
+BUY_PARAMS = (
+    'buy_resistance_weeks', 'buy_min_base_weeks', 'buy_max_base_slope',
+    'buy_max_dist_entry', 'buy_min_rs_rank', 'volume_spike_threshold',
+)
+
+# Semanas de la ventana del MRS (SignalGenerator._compute_mrs)
+MRS_WEEKS = 52
+
+# Columnas de la tabla de ventanas
+WINDOW_COLUMNS = (
+    'train_start', 'train_end', 'test_start', 'test_end', 'combinations',
+    'train_trades', 'train_score', 'test_trades', 'test_score',
+    'test_win_rate_pct', 'test_avg_return_pct', 'test_max_drawdown_pct',
+) + ANALYZER_PARAMS + BUY_PARAMS + GRID_PARAMS
+
+
+class FeatureCache:
+    """
+    Indicadores del universo calculados una vez sobre todo el histórico.
+
+    Las reglas BUY trabajan sobre la lista weekly_ma30 de producción (semanas
+    con MA30 y slope); `rows` son esas filas del universo y cada indicador es
+    un array alineado con ellas. Las claves incluyen el parámetro del que
+    dependen (p. ej. ('prior_max', 30)), así cada valor del barrido se calcula
+    una sola vez para todas las ventanas.
+    """
+
+    def __init__(self, universe: Universe):
+        self.universe = universe
+        w = universe.weekly
+        self.rows = np.flatnonzero(~np.isnan(w['ma30']) & ~np.isnan(w['ma30_slope']))
+        first = np.append(np.searchsorted(self.rows, w['offsets'][:-1]), len(self.rows))
+        self.stock_of = np.searchsorted(w['offsets'], self.rows, side='right') - 1
+        self.local = np.arange(len(self.rows)) - first[self.stock_of]
+        self.stock_weeks = np.diff(first)[self.stock_of]
+        self.date = w['date'][self.rows]
+        self.close = w['close'][self.rows]
+        self.ma30 = w['ma30'][self.rows]
+        self.slope = w['ma30_slope'][self.rows]
+        self.volume = w['volume'][self.rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.dist = (self.close - self.ma30) / self.ma30
+        self._features: Dict[tuple, np.ndarray] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, *params):
+        """Indicador `name` para `params` (calculado la primera vez)."""
+        key = (name,) + params
+        if key in self._features:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._features[key] = getattr(self, f'_compute_{name}')(*params)
+        return self._features[key]
+
+    # ------------------------------------------------------------------
+    # Indicadores
+    # ------------------------------------------------------------------
+
+    def _compute_prior_max(self, weeks: int) -> np.ndarray:
+        """Máximo cierre de las `weeks` semanas anteriores (resistencia)."""
+        return pd.Series(self.close).rolling(weeks).max().shift(1).to_numpy()
+
+    def _compute_flat_weeks(self, weeks: int, max_slope: float) -> np.ndarray:
+        """Semanas con MA30 plana (slope != 0 y |slope| <= max_slope) entre las `weeks` anteriores."""
+        flat = ((self.slope != 0) & (np.abs(self.slope) <= max_slope)).astype(np.int64)
+        return pd.Series(flat).rolling(weeks).sum().shift(1).fillna(0).to_numpy().astype(np.int64)
+
+    def _compute_base_volume(self, weeks: int) -> tuple:
+        """
+        Media y número de volúmenes positivos de las `weeks` semanas
+        anteriores. Suma en el mismo orden que la regla (mismo redondeo).
+        """
+        n = len(self.rows)
+        positive = self.volume > 0
+        values = np.where(positive, self.volume, 0.0)
+        total = np.zeros(n)
+        count = np.zeros(n, dtype=np.int64)
+        for k in range(min(weeks, n), 0, -1):
+            total[k:] += values[:n - k]
+            count[k:] += positive[:n - k]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return total / count, count
+
+    def _compute_market(self) -> np.ndarray:
+        """Benchmark alcista en la semana (filtro de mercado de las señales BUY)."""
+        benchmarks = self.universe.benchmarks
+        bench_of = [benchmarks.benchmark_for(t) for t in self.universe.tickers]
+        bullish = np.ones(len(self.rows), dtype=bool)
+        for bench in set(bench_of):
+            stocks = [i for i, b in enumerate(bench_of) if b == bench]
+            sel = np.flatnonzero(np.isin(self.stock_of, stocks))
+            days, inverse = np.unique(self.date[sel], return_inverse=True)
+            states = np.array([benchmarks.is_bullish(bench, d) for d in days.astype(object)], dtype=bool)
+            bullish[sel] = states[inverse]
+        return bullish
+
+    def _compute_mrs_ok(self) -> np.ndarray:
+        """MRS sin datos o positivo (compute_mrs sobre 52 semanas de weekly_ma30)."""
+        benchmarks = self.universe.benchmarks
+        bench_of = [benchmarks.benchmark_for(t) for t in self.universe.tickers]
+        bench_close = np.full(len(self.rows), np.nan)
+        for bench in set(bench_of):
+            closes = benchmarks.closes(bench)
+            if not closes:
+                continue
+            stocks = [i for i, b in enumerate(bench_of) if b == bench]
+            sel = np.flatnonzero(np.isin(self.stock_of, stocks))
+            series = pd.Series(closes, dtype=np.float64)
+            series.index = pd.to_datetime(series.index)
+            bench_close[sel] = series.reindex(pd.to_datetime(self.date[sel])).to_numpy()
+
+        n = len(self.rows)
+        span = MRS_WEEKS - 1
+        if n <= span:
+            return np.ones(n, dtype=bool)
+        valid = bench_close > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(valid, self.close / bench_close, 0.0)
+        total = np.zeros(n)
+        complete = np.zeros(n, dtype=np.int64)
+        for k in range(span, -1, -1):
+            total[span:] += ratio[span - k:n - k]
+            complete[span:] += valid[span - k:n - k]
+
+        defined = (self.local >= MRS_WEEKS) & (complete == MRS_WEEKS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mrs = (self.close / bench_close / (total / MRS_WEEKS) - 1) * 100
+        return ~defined | (mrs > 0)
+
+    def _compute_rs_rank(self) -> np.ndarray:
+        return self.universe.weekly['rs_rank'][self.rows]
+
+    # ------------------------------------------------------------------
+    # Reglas
+    # ------------------------------------------------------------------
+
+    def stages(self, param_sets: List[dict]) -> List[np.ndarray]:
+        """Etapas de todo el universo para cada combinación del analizador (barrido conjunto)."""
+        keys = [tuple(p[k] for k in ANALYZER_PARAMS) for p in param_sets]
+        missing = list(dict.fromkeys(k for k in keys if ('stages', k) not in self._features))
+        if missing:
+            swept = sweep_stages(self.universe, [dict(zip(ANALYZER_PARAMS, k)) for k in missing])
+            for key, stage in zip(missing, swept):
+                self._features[('stages', key)] = stage
+        self.misses += len(missing)
+        self.hits += len(set(keys)) - len(missing)
+        return [self._features[('stages', k)] for k in keys]
+
+    def buy_mask(self, params: dict) -> np.ndarray:
+        """
+        Semanas (de `rows`) con señal BUY: las mismas condiciones que
+        SignalGenerator._is_valid_buy_breakout y los filtros de mercado, MRS
+        y RS rank de _generate_buy_signals.
+        """
+        rw = params['buy_resistance_weeks']
+        bw = params['buy_min_base_weeks']
+        mean_volume, volume_weeks = self.get('base_volume', bw)
+        rs_rank = self.get('rs_rank')
+        with np.errstate(invalid='ignore'):
+            mask = (
+                (self.stock_weeks >= MIN_WEEKS_FOR_ANALYSIS + bw)
+                & (self.local >= MIN_WEEKS_FOR_ANALYSIS + rw)
+                & (self.local >= bw)
+                & (self.ma30 != 0)
+                & (self.dist <= params['buy_max_dist_entry'])
+                & (self.slope > 0)
+                & (self.close > self.get('prior_max', rw) * 1.01)
+                & (self.get('flat_weeks', bw, params['buy_max_base_slope']) >= int(bw * 0.75))
+                & ~((self.volume > 0) & (volume_weeks >= 8)
+                    & (self.volume < mean_volume * params['volume_spike_threshold']))
+                & self.get('market')
+                & self.get('mrs_ok')
+                & ~(rs_rank < params['buy_min_rs_rank'])
+            )
+        return mask
+
+
+class WalkForwardResult:
+    """Ventanas, operaciones fuera de muestra y métricas de la curva OOS."""
+
+    def __init__(self, params: dict, windows: List[dict], trades: List[dict],
+                 equity: List[tuple], metrics: dict, timings: Dict[str, float]):
+        self.params = params
+        self.windows = windows
+        self.trades = trades
+        self.equity = equity
+        self.metrics = metrics
+        self.timings = timings
+
+
+class WalkForward:
+    """
+    Optimización walk-forward sobre un Universe.
+
+    Uso:
+        universe = load_universe(db)
+        wf = WalkForward(universe, {'ma30_slope_entry_threshold': [0.02, 0.025, 0.03],
+                                    'buy_max_dist_entry': [0.10, 0.15],
+                                    'trailing_stop_pct': [10, 15, 20]})
+        result = wf.run()
+    """
+
+    def __init__(self, universe: Universe, space: Optional[Dict[str, list]] = None,
+                 train_months: int = 36, test_months: int = 12, step_months: Optional[int] = None,
+                 anchored: bool = False, start: Optional[date] = None, end: Optional[date] = None,
+                 metric: str = 'cagr_pct', min_trades: int = 5, allocation: float = 0.10,
+                 max_days: int = TRADE_MAX_DAYS):
+        """
+        Args:
+            universe: Datos cargados con load_universe
+            space: Valores a barrer por parámetro (ANALYZER_PARAMS, BUY_PARAMS,
+                GRID_PARAMS); los que falten usan el valor de config
+            train_months, test_months: Duración de las ventanas
+            step_months: Avance entre ventanas (por defecto test_months)
+            anchored: Entrenamiento desde `start` (ventana creciente)
+            start, end: Histórico a recorrer (por defecto todo el universo)
+            metric: Métrica a maximizar (max_drawdown_pct se minimiza)
+            min_trades: Operaciones mínimas en entrenamiento para elegir una combinación
+            allocation: Fracción del capital por operación en la curva
+        """
+        space = dict(space or {})
+        unknown = set(space) - set(ANALYZER_PARAMS) - set(BUY_PARAMS) - set(GRID_PARAMS)
+        if unknown:
+            raise ValueError(f"Parámetros desconocidos: {', '.join(sorted(unknown))}")
+
+        analyzer = WeinsteinAnalyzer(None)
+        generator = SignalGenerator(None)
+        defaults = {name: getattr(analyzer, name) for name in ANALYZER_PARAMS}
+        defaults.update({name: getattr(generator, name) for name in BUY_PARAMS})
+        defaults.update({'initial_stop_pct': 8.0, 'trailing_stop_pct': 15.0, 'max_days': None, 'target_pct': None})
+        self.space = {name: list(space.get(name) or [defaults[name]]) for name in defaults}
+
+        self.universe = universe
+        self.train_months = train_months
+        self.test_months = test_months
+        self.step_months = step_months or test_months
+        self.anchored = anchored
+        dates = universe.weekly['date']
+        self.start = start or dates.min().astype(object)
+        self.end = end or dates.max().astype(object)
+        self.metric = metric
+        self.min_trades = min_trades
+        self.allocation = allocation
+        self.max_days = max_days
+        self.features = FeatureCache(universe)
+        self._simulators: Dict[tuple, TradeSimulator] = {}
+
+    # ------------------------------------------------------------------
+    # Combinaciones y ventanas
+    # ------------------------------------------------------------------
+
+    def _combos(self, names: tuple) -> List[dict]:
+        return [dict(zip(names, values)) for values in itertools.product(*(self.space[n] for n in names))]
+
+    def windows(self) -> List[tuple]:
+        """Ventanas (train_start, train_end, test_start, test_end); fechas incluidas."""
+        origin = self.start.replace(day=1)
+        windows = []
+        k = 0
+        while True:
+            train_start = origin if self.anchored else _add_months(origin, k * self.step_months)
+            test_start = _add_months(origin, k * self.step_months + self.train_months)
+            test_end = _add_months(test_start, self.test_months) - timedelta(days=1)
+            if test_start > self.end:
+                break
+            windows.append((max(train_start, self.start), test_start - timedelta(days=1),
+                            test_start, min(test_end, self.end)))
+            k += 1
+        return windows
+
+    def _simulator(self, analyzer_params: dict, stage: np.ndarray) -> TradeSimulator:
+        key = tuple(analyzer_params[k] for k in ANALYZER_PARAMS)
+        if key not in self._simulators:
+            self._simulators[key] = TradeSimulator(self.universe, stage, self.max_days)
+        return self._simulators[key]
+
+    # ------------------------------------------------------------------
+    # Evaluación
+    # ------------------------------------------------------------------
+
+    def _entries(self, mask: np.ndarray, lo: date, hi: date) -> np.ndarray:
+        f = self.features
+        in_range = (f.date >= np.datetime64(lo, 'D')) & (f.date <= np.datetime64(hi, 'D'))
+        return np.flatnonzero(mask & in_range)
+
+    def _simulate(self, simulator: TradeSimulator, entries: np.ndarray, exit_params: dict,
+                  end: date) -> dict:
+        f = self.features
+        return simulator.simulate(f.stock_of[entries], f.date[entries], f.close[entries],
+                                  default_exit_rules(**exit_params), end=end)
+
+    def _score(self, result: dict, select: np.ndarray, entry_dates: np.ndarray, start: date) -> dict:
+        """Métricas de las operaciones `select` de un resultado de simulate()."""
+        select = select[result['has_days'][select]]
+        if not len(select):
+            return {'trades': 0}
+        exits = result['exit_date'][select].astype(object)
+        entries = entry_dates[select].astype(object)
+        trades = [
+            {'return_pct': r, 'winner': r > 0, 'days_held': d, 'exit_reason': reason,
+             'exit_date': x, 'entry_date': e}
+            for r, d, reason, x, e in zip(result['return_pct'][select].tolist(),
+                                          result['days_held'][select].tolist(),
+                                          result['exit_reason'][select], exits, entries)
+        ]
+        stats = summarize_trades(trades)
+        stats.update(curve_stats(equity_curve(trades, self.allocation), start))
+        return stats
+
+    def _better(self, score: dict, best: Optional[dict]) -> bool:
+        value = score.get(self.metric)
+        if score.get('trades', 0) < self.min_trades or value is None:
+            return False
+        if best is None:
+            return True
+        if self.metric == 'max_drawdown_pct':
+            return value < best[self.metric]
+        return value > best[self.metric]
+
+    def optimize(self, lo: date, hi: date) -> tuple:
+        """
+        Mejor combinación en [lo, hi]: cada operación se cierra como muy
+        tarde en `hi` (no se usan precios posteriores a la ventana).
+
+        Returns:
+            (params, score, combinaciones evaluadas); params None si ninguna
+            llega a min_trades
+        """
+        f = self.features
+        analyzer_sets = self._combos(ANALYZER_PARAMS)
+        buy_sets = self._combos(BUY_PARAMS)
+        exit_sets = self._combos(GRID_PARAMS)
+        stages = f.stages(analyzer_sets)
+        entries = [self._entries(f.buy_mask(b), lo, hi) for b in buy_sets]
+        union = np.unique(np.concatenate(entries)) if entries else np.array([], dtype=np.int64)
+
+        best_params, best = None, None
+        evaluated = 0
+        for a, stage in zip(analyzer_sets, stages):
+            simulator = self._simulator(a, stage)
+            for c in exit_sets:
+                result = self._simulate(simulator, union, c, hi) if len(union) else None
+                for b, rows in zip(buy_sets, entries):
+                    evaluated += 1
+                    if result is None or not len(rows):
+                        continue
+                    score = self._score(result, np.searchsorted(union, rows), f.date[union], lo)
+                    if self._better(score, best):
+                        best_params, best = {**a, **b, **c}, score
+        return best_params, best, evaluated
+
+    def evaluate(self, params: dict, lo: date, hi: date) -> List[dict]:
+        """Operaciones de una combinación en [lo, hi] (formato de to_trades)."""
+        f = self.features
+        a = {k: params[k] for k in ANALYZER_PARAMS}
+        stage = f.stages([a])[0]
+        rows = self._entries(f.buy_mask(params), lo, hi)
+        if not len(rows):
+            return []
+        result = self._simulate(self._simulator(a, stage), rows, {k: params[k] for k in GRID_PARAMS}, hi)
+        stock_ids = self.universe.stock_ids
+        signals = [
+            {'stock_id': int(stock_ids[i]), 'week_end_date': d, 'price': p, 'ma30': m}
+            for i, d, p, m in zip(f.stock_of[rows].tolist(), f.date[rows].astype(object),
+                                  f.close[rows].tolist(), f.ma30[rows].tolist())
+        ]
+        return to_trades(self.universe, signals, result)
+
+    def run(self) -> WalkForwardResult:
+        """Optimizar cada ventana de entrenamiento y evaluar en la de prueba."""
+        started = time.perf_counter()
+        windows = []
+        trades = []
+        for train_start, train_end, test_start, test_end in self.windows():
+            params, score, evaluated = self.optimize(train_start, train_end)
+            row = {
+                'train_start': train_start, 'train_end': train_end,
+                'test_start': test_start, 'test_end': test_end, 'combinations': evaluated,
+                'train_trades': score['trades'] if score else 0,
+                'train_score': score[self.metric] if score else None,
+            }
+            if params is None:
+                logger.info(f"Ventana {train_start} → {train_end}: ninguna combinación con "
+                            f"{self.min_trades} operaciones; sin prueba")
+                windows.append(row)
+                continue
+
+            window_trades = self.evaluate(params, test_start, test_end)
+            test = summarize_trades(window_trades)
+            test.update(curve_stats(equity_curve(window_trades, self.allocation), test_start))
+            row.update(params)
+            row.update({
+                'test_trades': test['trades'], 'test_score': test.get(self.metric),
+                'test_win_rate_pct': test.get('win_rate_pct'),
+                'test_avg_return_pct': test.get('avg_return_pct'),
+                'test_max_drawdown_pct': test.get('max_drawdown_pct'),
+            })
+            windows.append(row)
+            for t in window_trades:
+                t['window'] = len(windows)
+            trades += window_trades
+
+        oos_start = windows[0]['test_start'] if windows else None
+        equity = equity_curve(trades, self.allocation)
+        metrics = summarize_trades(trades)
+        metrics.update(curve_stats(equity, oos_start))
+        scores = [w['train_score'] for w in windows if w['train_score'] is not None]
+        metrics['train_score_avg'] = sum(scores) / len(scores) if scores else None
+
+        timings = {'total_s': round(time.perf_counter() - started, 2)}
+        logger.info(
+            f"Walk-forward: {len(windows)} ventanas, {len(trades)} operaciones OOS en {timings['total_s']}s "
+            f"(indicadores: {self.features.misses} calculados, {self.features.hits} reutilizados)"
+        )
+        params = {
+            'train_months': self.train_months, 'test_months': self.test_months,
+            'step_months': self.step_months, 'anchored': self.anchored,
+            'start': self.start, 'end': self.end, 'metric': self.metric,
+            'min_trades': self.min_trades, 'allocation': self.allocation, 'space': self.space,
+        }
+        return WalkForwardResult(params, windows, trades, equity, metrics, timings)
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def sweep_stages(universe: Universe, param_sets: List[dict]) -> List[np.ndarray]:
+    """
+    Etapas de todo el universo con cada combinación de umbrales del
+    analizador (ANALYZER_PARAMS). Misma lógica que detect_stage sobre las
+    semanas con MA30 de cada acción (analyze_weeks sin contexto previo),
+    pero semana a semana para todas las acciones y combinaciones a la vez.
+    Las semanas sin MA30 conservan la etapa del universo.
+    """
+    w = universe.weekly
+    rows = np.flatnonzero(~np.isnan(w['ma30']))
+    counts = np.diff(np.append(np.searchsorted(rows, w['offsets'][:-1]), len(rows)))
+    starts = np.append(0, np.cumsum(counts)[:-1])
+
+    # Acciones de más a menos semanas: en la semana t están activas las `active[t]` primeras
+    order = np.argsort(-counts, kind='stable')
+    counts, starts = counts[order], starts[order]
+    active = np.searchsorted(-counts, -np.arange(counts.max() if len(counts) else 0), side='left')
+
+    ma30 = w['ma30'][rows]
+    slope = w['ma30_slope'][rows]
+    no_ma30 = ma30 == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dist = (w['close'][rows] - ma30) / ma30
+    no_slope = np.isnan(slope) | (slope == 0)
+    slope = np.where(no_slope, 0.0, slope)
+
+    exit_thr = np.array([p['ma30_slope_threshold'] for p in param_sets])
+    entry_thr = np.array([p['ma30_slope_entry_threshold'] for p in param_sets])
+    band = np.array([p['price_ma30_threshold'] for p in param_sets])
+
+    prev = np.zeros((len(counts), len(param_sets)), dtype=np.int8)
+    result = np.zeros((len(param_sets), len(rows)), dtype=np.int8)
+    for t, k in enumerate(active):
+        r = starts[:k] + t
+        p = prev[:k]
+        d = dist[r][:, None]
+        s = slope[r][:, None]
+        has_slope = ~no_slope[r][:, None]
+
+        with np.errstate(invalid='ignore'):
+            above = d > band
+            below = d < -band
+        near = ~above & ~below
+        flat = ~has_slope | (np.abs(s) <= exit_thr)
+        up = has_slope & (s > exit_thr)
+        down = has_slope & (s < -exit_thr)
+        keep = np.where(p > 0, p, 1)
+
+        stage = np.select(
+            [
+                no_ma30[r][:, None],
+                above & (((p == 2) & up) | ((p != 2) & has_slope & (s > entry_thr))),
+                below & (((p == 4) & down) | ((p != 4) & has_slope & (s < -entry_thr))),
+                (near | above) & flat & ((p == 2) | (p == 3)),
+                (near | below) & (flat | down) & ((p == 4) | (p == 1) | (p == 0)),
+            ],
+            [keep, 2, 4, 3, 1],
+            default=keep,
+        ).astype(np.int8)
+        prev[:k] = stage
+        result[:, r] = stage.T
+
+    stages = []
+    for j in range(len(param_sets)):
+        stage = w['stage'].copy()
+        stage[rows] = result[j]
+        stages.append(stage)
+    return stages
+
+
+def _add_months(day: date, months: int) -> date:
+    year, month = divmod(day.month - 1 + months, 12)
+    return date(day.year + year, month + 1, 1)
+
+
+def save_walkforward(result: WalkForwardResult, name: Optional[str] = None) -> str:
+    """
+    Guardar las ventanas en data/backtest/<nombre>.csv y la configuración y
+    métricas OOS en <nombre>.json.
+
+    Returns:
+        Ruta del CSV
+    """
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    name = name or f"walkforward-{datetime.now():%Y%m%d-%H%M%S}"
+    path = os.path.join(BACKTEST_DIR, f"{name}.csv")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=WINDOW_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for row in result.windows:
+            writer.writerow({k: (round(v, 4) if isinstance(v, float) else v) for k, v in row.items()})
+    with open(os.path.join(BACKTEST_DIR, f"{name}.json"), 'w') as f:
+        json.dump({'params': result.params, 'oos': result.metrics, 'timings': result.timings},
+                  f, indent=1, default=str)
+    return path
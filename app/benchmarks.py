@@ -0,0 +1,228 @@
+"""
+Matriz de índices de referencia (benchmarks) - Sistema Weinstein
+Carga en una sola consulta los cierres semanales y el estado de mercado
+(alcista/bajista) de todos los índices configurados, como matriz
+fecha × benchmark. Filtro de mercado y MRS consultan la columna del índice
+que corresponde a cada acción (p. ej. ^IBEX para .MC, SPY por defecto).
+"""
+import bisect
+import logging
+import threading
+from datetime import date
+from typing import Dict, Optional
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.database import Stock, WeeklyData
+from app.data_version import get_data_version
+from app.config import BENCHMARK_DEFAULT, BENCHMARKS_BY_SUFFIX
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Mercado alcista = cierre >= MA30 * REGIME_MA30_FACTOR  Y  slope >= 0
+REGIME_MA30_FACTOR = 0.97
+
+
+def is_bullish_week(close, ma30, slope) -> Optional[bool]:
+    """Estado de mercado de una semana; None si no hay MA30."""
+    if ma30 is None:
+        return None
+    return float(close) >= float(ma30) * REGIME_MA30_FACTOR and float(slope or 0) >= 0
+
+
+class BenchmarkMatrix:
+    """
+    Cierres semanales y estado de mercado de todos los benchmarks.
+
+    Internamente son dos DataFrames (fechas × benchmarks); las consultas por
+    semana se resuelven con diccionarios por columna en O(1), con búsqueda
+    binaria para fechas que no son cierre de semana de ningún índice.
+    """
+
+    def __init__(self, stock_ids: Dict[str, int], closes: pd.DataFrame, regime: pd.DataFrame):
+        self.stock_ids = stock_ids
+        self.closes_df = closes
+        self.regime_df = regime
+        self._build_lookups()
+
+    @classmethod
+    def load(cls, db: Session) -> 'BenchmarkMatrix':
+        """Cargar todos los benchmarks configurados con una sola consulta."""
+        tickers = set(BENCHMARKS_BY_SUFFIX.values()) | {BENCHMARK_DEFAULT}
+
+        rows = db.query(
+            Stock.id, Stock.ticker, WeeklyData.week_end_date,
+            WeeklyData.close, WeeklyData.ma30, WeeklyData.ma30_slope
+        ).join(
+            WeeklyData, WeeklyData.stock_id == Stock.id
+        ).filter(
+            Stock.ticker.in_(tickers)
+        ).all()
+
+        stock_ids = {r.ticker: r.id for r in rows}
+        missing = tickers - set(stock_ids)
+        if missing:
+            logger.warning(f"Benchmarks sin datos en BD: {', '.join(sorted(missing))}")
+
+        if not rows:
+            empty = pd.DataFrame()
+            return cls({}, empty, empty)
+
+        df = pd.DataFrame(
+            [(r.ticker, r.week_end_date, float(r.close),
+              is_bullish_week(r.close, r.ma30, r.ma30_slope)) for r in rows],
+            columns=['ticker', 'week_end_date', 'close', 'bullish']
+        )
+
+        closes = df.pivot(index='week_end_date', columns='ticker', values='close').sort_index()
+        regime = df.pivot(index='week_end_date', columns='ticker', values='bullish').sort_index()
+
+        return cls(stock_ids, closes, regime)
+
+    def _build_lookups(self) -> None:
+        """Diccionarios por benchmark a partir de las matrices."""
+        self._close_by_bench = {}
+        self._regime_by_bench = {}
+        self._dates_by_bench = {}
+
+        for ticker in self.closes_df.columns:
+            col = self.closes_df[ticker].dropna()
+            self._close_by_bench[ticker] = dict(zip(col.index, col.astype(float)))
+
+        for ticker in self.regime_df.columns:
+            # Semanas sin MA30 heredan el estado anterior; sin estado previo → alcista
+            col = self.regime_df[ticker].astype(object).ffill()
+            self._regime_by_bench[ticker] = {
+                d: (True if pd.isna(v) else bool(v)) for d, v in col.items()
+            }
+            self._dates_by_bench[ticker] = list(col.index)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @property
+    def benchmarks(self) -> list:
+        """Benchmarks con datos cargados."""
+        return list(self.stock_ids)
+
+    def benchmark_for(self, ticker: str) -> Optional[str]:
+        """
+        Benchmark de una acción según el sufijo del ticker.
+        Si el índice de su mercado no tiene datos se usa BENCHMARK_DEFAULT;
+        None si tampoco hay datos del índice por defecto.
+        """
+        for suffix, bench in BENCHMARKS_BY_SUFFIX.items():
+            if ticker.endswith(suffix):
+                if bench in self._close_by_bench:
+                    return bench
+                break
+        return BENCHMARK_DEFAULT if BENCHMARK_DEFAULT in self._close_by_bench else None
+
+    def closes(self, benchmark: Optional[str]) -> Dict[date, float]:
+        """Cierres semanales del benchmark {week_end_date: close}."""
+        return self._close_by_bench.get(benchmark, {})
+
+    def close(self, benchmark: Optional[str], week_date: date) -> Optional[float]:
+        """Cierre del benchmark en la semana exacta (None si no existe)."""
+        return self.closes(benchmark).get(week_date)
+
+    def is_bullish(self, benchmark: Optional[str], week_date: date) -> bool:
+        """
+        Estado del benchmark en la semana más cercana anterior o igual a week_date.
+        Sin datos del benchmark devuelve True (no filtrar).
+        """
+        states = self._regime_by_bench.get(benchmark)
+        if not states:
+            return True
+
+        state = states.get(week_date)
+        if state is not None:
+            return state
+
+        dates = self._dates_by_bench[benchmark]
+        pos = bisect.bisect_right(dates, week_date) - 1
+        if pos < 0:
+            return True
+        return states[dates[pos]]
+
+    def add_week(self, benchmark: str, week_date: date, close, ma30, slope) -> None:
+        """
+        Añadir (o sustituir) una semana de un benchmark, p. ej. la semana
+        provisional en curso. Solo actualiza los diccionarios de consulta.
+        """
+        bullish = is_bullish_week(close, ma30, slope)
+        if bullish is None:
+            bullish = self.is_bullish(benchmark, week_date)
+        self._close_by_bench.setdefault(benchmark, {})[week_date] = float(close)
+        self._regime_by_bench.setdefault(benchmark, {})[week_date] = bullish
+        dates = self._dates_by_bench.setdefault(benchmark, [])
+        if week_date not in dates:
+            bisect.insort(dates, week_date)
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+_cache_lock = threading.Lock()
+_cached_matrix: Optional[BenchmarkMatrix] = None
+_cached_version = None
+
+
+def get_benchmark_matrix(db: Session) -> BenchmarkMatrix:
+    """
+    Matriz de benchmarks compartida por el proceso (web), recargada cuando
+    el pipeline publica una nueva versión de datos. Los scripts batch crean
+    su propia matriz con load().
+    """
+    global _cached_matrix, _cached_version
+    version = get_data_version()['version']
+    with _cache_lock:
+        if _cached_matrix is None or version != _cached_version:
+            _cached_matrix = BenchmarkMatrix.load(db)
+            _cached_version = version
+        return _cached_matrix
+
+
+def compute_mrs(closes: list, bench_closes: list) -> Optional[float]:
+    """
+    Mansfield Relative Strength de la última semana de la ventana.
+    MRS = (rs_ratio / MA52_rs_ratio - 1) × 100
+
+    Args:
+        closes: Cierres de la acción (52 semanas, orden cronológico)
+        bench_closes: Cierres del benchmark en las mismas semanas (None si falta)
+
+    Returns:
+        MRS o None si falta algún cierre del benchmark
+    """
+    rs_window = [
+        float(c) / b for c, b in zip(closes, bench_closes)
+        if b and b > 0
+    ]
+    if len(rs_window) < 52 or not bench_closes[-1]:
+        return None
+    ma52 = sum(rs_window) / len(rs_window)
+    return (float(closes[-1]) / bench_closes[-1] / ma52 - 1) * 100
+
+
+if __name__ == '__main__':
+    from app.database import SessionLocal
+
+    print("=== TEST MATRIZ DE BENCHMARKS ===\n")
+
+    db = SessionLocal()
+    matrix = BenchmarkMatrix.load(db)
+    print(f"Benchmarks cargados: {', '.join(matrix.benchmarks) or 'ninguno'}")
+    print(f"Semanas en la matriz: {len(matrix.closes_df)}\n")
+    for ticker in ['AAPL', 'SAN.MC', 'BP.L']:
+        bench = matrix.benchmark_for(ticker)
+        print(f"  {ticker:8s} → {bench}")
+    db.close()
@@ -0,0 +1,218 @@
+"""
+Amplitud de mercado (market breadth) - Tabla market_breadth
+Foto semanal de cada mercado (y del total 'ALL') para el gráfico de
+/api/breadth: acciones en cada etapa, % por encima de la MA30, nuevos
+máximos y mínimos de 52 semanas y cuántas acciones entran en Etapa 2 o 4.
+
+Las etapas de las últimas semanas cambian cuando el proceso semanal las
+reanaliza, así que cada actualización rehace esas semanas además de añadir
+las nuevas. Relleno inicial: python app/breadth.py --full
+"""
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import Stock, WeeklyData, MarketBreadth, SessionLocal
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Ventana de nuevos máximos / mínimos
+BREADTH_HIGH_LOW_WEEKS = 52
+
+# Semanas que se recalculan en cada actualización incremental
+# (el pipeline reanaliza las etapas de las últimas ANALYZE_WEEKS_BACK = 10 semanas)
+BREADTH_RECOMPUTE_WEEKS = 10
+
+# Fila con el total de todos los mercados
+ALL_EXCHANGES = 'ALL'
+
+BREADTH_COUNTS = (
+    'total', 'stage1', 'stage2', 'stage3', 'stage4', 'above_ma30',
+    'new_highs', 'new_lows', 'stage2_entries', 'stage4_entries',
+)
+
+
+def update_market_breadth(db: Session, full: bool = False) -> int:
+    """
+    Añadir las semanas nuevas a market_breadth y rehacer las últimas
+    BREADTH_RECOMPUTE_WEEKS, cuyas etapas acaba de reanalizar el proceso
+    semanal. Se leen 52 semanas más para los máximos/mínimos.
+
+    Args:
+        full: Borrar y recalcular todo el histórico
+
+    Returns:
+        Número de semanas escritas (cada una con una fila por mercado y 'ALL')
+    """
+    last_week = None if full else db.query(func.max(MarketBreadth.week_end_date)).scalar()
+    if last_week is None:
+        from_week, since = None, None
+    else:
+        from_week = last_week - timedelta(weeks=BREADTH_RECOMPUTE_WEEKS)
+        since = from_week - timedelta(weeks=BREADTH_HIGH_LOW_WEEKS + 1)
+
+    df = _load_weekly_frame(db, since)
+    exchanges = dict(db.query(Stock.id, Stock.exchange).all())
+    records = compute_breadth(df, exchanges, from_week)
+
+    try:
+        query = db.query(MarketBreadth)
+        if from_week is not None:
+            query = query.filter(MarketBreadth.week_end_date >= from_week)
+        query.delete(synchronize_session=False)
+        db.bulk_insert_mappings(MarketBreadth, records)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len({r['week_end_date'] for r in records})
+
+
+def get_breadth_series(db: Session, exchange: str = ALL_EXCHANGES, weeks: int = 104) -> List[dict]:
+    """Últimas `weeks` semanas de amplitud de un mercado, en orden cronológico."""
+    rows = db.query(MarketBreadth).filter(
+        MarketBreadth.exchange == exchange
+    ).order_by(MarketBreadth.week_end_date.desc()).limit(weeks).all()
+
+    series = []
+    for r in reversed(rows):
+        point = {'week_end_date': r.week_end_date.isoformat()}
+        for name in BREADTH_COUNTS:
+            point[name] = getattr(r, name)
+        for stage in (1, 2, 3, 4):
+            point[f'pct_stage{stage}'] = round(point[f'stage{stage}'] / r.total * 100, 2) if r.total else None
+        point['pct_above_ma30'] = float(r.pct_above_ma30) if r.pct_above_ma30 is not None else None
+        series.append(point)
+    return series
+
+
+def get_breadth_exchanges(db: Session) -> List[str]:
+    """Mercados con datos de amplitud ('ALL' primero)."""
+    exchanges = [e for (e,) in db.query(MarketBreadth.exchange).distinct().all()]
+    return sorted(exchanges, key=lambda e: (e != ALL_EXCHANGES, e))
+
+
+def compute_breadth(df: pd.DataFrame, exchanges: Dict[int, str],
+                    from_week: Optional[date] = None) -> List[dict]:
+    """
+    Calcular la amplitud semanal (sin escribir en BD).
+
+    Args:
+        df: Filas semanales (stock_id, week_end_date, high, low, close, ma30, stage)
+            con al menos BREADTH_HIGH_LOW_WEEKS semanas previas a from_week
+        exchanges: {stock_id: exchange}
+        from_week: Primera semana que se devuelve (None = todas)
+
+    Returns:
+        Lista de dicts con las columnas de MarketBreadth
+    """
+    if df.empty:
+        return []
+
+    # Matrices semana × acción
+    matrix = df.pivot(index='week_end_date', columns='stock_id')
+    high, low = matrix['high'], matrix['low']
+    close, ma30, stage = matrix['close'], matrix['ma30'], matrix['stage']
+
+    classified = stage.notna()
+    prev_high = high.rolling(BREADTH_HIGH_LOW_WEEKS, min_periods=BREADTH_HIGH_LOW_WEEKS).max().shift(1)
+    prev_low = low.rolling(BREADTH_HIGH_LOW_WEEKS, min_periods=BREADTH_HIGH_LOW_WEEKS).min().shift(1)
+    prev_stage = stage.shift(1)
+
+    flags = {
+        'total': classified,
+        'stage1': stage == 1,
+        'stage2': stage == 2,
+        'stage3': stage == 3,
+        'stage4': stage == 4,
+        'above_ma30': classified & (close > ma30),
+        'new_highs': classified & (high > prev_high),
+        'new_lows': classified & (low < prev_low),
+        'stage2_entries': (stage == 2) & prev_stage.notna() & (prev_stage != 2),
+        'stage4_entries': (stage == 4) & prev_stage.notna() & (prev_stage != 4),
+    }
+
+    # Conteos semana × mercado (+ total)
+    labels = [exchanges.get(stock_id) or 'UNKNOWN' for stock_id in stage.columns]
+    counts = {}
+    for name, frame in flags.items():
+        by_exchange = frame.T.groupby(labels).sum().T
+        by_exchange[ALL_EXCHANGES] = frame.sum(axis=1)
+        counts[name] = by_exchange
+
+    weeks = counts['total'].index
+    if from_week is not None:
+        weeks = weeks[weeks >= from_week]
+
+    records = []
+    for exchange in counts['total'].columns:
+        for week in weeks:
+            total = int(counts['total'].at[week, exchange])
+            if total == 0:
+                continue
+            record = {'week_end_date': week, 'exchange': exchange}
+            for name in BREADTH_COUNTS:
+                record[name] = int(counts[name].at[week, exchange])
+            record['pct_above_ma30'] = round(record['above_ma30'] / total * 100, 2)
+            records.append(record)
+
+    return records
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def _load_weekly_frame(db: Session, since: Optional[date]) -> pd.DataFrame:
+    """Filas semanales de las acciones activas (sin índices) desde `since`."""
+    query = db.query(
+        WeeklyData.stock_id, WeeklyData.week_end_date, WeeklyData.high, WeeklyData.low,
+        WeeklyData.close, WeeklyData.ma30, WeeklyData.stage
+    ).join(
+        Stock, WeeklyData.stock_id == Stock.id
+    ).filter(
+        Stock.active == True,
+        Stock.exchange != 'INDEX'
+    )
+    if since is not None:
+        query = query.filter(WeeklyData.week_end_date >= since)
+
+    df = pd.DataFrame(
+        query.all(),
+        columns=['stock_id', 'week_end_date', 'high', 'low', 'close', 'ma30', 'stage']
+    )
+    for col in ('high', 'low', 'close', 'ma30', 'stage'):
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+    return df
+
+
+if __name__ == '__main__':
+    import sys
+
+    print("=== AMPLITUD DE MERCADO ===\n")
+
+    db = SessionLocal()
+    n = update_market_breadth(db, full='--full' in sys.argv)
+    print(f"✓ {n} semanas actualizadas\n")
+
+    # Última semana de cada mercado
+    for exchange in get_breadth_exchanges(db):
+        series = get_breadth_series(db, exchange, weeks=1)
+        if not series:
+            continue
+        point = series[-1]
+        print(f"  {exchange:8s} {point['week_end_date']}  {point['total']:5d} acciones  "
+              f"E1 {point['pct_stage1']:5.1f}%  E2 {point['pct_stage2']:5.1f}%  "
+              f"E3 {point['pct_stage3']:5.1f}%  E4 {point['pct_stage4']:5.1f}%  "
+              f">MA30 {point['pct_above_ma30']:5.1f}%  máx/mín 52s {point['new_highs']}/{point['new_lows']}")
+    db.close()
@@ -0,0 +1,82 @@
+"""
+Caché en memoria con expulsión LRU ligada a la versión de datos
+Las entradas se descartan en bloque cuando cambia el token de data_version
+(es decir, cuando el pipeline publica datos nuevos).
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.data_version import get_data_version
+
+# Valor centinela para distinguir "no está en caché" de un valor None
+MISSING = object()
+
+
+class VersionedLRUCache:
+    """
+    Caché LRU thread-safe. Cada entrada pertenece a la versión de datos
+    vigente al calcularla; al detectar una versión nueva se vacía entera.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_version(self, version: str) -> None:
+        """Vaciar la caché si la versión de datos ha cambiado (con el lock tomado)."""
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def current_version(self) -> str:
+        """Token de la versión de datos actual."""
+        return get_data_version()['version']
+
+    def get(self, key: Hashable) -> Any:
+        """Valor en caché o MISSING."""
+        version = self.current_version()
+        with self._lock:
+            self._sync_version(version)
+            value = self._entries.get(key, MISSING)
+            if value is MISSING:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[str] = None) -> None:
+        """
+        Guardar un valor. Si se indica `version` (la vigente al empezar a
+        calcularlo) y ya no es la actual, el valor está obsoleto y no se guarda.
+        """
+        current = self.current_version()
+        if version is not None and version != current:
+            return
+        with self._lock:
+            self._sync_version(current)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Vaciar la caché."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Entradas, aciertos y fallos."""
+        with self._lock:
+            return {
+                'version': self._version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
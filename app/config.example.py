@@ -42,3 +42,42 @@ BUY_RESISTANCE_WEEKS = 30   # semanas para calcular el nivel de resistencia (má
 BUY_MIN_BASE_WEEKS = 16     # semanas mínimas de base previa (MA30 plana)
 BUY_MAX_BASE_SLOPE = 0.008  # slope MA30 máximo (|slope| ≤ 0.8%) en la base
 BUY_MAX_DIST_ENTRY = 0.15   # distancia máxima precio-MA30 al entrar (15%)
+BUY_MIN_RS_RANK = 0         # percentil mínimo de fuerza relativa (weekly_rs_rank); 0 = sin filtro
+
+# Índices de referencia (filtro de mercado y Mansfield RS) por mercado
+# Las acciones cuyo ticker termina en el sufijo se comparan con ese índice;
+# el resto (y los mercados cuyo índice no está cargado) usan BENCHMARK_DEFAULT
+BENCHMARK_DEFAULT = 'SPY'
+BENCHMARKS_BY_SUFFIX = {
+    '.MC': '^IBEX',     # Bolsa de Madrid
+    '.L': '^FTSE',      # Londres
+    '.DE': '^GDAXI',    # Xetra
+    '.PA': '^FCHI',     # París
+    '.ST': '^OMX',      # Estocolmo
+}
+
+# Web: hilos dedicados a consultas de BD y pool de conexiones propio
+# (WEB_DB_WORKERS ≤ WEB_DB_POOL_SIZE + WEB_DB_MAX_OVERFLOW para no esperar conexión)
+WEB_DB_WORKERS = 10
+WEB_DB_POOL_SIZE = 10
+WEB_DB_MAX_OVERFLOW = 5
+
+# Orquestador del pipeline (python -m app.pipeline run)
+# Cada hilo usa una conexión: PIPELINE_WORKERS + PIPELINE_INGEST_WORKERS + 1 ≤ 15 (pool por defecto)
+PIPELINE_WORKERS = 4         # hilos para agregación, análisis y señales
+PIPELINE_INGEST_WORKERS = 1  # hilos de descarga (cada uno respeta RATE_LIMIT_DELAY)
+PIPELINE_MAX_ATTEMPTS = 2    # intentos por tarea antes de marcarla como fallida
+
+# Instrumentación de consultas SQL (app/db_stats.py); también con DB_STATS=1 en el entorno
+DB_STATS_ENABLED = False     # huellas de sentencias, latencias y espera de pool
+DB_SLOW_QUERY_MS = 500       # consultas más lentas se registran en el log
+
+# Web: endpoint /metrics (Prometheus). Vacío = solo peticiones locales directas
+# (sin pasar por el proxy); con token se exige 'Authorization: Bearer <token>'
+METRICS_TOKEN = ''
+
+# Backtest (python -m app.backtest): procesos de la búsqueda de parámetros
+BACKTEST_WORKERS = 4
+# Caché de resultados del backtest en data/backtest/cache (MB; 0 = desactivada).
+# Al superar el tamaño se borran los resultados usados hace más tiempo
+BACKTEST_CACHE_MB = 500
@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
 from app.database import Stock, DailyData, SessionLocal
+from app.perf import timed
 from app.config import (
     RATE_LIMIT_DELAY, MAX_RETRIES, RETRY_DELAY,
     TWELVEDATA_API_KEY, DATA_SOURCES
@@ -264,6 +265,7 @@ class DataCollector:
             logger.debug(f"yfinance falló para {ticker}: {e}")
             return None
     
+    @timed('download')
     def download_stock_data(self, ticker: str, start_date: str, end_date: Optional[str] = None, retries: int = 0) -> Optional[Dict]:
         """
         Descargar datos usando múltiples fuentes con fallback
@@ -303,6 +305,7 @@ class DataCollector:
         logger.error(f"✗ {ticker}: Error definitivo después de {MAX_RETRIES} reintentos con todas las fuentes")
         return None
     
+    @timed('save_daily')
     def save_daily_data(self, stock_id: int, ticker: str, data_dict: Dict) -> int:
         """
         Guardar o actualizar datos diarios en la base de datos
@@ -443,7 +446,7 @@ class DataCollector:
         
         return saved > 0
     
-    def update_daily_data(self, ticker: str, days_back: int = 5) -> bool:
+    def update_daily_data(self, ticker: str, days_back: int = 5) -> Optional[bool]:
         """
         Actualizar datos recientes
         
@@ -452,7 +455,8 @@ class DataCollector:
             days_back: Días hacia atrás (default: 5)
         
         Returns:
-            True si se actualizó correctamente
+            True si se actualizó correctamente, False si la descarga no trajo
+            filas nuevas y None si fallaron todas las fuentes
         """
         # Buscar stock
         stock = self.db.query(Stock).filter(Stock.ticker == ticker).first()
@@ -473,7 +477,7 @@ class DataCollector:
         )
         
         if not data_dict:
-            return False
+            return None
         
         # Guardar/actualizar
         saved = self.save_daily_data(stock.id, ticker, data_dict)
@@ -0,0 +1,69 @@
+"""
+Versión de datos - Token que cambia cada vez que el pipeline publica datos nuevos
+El pipeline (tarea version) y los scripts manuales llaman a bump_data_version()
+al terminar; la web lo consulta para invalidar sus cachés.
+Se guarda en data/data_version.json (mismo directorio que auth.json).
+"""
+import os
+import json
+import threading
+from datetime import datetime
+
+VERSION_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'data_version.json')
+
+# Memo del último fichero leído: (mtime_ns, contenido)
+_memo_lock = threading.Lock()
+_memo = (None, None)
+
+
+def bump_data_version(source: str) -> str:
+    """
+    Publicar una nueva versión de datos.
+
+    Args:
+        source: Proceso que la publica (daily, weekly, provisional, admin...)
+
+    Returns:
+        Nuevo token de versión
+    """
+    now = datetime.now()
+    version = now.strftime('%Y%m%d%H%M%S%f')
+    os.makedirs(os.path.dirname(VERSION_FILE), exist_ok=True)
+
+    # Escritura atómica: la web nunca lee un fichero a medias
+    tmp_file = f"{VERSION_FILE}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({
+            'version': version,
+            'source': source,
+            'updated_at': now.isoformat(timespec='seconds'),
+        }, f)
+    os.replace(tmp_file, VERSION_FILE)
+    return version
+
+
+def get_data_version() -> dict:
+    """
+    Versión de datos actual: {'version', 'source', 'updated_at'}.
+    Solo relee el fichero si cambia su mtime (un stat por llamada).
+    Sin fichero devuelve la versión '0'.
+    """
+    global _memo
+    try:
+        mtime = os.stat(VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return {'version': '0', 'source': None, 'updated_at': None}
+
+    cached_mtime, cached = _memo
+    if cached_mtime == mtime:
+        return cached
+
+    with _memo_lock:
+        try:
+            with open(VERSION_FILE, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # Fichero ilegible: mantener la última versión conocida
+            return cached or {'version': '0', 'source': None, 'updated_at': None}
+        _memo = (mtime, data)
+        return data
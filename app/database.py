@@ -8,19 +8,33 @@ from sqlalchemy.sql import func
 from datetime import datetime
 import pymysql
 from app.config import DB_CONFIG
+from app.db_stats import instrument_if_enabled
 
 # Crear URL de conexión
 DATABASE_URL = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}/{DB_CONFIG['database']}?charset={DB_CONFIG['charset']}"
 
+
+def create_pooled_engine(pool_size: int = 5, max_overflow: int = 10):
+    """
+    Crear un engine con pool de conexiones propio.
+    Los scripts usan el engine por defecto; la web crea el suyo con el
+    tamaño ajustado a sus hilos de acceso a BD (WEB_DB_*).
+    Con DB_STATS_ENABLED (o DB_STATS=1) se instrumenta (app/db_stats.py).
+    """
+    pooled_engine = create_engine(
+        DATABASE_URL,
+        pool_pre_ping=True,          # Verificar conexión antes de usar
+        pool_recycle=3600,           # Reciclar conexiones cada hora
+        pool_size=pool_size,         # Tamaño del pool
+        max_overflow=max_overflow,   # Conexiones adicionales
+        echo=False                   # Cambiar a True para debug SQL
+    )
+    instrument_if_enabled(pooled_engine)
+    return pooled_engine
+
+
 # Crear engine con pool de conexiones
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,      # Verificar conexión antes de usar
-    pool_recycle=3600,       # Reciclar conexiones cada hora
-    pool_size=5,             # Tamaño del pool
-    max_overflow=10,         # Conexiones adicionales
-    echo=False               # Cambiar a True para debug SQL
-)
+engine = create_pooled_engine(pool_size=5, max_overflow=10)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -166,6 +180,193 @@ class Position(Base):
         return f"<Position(stock_id={self.stock_id}, status={self.status}, entry_date={self.entry_date})>"
 
 
+class ProvisionalWeekly(Base):
+    """
+    Vela provisional de la semana en curso (construida desde daily_data)
+    con MA30, etapa y señal BUY/SHORT preliminares.
+    Una fila por acción; se sustituye cuando el proceso semanal cierra la semana.
+    """
+    __tablename__ = 'provisional_weekly'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stock_id = Column(Integer, ForeignKey('stocks.id', ondelete='CASCADE'), nullable=False)
+    week_end_date = Column(Date, nullable=False)   # Viernes de la semana en curso
+    as_of_date = Column(Date, nullable=False)      # Último día diario incluido
+    days = Column(Integer)                         # Sesiones agregadas (1-5)
+    open = Column(DECIMAL(12, 4))
+    high = Column(DECIMAL(12, 4))
+    low = Column(DECIMAL(12, 4))
+    close = Column(DECIMAL(12, 4))
+    volume = Column(BigInteger)
+    ma30 = Column(DECIMAL(12, 4))
+    ma30_slope = Column(DECIMAL(8, 4))
+    stage = Column(Integer)
+    stage_prev = Column(Integer)                   # Etapa de la última semana cerrada
+    signal_type = Column(Enum('BUY', 'SHORT'))     # Señal preliminar (NULL = ninguna)
+    mrs = Column(DECIMAL(10, 4))
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    stock = relationship('Stock')
+
+    __table_args__ = (
+        Index('uq_provisional_stock', 'stock_id', unique=True),
+        Index('idx_provisional_week', 'week_end_date'),
+        Index('idx_provisional_signal', 'signal_type'),
+    )
+
+    def __repr__(self):
+        return f"<ProvisionalWeekly(stock_id={self.stock_id}, week={self.week_end_date}, stage={self.stage})>"
+
+
+class StockLatest(Base):
+    """
+    Estado actual de cada acción (snapshot materializado): última semana
+    cerrada con su análisis y último cierre diario. Una fila por acción;
+    se regenera al final de los procesos diario y semanal (app/snapshot.py).
+    """
+    __tablename__ = 'stock_latest'
+
+    stock_id = Column(Integer, ForeignKey('stocks.id', ondelete='CASCADE'), primary_key=True)
+    week_end_date = Column(Date)                   # Última semana en weekly_data
+    stage = Column(Integer)
+    close = Column(DECIMAL(12, 4))
+    ma30 = Column(DECIMAL(12, 4))
+    ma30_slope = Column(DECIMAL(8, 4))
+    mrs = Column(DECIMAL(10, 4))                   # Mansfield RS vs benchmark
+    distance_ma30 = Column(DECIMAL(10, 4))         # % del cierre sobre la MA30
+    weeks_in_stage = Column(Integer)               # Semanas consecutivas en la etapa actual
+    rs_rank = Column(DECIMAL(5, 2))                # Percentil de fuerza relativa (weekly_rs_rank)
+    last_daily_date = Column(Date)
+    last_daily_close = Column(DECIMAL(12, 4))
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    stock = relationship('Stock')
+
+    __table_args__ = (
+        Index('idx_latest_stage_slope', 'stage', 'ma30_slope'),
+        Index('idx_latest_slope', 'ma30_slope'),
+        Index('idx_latest_week', 'week_end_date'),
+        Index('idx_latest_daily', 'last_daily_date'),
+    )
+
+    def __repr__(self):
+        return f"<StockLatest(stock_id={self.stock_id}, week={self.week_end_date}, stage={self.stage})>"
+
+
+class PipelineEvent(Base):
+    """
+    Eventos de los procesos de cron (outbox): fases, progreso y señales
+    nuevas. La web los lee por id creciente y los emite por SSE.
+    """
+    __tablename__ = 'pipeline_events'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    source = Column(String(20), nullable=False)       # daily, weekly, provisional...
+    event_type = Column(String(20), nullable=False)   # phase_start, progress, phase_end, signal, finished, failed
+    payload = Column(Text)                            # JSON
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_event_created', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<PipelineEvent(id={self.id}, source={self.source}, type={self.event_type})>"
+
+
+class MarketBreadth(Base):
+    """
+    Amplitud de mercado semanal por mercado (exchange) y total ('ALL'):
+    acciones por etapa, % sobre MA30, nuevos máximos/mínimos de 52 semanas
+    y entradas en Etapa 2 / Etapa 4. La calcula el proceso semanal (app/breadth.py).
+    """
+    __tablename__ = 'market_breadth'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    week_end_date = Column(Date, nullable=False)
+    exchange = Column(String(50), nullable=False)      # 'ALL' = todo el universo
+    total = Column(Integer, nullable=False)            # Acciones con etapa esa semana
+    stage1 = Column(Integer, nullable=False, default=0)
+    stage2 = Column(Integer, nullable=False, default=0)
+    stage3 = Column(Integer, nullable=False, default=0)
+    stage4 = Column(Integer, nullable=False, default=0)
+    above_ma30 = Column(Integer, nullable=False, default=0)
+    pct_above_ma30 = Column(DECIMAL(6, 2))
+    new_highs = Column(Integer, nullable=False, default=0)   # Máximo de 52 semanas
+    new_lows = Column(Integer, nullable=False, default=0)    # Mínimo de 52 semanas
+    stage2_entries = Column(Integer, nullable=False, default=0)
+    stage4_entries = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        Index('uq_breadth_week_exchange', 'week_end_date', 'exchange', unique=True),
+        Index('idx_breadth_exchange_week', 'exchange', 'week_end_date'),
+    )
+
+    def __repr__(self):
+        return f"<MarketBreadth(week={self.week_end_date}, exchange={self.exchange}, stage2={self.stage2})>"
+
+
+class WeeklyRsRank(Base):
+    """
+    Fuerza relativa transversal semanal: rentabilidad a 13/26/52 semanas y
+    MRS de cada acción, con su percentil (0-100) frente a todas las acciones
+    activas esa misma semana. Tabla compañera de weekly_data (app/rs_rank.py).
+    """
+    __tablename__ = 'weekly_rs_rank'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stock_id = Column(Integer, ForeignKey('stocks.id', ondelete='CASCADE'), nullable=False)
+    week_end_date = Column(Date, nullable=False)
+    ret_13w = Column(DECIMAL(10, 4))               # Rentabilidad en % a 13 semanas
+    ret_26w = Column(DECIMAL(10, 4))
+    ret_52w = Column(DECIMAL(10, 4))
+    mrs = Column(DECIMAL(10, 4))
+    rank_13w = Column(DECIMAL(5, 2))               # Percentil 0-100 (100 = la más fuerte)
+    rank_26w = Column(DECIMAL(5, 2))
+    rank_52w = Column(DECIMAL(5, 2))
+    rank_mrs = Column(DECIMAL(5, 2))
+    rs_rank = Column(DECIMAL(5, 2))                # Percentil de la media de los anteriores
+
+    __table_args__ = (
+        Index('uq_rs_stock_week', 'stock_id', 'week_end_date', unique=True),
+        Index('idx_rs_week_rank', 'week_end_date', 'rs_rank'),
+    )
+
+    def __repr__(self):
+        return f"<WeeklyRsRank(stock_id={self.stock_id}, week={self.week_end_date}, rs_rank={self.rs_rank})>"
+
+
+class PipelineTask(Base):
+    """
+    Estado de cada tarea de una ejecución del orquestador (app/pipeline.py):
+    una fila por tarea por acción (ingest, aggregate, analyze, signals) o
+    global (stock_id NULL). Permite reintentar y reanudar una ejecución.
+    """
+    __tablename__ = 'pipeline_tasks'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    run_id = Column(String(32), nullable=False)       # p. ej. 20240615-003000-full
+    mode = Column(String(10), nullable=False)         # daily, weekly, full
+    task = Column(String(20), nullable=False)         # ingest, aggregate, analyze, signals, snapshot...
+    stock_id = Column(Integer, ForeignKey('stocks.id', ondelete='CASCADE'))
+    status = Column(String(10), nullable=False, default='pending')  # pending | running | done | failed | skipped
+    attempts = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    error = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        Index('uq_pipeline_task', 'run_id', 'task', 'stock_id', unique=True),
+        Index('idx_pipeline_status', 'run_id', 'status'),
+        Index('idx_pipeline_created', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<PipelineTask(run={self.run_id}, task={self.task}, stock_id={self.stock_id}, status={self.status})>"
+
+
 # ============================================
 # FUNCIONES AUXILIARES
 # ============================================
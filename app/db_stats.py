@@ -0,0 +1,286 @@
+"""
+Instrumentación de consultas SQL (opcional)
+Se engancha a los eventos del engine y acumula, por huella de sentencia
+(SQL con literales y parámetros normalizados): número de ejecuciones,
+tiempo total y máximo. También mide la espera al obtener conexión del pool
+y registra en el log las consultas que superan DB_SLOW_QUERY_MS.
+
+Se activa con DB_STATS_ENABLED = True en config.py o, para un proceso
+concreto, con la variable de entorno DB_STATS=1:
+    DB_STATS=1 venv/bin/python -m app.pipeline run
+
+Al terminar el proceso se escribe un resumen en el log y en data/db_stats/;
+la web lo expone en /api/admin/db-stats.
+"""
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.config import DB_STATS_ENABLED, DB_SLOW_QUERY_MS
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DB_STATS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'db_stats')
+
+# Huellas distintas que se guardan; el resto se acumula en OTHER_FINGERPRINT
+DB_STATS_MAX_FINGERPRINTS = 1000
+OTHER_FINGERPRINT = '<otras>'
+
+# Huellas que se listan en el resumen (ordenadas por tiempo total)
+DB_STATS_TOP_N = 25
+
+# Normalización de sentencias
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_RE_PARAM = re.compile(r"%\(\w+\)s|%s|\?|(?<![:\w]):\w+")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ROWS = re.compile(r"(\(\?\+?\))(?:\s*,\s*\(\?\+?\))+")
+_RE_SPACE = re.compile(r"\s+")
+
+
+class QueryStats:
+    """Acumulado de consultas y esperas de pool del proceso (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.since = datetime.now()
+            self.queries = 0
+            self.total_ms = 0.0
+            self.slow_queries = 0
+            # huella -> [ejecuciones, ms total, ms máximo]
+            self.fingerprints = {}
+            self.checkouts = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.peak_checked_out = 0
+
+    def record_query(self, fingerprint: str, elapsed_ms: float):
+        with self._lock:
+            self.queries += 1
+            self.total_ms += elapsed_ms
+            entry = self.fingerprints.get(fingerprint)
+            if entry is None:
+                if len(self.fingerprints) >= DB_STATS_MAX_FINGERPRINTS:
+                    fingerprint = OTHER_FINGERPRINT
+                    entry = self.fingerprints.get(fingerprint)
+                if entry is None:
+                    entry = self.fingerprints[fingerprint] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            if elapsed_ms > entry[2]:
+                entry[2] = elapsed_ms
+            if elapsed_ms >= DB_SLOW_QUERY_MS:
+                self.slow_queries += 1
+
+    def record_checkout(self, wait_ms: float, checked_out: int):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            if wait_ms > self.wait_max_ms:
+                self.wait_max_ms = wait_ms
+            if checked_out > self.peak_checked_out:
+                self.peak_checked_out = checked_out
+
+    def summary(self, top: int = DB_STATS_TOP_N) -> dict:
+        """Totales, esperas de pool y las `top` huellas con más tiempo acumulado."""
+        with self._lock:
+            rows = sorted(self.fingerprints.items(), key=lambda kv: kv[1][1], reverse=True)
+            return {
+                'process': _process_name(),
+                'since': self.since.isoformat(timespec='seconds'),
+                'uptime_s': round((datetime.now() - self.since).total_seconds(), 1),
+                'queries': self.queries,
+                'total_ms': round(self.total_ms, 1),
+                'slow_query_ms': DB_SLOW_QUERY_MS,
+                'slow_queries': self.slow_queries,
+                'distinct_fingerprints': len(self.fingerprints),
+                'pool': {
+                    'checkouts': self.checkouts,
+                    'wait_total_ms': round(self.wait_total_ms, 1),
+                    'wait_mean_ms': round(self.wait_total_ms / self.checkouts, 2) if self.checkouts else 0.0,
+                    'wait_max_ms': round(self.wait_max_ms, 1),
+                    'peak_checked_out': self.peak_checked_out,
+                },
+                'fingerprints': [
+                    {
+                        'fingerprint': fp,
+                        'count': count,
+                        'total_ms': round(total, 1),
+                        'mean_ms': round(total / count, 2),
+                        'max_ms': round(max_ms, 1),
+                    }
+                    for fp, (count, total, max_ms) in rows[:top]
+                ],
+            }
+
+
+# Acumulado del proceso y engines instrumentados
+_stats = QueryStats()
+_instrumented = set()
+_instrument_lock = threading.Lock()
+_atexit_registered = False
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """
+    Huella de una sentencia: literales y parámetros pasan a '?', las listas
+    IN (...) y los VALUES multi-fila se colapsan a (?+) y se normalizan espacios.
+    """
+    fp = _RE_STRING.sub('?', statement)
+    fp = _RE_PARAM.sub('?', fp)
+    fp = _RE_NUMBER.sub('?', fp)
+    fp = _RE_LIST.sub('(?+)', fp)
+    fp = _RE_ROWS.sub(r'\1, ...', fp)
+    return _RE_SPACE.sub(' ', fp).strip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._db_stats_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_db_stats_start', None)
+    if start is None:
+        return
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _stats.record_query(fingerprint(statement), elapsed_ms)
+    if elapsed_ms >= DB_SLOW_QUERY_MS:
+        logger.warning(f"⚠ Consulta lenta ({elapsed_ms:.0f} ms): {_RE_SPACE.sub(' ', statement)[:500]}")
+
+
+def _wrap_pool_connect(pool) -> None:
+    """
+    Medir la espera de pool.connect() (cola del pool + conexión nueva o pre-ping).
+    El pool no tiene evento de "inicio de checkout", por eso se envuelve el método.
+    """
+    original = pool.connect
+    checkedout = getattr(pool, 'checkedout', lambda: 0)   # solo QueuePool lleva la cuenta
+
+    def connect():
+        start = time.perf_counter()
+        connection = original()
+        _stats.record_checkout((time.perf_counter() - start) * 1000, checkedout())
+        return connection
+
+    pool.connect = connect
+
+
+def _process_name() -> str:
+    name = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in name) or 'python'
+
+
+def _dump_at_exit() -> None:
+    """Resumen al terminar el proceso: log + data/db_stats/<proceso>-<fecha>-<pid>.json"""
+    summary = _stats.summary()
+    if not summary['queries']:
+        return
+
+    pool = summary['pool']
+    logger.info(
+        f"📊 Consultas SQL: {summary['queries']} en {summary['total_ms'] / 1000:.1f}s "
+        f"({summary['distinct_fingerprints']} huellas, {summary['slow_queries']} lentas) | "
+        f"Pool: {pool['checkouts']} checkouts, espera media {pool['wait_mean_ms']} ms, "
+        f"máx {pool['wait_max_ms']} ms"
+    )
+    for entry in summary['fingerprints'][:10]:
+        logger.info(
+            f"   {entry['count']:>7}x  {entry['total_ms'] / 1000:>8.2f}s  "
+            f"máx {entry['max_ms']:>7.1f} ms  {entry['fingerprint'][:120]}"
+        )
+
+    try:
+        os.makedirs(DB_STATS_DIR, exist_ok=True)
+        path = os.path.join(
+            DB_STATS_DIR, f"{summary['process']}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.json"
+        )
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=1)
+        logger.info(f"✓ Estadísticas de BD: {path}")
+    except OSError as e:
+        logger.warning(f"⚠ No se pudieron guardar las estadísticas de BD: {e}")
+
+
+def is_enabled() -> bool:
+    """Instrumentación activa (config o variable de entorno DB_STATS=1)."""
+    return bool(DB_STATS_ENABLED) or os.environ.get('DB_STATS') == '1'
+
+
+def instrument(engine) -> None:
+    """Instrumentar un engine (idempotente) y registrar el volcado al salir."""
+    global _atexit_registered
+    with _instrument_lock:
+        if id(engine) in _instrumented:
+            return
+        _instrumented.add(id(engine))
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        _wrap_pool_connect(engine.pool)
+        if not _atexit_registered:
+            atexit.register(_dump_at_exit)
+            _atexit_registered = True
+
+
+def instrument_if_enabled(engine) -> bool:
+    """Instrumentar el engine solo si la instrumentación está activada."""
+    if not is_enabled():
+        return False
+    instrument(engine)
+    return True
+
+
+def get_db_stats(top: int = DB_STATS_TOP_N) -> Optional[dict]:
+    """Resumen del proceso (None si la instrumentación está desactivada)."""
+    if not _instrumented:
+        return None
+    return _stats.summary(top)
+
+
+def reset_db_stats() -> None:
+    """Poner a cero el acumulado (p. ej. antes de medir una operación concreta)."""
+    _stats.reset()
+
+
+if __name__ == '__main__':
+    from sqlalchemy import create_engine, text
+
+    print("=== TEST INSTRUMENTACIÓN SQL ===\n")
+
+    for sql in (
+        "SELECT * FROM weekly_data WHERE stock_id = %(stock_id_1)s AND week_end_date >= '2024-01-05'",
+        "SELECT * FROM stocks WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s) LIMIT 50",
+        "INSERT INTO signals (stock_id, signal_type) VALUES (%s, %s), (%s, %s), (%s, %s)",
+    ):
+        print(f"  {sql}\n  -> {fingerprint(sql)}\n")
+
+    engine = create_engine('sqlite://')
+    instrument(engine)
+    with engine.connect() as conn:
+        for i in range(5):
+            conn.execute(text("SELECT :n + 1"), {'n': i})
+    print(json.dumps(get_db_stats(), indent=1))
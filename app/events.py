@@ -0,0 +1,180 @@
+"""
+Eventos de los procesos batch - Outbox en la tabla pipeline_events
+Los scripts de cron publican el progreso de cada fase y las señales nuevas;
+la web los lee por id creciente y los reenvía al navegador por SSE
+(/api/events/stream).
+
+Cada evento se escribe con su propia sesión y commit inmediato, así la web
+lo ve aunque el proceso siga con su transacción. Un fallo al publicar nunca
+interrumpe el proceso: solo se registra en el log.
+"""
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import PipelineEvent, Signal, SessionLocal
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Días que se conservan los eventos (purge_events)
+EVENTS_RETENTION_DAYS = 7
+
+
+class PipelineEvents:
+    """
+    Publicador de eventos de un proceso (daily, weekly, provisional).
+    El progreso se limita a un evento cada `progress_every` acciones o
+    `min_interval` segundos para no llenar la tabla.
+    """
+
+    def __init__(self, source: str, progress_every: int = 25, min_interval: float = 2.0):
+        self.source = source
+        self.progress_every = progress_every
+        self.min_interval = min_interval
+        self._phase = None
+        self._phase_started = None
+        self._last_progress = 0.0
+
+    def publish(self, event_type: str, **payload) -> Optional[int]:
+        """
+        Guardar un evento.
+
+        Returns:
+            id del evento o None si no se pudo guardar
+        """
+        db = SessionLocal()
+        try:
+            event = PipelineEvent(
+                source=self.source,
+                event_type=event_type,
+                payload=json.dumps(payload, default=str),
+            )
+            db.add(event)
+            db.commit()
+            return event.id
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠ No se pudo publicar evento {event_type}: {e}")
+            return None
+        finally:
+            db.close()
+
+    def phase_start(self, phase: str, total: Optional[int] = None) -> None:
+        """Inicio de una fase (aggregate, analyze, signals...)."""
+        self._phase = phase
+        self._phase_started = time.perf_counter()
+        self._last_progress = 0.0
+        self.publish('phase_start', phase=phase, total=total)
+
+    def progress(self, done: int, total: int, ticker: str) -> None:
+        """Acción `done` de `total` procesada (con límite de frecuencia)."""
+        now = time.perf_counter()
+        if (done != total and done % self.progress_every != 0
+                and now - self._last_progress < self.min_interval):
+            return
+        self._last_progress = now
+        self.publish('progress', phase=self._phase, done=done, total=total, ticker=ticker)
+
+    def phase_end(self, phase: str, **stats) -> None:
+        """Fin de una fase con su duración y estadísticas."""
+        duration = None
+        if self._phase == phase and self._phase_started is not None:
+            duration = round(time.perf_counter() - self._phase_started, 1)
+        self.publish('phase_end', phase=phase, duration_s=duration, **stats)
+        self._phase = None
+        self._phase_started = None
+
+    def signals(self, ticker: str, signals: List[Signal]) -> None:
+        """Señales recién guardadas de una acción (un evento por señal)."""
+        for payload in signal_payloads(ticker, signals):
+            self.publish('signal', **payload)
+
+    def finished(self, duration_s: float, **stats) -> None:
+        """Proceso terminado (la web recarga sus datos)."""
+        self.publish('finished', duration_s=round(duration_s, 1), **stats)
+
+    def failed(self, error: str) -> None:
+        """Proceso abortado por un error crítico."""
+        self.publish('failed', error=error)
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def signal_payloads(ticker: str, signals: List[Signal]) -> List[dict]:
+    """
+    Contenido de los eventos 'signal'. Se calcula con la sesión de la señal
+    abierta, para publicarlo después desde otro hilo (app/pipeline.py).
+    """
+    return [
+        {
+            'id': s.id,
+            'ticker': ticker,
+            'signal_type': s.signal_type,
+            'signal_date': s.signal_date.isoformat() if s.signal_date else None,
+            'stage_from': s.stage_from,
+            'stage_to': s.stage_to,
+            'price': float(s.price) if s.price is not None else None,
+        }
+        for s in signals
+    ]
+
+
+def latest_event_id(db: Session) -> int:
+    """Id del último evento (0 si no hay)."""
+    return db.query(func.max(PipelineEvent.id)).scalar() or 0
+
+
+def fetch_events(db: Session, after_id: int, limit: int = 100) -> List[dict]:
+    """Eventos con id > after_id en orden de publicación."""
+    rows = db.query(PipelineEvent).filter(
+        PipelineEvent.id > after_id
+    ).order_by(PipelineEvent.id.asc()).limit(limit).all()
+
+    return [
+        {
+            'id': e.id,
+            'source': e.source,
+            'event_type': e.event_type,
+            'payload': json.loads(e.payload) if e.payload else {},
+            'created_at': e.created_at.isoformat() if e.created_at else None,
+        }
+        for e in rows
+    ]
+
+
+def purge_events(db: Session, days: int = EVENTS_RETENTION_DAYS) -> int:
+    """Borrar eventos de más de `days` días. Devuelve las filas eliminadas."""
+    cutoff = datetime.now() - timedelta(days=days)
+    deleted = db.query(PipelineEvent).filter(
+        PipelineEvent.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+if __name__ == '__main__':
+    print("=== TEST EVENTOS DEL PIPELINE ===\n")
+
+    events = PipelineEvents('test', progress_every=2)
+    events.phase_start('demo', total=4)
+    for i, ticker in enumerate(['AAA', 'BBB', 'CCC', 'DDD'], 1):
+        events.progress(i, 4, ticker)
+    events.phase_end('demo', processed=4)
+    events.finished(0.0)
+
+    db = SessionLocal()
+    for e in fetch_events(db, 0)[-6:]:
+        print(f"  #{e['id']} {e['source']} {e['event_type']}: {e['payload']}")
+    db.close()
@@ -0,0 +1,248 @@
+"""
+Exportación de datos en streaming (CSV / Parquet)
+Las consultas se leen por páginas de EXPORT_CHUNK_ROWS filas (LIMIT/OFFSET
+sobre un orden total), cada una con su propia sesión: la conexión vuelve al
+pool antes de serializar y enviar el bloque, así una descarga lenta no la
+retiene y la memoria no crece con el tamaño del export.
+Parquet requiere pyarrow (opcional): cada bloque es un row group.
+"""
+import io
+import csv
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, desc
+from sqlalchemy.orm import Session
+
+from app.database import Stock, StockLatest, Signal, DailyData, WeeklyData, SessionLocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Filas por bloque (y por row group en Parquet)
+EXPORT_CHUNK_ROWS = 5000
+
+# Columnas de cada export: (nombre, tipo) con tipo en str | int | float | date
+STOCK_COLUMNS = [
+    ('ticker', 'str'), ('name', 'str'), ('exchange', 'str'), ('stage', 'int'),
+    ('week_end_date', 'date'), ('close', 'float'), ('ma30', 'float'), ('ma30_slope', 'float'),
+    ('distance_ma30', 'float'), ('mrs', 'float'), ('weeks_in_stage', 'int'),
+    ('rs_rank', 'float'), ('last_daily_date', 'date'), ('last_daily_close', 'float'),
+]
+SIGNAL_COLUMNS = [
+    ('ticker', 'str'), ('name', 'str'), ('signal_date', 'date'), ('signal_type', 'str'),
+    ('stage_from', 'int'), ('stage_to', 'int'), ('price', 'float'), ('ma30', 'float'),
+]
+DAILY_COLUMNS = [
+    ('date', 'date'), ('open', 'float'), ('high', 'float'), ('low', 'float'),
+    ('close', 'float'), ('volume', 'int'),
+]
+WEEKLY_COLUMNS = [
+    ('week_end_date', 'date'), ('open', 'float'), ('high', 'float'), ('low', 'float'),
+    ('close', 'float'), ('volume', 'int'), ('ma30', 'float'), ('ma30_slope', 'float'),
+    ('stage', 'int'),
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def parquet_available() -> bool:
+    """pyarrow instalado."""
+    return pa is not None
+
+
+# ============================================
+# CONSULTAS (mismos filtros que /api/stocks y /api/signals)
+# ============================================
+
+def stocks_statement(stage: Optional[int] = None, stock_ids: Optional[List[int]] = None):
+    """Estado actual de las acciones activas (stock_latest), orden de /api/stocks."""
+    stmt = select(
+        Stock.ticker, Stock.name, Stock.exchange, StockLatest.stage,
+        StockLatest.week_end_date, StockLatest.close, StockLatest.ma30, StockLatest.ma30_slope,
+        StockLatest.distance_ma30, StockLatest.mrs, StockLatest.weeks_in_stage,
+        StockLatest.rs_rank, StockLatest.last_daily_date, StockLatest.last_daily_close,
+    ).join(
+        StockLatest, Stock.id == StockLatest.stock_id
+    ).where(
+        Stock.active == True,
+        StockLatest.week_end_date.isnot(None)
+    )
+    if stage is not None:
+        stmt = stmt.where(StockLatest.stage == stage)
+    if stock_ids is not None:
+        stmt = stmt.where(Stock.id.in_(stock_ids))
+    return stmt.order_by(
+        StockLatest.ma30_slope.is_(None), desc(StockLatest.ma30_slope), StockLatest.stock_id
+    )
+
+
+def signals_statement(signal_type: Optional[str] = None, days: int = 30, date: Optional[str] = None):
+    """Historial de señales (sin límite de filas), orden de /api/signals."""
+    stmt = select(
+        Stock.ticker, Stock.name, Signal.signal_date, Signal.signal_type,
+        Signal.stage_from, Signal.stage_to, Signal.price, Signal.ma30,
+    ).join(
+        Stock, Signal.stock_id == Stock.id
+    )
+    if date:
+        stmt = stmt.where(Signal.signal_date == date)
+    else:
+        stmt = stmt.where(Signal.signal_date >= datetime.now().date() - timedelta(days=days))
+    if signal_type:
+        stmt = stmt.where(Signal.signal_type == signal_type.upper())
+    return stmt.order_by(desc(Signal.signal_date), Signal.id)
+
+
+def history_statement(stock_id: int, timeframe: str = 'daily',
+                      start: Optional[str] = None, end: Optional[str] = None):
+    """Histórico diario o semanal de una acción en orden cronológico."""
+    if timeframe == 'weekly':
+        date_col = WeeklyData.week_end_date
+        stmt = select(
+            WeeklyData.week_end_date, WeeklyData.open, WeeklyData.high, WeeklyData.low,
+            WeeklyData.close, WeeklyData.volume, WeeklyData.ma30, WeeklyData.ma30_slope,
+            WeeklyData.stage,
+        ).where(WeeklyData.stock_id == stock_id)
+    else:
+        date_col = DailyData.date
+        stmt = select(
+            DailyData.date, DailyData.open, DailyData.high, DailyData.low,
+            DailyData.close, DailyData.volume,
+        ).where(DailyData.stock_id == stock_id)
+
+    if start:
+        stmt = stmt.where(date_col >= start)
+    if end:
+        stmt = stmt.where(date_col <= end)
+    return stmt.order_by(date_col)
+
+
+# ============================================
+# SERIALIZACIÓN EN STREAMING
+# ============================================
+
+def iter_chunks(session_factory: Callable[[], Session], stmt,
+                chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[list]:
+    """
+    Bloques de filas de una consulta, una página (y una sesión) por bloque.
+    La sesión se cierra antes de entregar el bloque: entre bloques no se
+    retiene ninguna conexión. La consulta debe tener un orden total.
+    """
+    offset = 0
+    while True:
+        db = session_factory()
+        try:
+            rows = db.execute(stmt.limit(chunk_rows).offset(offset)).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_rows:
+            return
+        offset += len(rows)
+
+
+def iter_csv(chunks: Iterator[list], columns: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """CSV con cabecera; un trozo de salida por bloque de filas."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([name for name, _ in columns])
+    yield buffer.getvalue().encode('utf-8')
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _DrainableSink(io.RawIOBase):
+    """Fichero en memoria que se vacía tras cada row group (para hacer streaming)."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(columns: List[Tuple[str, str]]):
+    """Esquema Arrow a partir de las columnas del export."""
+    types = {'str': pa.string(), 'int': pa.int64(), 'float': pa.float64(), 'date': pa.date32()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def iter_parquet(chunks: Iterator[list], columns: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """Parquet con un row group por bloque de filas (requiere pyarrow)."""
+    schema = _arrow_schema(columns)
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in chunks:
+            arrays = []
+            for i, (name, kind) in enumerate(columns):
+                values = [row[i] for row in rows]
+                if kind == 'float':
+                    values = [float(v) if v is not None else None for v in values]
+                arrays.append(pa.array(values, type=schema.field(name).type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(session_factory: Callable[[], Session], stmt,
+                  columns: List[Tuple[str, str]], fmt: str) -> Iterator[bytes]:
+    """Generador de bytes del export en el formato pedido (csv | parquet)."""
+    chunks = iter_chunks(session_factory, stmt)
+    if fmt == 'parquet':
+        return iter_parquet(chunks, columns)
+    return iter_csv(chunks, columns)
+
+
+if __name__ == '__main__':
+    import sys
+
+    print("=== TEST EXPORTACIÓN ===\n")
+
+    total = 0
+    for chunk in stream_export(SessionLocal, stocks_statement(stage=2), STOCK_COLUMNS, 'csv'):
+        total += len(chunk)
+        if total == len(chunk):
+            sys.stdout.write(chunk.decode('utf-8'))
+    print(f"\nCSV de acciones en Etapa 2: {total} bytes")
+    print(f"Parquet disponible: {'sí' if parquet_available() else 'no (pip install pyarrow)'}")
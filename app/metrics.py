@@ -0,0 +1,135 @@
+"""
+Métricas de la web en formato de texto de Prometheus
+Contadores de peticiones por ruta, histograma de latencias y peticiones en
+curso (los alimenta el middleware de web/main.py). El endpoint /metrics
+añade al volcado los gauges del momento: pool de BD, cachés y antigüedad
+de los datos.
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+# Límites del histograma de latencias (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prefijo común de todas las métricas
+METRIC_PREFIX = 'weinstein_'
+
+
+class RequestMetrics:
+    """
+    Peticiones HTTP: total por (método, ruta, estado), latencia por ruta y
+    peticiones en curso. Las rutas son las plantillas (/api/stock/{ticker}),
+    así el número de series no crece con los tickers.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        # ruta -> [cuentas por bucket (no acumuladas)..., +Inf, suma, total]
+        self.latency: Dict[str, list] = {}
+
+    def start(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, method: str, route: str, status: int, seconds: float) -> None:
+        """Cerrar una petición iniciada con start()."""
+        key = (method, route, str(status))
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.latency.get(route)
+            if hist is None:
+                hist = self.latency[route] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            hist[bisect_left(self.buckets, seconds)] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    def count(self, method: str, route: str, status: int) -> None:
+        """Contar una petición sin latencia ni en curso (streams de larga duración)."""
+        key = (method, route, str(status))
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def render(self) -> List[str]:
+        """Líneas de texto Prometheus de las métricas de peticiones."""
+        with self._lock:
+            requests = sorted(self.requests.items())
+            latency = sorted((route, list(hist)) for route, hist in self.latency.items())
+            in_flight = self.in_flight
+
+        lines = format_metric(
+            'http_requests_total', 'counter', 'Peticiones HTTP por metodo, ruta y estado',
+            ((dict(method=m, route=r, status=s), n) for (m, r, s), n in requests)
+        )
+        lines += format_metric('http_requests_in_flight', 'gauge', 'Peticiones HTTP en curso', [({}, in_flight)])
+
+        name = METRIC_PREFIX + 'http_request_duration_seconds'
+        lines.append(f"# HELP {name} Latencia de las peticiones HTTP por ruta")
+        lines.append(f"# TYPE {name} histogram")
+        for route, hist in latency:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), hist):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_labels(route=route, le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(route=route)} {hist[-2]:.6f}")
+            lines.append(f"{name}_count{_labels(route=route)} {hist[-1]}")
+        return lines
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(round(float(value), 6))
+
+
+def format_metric(name: str, metric_type: str, help_text: str, samples: Iterable[Tuple[dict, float]]) -> List[str]:
+    """
+    Líneas HELP/TYPE y una muestra por (etiquetas, valor). Las muestras con
+    valor None se omiten (p. ej. sin datos todavía).
+    """
+    name = METRIC_PREFIX + name
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_labels(**labels)} {_format_value(value)}")
+    return lines
+
+
+def render_metrics(lines: List[str]) -> str:
+    """Cuerpo de la respuesta /metrics (formato de texto 0.0.4)."""
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == '__main__':
+    print("=== TEST MÉTRICAS ===\n")
+
+    metrics = RequestMetrics()
+    for seconds in (0.003, 0.02, 0.2, 0.7, 12.0):
+        metrics.start()
+        metrics.finish('GET', '/api/stock/{ticker}', 200, seconds)
+    metrics.count('GET', '/api/events/stream', 200)
+
+    lines = metrics.render()
+    lines += format_metric('db_pool_checked_out', 'gauge', 'Conexiones en uso', [({}, 3)])
+    print(render_metrics(lines))
@@ -0,0 +1,133 @@
+"""
+Notificaciones Telegram de los procesos batch
+Alertas de stop loss de la cartera (tras la descarga diaria) y envío
+del resumen semanal de señales (scripts/telegram_bot.py --notify).
+"""
+import os
+import sys
+import logging
+import subprocess
+
+import requests
+from sqlalchemy.orm import Session, joinedload
+
+from app.database import Position, SessionLocal
+from app.prices import get_latest_prices
+from app.config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Bot de Telegram (no versionado: se crea a partir de telegram_bot.py.example)
+TELEGRAM_BOT_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'telegram_bot.py'
+)
+
+# Tiempo máximo del envío semanal (segundos)
+NOTIFY_TIMEOUT = 300
+
+
+def send_telegram(text: str):
+    """Enviar mensaje a Telegram (best effort)"""
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        return
+    try:
+        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        requests.post(url, json={
+            'chat_id': TELEGRAM_CHAT_ID,
+            'text': text,
+            'parse_mode': 'HTML'
+        }, timeout=10)
+    except Exception as e:
+        logger.warning(f"⚠ Error enviando Telegram: {e}")
+
+
+def check_stop_losses(db: Session) -> int:
+    """
+    Alertar vía Telegram cuando el precio diario cae bajo el stop loss de una posición abierta
+
+    Returns:
+        Número de alertas enviadas
+    """
+    positions = db.query(Position).options(joinedload(Position.stock)).filter(
+        Position.status == 'OPEN'
+    ).all()
+    if not positions:
+        return 0
+
+    # Último cierre diario de todas las posiciones en una sola consulta; sin
+    # respaldo semanal, un cierre de hace días no debe disparar una alerta
+    prices = get_latest_prices(db, [pos.stock_id for pos in positions], weekly_fallback=False)
+
+    alerts = []
+    for pos in positions:
+        if pos.stock_id not in prices:
+            continue
+
+        current_price = prices[pos.stock_id]
+        stop_loss = float(pos.stop_loss)
+
+        if current_price <= stop_loss:
+            dist_pct = (current_price - stop_loss) / stop_loss * 100
+            alerts.append({
+                'ticker': pos.stock.ticker,
+                'current_price': current_price,
+                'stop_loss': stop_loss,
+                'dist_pct': dist_pct,
+                'entry_date': pos.entry_date,
+                'entry_price': float(pos.entry_price),
+            })
+            logger.warning(
+                f"🚨 STOP LOSS activado: {pos.stock.ticker} | "
+                f"Precio: {current_price:.2f} | Stop: {stop_loss:.2f} | "
+                f"Dist: {dist_pct:.1f}%"
+            )
+
+    if alerts:
+        msg = "🚨 <b>ALERTAS STOP LOSS</b>\n\n"
+        for a in alerts:
+            msg += (
+                f"<b>{a['ticker']}</b>\n"
+                f"  Precio: {a['current_price']:.2f} | Stop: {a['stop_loss']:.2f}\n"
+                f"  Distancia: {a['dist_pct']:.1f}%\n"
+                f"  Entrada: {a['entry_date']} @ {a['entry_price']:.2f}\n\n"
+            )
+        send_telegram(msg)
+        logger.info(f"✓ {len(alerts)} alerta(s) de stop loss enviadas a Telegram")
+
+    return len(alerts)
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def notify_weekly_signals() -> bool:
+    """
+    Ejecutar el envío semanal del bot (telegram_bot.py --notify).
+
+    Returns:
+        True si se envió; False si el bot no está instalado
+
+    Raises:
+        subprocess.CalledProcessError si el bot termina con error
+    """
+    if not os.path.exists(TELEGRAM_BOT_SCRIPT):
+        logger.warning(f"⚠ {TELEGRAM_BOT_SCRIPT} no existe; notificación semanal omitida")
+        return False
+    subprocess.run([sys.executable, TELEGRAM_BOT_SCRIPT, '--notify'], check=True, timeout=NOTIFY_TIMEOUT)
+    return True
+
+
+if __name__ == '__main__':
+    print("=== TEST NOTIFICACIONES ===\n")
+
+    db = SessionLocal()
+    n = check_stop_losses(db)
+    print(f"Alertas de stop loss: {n}")
+    print(f"Bot semanal: {'instalado' if os.path.exists(TELEGRAM_BOT_SCRIPT) else 'no instalado'}")
+    db.close()
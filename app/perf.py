@@ -0,0 +1,341 @@
+"""
+Informe de rendimiento de los procesos batch
+Mide cada paso por acción (descarga, guardado, agregación, análisis,
+señales): tiempo, consultas SQL y filas escritas. Los métodos se marcan
+con @timed('fase'); sin una grabación activa el decorador solo añade una
+comprobación. Al terminar la ejecución se escribe un JSON en data/perf/
+con p50/p95/p99 por fase y las acciones más lentas (visible en /admin).
+
+Uso:
+    recorder = start_recording('weekly')
+    ...
+    recorder.write_report()
+"""
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.database import Stock, SessionLocal
+from app.db_stats import get_db_stats
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PERF_REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'perf')
+
+# Informes que se conservan (los más antiguos se borran al escribir uno nuevo)
+PERF_KEEP_REPORTS = 60
+
+# Acciones más lentas que se listan por fase y en total
+PERF_TOP_N = 20
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Grabación activa del proceso (una a la vez) y spans abiertos por hilo
+_active = None
+_local = threading.local()
+_listeners_lock = threading.Lock()
+_listeners_installed = False
+
+
+class _Span:
+    """Medición en curso de una fase para una acción."""
+
+    __slots__ = ('phase', 'key', 'start', 'queries', 'rows')
+
+    def __init__(self, phase: str, key):
+        self.phase = phase
+        self.key = key
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+
+
+class PerfRecorder:
+    """
+    Muestras (acción, ms, consultas, filas escritas, error) por fase.
+    Las métricas son inclusivas: un span anidado también cuenta en el exterior.
+    """
+
+    def __init__(self, run: str):
+        self.run = run
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[tuple]] = defaultdict(list)
+
+    @contextmanager
+    def track(self, phase: str, key=None):
+        """Medir un bloque de la fase `phase` para la acción `key` (ticker o stock_id)."""
+        spans = _thread_spans()
+        # Reintentos recursivos (download_stock_data) se miden como una sola llamada
+        if spans and spans[-1].phase == phase and spans[-1].key == key:
+            yield
+            return
+
+        span = _Span(phase, key)
+        spans.append(span)
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            spans.pop()
+            elapsed_ms = (time.perf_counter() - span.start) * 1000
+            with self._lock:
+                self.samples[phase].append((key, elapsed_ms, span.queries, span.rows, failed))
+
+    # ------------------------------------------------------------------
+    # Informe
+    # ------------------------------------------------------------------
+
+    def build_report(self, tickers: Optional[Dict[int, str]] = None) -> dict:
+        """Resumen por fase y acciones más lentas (tickers = {stock_id: ticker})."""
+        tickers = tickers or {}
+
+        def name(key):
+            if isinstance(key, int):
+                return tickers.get(key, f"ID:{key}")
+            return key
+
+        with self._lock:
+            samples = {phase: list(rows) for phase, rows in self.samples.items()}
+
+        phases = {}
+        slowest = {}
+        by_ticker = defaultdict(lambda: {'total_ms': 0.0, 'queries': 0, 'rows_written': 0, 'phases': {}})
+
+        for phase, rows in samples.items():
+            ms = np.array([r[1] for r in rows])
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            phases[phase] = {
+                'count': len(rows),
+                'errors': sum(1 for r in rows if r[4]),
+                'total_s': round(float(ms.sum()) / 1000, 2),
+                'mean_ms': round(float(ms.mean()), 1),
+                'p50_ms': round(float(p50), 1),
+                'p95_ms': round(float(p95), 1),
+                'p99_ms': round(float(p99), 1),
+                'max_ms': round(float(ms.max()), 1),
+                'queries': sum(r[2] for r in rows),
+                'rows_written': sum(r[3] for r in rows),
+            }
+
+            top = sorted(rows, key=lambda r: r[1], reverse=True)[:PERF_TOP_N]
+            slowest[phase] = [
+                {'ticker': name(r[0]), 'ms': round(r[1], 1), 'queries': r[2], 'rows_written': r[3]}
+                for r in top
+            ]
+
+            for key, elapsed, queries, written, _ in rows:
+                if key is None:
+                    continue
+                entry = by_ticker[name(key)]
+                entry['total_ms'] += elapsed
+                entry['queries'] += queries
+                entry['rows_written'] += written
+                entry['phases'][phase] = round(entry['phases'].get(phase, 0.0) + elapsed, 1)
+
+        top_tickers = sorted(by_ticker.items(), key=lambda kv: kv[1]['total_ms'], reverse=True)[:PERF_TOP_N]
+        finished_at = datetime.now()
+
+        report = {
+            'run': self.run,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': finished_at.isoformat(timespec='seconds'),
+            'duration_s': round(time.perf_counter() - self._start, 1),
+            'phases': phases,
+            'slowest': slowest,
+            'slowest_tickers': [
+                {'ticker': t, **entry, 'total_ms': round(entry['total_ms'], 1)}
+                for t, entry in top_tickers
+            ],
+        }
+        # Huellas SQL del proceso si la instrumentación está activa (DB_STATS=1)
+        db_stats = get_db_stats(PERF_TOP_N)
+        if db_stats is not None:
+            report['db'] = db_stats
+        return report
+
+    def write_report(self, stop: bool = True) -> Optional[str]:
+        """
+        Escribir el informe en PERF_REPORT_DIR y (por defecto) detener la grabación.
+
+        Returns:
+            Ruta del fichero o None si no se pudo escribir
+        """
+        global _active
+        if stop and _active is self:
+            _active = None
+
+        try:
+            db = SessionLocal()
+            try:
+                tickers = dict(db.query(Stock.id, Stock.ticker).all())
+            finally:
+                db.close()
+            report = self.build_report(tickers)
+
+            os.makedirs(PERF_REPORT_DIR, exist_ok=True)
+            path = os.path.join(PERF_REPORT_DIR, f"{_safe_name(self.run)}.json")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(report, f, indent=1)
+            os.replace(tmp_path, path)
+            _prune_reports()
+        except Exception as e:
+            logger.warning(f"⚠ No se pudo escribir el informe de rendimiento: {e}")
+            return None
+
+        logger.info(f"✓ Informe de rendimiento: {path}")
+        return path
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def _thread_spans() -> list:
+    spans = getattr(_local, 'spans', None)
+    if spans is None:
+        spans = _local.spans = []
+    return spans
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = getattr(_local, 'spans', None)
+    if spans:
+        for span in spans:
+            span.queries += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = getattr(_local, 'spans', None)
+    if spans and statement.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        rowcount = cursor.rowcount
+        if rowcount and rowcount > 0:
+            for span in spans:
+                span.rows += rowcount
+
+
+def _install_listeners() -> None:
+    """Contadores de consultas en todos los engines (una sola vez por proceso)."""
+    global _listeners_installed
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            _listeners_installed = True
+
+
+def _safe_name(run: str) -> str:
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in run)
+
+
+def _prune_reports(keep: int = PERF_KEEP_REPORTS) -> None:
+    """Borrar los informes más antiguos."""
+    reports = sorted(
+        (os.path.join(PERF_REPORT_DIR, f) for f in os.listdir(PERF_REPORT_DIR) if f.endswith('.json')),
+        key=os.path.getmtime
+    )
+    for path in reports[:-keep]:
+        os.remove(path)
+
+
+def start_recording(run: str) -> PerfRecorder:
+    """Activar la grabación del proceso (sustituye a la anterior si la hubiera)."""
+    global _active
+    _install_listeners()
+    _active = PerfRecorder(run)
+    return _active
+
+
+def get_recorder() -> Optional[PerfRecorder]:
+    """Grabación activa (None si no hay)."""
+    return _active
+
+
+def timed(phase: str):
+    """
+    Decorador para métodos por acción: el primer argumento tras self
+    (ticker o stock_id) identifica la acción en el informe.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, key, *args, **kwargs):
+            recorder = _active
+            if recorder is None:
+                return func(self, key, *args, **kwargs)
+            with recorder.track(phase, key):
+                return func(self, key, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def list_reports() -> List[dict]:
+    """Informes disponibles, del más reciente al más antiguo."""
+    if not os.path.isdir(PERF_REPORT_DIR):
+        return []
+    reports = []
+    for filename in os.listdir(PERF_REPORT_DIR):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(PERF_REPORT_DIR, filename)
+        try:
+            with open(path) as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        reports.append({
+            'name': filename[:-5],
+            'run': report.get('run'),
+            'started_at': report.get('started_at'),
+            'duration_s': report.get('duration_s'),
+        })
+    return sorted(reports, key=lambda r: r['started_at'] or '', reverse=True)
+
+
+def load_report(name: str) -> Optional[dict]:
+    """Leer un informe por nombre (None si no existe)."""
+    if _safe_name(name) != name:
+        return None
+    path = os.path.join(PERF_REPORT_DIR, f"{name}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    from app.analyzer import WeinsteinAnalyzer
+
+    print("=== TEST INFORME DE RENDIMIENTO ===\n")
+
+    recorder = start_recording('test')
+    db = SessionLocal()
+    analyzer = WeinsteinAnalyzer(db)
+    for (stock_id,) in db.query(Stock.id).filter(Stock.active == True).limit(20).all():
+        analyzer.analyze_stock_stages(stock_id, weeks_back=10)
+    db.close()
+
+    path = recorder.write_report()
+    report = load_report('test')
+    for phase, stats in report['phases'].items():
+        print(f"  {phase:10s} n={stats['count']}  p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  "
+              f"consultas {stats['queries']}  filas {stats['rows_written']}")
+    print(f"\nInforme: {path}")
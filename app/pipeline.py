@@ -0,0 +1,627 @@
+"""
+Orquestador del pipeline batch - Grafo de tareas por acción
+Sustituye a las entradas de cron encadenadas por hora: cada acción tiene
+sus propias tareas ingest → aggregate → analyze → signals y cada una se
+lanza en cuanto terminan sus dependencias (la acción A se analiza mientras
+la B todavía se agrega). Las tareas globales (ranking RS, snapshot,
+amplitud, versión de datos, notificación) esperan a que termine su fase.
+
+El estado de cada tarea se guarda en pipeline_tasks: los fallos se
+reintentan hasta PIPELINE_MAX_ATTEMPTS veces, las tareas que dependen de
+una fallida se marcan como 'skipped' y una ejecución interrumpida se
+reanuda con --resume RUN_ID (las tareas 'done' no se repiten, salvo las que dependen de una que se repite). Cada
+ejecución deja su informe de rendimiento en data/perf/RUN_ID.json (app/perf.py).
+
+Uso:
+    python -m app.pipeline run                  # modo según el día (auto)
+    python -m app.pipeline run --mode weekly --workers 8
+    python -m app.pipeline run --resume 20240615-003000-full
+    python -m app.pipeline status [RUN_ID]
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import Stock, PipelineTask, SessionLocal
+from app.data_collector import DataCollector
+from app.aggregator import WeeklyAggregator
+from app.analyzer import WeinsteinAnalyzer
+from app.signals import SignalGenerator
+from app.benchmarks import BenchmarkMatrix
+from app.provisional import ProvisionalAnalyzer, purge_closed_weeks
+from app.rs_rank import update_rs_ranks
+from app.breadth import update_market_breadth
+from app.snapshot import refresh_stock_latest
+from app.data_version import bump_data_version
+from app.events import PipelineEvents, purge_events, signal_payloads
+from app.notifications import check_stop_losses, notify_weekly_signals
+from app.perf import start_recording
+from app.config import (
+    BENCHMARK_DEFAULT, BENCHMARKS_BY_SUFFIX, BUY_MIN_RS_RANK,
+    PIPELINE_WORKERS, PIPELINE_INGEST_WORKERS, PIPELINE_MAX_ATTEMPTS,
+)
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# daily: descarga + semana provisional | weekly: cierre semanal | full: descarga + cierre semanal
+PIPELINE_MODES = ('daily', 'weekly', 'full')
+
+# Tareas por acción, en orden de dependencia
+STOCK_TASKS = ('ingest', 'aggregate', 'analyze', 'signals')
+
+# Parámetros de cada tarea (los mismos que usaban los scripts de cron)
+INGEST_DAYS_BACK = 5
+AGGREGATE_WEEKS_BACK = 4
+ANALYZE_WEEKS_BACK = 10
+SIGNALS_WEEKS_BACK = 1
+
+# Días que se conservan las filas de pipeline_tasks
+PIPELINE_RETENTION_DAYS = 30
+
+FINISHED_STATUSES = ('done', 'failed', 'skipped')
+
+
+class Task:
+    """
+    Nodo del grafo. Las dependencias 'hard' deben terminar en 'done' (si no,
+    la tarea se omite); las 'soft' solo tienen que haber terminado.
+    """
+
+    def __init__(self, name: str, stock_id: Optional[int] = None, ticker: Optional[str] = None):
+        self.name = name
+        self.stock_id = stock_id
+        self.ticker = ticker
+        self.hard = []          # claves de las que depende (deben acabar en 'done')
+        self.soft = []          # claves que solo deben haber terminado
+        self.dependents = []    # tareas que esperan a esta
+        self.status = 'pending'
+        self.attempts = 0       # intentos en esta ejecución
+        self.blocked = False    # alguna dependencia hard no terminó en 'done'
+        self.row_id = None      # id en pipeline_tasks
+        self.signals = []       # eventos de señales guardadas, pendientes de publicar
+
+    @property
+    def key(self) -> Tuple[str, Optional[int]]:
+        return (self.name, self.stock_id)
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}:{self.ticker}" if self.ticker else self.name
+
+
+class Pipeline:
+    """
+    Ejecución del grafo con dos grupos de hilos: uno para las descargas
+    (PIPELINE_INGEST_WORKERS, respeta el rate limit del proveedor) y otro
+    para el resto (PIPELINE_WORKERS). Cada intento de tarea usa su propia
+    sesión de BD; el estado lo escribe solo el hilo principal.
+    """
+
+    def __init__(self, mode: str, run_id: Optional[str] = None,
+                 workers: int = PIPELINE_WORKERS,
+                 ingest_workers: int = PIPELINE_INGEST_WORKERS,
+                 max_attempts: int = PIPELINE_MAX_ATTEMPTS):
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Modo desconocido: {mode} (opciones: {', '.join(PIPELINE_MODES)})")
+        self.mode = mode
+        self.run_id = run_id or f"{datetime.now():%Y%m%d-%H%M%S}-{mode}"
+        self.workers = max(1, workers)
+        self.ingest_workers = max(1, ingest_workers)
+        self.max_attempts = max(1, max_attempts)
+
+        self.tasks: Dict[Tuple[str, Optional[int]], Task] = {}
+        self.events = PipelineEvents(mode)
+        self._phase_events: Dict[str, PipelineEvents] = {}
+        self._phase_totals = Counter()
+        self._phase_done = Counter()
+        self._benchmarks = None
+        self._benchmarks_lock = threading.Lock()
+        self._version = None
+        self._recorder = None
+
+    # ------------------------------------------------------------------
+    # Construcción del grafo
+    # ------------------------------------------------------------------
+
+    def _add(self, name: str, stock_id: Optional[int] = None, ticker: Optional[str] = None,
+             hard: Tuple = (), soft: Tuple = ()) -> Task:
+        task = Task(name, stock_id, ticker)
+        task.hard = [key for key in hard if key in self.tasks]
+        task.soft = [key for key in soft if key in self.tasks]
+        self.tasks[task.key] = task
+        return task
+
+    def _keys(self, name: str) -> List[Tuple[str, Optional[int]]]:
+        return [key for key in self.tasks if key[0] == name]
+
+    def build(self, db: Session) -> None:
+        """Crear las tareas del modo para las acciones activas."""
+        stocks = db.query(Stock.id, Stock.ticker, Stock.exchange).filter(
+            Stock.active == True
+        ).order_by(Stock.id).all()
+        benchmark_tickers = set(BENCHMARKS_BY_SUFFIX.values()) | {BENCHMARK_DEFAULT}
+
+        if self.mode in ('daily', 'full'):
+            for s in stocks:
+                self._add('ingest', s.id, s.ticker)
+            self._add('stop_loss', soft=self._keys('ingest'))
+
+        if self.mode == 'daily':
+            self._add('provisional', soft=self._keys('ingest'))
+            self._add('snapshot', soft=self._keys('ingest'))
+            self._add('version', soft=[('snapshot', None), ('provisional', None), ('stop_loss', None)])
+            return
+
+        # Si falla la descarga se agregan igualmente los días ya guardados: con
+        # SIGNALS_WEEKS_BACK = 1 la semana no se vuelve a revisar el sábado siguiente
+        for s in stocks:
+            self._add('aggregate', s.id, s.ticker, soft=[('ingest', s.id)])
+            self._add('analyze', s.id, s.ticker, hard=[('aggregate', s.id)])
+
+        # Matriz de benchmarks compartida por las señales (tras analizar los índices)
+        self._add('benchmarks', soft=[('analyze', s.id) for s in stocks if s.ticker in benchmark_tickers])
+        self._add('rs_rank', soft=self._keys('analyze'))
+        self._add('breadth', soft=self._keys('analyze'))
+
+        # El ranking RS solo condiciona las señales si filtra las BUY
+        signal_soft = [('benchmarks', None)] + ([('rs_rank', None)] if BUY_MIN_RS_RANK > 0 else [])
+        for s in stocks:
+            if s.exchange != 'INDEX':
+                self._add('signals', s.id, s.ticker, hard=[('analyze', s.id)], soft=signal_soft)
+
+        self._add('purge_provisional', soft=self._keys('signals'))
+        self._add('snapshot', soft=self._keys('signals') + [('rs_rank', None)])
+        self._add('version', soft=[('snapshot', None), ('breadth', None),
+                                   ('purge_provisional', None), ('stop_loss', None)])
+        self._add('notify', soft=[('version', None)])
+
+    def _link(self) -> None:
+        """Rellenar las listas de dependientes."""
+        for task in self.tasks.values():
+            for key in task.hard + task.soft:
+                self.tasks[key].dependents.append(task)
+
+    # ------------------------------------------------------------------
+    # Estado persistente (pipeline_tasks)
+    # ------------------------------------------------------------------
+
+    def _load_state(self, db: Session) -> None:
+        """Crear las filas de la ejecución o recuperar las de una anterior (--resume)."""
+        rows = {
+            (r.task, r.stock_id): r
+            for r in db.query(PipelineTask).filter(PipelineTask.run_id == self.run_id).all()
+        }
+
+        missing = [
+            {'run_id': self.run_id, 'mode': self.mode, 'task': t.name,
+             'stock_id': t.stock_id, 'status': 'pending', 'attempts': 0}
+            for key, t in self.tasks.items() if key not in rows
+        ]
+        if missing:
+            db.bulk_insert_mappings(PipelineTask, missing)
+            db.commit()
+            rows = {
+                (r.task, r.stock_id): r
+                for r in db.query(PipelineTask).filter(PipelineTask.run_id == self.run_id).all()
+            }
+
+        reset = []
+        for key, task in self.tasks.items():
+            row = rows[key]
+            task.row_id = row.id
+            if row.status == 'done':
+                task.status = 'done'
+            elif row.status != 'pending':
+                reset.append({'id': row.id, 'status': 'pending', 'error': None})
+
+        # Una tarea hecha se repite si alguna dependencia se repite (p. ej. el
+        # aggregate de un ingest fallido que ahora descarga el viernes). Las
+        # dependencias se crean antes que sus dependientes: basta una pasada
+        for task in self.tasks.values():
+            if task.status == 'done' and any(self.tasks[k].status != 'done' for k in task.hard + task.soft):
+                task.status = 'pending'
+                reset.append({'id': task.row_id, 'status': 'pending', 'error': None})
+        if reset:
+            db.bulk_update_mappings(PipelineTask, reset)
+            db.commit()
+
+    def _save(self, db: Session, updates: List[dict]) -> None:
+        """Escribir cambios de estado acumulados (un commit por iteración)."""
+        if not updates:
+            return
+        try:
+            db.bulk_update_mappings(PipelineTask, updates)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠ No se pudo guardar el estado de {len(updates)} tareas: {e}")
+        updates.clear()
+
+    # ------------------------------------------------------------------
+    # Tareas
+    # ------------------------------------------------------------------
+
+    def _shared_benchmarks(self, db: Session) -> BenchmarkMatrix:
+        """Matriz de benchmarks cargada una vez por ejecución."""
+        with self._benchmarks_lock:
+            if self._benchmarks is None:
+                self._benchmarks = BenchmarkMatrix.load(db)
+            return self._benchmarks
+
+    def _execute(self, task: Task) -> None:
+        """Ejecutar un intento de la tarea con su propia sesión (lanza excepción si falla)."""
+        db = SessionLocal()
+        try:
+            handler = getattr(self, f'_task_{task.name}')
+            if task.stock_id is None:
+                # Las tareas por acción se miden con @timed en sus métodos
+                with self._recorder.track(task.name):
+                    handler(db, task)
+            else:
+                handler(db, task)
+        finally:
+            db.close()
+
+    def _task_ingest(self, db: Session, task: Task) -> None:
+        updated = DataCollector(db).update_daily_data(task.ticker, days_back=INGEST_DAYS_BACK)
+        if updated is None:
+            # Fallaron todas las fuentes: la tarea se reintenta y, si sigue
+            # fallando, queda 'failed' (la agregación de la acción se salta)
+            raise RuntimeError(f"descarga fallida para {task.ticker}")
+        if not updated:
+            # Sin filas nuevas (festivo): no es un fallo
+            logger.warning(f"⚠ {task.ticker}: sin nuevos datos")
+
+    def _task_aggregate(self, db: Session, task: Task) -> None:
+        WeeklyAggregator(db).aggregate_stock_weekly_data(task.stock_id, weeks_back=AGGREGATE_WEEKS_BACK)
+
+    def _task_analyze(self, db: Session, task: Task) -> None:
+        WeinsteinAnalyzer(db).analyze_stock_stages(task.stock_id, weeks_back=ANALYZE_WEEKS_BACK)
+
+    def _task_signals(self, db: Session, task: Task) -> None:
+        # Los eventos se publican desde el hilo del orquestador al terminar la
+        # tarea: publicados desde varios hilos, un id menor podría confirmarse
+        # después de que la web hubiera leído uno mayor y no lo vería nunca
+        generator = SignalGenerator(
+            db, on_signals=lambda ticker, created: task.signals.extend(signal_payloads(ticker, created)),
+            benchmarks=self._shared_benchmarks(db))
+        generator.generate_signals_for_stock(task.stock_id, weeks_back=SIGNALS_WEEKS_BACK)
+
+    def _task_stop_loss(self, db: Session, task: Task) -> None:
+        check_stop_losses(db)
+
+    def _task_provisional(self, db: Session, task: Task) -> None:
+        result = ProvisionalAnalyzer(db).process_all_stocks()
+        logger.info(f"✓ Semana provisional {result['week_end_date']}: "
+                    f"{result['success']}/{result['total']} acciones, {result['signals']} señales")
+
+    def _task_benchmarks(self, db: Session, task: Task) -> None:
+        matrix = self._shared_benchmarks(db)
+        logger.info(f"✓ Benchmarks cargados: {', '.join(matrix.benchmarks) or 'ninguno'}")
+
+    def _task_rs_rank(self, db: Session, task: Task) -> None:
+        n = update_rs_ranks(db)
+        logger.info(f"✓ Ranking de fuerza relativa actualizado ({n} filas)")
+
+    def _task_breadth(self, db: Session, task: Task) -> None:
+        n = update_market_breadth(db)
+        logger.info(f"✓ Amplitud de mercado actualizada ({n} semanas)")
+
+    def _task_purge_provisional(self, db: Session, task: Task) -> None:
+        # La semana cerrada sustituye a la vista previa intrasemanal
+        week_end = WeeklyAggregator(db).get_week_end_date(datetime.now().date())
+        n = purge_closed_weeks(db, week_end)
+        logger.info(f"✓ Semana provisional sustituida ({n} filas eliminadas)")
+
+    def _task_snapshot(self, db: Session, task: Task) -> None:
+        n = refresh_stock_latest(db)
+        logger.info(f"✓ Snapshot stock_latest actualizado ({n} acciones)")
+
+    def _task_version(self, db: Session, task: Task) -> None:
+        self._version = bump_data_version(self.mode)
+        logger.info(f"✓ Versión de datos publicada: {self._version}")
+
+    def _task_notify(self, db: Session, task: Task) -> None:
+        notify_weekly_signals()
+
+    # ------------------------------------------------------------------
+    # Planificador
+    # ------------------------------------------------------------------
+
+    def _phase_started(self, task: Task) -> None:
+        """Evento phase_start al lanzar la primera tarea de una fase por acción."""
+        if task.stock_id is None or task.name in self._phase_events:
+            return
+        events = PipelineEvents(self.mode)
+        events.phase_start(task.name, total=self._phase_totals[task.name])
+        self._phase_events[task.name] = events
+
+    def _phase_progress(self, task: Task) -> None:
+        """Progreso y phase_end de las fases por acción."""
+        if task.stock_id is None:
+            return
+        self._phase_done[task.name] += 1
+        done, total = self._phase_done[task.name], self._phase_totals[task.name]
+        events = self._phase_events.get(task.name)
+        if events is None:
+            return
+        events.progress(done, total, task.ticker)
+        if done == total:
+            statuses = Counter(t.status for t in self.tasks.values() if t.name == task.name)
+            events.phase_end(task.name, success=statuses['done'],
+                             failed=statuses['failed'], skipped=statuses['skipped'])
+
+    def run(self) -> dict:
+        """
+        Ejecutar (o reanudar) el grafo completo.
+
+        Returns:
+            Dict con el recuento de tareas por estado
+        """
+        start_time = time.perf_counter()
+        self._recorder = start_recording(self.run_id)
+        db = SessionLocal()
+        ingest_pool = ThreadPoolExecutor(max_workers=self.ingest_workers, thread_name_prefix='ingest')
+        work_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='work')
+
+        try:
+            if not self.tasks:
+                self.build(db)
+            self._link()
+            self._load_state(db)
+
+            for task in self.tasks.values():
+                if task.stock_id is not None:
+                    self._phase_totals[task.name] += 1
+                    if task.status == 'done':
+                        self._phase_done[task.name] += 1
+
+            resumed = sum(1 for t in self.tasks.values() if t.status == 'done')
+            logger.info(f"Pipeline {self.run_id}: {len(self.tasks)} tareas "
+                        f"({resumed} ya completadas), {self.workers} hilos + {self.ingest_workers} de descarga")
+
+            # Dependencias pendientes de cada tarea
+            waiting = {}
+            ready = deque()
+            for task in self.tasks.values():
+                if task.status == 'done':
+                    continue
+                deps = [self.tasks[k] for k in task.hard + task.soft]
+                waiting[task.key] = sum(1 for d in deps if d.status != 'done')
+                if waiting[task.key] == 0:
+                    ready.append(task)
+
+            updates = []
+            running = {}
+
+            def finish(task: Task, status: str, error: Optional[str] = None) -> None:
+                """Cerrar una tarea y propagar a sus dependientes (omitiendo los bloqueados)."""
+                stack = [(task, status, error)]
+                while stack:
+                    current, current_status, current_error = stack.pop()
+                    current.status = current_status
+                    updates.append({'id': current.row_id, 'status': current_status,
+                                    'finished_at': datetime.now(), 'error': current_error})
+                    self._phase_progress(current)
+                    for dependent in current.dependents:
+                        if dependent.status != 'pending':
+                            continue
+                        if current_status != 'done' and current.key in dependent.hard:
+                            dependent.blocked = True
+                        waiting[dependent.key] -= 1
+                        if waiting[dependent.key] == 0:
+                            if dependent.blocked:
+                                stack.append((dependent, 'skipped', f"dependencia no completada: {current.label}"))
+                            else:
+                                ready.append(dependent)
+
+            def submit(task: Task) -> None:
+                task.status = 'running'
+                task.attempts += 1
+                updates.append({'id': task.row_id, 'status': 'running',
+                                'attempts': task.attempts, 'started_at': datetime.now()})
+                self._phase_started(task)
+                pool = ingest_pool if task.name == 'ingest' else work_pool
+                running[pool.submit(self._execute, task)] = task
+
+            while ready or running:
+                while ready:
+                    submit(ready.popleft())
+                self._save(db, updates)
+
+                completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    task = running.pop(future)
+                    error = future.exception()
+                    # Señales ya guardadas (también si el intento falló después)
+                    for payload in task.signals:
+                        self.events.publish('signal', **payload)
+                    task.signals = []
+                    if error is None:
+                        finish(task, 'done')
+                    elif task.attempts < self.max_attempts:
+                        logger.warning(f"⚠ {task.label}: intento {task.attempts} fallido ({error}), reintentando")
+                        task.status = 'pending'
+                        ready.append(task)
+                    else:
+                        logger.error(f"✗ {task.label}: {error}")
+                        finish(task, 'failed', str(error))
+
+            self._save(db, updates)
+
+            stats = Counter(t.status for t in self.tasks.values())
+            duration = time.perf_counter() - start_time
+            self.events.finished(duration, version=self._version, run_id=self.run_id,
+                                 done=stats['done'], failed=stats['failed'], skipped=stats['skipped'])
+            purge_events(db)
+            purge_pipeline_tasks(db)
+
+            return {'run_id': self.run_id, 'mode': self.mode, 'duration_s': round(duration, 1),
+                    'total': len(self.tasks), **{s: stats[s] for s in FINISHED_STATUSES}}
+
+        except Exception as e:
+            self.events.failed(str(e))
+            raise
+        finally:
+            ingest_pool.shutdown(wait=True)
+            work_pool.shutdown(wait=True)
+            db.close()
+            self._recorder.write_report()
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def resolve_mode(today: Optional[date] = None) -> str:
+    """
+    Modo automático para el cron (martes a sábado de madrugada):
+    sábado = descarga del viernes + cierre semanal; domingo = solo cierre
+    semanal; resto = descarga diaria + semana provisional.
+    """
+    weekday = (today or datetime.now().date()).weekday()
+    if weekday == 5:
+        return 'full'
+    if weekday == 6:
+        return 'weekly'
+    return 'daily'
+
+
+def get_run_mode(db: Session, run_id: str) -> Optional[str]:
+    """Modo de una ejecución guardada (None si no existe)."""
+    return db.query(PipelineTask.mode).filter(PipelineTask.run_id == run_id).limit(1).scalar()
+
+
+def get_run_summary(db: Session, run_id: Optional[str] = None) -> Optional[dict]:
+    """Recuento por tarea y estado de una ejecución (por defecto la última)."""
+    if run_id is None:
+        run_id = db.query(PipelineTask.run_id).order_by(PipelineTask.id.desc()).limit(1).scalar()
+        if run_id is None:
+            return None
+
+    rows = db.query(
+        PipelineTask.task, PipelineTask.status, func.count(PipelineTask.id),
+        func.min(PipelineTask.started_at), func.max(PipelineTask.finished_at)
+    ).filter(
+        PipelineTask.run_id == run_id
+    ).group_by(PipelineTask.task, PipelineTask.status).all()
+    if not rows:
+        return None
+
+    tasks = {}
+    for name, status, count, started, finished in rows:
+        entry = tasks.setdefault(name, {'started_at': None, 'finished_at': None})
+        entry[status] = count
+        if started and (entry['started_at'] is None or started < entry['started_at']):
+            entry['started_at'] = started
+        if finished and (entry['finished_at'] is None or finished > entry['finished_at']):
+            entry['finished_at'] = finished
+
+    failed = db.query(Stock.ticker, PipelineTask.task, PipelineTask.error).outerjoin(
+        Stock, PipelineTask.stock_id == Stock.id
+    ).filter(
+        PipelineTask.run_id == run_id,
+        PipelineTask.status == 'failed'
+    ).limit(50).all()
+
+    return {
+        'run_id': run_id,
+        'mode': get_run_mode(db, run_id),
+        'tasks': tasks,
+        'failed': [{'ticker': t, 'task': name, 'error': error} for t, name, error in failed],
+    }
+
+
+def purge_pipeline_tasks(db: Session, days: int = PIPELINE_RETENTION_DAYS) -> int:
+    """Borrar el estado de ejecuciones de más de `days` días."""
+    cutoff = datetime.now() - timedelta(days=days)
+    deleted = db.query(PipelineTask).filter(
+        PipelineTask.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def _print_summary(summary: Optional[dict]) -> None:
+    if summary is None:
+        print("Sin ejecuciones registradas")
+        return
+    print(f"Ejecución {summary['run_id']} ({summary['mode']})\n")
+    order = {name: i for i, name in enumerate(STOCK_TASKS)}
+    for name, entry in sorted(summary['tasks'].items(), key=lambda kv: (order.get(kv[0], len(order)), kv[0])):
+        counts = '  '.join(f"{s} {entry[s]}" for s in ('pending', 'running') + FINISHED_STATUSES if entry.get(s))
+        print(f"  {name:18s} {counts}")
+    for f in summary['failed']:
+        print(f"  ✗ {f['task']} {f['ticker'] or ''}: {f['error']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Orquestador del pipeline batch - Sistema Weinstein')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Ejecutar (o reanudar) el pipeline')
+    run_parser.add_argument('--mode', choices=('auto',) + PIPELINE_MODES, default='auto',
+                            help='daily, weekly, full o auto según el día (default: auto)')
+    run_parser.add_argument('--workers', type=int, default=PIPELINE_WORKERS,
+                            help=f'Hilos para agregación/análisis/señales (default: {PIPELINE_WORKERS})')
+    run_parser.add_argument('--ingest-workers', type=int, default=PIPELINE_INGEST_WORKERS,
+                            help=f'Hilos de descarga (default: {PIPELINE_INGEST_WORKERS})')
+    run_parser.add_argument('--resume', metavar='RUN_ID', help='Reanudar una ejecución anterior')
+
+    status_parser = commands.add_parser('status', help='Estado de una ejecución')
+    status_parser.add_argument('run_id', nargs='?', help='Ejecución (default: la última)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        db = SessionLocal()
+        try:
+            _print_summary(get_run_summary(db, args.run_id))
+        finally:
+            db.close()
+        return 0
+
+    mode = args.mode
+    if args.resume:
+        db = SessionLocal()
+        try:
+            mode = get_run_mode(db, args.resume)
+        finally:
+            db.close()
+        if mode is None:
+            logger.error(f"✗ Ejecución {args.resume} no encontrada")
+            return 1
+    elif mode == 'auto':
+        mode = resolve_mode()
+
+    pipeline = Pipeline(mode, run_id=args.resume, workers=args.workers,
+                        ingest_workers=args.ingest_workers)
+    logger.info("=" * 60)
+    logger.info(f"PIPELINE {mode.upper()} - {pipeline.run_id}")
+    logger.info("=" * 60)
+
+    result = pipeline.run()
+
+    logger.info("=" * 60)
+    logger.info(f"Tareas: {result['done']} completadas, {result['failed']} fallidas, "
+                f"{result['skipped']} omitidas de {result['total']} en {result['duration_s']:.0f} s")
+    logger.info("=" * 60)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
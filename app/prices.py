@@ -0,0 +1,81 @@
+"""
+Último precio disponible de un conjunto de acciones
+Sustituye las consultas por acción (N+1) de la cartera y del control de
+stop loss por una consulta agrupada sobre daily_data (índice stock_id, date)
+más otra sobre weekly_data solo para las acciones sin datos diarios (la
+cartera; el stop loss usa solo cierres diarios).
+"""
+import logging
+from typing import Dict, Iterable
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from app.database import DailyData, WeeklyData, SessionLocal
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def _latest_closes(db: Session, model, date_column, stock_ids: set) -> Dict[int, float]:
+    """Cierre de la fila más reciente de cada acción en `model` (una consulta)."""
+    subq = db.query(
+        model.stock_id,
+        func.max(date_column).label('max_date')
+    ).filter(
+        model.stock_id.in_(stock_ids)
+    ).group_by(model.stock_id).subquery()
+
+    rows = db.query(model.stock_id, model.close).join(
+        subq,
+        and_(
+            model.stock_id == subq.c.stock_id,
+            date_column == subq.c.max_date
+        )
+    ).all()
+    return {stock_id: float(close) for stock_id, close in rows}
+
+
+def get_latest_prices(db: Session, stock_ids: Iterable[int],
+                      weekly_fallback: bool = True) -> Dict[int, float]:
+    """
+    Último cierre diario de cada acción, con el semanal como respaldo.
+
+    Args:
+        db: Sesión de base de datos
+        stock_ids: IDs de las acciones
+        weekly_fallback: Usar el último cierre semanal de las acciones sin
+            datos diarios (puede tener días de antigüedad)
+
+    Returns:
+        Dict {stock_id: precio}; las acciones sin datos no aparecen
+    """
+    stock_ids = set(stock_ids)
+    if not stock_ids:
+        return {}
+
+    prices = _latest_closes(db, DailyData, DailyData.date, stock_ids)
+
+    missing = stock_ids - prices.keys()
+    if missing and weekly_fallback:
+        prices.update(_latest_closes(db, WeeklyData, WeeklyData.week_end_date, missing))
+
+    return prices
+
+
+if __name__ == '__main__':
+    from app.database import Position
+
+    print("=== TEST ÚLTIMOS PRECIOS ===\n")
+
+    db = SessionLocal()
+    positions = db.query(Position).filter(Position.status == 'OPEN').all()
+    prices = get_latest_prices(db, [p.stock_id for p in positions])
+    for pos in positions:
+        print(f"  {pos.stock.ticker:10s} {prices.get(pos.stock_id)}")
+    print(f"\n{len(prices)} precios para {len(positions)} posiciones abiertas")
+    db.close()
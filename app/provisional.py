@@ -0,0 +1,277 @@
+"""
+Vista previa intrasemanal - Etapa y señales provisionales
+Construye la vela parcial de la semana en curso desde daily_data y aplica
+MA30, detección de etapa y reglas BUY/SHORT sin modificar weekly_data.
+Los resultados se guardan en provisional_weekly y se sustituyen al cerrar la semana.
+"""
+import logging
+from datetime import datetime, date
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import Stock, WeeklyData, ProvisionalWeekly, SessionLocal
+from app.aggregator import WeeklyAggregator
+from app.analyzer import WeinsteinAnalyzer
+from app.signals import SignalGenerator
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Semanas cerradas que se cargan por acción: cubren la ventana de las reglas
+# BUY/SHORT (MIN_WEEKS_FOR_ANALYSIS + 30) y las 52 semanas del MRS
+HISTORY_WEEKS = 120
+
+
+class ProvisionalAnalyzer:
+    """
+    Análisis provisional de la semana en curso.
+
+    Reutiliza el estado guardado de la última semana cerrada (cierres, MA30,
+    etapa) y solo calcula la vela parcial: una consulta de histórico y otra
+    de datos diarios por acción.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.aggregator = WeeklyAggregator(db)
+        self.analyzer = WeinsteinAnalyzer(db)
+        self.generator = SignalGenerator(db)
+
+    def current_week_end(self, today: Optional[date] = None) -> date:
+        """Viernes de la semana en curso (sábado/domingo → viernes anterior)."""
+        today = today or datetime.now().date()
+        return self.aggregator.get_week_end_date(today)
+
+    def _load_history(self, stock_id: int, week_end_date: date) -> list:
+        """Últimas HISTORY_WEEKS semanas guardadas hasta week_end_date (orden cronológico)."""
+        rows = self.db.query(WeeklyData).filter(
+            WeeklyData.stock_id == stock_id,
+            WeeklyData.week_end_date <= week_end_date
+        ).order_by(WeeklyData.week_end_date.desc()).limit(HISTORY_WEEKS).all()
+        rows.reverse()
+        return rows
+
+    def build_provisional_week(self, stock_id: int, week_end_date: date) -> Optional[dict]:
+        """
+        Calcular la vela provisional de una acción con MA30/pendiente incrementales
+        y etapa preliminar.
+
+        Returns:
+            Dict con la vela provisional, el histórico usado y el objeto WeeklyData
+            transitorio (no se añade a la sesión), o None si no hay datos
+        """
+        partial = self.aggregator.aggregate_week(stock_id, week_end_date)
+        if not partial:
+            return None
+
+        history = self._load_history(stock_id, week_end_date)
+        if not history or history[-1].week_end_date == week_end_date:
+            # Sin histórico o semana ya cerrada por el proceso semanal
+            return None
+
+        prev = history[-1]
+        close = float(partial['close'])
+
+        # MA30 incremental: 29 cierres guardados + cierre parcial
+        ma30 = None
+        if len(history) >= 29:
+            closes = [float(w.close) for w in history[-29:]] + [close]
+            ma30 = round(sum(closes) / len(closes), 4)
+
+        # Redondeo igual que las columnas DECIMAL de weekly_data, para que los
+        # umbrales de etapa den el mismo resultado que al cerrar la semana
+        slope = None
+        if ma30 is not None and prev.ma30:
+            prev_ma30 = float(prev.ma30)
+            if prev_ma30 != 0:
+                slope = round((ma30 - prev_ma30) / prev_ma30, 4)
+
+        # Semana transitoria con la misma forma que weekly_data (no se persiste)
+        candle = WeeklyData(
+            stock_id=stock_id,
+            week_end_date=week_end_date,
+            open=partial['open'],
+            high=partial['high'],
+            low=partial['low'],
+            close=close,
+            volume=partial['volume'],
+            ma30=ma30,
+            ma30_slope=slope,
+        )
+        candle.stage = self.analyzer.detect_stage(candle, prev.stage)
+
+        return {
+            'candle': candle,
+            'history': history,
+            'stage_prev': prev.stage,
+            'as_of_date': partial['last_date'],
+            'days': partial['days'],
+        }
+
+    def _register_market_weeks(self, week_end_date: date) -> None:
+        """
+        Añadir la semana provisional de cada benchmark a la matriz del generador
+        para que el filtro de mercado y el MRS usen la misma semana parcial
+        que las acciones.
+        """
+        benchmarks = self.generator._load_benchmarks()
+        for ticker, stock_id in benchmarks.stock_ids.items():
+            result = self.build_provisional_week(stock_id, week_end_date)
+            if not result:
+                continue
+            candle = result['candle']
+            benchmarks.add_week(ticker, week_end_date, candle.close,
+                                candle.ma30, candle.ma30_slope)
+
+    def _evaluate_signal(self, ticker: str, history: list, candle: WeeklyData) -> tuple:
+        """
+        Aplicar las reglas BUY/SHORT de SignalGenerator a la semana provisional,
+        con el benchmark que corresponde a la acción.
+
+        Returns:
+            (signal_type o None, MRS o None)
+        """
+        if candle.ma30 is None or candle.ma30_slope is None:
+            return None, None
+
+        # Misma lista que usa el generador: semanas con MA30 y pendiente
+        weekly_all = [
+            w for w in history
+            if w.ma30 is not None and w.ma30_slope is not None
+        ] + [candle]
+        idx = len(weekly_all) - 1
+        week = candle.week_end_date
+        benchmark = self.generator._benchmark_for(ticker)
+
+        mrs = self.generator._compute_mrs(weekly_all, idx, benchmark)
+
+        if self.generator._is_valid_buy_breakout(weekly_all, idx):
+            if self.generator._market_is_bullish(week, benchmark) and (mrs is None or mrs > 0):
+                return 'BUY', mrs
+
+        if self.generator._is_valid_short_breakdown(weekly_all, idx):
+            if self.generator._market_is_bearish(week, benchmark) and (mrs is None or mrs < 0):
+                return 'SHORT', mrs
+
+        return None, mrs
+
+    def process_all_stocks(self, today: Optional[date] = None) -> dict:
+        """
+        Recalcular la semana provisional de todas las acciones activas.
+
+        Returns:
+            Dict con estadísticas
+        """
+        week_end_date = self.current_week_end(today)
+
+        # Las filas de semanas anteriores quedan sustituidas
+        purge_closed_weeks(self.db, week_end_date, inclusive=False)
+
+        stocks = self.db.query(Stock).filter(Stock.active == True).all()
+        existing = {
+            p.stock_id: p for p in self.db.query(ProvisionalWeekly).all()
+        }
+
+        logger.info(f"Semana provisional {week_end_date}: {len(stocks)} acciones")
+
+        self._register_market_weeks(week_end_date)
+
+        total = len(stocks)
+        success = 0
+        skipped = 0
+        signals = 0
+        failed = []
+
+        for stock in stocks:
+            try:
+                result = self.build_provisional_week(stock.id, week_end_date)
+                if not result:
+                    skipped += 1
+                    continue
+
+                candle = result['candle']
+                signal_type, mrs = None, None
+                if stock.exchange != 'INDEX':
+                    signal_type, mrs = self._evaluate_signal(
+                        stock.ticker, result['history'], candle)
+
+                row = existing.get(stock.id)
+                if row is None:
+                    row = ProvisionalWeekly(stock_id=stock.id)
+                    self.db.add(row)
+
+                row.week_end_date = week_end_date
+                row.as_of_date = result['as_of_date']
+                row.days = result['days']
+                row.open = candle.open
+                row.high = candle.high
+                row.low = candle.low
+                row.close = candle.close
+                row.volume = candle.volume
+                row.ma30 = candle.ma30
+                row.ma30_slope = candle.ma30_slope
+                row.stage = candle.stage
+                row.stage_prev = result['stage_prev']
+                row.signal_type = signal_type
+                row.mrs = mrs
+
+                self.db.commit()
+                success += 1
+
+                if signal_type:
+                    signals += 1
+                    logger.info(f"✓ {stock.ticker}: {signal_type} provisional {week_end_date} "
+                                f"(datos al {result['as_of_date']})")
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"✗ Error en semana provisional de {stock.ticker}: {e}")
+                failed.append(stock.ticker)
+
+        return {
+            'week_end_date': week_end_date,
+            'total': total,
+            'success': success,
+            'skipped': skipped,
+            'signals': signals,
+            'failed': len(failed),
+            'failed_tickers': failed
+        }
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def purge_closed_weeks(db: Session, week_end_date: date, inclusive: bool = True) -> int:
+    """
+    Borrar filas provisionales ya sustituidas por semanas cerradas.
+
+    Args:
+        week_end_date: Fecha de referencia (viernes)
+        inclusive: True = borrar también las de week_end_date (semana ya cerrada)
+
+    Returns:
+        Número de filas borradas
+    """
+    column = ProvisionalWeekly.week_end_date
+    condition = column <= week_end_date if inclusive else column < week_end_date
+    deleted = db.query(ProvisionalWeekly).filter(condition).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+if __name__ == '__main__':
+    print("=== TEST SEMANA PROVISIONAL ===\n")
+
+    db = SessionLocal()
+    provisional = ProvisionalAnalyzer(db)
+    result = provisional.process_all_stocks()
+    print(f"Semana: {result['week_end_date']}")
+    print(f"Procesadas: {result['success']}/{result['total']} "
+          f"(sin datos: {result['skipped']}, señales: {result['signals']})")
+    db.close()
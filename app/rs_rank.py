@@ -0,0 +1,218 @@
+"""
+Ranking de fuerza relativa - Tabla weekly_rs_rank
+El MRS compara una acción con su índice; este ranking la compara con el
+resto de acciones activas. Cada semana se guardan la rentabilidad a 13, 26
+y 52 semanas y el MRS, su percentil (0-100) entre las acciones con dato y
+un rango compuesto (rs_rank: percentil de la media de los cuatro).
+
+rs_rank alimenta el filtro BUY_MIN_RS_RANK de las señales, stock_latest,
+la watchlist y el screener. Relleno inicial: python app/rs_rank.py --full
+"""
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import Stock, WeeklyData, WeeklyRsRank, SessionLocal
+from app.benchmarks import BenchmarkMatrix
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Horizontes de rentabilidad (semanas)
+RS_RETURN_WEEKS = (13, 26, 52)
+
+# Ventana de la media del ratio acción/benchmark del MRS
+RS_MRS_WEEKS = 52
+
+# Semanas que se recalculan en cada actualización incremental
+# (el pipeline reagrega las últimas AGGREGATE_WEEKS_BACK = 4 semanas)
+RS_RECOMPUTE_WEEKS = 4
+
+# Filas por inserción masiva
+RS_INSERT_CHUNK = 10000
+
+# Valores (4 decimales) y percentiles (2 decimales)
+RS_VALUE_COLUMNS = ('ret_13w', 'ret_26w', 'ret_52w', 'mrs')
+RS_RANK_COLUMNS = ('rank_13w', 'rank_26w', 'rank_52w', 'rank_mrs', 'rs_rank')
+RS_COLUMNS = RS_VALUE_COLUMNS + RS_RANK_COLUMNS
+
+
+def update_rs_ranks(db: Session, full: bool = False) -> int:
+    """
+    Recalcular los percentiles de las semanas nuevas y de las últimas
+    RS_RECOMPUTE_WEEKS (sus cierres cambian al reagregarlas). Como un
+    percentil depende de todas las acciones, se reescriben semanas enteras;
+    los cierres se leen desde 53 semanas antes para los retornos y el MRS.
+
+    Args:
+        full: Borrar y recalcular todo el histórico
+
+    Returns:
+        Número de filas (acción, semana) escritas
+    """
+    last_week = None if full else db.query(func.max(WeeklyRsRank.week_end_date)).scalar()
+    if last_week is None:
+        from_week, since = None, None
+    else:
+        from_week = last_week - timedelta(weeks=RS_RECOMPUTE_WEEKS)
+        since = from_week - timedelta(weeks=max(RS_RETURN_WEEKS + (RS_MRS_WEEKS,)) + 1)
+
+    closes = _load_close_matrix(db, since)
+    tickers = dict(db.query(Stock.id, Stock.ticker).all())
+    bench = _benchmark_matrix(closes, tickers, BenchmarkMatrix.load(db)) if not closes.empty else closes
+    records = compute_rs_ranks(closes, bench, from_week)
+
+    try:
+        query = db.query(WeeklyRsRank)
+        if from_week is not None:
+            query = query.filter(WeeklyRsRank.week_end_date >= from_week)
+        query.delete(synchronize_session=False)
+        for start in range(0, len(records), RS_INSERT_CHUNK):
+            db.bulk_insert_mappings(WeeklyRsRank, records[start:start + RS_INSERT_CHUNK])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(records)
+
+
+def get_rs_ranks_by_week(db: Session, stock_id: int) -> Dict[date, float]:
+    """Rango compuesto de una acción por semana {week_end_date: rs_rank}."""
+    rows = db.query(WeeklyRsRank.week_end_date, WeeklyRsRank.rs_rank).filter(
+        WeeklyRsRank.stock_id == stock_id,
+        WeeklyRsRank.rs_rank.isnot(None)
+    ).all()
+    return {week: float(rank) for week, rank in rows}
+
+
+def compute_rs_ranks(closes: pd.DataFrame, bench: pd.DataFrame,
+                     from_week: Optional[date] = None) -> List[dict]:
+    """
+    Calcular rentabilidades, MRS y percentiles (sin escribir en BD).
+
+    Args:
+        closes: Cierres semana × acción con al menos 52 semanas previas a from_week
+        bench: Cierres del benchmark de cada acción (misma forma)
+        from_week: Primera semana que se devuelve (None = todas)
+
+    Returns:
+        Lista de dicts con las columnas de WeeklyRsRank
+    """
+    if closes.empty:
+        return []
+
+    metrics = {}
+    for weeks in RS_RETURN_WEEKS:
+        metrics[f'ret_{weeks}w'] = (closes / closes.shift(weeks) - 1) * 100
+
+    # MRS = (rs_ratio / MA52_rs_ratio - 1) × 100 (igual que compute_mrs)
+    rs_ratio = closes / bench.where(bench > 0)
+    metrics['mrs'] = (rs_ratio / rs_ratio.rolling(RS_MRS_WEEKS, min_periods=RS_MRS_WEEKS).mean() - 1) * 100
+
+    # Percentiles por semana (fila) entre las acciones con dato
+    ranks = {}
+    for weeks in RS_RETURN_WEEKS:
+        ranks[f'rank_{weeks}w'] = metrics[f'ret_{weeks}w'].rank(axis=1, pct=True) * 100
+    ranks['rank_mrs'] = metrics['mrs'].rank(axis=1, pct=True) * 100
+
+    # Compuesto: percentil de la media de los percentiles disponibles
+    stacked = np.stack([r.to_numpy() for r in ranks.values()])
+    available = (~np.isnan(stacked)).sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        mean_rank = np.where(available > 0, np.nansum(stacked, axis=0) / np.maximum(available, 1), np.nan)
+    mean_rank = pd.DataFrame(mean_rank, index=closes.index, columns=closes.columns)
+    ranks['rs_rank'] = mean_rank.rank(axis=1, pct=True) * 100
+
+    frames = {**metrics, **ranks}
+    if from_week is not None:
+        keep = closes.index >= from_week
+        closes = closes[keep]
+        frames = {name: frame[keep] for name, frame in frames.items()}
+
+    # Formato largo: una fila por (semana, acción) con cierre
+    present = closes.notna().to_numpy()
+    week_idx, stock_idx = np.nonzero(present)
+    weeks = closes.index.to_numpy()[week_idx]
+    stock_ids = closes.columns.to_numpy()[stock_idx]
+    values = {name: frame.to_numpy()[week_idx, stock_idx] for name, frame in frames.items()}
+
+    records = []
+    for i in range(len(week_idx)):
+        record = {'stock_id': int(stock_ids[i]), 'week_end_date': weeks[i]}
+        for name in RS_COLUMNS:
+            value = values[name][i]
+            digits = 4 if name in RS_VALUE_COLUMNS else 2
+            record[name] = None if np.isnan(value) else round(float(value), digits)
+        records.append(record)
+    return records
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def _load_close_matrix(db: Session, since: Optional[date]) -> pd.DataFrame:
+    """Cierres semanales de las acciones activas (sin índices): semana × stock_id."""
+    query = db.query(
+        WeeklyData.stock_id, WeeklyData.week_end_date, WeeklyData.close
+    ).join(
+        Stock, WeeklyData.stock_id == Stock.id
+    ).filter(
+        Stock.active == True,
+        Stock.exchange != 'INDEX'
+    )
+    if since is not None:
+        query = query.filter(WeeklyData.week_end_date >= since)
+
+    df = pd.DataFrame(query.all(), columns=['stock_id', 'week_end_date', 'close'])
+    if df.empty:
+        return pd.DataFrame()
+    df['close'] = df['close'].astype(float)
+    return df.pivot(index='week_end_date', columns='stock_id', values='close').sort_index()
+
+
+def _benchmark_matrix(closes: pd.DataFrame, tickers: Dict[int, str],
+                      benchmarks: BenchmarkMatrix) -> pd.DataFrame:
+    """Cierre del benchmark de cada acción, con la misma forma que `closes`."""
+    if benchmarks.closes_df.empty:
+        return pd.DataFrame(np.nan, index=closes.index, columns=closes.columns)
+
+    bench_closes = benchmarks.closes_df.reindex(closes.index)
+    columns = [benchmarks.benchmark_for(tickers.get(stock_id, '')) for stock_id in closes.columns]
+    matrix = bench_closes.reindex(columns=columns)
+    matrix.columns = closes.columns
+    return matrix
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    print("=== RANKING DE FUERZA RELATIVA ===\n")
+
+    full = '--full' in sys.argv
+    db = SessionLocal()
+    start = time.perf_counter()
+    n = update_rs_ranks(db, full=full)
+    print(f"✓ {n} filas {'(histórico completo) ' if full else ''}en {time.perf_counter() - start:.1f} s\n")
+
+    last_week = db.query(func.max(WeeklyRsRank.week_end_date)).scalar()
+    top = db.query(Stock.ticker, WeeklyRsRank).join(
+        WeeklyRsRank, Stock.id == WeeklyRsRank.stock_id
+    ).filter(
+        WeeklyRsRank.week_end_date == last_week
+    ).order_by(WeeklyRsRank.rs_rank.desc()).limit(10).all()
+    print(f"Top 10 semana {last_week}:")
+    for ticker, r in top:
+        print(f"    {ticker:10s} RS {r.rs_rank}  13s {r.rank_13w}  26s {r.rank_26w}  52s {r.rank_52w}  MRS {r.rank_mrs}")
+    db.close()
@@ -0,0 +1,264 @@
+"""
+Screener en memoria - Filtros combinables sobre el estado actual
+Una columna NumPy por métrica (etapa, pendiente MA30, distancia a MA30, MRS,
+semanas en etapa, ratio de volumen...) con una posición por acción activa.
+Cada filtro es una máscara booleana vectorizada; ordenar es un lexsort.
+Una consulta sobre todo el universo tarda del orden de 1 ms y no toca la BD.
+La web comparte un snapshot por proceso, recargado al cambiar la versión de datos.
+"""
+import logging
+import threading
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import Stock, StockLatest, WeeklyData, Signal, SessionLocal
+from app.data_version import get_data_version
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Ratio de volumen = volumen de la última semana / media de las N anteriores
+SCREENER_VOLUME_WEEKS = 10
+
+# Días de señales que se cargan (filtro "señal reciente")
+SCREENER_SIGNAL_DAYS = 90
+
+# Columnas numéricas filtrables por rango y ordenables
+NUMERIC_FIELDS = (
+    'stage', 'close', 'ma30', 'ma30_slope', 'distance_ma30', 'mrs',
+    'weeks_in_stage', 'volume_ratio', 'rs_rank',
+)
+SORT_FIELDS = NUMERIC_FIELDS + ('ticker',)
+
+# Snapshot compartido por el proceso web (ver get_screener)
+_cache_lock = threading.Lock()
+_cached_screener = None
+_cached_version = None
+
+
+class StockScreener:
+    """
+    Snapshot columnar de stock_latest para las acciones activas.
+    Los valores ausentes son NaN: no cumplen ningún filtro de rango y
+    quedan al final al ordenar.
+    """
+
+    def __init__(self, stocks: List[dict], signals: Dict[str, Dict[int, date]], as_of: date):
+        """
+        Args:
+            stocks: Dicts con id, ticker, name, exchange, week_end_date y NUMERIC_FIELDS
+            signals: {tipo: {stock_id: fecha de la última señal}}
+            as_of: Fecha de referencia para "días desde la señal"
+        """
+        self.stocks = stocks
+        self.as_of = as_of
+        self.size = len(stocks)
+        self.ids = np.array([s['id'] for s in stocks], dtype=np.int64)
+        self.exchanges = np.array([s['exchange'] or '' for s in stocks], dtype=object)
+        self.columns = {
+            field: np.array(
+                [s[field] if s.get(field) is not None else np.nan for s in stocks],
+                dtype=np.float64
+            )
+            for field in NUMERIC_FIELDS
+        }
+        # Posición alfabética del ticker (para ordenar por ticker con lexsort)
+        order = np.argsort(np.array([s['ticker'] for s in stocks], dtype=object), kind='stable')
+        self.columns['ticker'] = np.empty(self.size, dtype=np.float64)
+        self.columns['ticker'][order] = np.arange(self.size)
+
+        # Días desde la última señal de cada tipo (inf = sin señal en la ventana)
+        position = {stock_id: i for i, stock_id in enumerate(self.ids.tolist())}
+        self.signal_age = {}
+        for signal_type, last_dates in signals.items():
+            ages = np.full(self.size, np.inf)
+            for stock_id, signal_date in last_dates.items():
+                if stock_id in position:
+                    ages[position[stock_id]] = (as_of - signal_date).days
+            self.signal_age[signal_type] = ages
+
+    @classmethod
+    def load(cls, db: Session) -> 'StockScreener':
+        """Cargar el snapshot con tres consultas (stock_latest, volúmenes, señales)."""
+        rows = db.query(Stock, StockLatest).join(
+            StockLatest, Stock.id == StockLatest.stock_id
+        ).filter(
+            Stock.active == True,
+            StockLatest.week_end_date.isnot(None)
+        ).order_by(Stock.id).all()
+
+        volume_ratios = _load_volume_ratios(db)
+
+        stocks = []
+        for stock, latest in rows:
+            stocks.append({
+                'id': stock.id,
+                'ticker': stock.ticker,
+                'name': stock.name,
+                'exchange': stock.exchange,
+                'week_end_date': latest.week_end_date,
+                'stage': latest.stage,
+                'close': _to_float(latest.close),
+                'ma30': _to_float(latest.ma30),
+                'ma30_slope': _to_float(latest.ma30_slope),
+                'distance_ma30': _to_float(latest.distance_ma30),
+                'mrs': _to_float(latest.mrs),
+                'weeks_in_stage': latest.weeks_in_stage,
+                'volume_ratio': volume_ratios.get(stock.id),
+                'rs_rank': _to_float(latest.rs_rank),
+            })
+
+        as_of = date.today()
+        return cls(stocks, _load_last_signals(db, as_of - timedelta(days=SCREENER_SIGNAL_DAYS)), as_of)
+
+    def screen(
+        self,
+        stages: Optional[Iterable[int]] = None,
+        exchanges: Optional[Iterable[str]] = None,
+        ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        signal_types: Optional[Iterable[str]] = None,
+        signal_days: int = 30,
+        sort: Optional[List[Tuple[str, bool]]] = None,
+        limit: Optional[int] = 100,
+    ) -> Tuple[int, List[dict]]:
+        """
+        Aplicar los filtros (todos deben cumplirse) y ordenar.
+
+        Args:
+            stages: Etapas admitidas
+            exchanges: Mercados admitidos
+            ranges: {campo: (mínimo, máximo)} con límites incluidos; None = sin límite
+            signal_types: Tipos de señal; basta con una de ellas en los últimos `signal_days` días
+            signal_days: Antigüedad máxima de la señal (como mucho SCREENER_SIGNAL_DAYS)
+            sort: Lista de (campo, descendente); por defecto pendiente MA30 descendente
+            limit: Máximo de resultados (None = todos)
+
+        Returns:
+            (total que cumple los filtros, lista de dicts de acciones)
+        """
+        mask = np.ones(self.size, dtype=bool)
+
+        if stages:
+            mask &= np.isin(self.columns['stage'], list(stages))
+        if exchanges:
+            mask &= np.isin(self.exchanges, [e.upper() for e in exchanges])
+        for field, (low, high) in (ranges or {}).items():
+            values = self.columns[field]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        if signal_types:
+            recent = np.zeros(self.size, dtype=bool)
+            for signal_type in signal_types:
+                ages = self.signal_age.get(signal_type.upper())
+                if ages is not None:
+                    recent |= ages <= signal_days
+            mask &= recent
+
+        selected = np.flatnonzero(mask)
+
+        # lexsort: la última clave es la principal; el id desempata
+        keys = [self.ids[selected]]
+        for field, descending in reversed(sort or [('ma30_slope', True)]):
+            values = self.columns[field][selected]
+            keys.append(-values if descending else values)
+        selected = selected[np.lexsort(keys)]
+
+        if limit is not None:
+            selected = selected[:limit]
+        return int(mask.sum()), [self.stocks[i] for i in selected.tolist()]
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def _to_float(value) -> Optional[float]:
+    """DECIMAL → float (None se mantiene)."""
+    return float(value) if value is not None else None
+
+
+def _load_volume_ratios(db: Session) -> Dict[int, float]:
+    """Volumen de la última semana / media de las SCREENER_VOLUME_WEEKS anteriores."""
+    last_week = db.query(func.max(WeeklyData.week_end_date)).scalar()
+    if not last_week:
+        return {}
+
+    cutoff = last_week - timedelta(weeks=SCREENER_VOLUME_WEEKS + 1)
+    rows = db.query(
+        WeeklyData.stock_id, WeeklyData.volume
+    ).filter(
+        WeeklyData.week_end_date > cutoff
+    ).order_by(
+        WeeklyData.stock_id, WeeklyData.week_end_date
+    ).all()
+
+    ratios = {}
+    for stock_id, group in groupby(rows, key=lambda r: r.stock_id):
+        volumes = [r.volume for r in group]
+        previous = [v for v in volumes[:-1] if v]
+        if previous and volumes[-1] is not None:
+            ratios[stock_id] = round(volumes[-1] / (sum(previous) / len(previous)), 4)
+    return ratios
+
+
+def _load_last_signals(db: Session, since: date) -> Dict[str, Dict[int, date]]:
+    """Fecha de la última señal de cada tipo por acción desde `since`."""
+    rows = db.query(
+        Signal.signal_type, Signal.stock_id, func.max(Signal.signal_date)
+    ).filter(
+        Signal.signal_date >= since
+    ).group_by(Signal.signal_type, Signal.stock_id).all()
+
+    signals = {}
+    for signal_type, stock_id, last_date in rows:
+        signals.setdefault(signal_type, {})[stock_id] = last_date
+    return signals
+
+
+def get_screener(db: Session) -> StockScreener:
+    """
+    Snapshot compartido por el proceso (web), recargado cuando el pipeline
+    publica una nueva versión de datos o cambia el día (antigüedad de señales).
+    """
+    global _cached_screener, _cached_version
+    version = (get_data_version()['version'], date.today())
+    with _cache_lock:
+        if _cached_screener is None or version != _cached_version:
+            _cached_screener = StockScreener.load(db)
+            _cached_version = version
+        return _cached_screener
+
+
+if __name__ == '__main__':
+    import time
+
+    print("=== TEST SCREENER ===\n")
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    screener = StockScreener.load(db)
+    print(f"Snapshot: {screener.size} acciones en {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+    start = time.perf_counter()
+    total, stocks = screener.screen(
+        stages=[2],
+        ranges={'mrs': (0, None), 'distance_ma30': (None, 15)},
+        sort=[('mrs', True)],
+        limit=10
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"Etapa 2, MRS > 0, distancia <= 15%: {total} acciones en {elapsed:.2f} ms")
+    for s in stocks:
+        print(f"    {s['ticker']:10s} MRS {s['mrs']:7.2f}  dist {s['distance_ma30']:6.2f}%")
+    db.close()
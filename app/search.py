@@ -0,0 +1,164 @@
+"""
+Índice de búsqueda por prefijo de ticker y nombre
+Listas ordenadas en memoria (bisect) con el ticker y cada palabra del nombre
+de todas las acciones; una búsqueda es O(log n + resultados) sin tocar la BD.
+La web comparte un índice por proceso, recargado al cambiar la versión de datos.
+"""
+import re
+import logging
+import threading
+from bisect import bisect_left
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import Stock, StockLatest, SessionLocal
+from app.data_version import get_data_version
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Separadores de palabras del nombre ("Banco Santander, S.A." → BANCO, SANTANDER, S, A)
+_WORD_SPLIT = re.compile(r'[^0-9A-Z]+')
+
+# Índice compartido por el proceso web (ver get_search_index)
+_cache_lock = threading.Lock()
+_cached_index = None
+_cached_version = None
+
+
+class StockSearchIndex:
+    """
+    Índice de prefijos: dos listas ordenadas de (clave, posición), una para
+    tickers y otra para palabras del nombre, sobre la lista de acciones.
+    """
+
+    def __init__(self, stocks: List[dict]):
+        """
+        Args:
+            stocks: Lista de dicts con id, ticker, name, exchange, active, stage
+        """
+        self.stocks = stocks
+        self._tickers = sorted((s['ticker'].upper(), i) for i, s in enumerate(stocks))
+        self._words = sorted(
+            (word, i)
+            for i, s in enumerate(stocks)
+            for word in set(_WORD_SPLIT.split((s['name'] or '').upper()))
+            if word
+        )
+
+    @classmethod
+    def load(cls, db: Session) -> 'StockSearchIndex':
+        """Cargar todas las acciones (con su etapa actual) en una consulta."""
+        rows = db.query(
+            Stock.id, Stock.ticker, Stock.name, Stock.exchange, Stock.active, StockLatest.stage
+        ).outerjoin(
+            StockLatest, Stock.id == StockLatest.stock_id
+        ).all()
+
+        return cls([
+            {
+                'id': r.id,
+                'ticker': r.ticker,
+                'name': r.name,
+                'exchange': r.exchange,
+                'active': bool(r.active),
+                'stage': r.stage,
+            }
+            for r in rows
+        ])
+
+    @staticmethod
+    def _prefix_matches(entries: list, prefix: str) -> list:
+        """Posiciones de las claves que empiezan por `prefix` (en orden de clave)."""
+        start = bisect_left(entries, (prefix,))
+        matches = []
+        for key, i in entries[start:]:
+            if not key.startswith(prefix):
+                break
+            matches.append(i)
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = 10, active_only: bool = True) -> List[dict]:
+        """
+        Buscar acciones por prefijo.
+
+        Orden de resultados: ticker exacto, ticker que empieza por la
+        consulta y nombre con alguna palabra que empieza por la consulta.
+
+        Args:
+            query: Texto buscado (no distingue mayúsculas)
+            limit: Máximo de resultados (None = todos)
+            active_only: Excluir acciones inactivas
+
+        Returns:
+            Lista de dicts de acciones
+        """
+        prefix = query.strip().upper()
+        if not prefix:
+            return []
+
+        seen = set()
+        results = []
+        for i in self._prefix_matches(self._tickers, prefix) + self._prefix_matches(self._words, prefix):
+            if i in seen:
+                continue
+            seen.add(i)
+            stock = self.stocks[i]
+            if active_only and not stock['active']:
+                continue
+            results.append(stock)
+
+        # Ticker exacto primero; el resto mantiene el orden (tickers antes que nombres)
+        results.sort(key=lambda s: s['ticker'].upper() != prefix)
+        return results if limit is None else results[:limit]
+
+    def count(self, stage: Optional[int] = None, active_only: bool = True) -> int:
+        """Número de acciones (por etapa) según el índice."""
+        return sum(
+            1 for s in self.stocks
+            if (not active_only or s['active']) and s['stage'] is not None
+            and (stage is None or s['stage'] == stage)
+        )
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def get_search_index(db: Session) -> StockSearchIndex:
+    """
+    Índice compartido por el proceso (web), recargado cuando el pipeline o
+    la administración publican una nueva versión de datos.
+    """
+    global _cached_index, _cached_version
+    version = get_data_version()['version']
+    with _cache_lock:
+        if _cached_index is None or version != _cached_version:
+            _cached_index = StockSearchIndex.load(db)
+            _cached_version = version
+        return _cached_index
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    print("=== TEST ÍNDICE DE BÚSQUEDA ===\n")
+
+    db = SessionLocal()
+    index = StockSearchIndex.load(db)
+    print(f"Acciones indexadas: {len(index.stocks)}\n")
+
+    for q in sys.argv[1:] or ['SAN', 'APP', 'BANK']:
+        start = time.perf_counter()
+        found = index.search(q)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"'{q}': {len(found)} resultados en {elapsed:.3f} ms")
+        for s in found[:5]:
+            print(f"    {s['ticker']:10s} {s['name']}")
+    db.close()
@@ -6,17 +6,20 @@ Señales SHORT: ruptura bajo soporte con techo sólido previo (Stage 3→4)
 Señales COVER: transición a Etapa 1 desde Stage 4 (cierre corto)
 """
 import logging
-from typing import Optional, List
+from typing import Optional, List, Callable, Iterable
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
 from app.database import Stock, WeeklyData, Signal, SessionLocal
+from app.perf import timed
+from app.benchmarks import BenchmarkMatrix, compute_mrs
+from app.rs_rank import get_rs_ranks_by_week
 from app.config import (
     BUY_RESISTANCE_WEEKS, BUY_MIN_BASE_WEEKS, BUY_MAX_BASE_SLOPE,
     BUY_MAX_DIST_ENTRY, MIN_WEEKS_FOR_ANALYSIS, VOLUME_SPIKE_THRESHOLD,
     SHORT_SUPPORT_WEEKS, SHORT_MIN_TOP_WEEKS, SHORT_MAX_TOP_SLOPE,
-    SHORT_MAX_DIST_ENTRY,
+    SHORT_MAX_DIST_ENTRY, BENCHMARK_DEFAULT, BUY_MIN_RS_RANK,
 )
 
 logging.basicConfig(
@@ -31,108 +34,75 @@ class SignalGenerator:
     Generador de señales de trading basado en la metodología Weinstein.
 
     Señales BUY: cruce de precio sobre MA30 con base sólida (16+ semanas
-    de consolidación con MA30 plana), filtrado por estado del mercado (SPY).
+    de consolidación con MA30 plana), filtrado por estado del mercado
+    (benchmark de cada acción: SPY por defecto, ^IBEX para .MC, etc.).
 
     Señales SELL: cambio de etapa a 3 ó 4 detectado por el analizador.
     """
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, on_signals: Optional[Callable] = None,
+                 benchmarks: Optional[BenchmarkMatrix] = None):
         self.db = db
-        self._spy_states = None   # caché estado alcista/bajista SPY
-        self._spy_closes = None   # caché cierres semanales SPY para MRS
+        self.on_signals = on_signals  # callback opcional on_signals(ticker, señales) tras cada commit
+        self._benchmarks = benchmarks  # caché matriz de benchmarks (se puede compartir entre generadores)
+
+        # Umbrales configurables de las reglas BUY/SHORT (el backtest los varía)
+        self.buy_resistance_weeks = BUY_RESISTANCE_WEEKS
+        self.buy_min_base_weeks = BUY_MIN_BASE_WEEKS
+        self.buy_max_base_slope = BUY_MAX_BASE_SLOPE
+        self.buy_max_dist_entry = BUY_MAX_DIST_ENTRY
+        self.buy_min_rs_rank = BUY_MIN_RS_RANK
+        self.short_support_weeks = SHORT_SUPPORT_WEEKS
+        self.short_min_top_weeks = SHORT_MIN_TOP_WEEKS
+        self.short_max_top_slope = SHORT_MAX_TOP_SLOPE
+        self.short_max_dist_entry = SHORT_MAX_DIST_ENTRY
+        self.volume_spike_threshold = VOLUME_SPIKE_THRESHOLD
 
     # ------------------------------------------------------------------
-    # SPY — Filtro de mercado
+    # Benchmarks — Filtro de mercado y MRS
     # ------------------------------------------------------------------
 
-    def _load_spy_states(self) -> dict:
+    def _load_benchmarks(self) -> BenchmarkMatrix:
         """
-        Carga el estado del mercado (alcista/bajista) de SPY para cada semana.
+        Carga (una vez) la matriz de benchmarks: estado alcista/bajista y
+        cierres semanales de todos los índices de referencia configurados.
         Alcista = precio >= MA30 * 0.97  Y  slope >= 0
         """
-        if self._spy_states is not None:
-            return self._spy_states
-
-        spy = self.db.query(Stock).filter(Stock.ticker == 'SPY').first()
-        if not spy:
-            logger.warning("SPY no encontrado en BD; filtro de mercado desactivado")
-            self._spy_states = {}
-            return self._spy_states
-
-        weekly = self.db.query(WeeklyData).filter(
-            WeeklyData.stock_id == spy.id,
-            WeeklyData.ma30.isnot(None)
-        ).order_by(WeeklyData.week_end_date.asc()).all()
-
-        self._spy_states = {}
-        for w in weekly:
-            ma30  = float(w.ma30)
-            close = float(w.close)
-            slope = float(w.ma30_slope) if w.ma30_slope else 0
-            self._spy_states[w.week_end_date] = (close >= ma30 * 0.97) and (slope >= 0)
-
-        return self._spy_states
-
-    def _market_is_bullish(self, week_date) -> bool:
-        """Devuelve True si el mercado (SPY) era alcista en la semana dada."""
-        states = self._load_spy_states()
-        if not states:
-            return True  # sin datos SPY: no filtrar
-
-        # Buscar la semana SPY más cercana anterior o igual a week_date
-        best = None
-        for d in sorted(states.keys()):
-            if d <= week_date:
-                best = d
-            else:
-                break
-        return states.get(best, True)
-
-    def _load_spy_closes(self) -> dict:
-        """Carga los cierres semanales de SPY (caché). Necesario para MRS."""
-        if self._spy_closes is not None:
-            return self._spy_closes
-        spy = self.db.query(Stock).filter(Stock.ticker == 'SPY').first()
-        if not spy:
-            self._spy_closes = {}
-            return self._spy_closes
-        rows = self.db.query(WeeklyData).filter(
-            WeeklyData.stock_id == spy.id
-        ).order_by(WeeklyData.week_end_date.asc()).all()
-        self._spy_closes = {w.week_end_date: float(w.close) for w in rows}
-        return self._spy_closes
-
-    def _compute_mrs(self, weekly_all: list, idx: int) -> Optional[float]:
+        if self._benchmarks is None:
+            self._benchmarks = BenchmarkMatrix.load(self.db)
+            if not self._benchmarks.benchmarks:
+                logger.warning("Sin benchmarks en BD; filtro de mercado desactivado")
+        return self._benchmarks
+
+    def _benchmark_for(self, ticker: str) -> Optional[str]:
+        """Benchmark con el que se compara la acción (según sufijo del ticker)."""
+        return self._load_benchmarks().benchmark_for(ticker)
+
+    def _market_is_bullish(self, week_date, benchmark: Optional[str] = BENCHMARK_DEFAULT) -> bool:
+        """Devuelve True si el mercado (benchmark) era alcista en la semana dada."""
+        # Semana del benchmark más cercana anterior o igual; sin datos: no filtrar
+        return self._load_benchmarks().is_bullish(benchmark, week_date)
+
+    def _compute_mrs(self, weekly_all: list, idx: int,
+                     benchmark: Optional[str] = BENCHMARK_DEFAULT) -> Optional[float]:
         """
         Mansfield Relative Strength en la semana `idx`.
         MRS = (rs_ratio / MA52_rs_ratio - 1) × 100
-        MRS > 0: acción supera al SPY respecto a su propia media histórica.
+        MRS > 0: acción supera a su benchmark respecto a su propia media histórica.
         Devuelve None si no hay suficientes datos (< 52 semanas).
         """
         if idx < 52:
             return None
-        spy_closes = self._load_spy_closes()
-        if not spy_closes:
-            return None
-
-        # RS ratio para las últimas 52 semanas (ventana deslizante)
-        rs_window = []
-        for i in range(idx - 51, idx + 1):
-            w = weekly_all[i]
-            spy_c = spy_closes.get(w.week_end_date)
-            if spy_c and spy_c > 0:
-                rs_window.append(float(w.close) / spy_c)
-
-        if len(rs_window) < 52:
+        bench_closes = self._load_benchmarks().closes(benchmark)
+        if not bench_closes:
             return None
 
-        ma52 = sum(rs_window) / len(rs_window)
-        curr = weekly_all[idx]
-        spy_curr = spy_closes.get(curr.week_end_date)
-        if not spy_curr or spy_curr <= 0:
-            return None
-
-        return (float(curr.close) / spy_curr / ma52 - 1) * 100
+        # Ventana deslizante de 52 semanas
+        window = weekly_all[idx - 51:idx + 1]
+        return compute_mrs(
+            [w.close for w in window],
+            [bench_closes.get(w.week_end_date) for w in window]
+        )
 
     # ------------------------------------------------------------------
     # Señales BUY — Cruce precio/MA30 con base sólida
@@ -151,7 +121,7 @@ class SignalGenerator:
            en al menos el 75% de las semanas (confirma base sólida previa)
         5. Suficiente histórico: idx >= MIN_WEEKS_FOR_ANALYSIS + BUY_RESISTANCE_WEEKS
         """
-        if idx < MIN_WEEKS_FOR_ANALYSIS + BUY_RESISTANCE_WEEKS:
+        if idx < MIN_WEEKS_FOR_ANALYSIS + self.buy_resistance_weeks:
             return False
 
         curr = weekly_all[idx]
@@ -163,7 +133,7 @@ class SignalGenerator:
         curr_dist  = (curr_close - curr_ma30) / curr_ma30
 
         # No demasiado extendido sobre MA30
-        if curr_dist > BUY_MAX_DIST_ENTRY:
+        if curr_dist > self.buy_max_dist_entry:
             return False
 
         # MA30 debe estar en subida en la semana de ruptura
@@ -171,7 +141,7 @@ class SignalGenerator:
             return False
 
         # Nivel de resistencia: máximo cierre de las últimas BUY_RESISTANCE_WEEKS semanas
-        resistance_window = weekly_all[idx - BUY_RESISTANCE_WEEKS:idx]
+        resistance_window = weekly_all[idx - self.buy_resistance_weeks:idx]
         resistance = max(float(w.close) for w in resistance_window)
 
         # El precio debe superar la resistencia con al menos 1% de margen
@@ -179,12 +149,12 @@ class SignalGenerator:
             return False
 
         # Validar base: MA30 plana en las últimas BUY_MIN_BASE_WEEKS semanas
-        base = weekly_all[idx - BUY_MIN_BASE_WEEKS:idx]
+        base = weekly_all[idx - self.buy_min_base_weeks:idx]
         slopes_flat = sum(
             1 for w in base
-            if w.ma30_slope and abs(float(w.ma30_slope)) <= BUY_MAX_BASE_SLOPE
+            if w.ma30_slope and abs(float(w.ma30_slope)) <= self.buy_max_base_slope
         )
-        if slopes_flat < int(BUY_MIN_BASE_WEEKS * 0.75):
+        if slopes_flat < int(self.buy_min_base_weeks * 0.75):
             return False
 
         # Volumen: la semana de ruptura debe tener volumen >= VOLUME_SPIKE_THRESHOLD
@@ -193,18 +163,23 @@ class SignalGenerator:
             base_vols = [float(w.volume) for w in base if w.volume and w.volume > 0]
             if len(base_vols) >= 8:
                 avg_base_vol = sum(base_vols) / len(base_vols)
-                if float(curr.volume) < avg_base_vol * VOLUME_SPIKE_THRESHOLD:
+                if float(curr.volume) < avg_base_vol * self.volume_spike_threshold:
                     return False
 
         return True
 
     def _generate_buy_signals(self, stock_id: int, stock_ticker: str,
-                               weekly_all: list, weeks_back: int) -> int:
+                               weekly_all: list, weeks_back: int,
+                               rs_ranks: Optional[dict] = None,
+                               indices: Optional[Iterable[int]] = None) -> int:
         """
         Genera señales BUY para las últimas `weeks_back` semanas de una acción.
         Si weeks_back=0 se revisa todo el histórico.
+        rs_ranks: {semana: rs_rank} para el filtro BUY_MIN_RS_RANK (None = sin filtro)
+        indices: posiciones a revisar dentro de ese rango (None = todas); el
+        backtest pasa solo las que superan un prefiltro vectorizado
         """
-        if len(weekly_all) < MIN_WEEKS_FOR_ANALYSIS + BUY_MIN_BASE_WEEKS:
+        if len(weekly_all) < MIN_WEEKS_FOR_ANALYSIS + self.buy_min_base_weeks:
             return 0
 
         # Índice del primer punto a revisar
@@ -213,25 +188,36 @@ class SignalGenerator:
         else:
             start_idx = 1
 
+        benchmark = self._benchmark_for(stock_ticker)
         signals_created = 0
 
-        for i in range(start_idx, len(weekly_all)):
+        positions = range(start_idx, len(weekly_all))
+        if indices is not None:
+            positions = [i for i in indices if start_idx <= i < len(weekly_all)]
+
+        for i in positions:
             if not self._is_valid_buy_breakout(weekly_all, i):
                 continue
 
             curr = weekly_all[i]
 
             # Filtro mercado
-            if not self._market_is_bullish(curr.week_end_date):
-                logger.debug(f"{stock_ticker}: BUY descartada {curr.week_end_date} — mercado bajista")
+            if not self._market_is_bullish(curr.week_end_date, benchmark):
+                logger.debug(f"{stock_ticker}: BUY descartada {curr.week_end_date} — mercado bajista ({benchmark})")
                 continue
 
-            # Filtro MRS: la acción debe estar superando al SPY (MRS > 0)
-            mrs = self._compute_mrs(weekly_all, i)
+            # Filtro MRS: la acción debe estar superando a su benchmark (MRS > 0)
+            mrs = self._compute_mrs(weekly_all, i, benchmark)
             if mrs is not None and mrs <= 0:
                 logger.debug(f"{stock_ticker}: BUY descartada {curr.week_end_date} — MRS negativo ({mrs:.1f})")
                 continue
 
+            # Filtro fuerza relativa transversal: percentil frente a todo el universo
+            rs_rank = rs_ranks.get(curr.week_end_date) if rs_ranks else None
+            if rs_rank is not None and rs_rank < self.buy_min_rs_rank:
+                logger.debug(f"{stock_ticker}: BUY descartada {curr.week_end_date} — RS rank bajo ({rs_rank:.0f})")
+                continue
+
             change_info = {
                 'stock_id': stock_id,
                 'week_end_date': curr.week_end_date,
@@ -253,20 +239,13 @@ class SignalGenerator:
     # Señales SHORT — Ruptura de soporte con techo sólido (espejo de BUY)
     # ------------------------------------------------------------------
 
-    def _market_is_bearish(self, week_date) -> bool:
-        """Devuelve True si el mercado (SPY) era bajista en la semana dada."""
-        states = self._load_spy_states()
-        if not states:
-            return True  # sin datos SPY: no filtrar
-
-        best = None
-        for d in sorted(states.keys()):
-            if d <= week_date:
-                best = d
-            else:
-                break
+    def _market_is_bearish(self, week_date, benchmark: Optional[str] = BENCHMARK_DEFAULT) -> bool:
+        """Devuelve True si el mercado (benchmark) era bajista en la semana dada."""
+        benchmarks = self._load_benchmarks()
+        if not benchmarks.closes(benchmark):
+            return True  # sin datos del benchmark: no filtrar
         # bajista = NOT alcista
-        return not states.get(best, True)
+        return not benchmarks.is_bullish(benchmark, week_date)
 
     def _is_valid_short_breakdown(self, weekly_all: list, idx: int) -> bool:
         """
@@ -281,7 +260,7 @@ class SignalGenerator:
            en al menos el 75% de las semanas (confirma techo sólido previo)
         5. Suficiente histórico: idx >= MIN_WEEKS_FOR_ANALYSIS + SHORT_SUPPORT_WEEKS
         """
-        if idx < MIN_WEEKS_FOR_ANALYSIS + SHORT_SUPPORT_WEEKS:
+        if idx < MIN_WEEKS_FOR_ANALYSIS + self.short_support_weeks:
             return False
 
         curr = weekly_all[idx]
@@ -293,7 +272,7 @@ class SignalGenerator:
         curr_dist  = (curr_ma30 - curr_close) / curr_ma30  # positivo cuando precio < MA30
 
         # No demasiado extendido bajo MA30
-        if curr_dist > SHORT_MAX_DIST_ENTRY:
+        if curr_dist > self.short_max_dist_entry:
             return False
 
         # MA30 debe estar en bajada en la semana de ruptura
@@ -301,7 +280,7 @@ class SignalGenerator:
             return False
 
         # Nivel de soporte: mínimo cierre de las últimas SHORT_SUPPORT_WEEKS semanas
-        support_window = weekly_all[idx - SHORT_SUPPORT_WEEKS:idx]
+        support_window = weekly_all[idx - self.short_support_weeks:idx]
         support = min(float(w.close) for w in support_window)
 
         # El precio debe romper por debajo del soporte con al menos 1% de margen
@@ -309,12 +288,12 @@ class SignalGenerator:
             return False
 
         # Validar techo: MA30 plana en las últimas SHORT_MIN_TOP_WEEKS semanas
-        top = weekly_all[idx - SHORT_MIN_TOP_WEEKS:idx]
+        top = weekly_all[idx - self.short_min_top_weeks:idx]
         slopes_flat = sum(
             1 for w in top
-            if w.ma30_slope and abs(float(w.ma30_slope)) <= SHORT_MAX_TOP_SLOPE
+            if w.ma30_slope and abs(float(w.ma30_slope)) <= self.short_max_top_slope
         )
-        if slopes_flat < int(SHORT_MIN_TOP_WEEKS * 0.75):
+        if slopes_flat < int(self.short_min_top_weeks * 0.75):
             return False
 
         # Volumen: la semana de ruptura debe tener spike de volumen
@@ -322,18 +301,20 @@ class SignalGenerator:
             top_vols = [float(w.volume) for w in top if w.volume and w.volume > 0]
             if len(top_vols) >= 8:
                 avg_top_vol = sum(top_vols) / len(top_vols)
-                if float(curr.volume) < avg_top_vol * VOLUME_SPIKE_THRESHOLD:
+                if float(curr.volume) < avg_top_vol * self.volume_spike_threshold:
                     return False
 
         return True
 
     def _generate_short_signals(self, stock_id: int, stock_ticker: str,
-                                 weekly_all: list, weeks_back: int) -> int:
+                                 weekly_all: list, weeks_back: int,
+                                 indices: Optional[Iterable[int]] = None) -> int:
         """
         Genera señales SHORT para las últimas `weeks_back` semanas de una acción.
         Si weeks_back=0 se revisa todo el histórico.
+        indices: posiciones a revisar dentro de ese rango (None = todas)
         """
-        if len(weekly_all) < MIN_WEEKS_FOR_ANALYSIS + SHORT_MIN_TOP_WEEKS:
+        if len(weekly_all) < MIN_WEEKS_FOR_ANALYSIS + self.short_min_top_weeks:
             return 0
 
         if weeks_back > 0:
@@ -341,21 +322,26 @@ class SignalGenerator:
         else:
             start_idx = 1
 
+        benchmark = self._benchmark_for(stock_ticker)
         signals_created = 0
 
-        for i in range(start_idx, len(weekly_all)):
+        positions = range(start_idx, len(weekly_all))
+        if indices is not None:
+            positions = [i for i in indices if start_idx <= i < len(weekly_all)]
+
+        for i in positions:
             if not self._is_valid_short_breakdown(weekly_all, i):
                 continue
 
             curr = weekly_all[i]
 
-            # Filtro mercado: SPY debe ser bajista para señales cortas
-            if not self._market_is_bearish(curr.week_end_date):
-                logger.debug(f"{stock_ticker}: SHORT descartada {curr.week_end_date} — mercado alcista")
+            # Filtro mercado: el benchmark debe ser bajista para señales cortas
+            if not self._market_is_bearish(curr.week_end_date, benchmark):
+                logger.debug(f"{stock_ticker}: SHORT descartada {curr.week_end_date} — mercado alcista ({benchmark})")
                 continue
 
-            # Filtro MRS: la acción debe estar rezagada respecto al SPY (MRS < 0)
-            mrs = self._compute_mrs(weekly_all, i)
+            # Filtro MRS: la acción debe estar rezagada respecto a su benchmark (MRS < 0)
+            mrs = self._compute_mrs(weekly_all, i, benchmark)
             if mrs is not None and mrs >= 0:
                 logger.debug(f"{stock_ticker}: SHORT descartada {curr.week_end_date} — MRS positivo ({mrs:.1f})")
                 continue
@@ -471,6 +457,7 @@ class SignalGenerator:
     # API pública
     # ------------------------------------------------------------------
 
+    @timed('signals')
     def generate_signals_for_stock(self, stock_id: int, weeks_back: int = 10) -> int:
         """
         Genera señales BUY y SELL para una acción.
@@ -504,27 +491,55 @@ class SignalGenerator:
             )
         ).order_by(WeeklyData.week_end_date.asc()).all()
 
-        buy_signals   = self._generate_buy_signals(stock_id, ticker, weekly_ma30, weeks_back)
-        short_signals = self._generate_short_signals(stock_id, ticker, weekly_ma30, weeks_back)
-        sell_signals  = self._generate_sell_signals(stock_id, ticker, weekly_stage, weeks_back)
+        rs_ranks = get_rs_ranks_by_week(self.db, stock_id) if self.buy_min_rs_rank > 0 else None
 
-        total = buy_signals + short_signals + sell_signals
+        total = self.generate_signals_from_weeks(stock_id, ticker, weekly_ma30, weekly_stage, weeks_back, rs_ranks)
         if total > 0:
+            created = [obj for obj in self.db.new if isinstance(obj, Signal)]
             try:
                 self.db.commit()
             except Exception as e:
                 self.db.rollback()
                 logger.error(f"✗ Error guardando señales de {ticker}: {e}")
                 return 0
+            if self.on_signals and created:
+                self.on_signals(ticker, created)
 
         return total
 
-    def generate_signals_for_all_stocks(self, weeks_back: int = 10) -> dict:
+    def generate_signals_from_weeks(self, stock_id: int, ticker: str,
+                                    weekly_ma30: list, weekly_stage: list,
+                                    weeks_back: int = 10,
+                                    rs_ranks: Optional[dict] = None,
+                                    buy_indices: Optional[Iterable[int]] = None,
+                                    short_indices: Optional[Iterable[int]] = None) -> int:
+        """
+        Reglas BUY/SHORT/SELL sobre semanas ya cargadas, sin consultar la BD.
+        Cada señal pasa por _create_signal_record (el backtest lo sustituye
+        para acumularlas en memoria).
+
+        Args:
+            weekly_ma30: Semanas con MA30 y slope (orden cronológico)
+            weekly_stage: Semanas con etapa (orden cronológico)
+            weeks_back: Semanas hacia atrás a revisar (0 = todas)
+            rs_ranks: {semana: rs_rank} para BUY_MIN_RS_RANK (None = sin filtro)
+            buy_indices, short_indices: Posiciones de weekly_ma30 a revisar (None = todas)
+
+        Returns:
+            Número de señales creadas
+        """
+        buy_signals   = self._generate_buy_signals(stock_id, ticker, weekly_ma30, weeks_back, rs_ranks, buy_indices)
+        short_signals = self._generate_short_signals(stock_id, ticker, weekly_ma30, weeks_back, short_indices)
+        sell_signals  = self._generate_sell_signals(stock_id, ticker, weekly_stage, weeks_back)
+        return buy_signals + short_signals + sell_signals
+
+    def generate_signals_for_all_stocks(self, weeks_back: int = 10, progress: Optional[Callable] = None) -> dict:
         """
         Genera señales para todas las acciones activas (excluye índices).
 
         Args:
             weeks_back: Semanas hacia atrás (0 = todas)
+            progress: Callback opcional progress(hechas, total, ticker) tras cada acción
 
         Returns:
             Dict con estadísticas
@@ -541,7 +556,7 @@ class SignalGenerator:
         stocks_with_signals = 0
         failed = []
 
-        for stock in stocks:
+        for idx, stock in enumerate(stocks, 1):
             try:
                 n = self.generate_signals_for_stock(stock.id, weeks_back)
                 total_signals += n
@@ -550,6 +565,8 @@ class SignalGenerator:
             except Exception as e:
                 logger.error(f"✗ Error en {stock.ticker}: {e}")
                 failed.append(stock.ticker)
+            if progress:
+                progress(idx, len(stocks), stock.ticker)
 
         return {
             'total_stocks': len(stocks),
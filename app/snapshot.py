@@ -0,0 +1,179 @@
+"""
+Snapshot del estado actual - Tabla stock_latest
+Una fila por acción con la última semana analizada (etapa, MA30, pendiente,
+MRS, distancia a MA30, semanas en la etapa, percentil de fuerza relativa)
+y el último cierre diario.
+Se regenera al final del pipeline (tarea snapshot); las consultas
+de "estado actual" (web, Telegram, diagnósticos) leen de aquí en lugar de
+recalcular max(week_end_date) GROUP BY stock_id sobre weekly_data.
+"""
+import logging
+from datetime import timedelta
+from itertools import groupby
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from app.database import Stock, WeeklyData, DailyData, StockLatest, WeeklyRsRank, SessionLocal
+from app.benchmarks import BenchmarkMatrix, compute_mrs
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Semanas de histórico usadas para el MRS (52) y para contar semanas en etapa
+# (weeks_in_stage queda acotado a este valor)
+SNAPSHOT_HISTORY_WEEKS = 156
+
+
+def _weeks_in_stage(weekly: list) -> int:
+    """Semanas consecutivas, contando hacia atrás, con la etapa de la última semana."""
+    stage = weekly[-1].stage
+    if stage is None:
+        return None
+    count = 0
+    for w in reversed(weekly):
+        if w.stage != stage:
+            break
+        count += 1
+    return count
+
+
+def _load_weekly_history(db: Session) -> dict:
+    """Últimas SNAPSHOT_HISTORY_WEEKS semanas de todas las acciones {stock_id: [filas]}."""
+    last_week = db.query(func.max(WeeklyData.week_end_date)).scalar()
+    if not last_week:
+        return {}
+
+    cutoff = last_week - timedelta(weeks=SNAPSHOT_HISTORY_WEEKS)
+    rows = db.query(
+        WeeklyData.stock_id, WeeklyData.week_end_date, WeeklyData.close,
+        WeeklyData.ma30, WeeklyData.ma30_slope, WeeklyData.stage
+    ).filter(
+        WeeklyData.week_end_date > cutoff
+    ).order_by(
+        WeeklyData.stock_id, WeeklyData.week_end_date
+    ).all()
+
+    return {stock_id: list(group) for stock_id, group in groupby(rows, key=lambda r: r.stock_id)}
+
+
+def _load_last_daily(db: Session) -> dict:
+    """Último cierre diario de cada acción {stock_id: (fecha, cierre)}."""
+    subq = db.query(
+        DailyData.stock_id,
+        func.max(DailyData.date).label('max_date')
+    ).group_by(DailyData.stock_id).subquery()
+
+    rows = db.query(DailyData.stock_id, DailyData.date, DailyData.close).join(
+        subq,
+        and_(
+            DailyData.stock_id == subq.c.stock_id,
+            DailyData.date == subq.c.max_date
+        )
+    ).all()
+    return {r.stock_id: (r.date, r.close) for r in rows}
+
+
+def _load_rs_ranks(db: Session) -> dict:
+    """Rango de fuerza relativa de las últimas semanas {(stock_id, semana): rs_rank}."""
+    last_week = db.query(func.max(WeeklyRsRank.week_end_date)).scalar()
+    if not last_week:
+        return {}
+
+    rows = db.query(
+        WeeklyRsRank.stock_id, WeeklyRsRank.week_end_date, WeeklyRsRank.rs_rank
+    ).filter(
+        WeeklyRsRank.week_end_date > last_week - timedelta(weeks=4)
+    ).all()
+    return {(r.stock_id, r.week_end_date): r.rs_rank for r in rows}
+
+
+def build_snapshot_rows(db: Session) -> list:
+    """
+    Calcular las filas de stock_latest (sin escribir en BD).
+
+    Returns:
+        Lista de dicts con las columnas de StockLatest
+    """
+    weekly_by_stock = _load_weekly_history(db)
+    daily_by_stock = _load_last_daily(db)
+    rs_ranks = _load_rs_ranks(db)
+    tickers = dict(db.query(Stock.id, Stock.ticker).all())
+    benchmarks = BenchmarkMatrix.load(db)
+
+    records = []
+    for stock_id in sorted(set(weekly_by_stock) | set(daily_by_stock)):
+        if stock_id not in tickers:
+            continue
+        record = {'stock_id': stock_id}
+
+        weekly = weekly_by_stock.get(stock_id)
+        if weekly:
+            last = weekly[-1]
+            ma30 = float(last.ma30) if last.ma30 else None
+            record.update({
+                'week_end_date': last.week_end_date,
+                'stage': last.stage,
+                'close': last.close,
+                'ma30': last.ma30,
+                'ma30_slope': last.ma30_slope,
+                'distance_ma30': round((float(last.close) - ma30) / ma30 * 100, 4) if ma30 else None,
+                'weeks_in_stage': _weeks_in_stage(weekly),
+                'rs_rank': rs_ranks.get((stock_id, last.week_end_date)),
+            })
+
+            # MRS de la última semana frente al benchmark de la acción
+            benchmark = benchmarks.benchmark_for(tickers[stock_id])
+            mrs = None
+            if benchmark and benchmark != tickers[stock_id] and len(weekly) >= 52:
+                bench_closes = benchmarks.closes(benchmark)
+                window = weekly[-52:]
+                mrs = compute_mrs(
+                    [w.close for w in window],
+                    [bench_closes.get(w.week_end_date) for w in window]
+                )
+            record['mrs'] = round(mrs, 4) if mrs is not None else None
+
+        daily = daily_by_stock.get(stock_id)
+        if daily:
+            record['last_daily_date'], record['last_daily_close'] = daily
+
+        records.append(record)
+
+    return records
+
+
+# ============================================
+# FUNCIONES AUXILIARES
+# ============================================
+
+def refresh_stock_latest(db: Session) -> int:
+    """
+    Regenerar stock_latest en una única transacción (los lectores ven el
+    snapshot anterior hasta el commit).
+
+    Returns:
+        Número de filas escritas
+    """
+    records = build_snapshot_rows(db)
+    try:
+        db.query(StockLatest).delete(synchronize_session=False)
+        db.bulk_insert_mappings(StockLatest, records)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(records)
+
+
+if __name__ == '__main__':
+    print("=== REGENERAR SNAPSHOT stock_latest ===\n")
+
+    db = SessionLocal()
+    n = refresh_stock_latest(db)
+    print(f"✓ {n} acciones en stock_latest")
+    db.close()
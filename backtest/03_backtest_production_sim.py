@@ -3,7 +3,9 @@ Backtest que simula el comportamiento REAL de producción.
 En producción, weekly_process re-analiza solo las últimas 10 semanas,
 lo cual puede cambiar las etapas asignadas previamente y generar señales espurias.
 
-También incluye V4: versión mejorada equilibrada.
+El BASELINE sale del replay del cron (app.backtest.replay), que ejecuta el
+código real de producción. simulate_production queda solo para los
+detectores experimentales V4/V5.
 """
 import sys
 sys.path.insert(0, '/home/gcb/Nextcloud/Desarrollo/stanweinstein_test')
@@ -15,6 +17,7 @@ from sqlalchemy.orm import sessionmaker
 
 from app.database import Stock, WeeklyData
 from app import config
+from app.backtest.replay import ProductionReplay, load_replay_universe
 
 config.DB_CONFIG['host'] = '192.168.100.11'
 DB_URL = (f"mysql+pymysql://{config.DB_CONFIG['user']}:{config.DB_CONFIG['password']}"
@@ -71,7 +74,8 @@ def recalculate_slopes(weeks_data):
 
 
 # ============================================================================
-# Detector baseline (replica producción)
+# Detector baseline (copia antigua de producción, solo como referencia;
+# el BASELINE de main() sale del replay)
 # ============================================================================
 
 class BaselineDetector:
@@ -237,7 +241,8 @@ class ImprovedDetectorV5:
 def simulate_production(ticker_data, detector, start_date, end_date, reanalysis_window=10):
     """
     Simula el comportamiento de producción donde cada sábado
-    se re-analizan las últimas 10 semanas.
+    se re-analizan las últimas 10 semanas, con un detector alternativo.
+    Para el detector real usar run_replay_baseline.
     """
     weeks = ticker_data
     n = len(weeks)
@@ -299,38 +304,43 @@ def simulate_production(ticker_data, detector, start_date, end_date, reanalysis_
                 if not detector.validate_buy(w, history):
                     continue
 
-            # Calcular rendimientos
-            future = weeks[current_idx + 1:]
-            returns = {}
-            for t in [4, 8, 12]:
-                if len(future) >= t:
-                    returns[f'{t}w'] = (future[t-1]['close'] - w['close']) / w['close'] * 100
-                else:
-                    returns[f'{t}w'] = None
-
-            max_gain, max_dd = 0.0, 0.0
-            for fw in future[:12]:
-                if fw['high']:
-                    max_gain = max(max_gain, (fw['high'] - w['close']) / w['close'] * 100)
-                if fw['low']:
-                    max_dd = min(max_dd, (fw['low'] - w['close']) / w['close'] * 100)
-
             ma30 = w.get('ma30_calc') or w.get('ma30')
-            pma = ((w['close'] - ma30) / ma30 * 100) if ma30 else None
-
-            signals.append({
-                'date': w['date'],
-                'price': w['close'],
-                'price_vs_ma30': pma,
-                'returns': returns,
-                'max_gain_12w': max_gain,
-                'max_drawdown_12w': max_dd,
-                'is_false_positive': max_gain < 5.0,
-            })
+            signals.append(signal_outcome(weeks, current_idx, ma30))
 
     return signals
 
 
+def signal_outcome(weeks, idx, ma30):
+    """Rendimientos a 4/8/12 semanas y máximos de una BUY en la semana idx"""
+    w = weeks[idx]
+    future = weeks[idx + 1:]
+    returns = {}
+    for t in [4, 8, 12]:
+        if len(future) >= t:
+            returns[f'{t}w'] = (future[t-1]['close'] - w['close']) / w['close'] * 100
+        else:
+            returns[f'{t}w'] = None
+
+    max_gain, max_dd = 0.0, 0.0
+    for fw in future[:12]:
+        if fw['high']:
+            max_gain = max(max_gain, (fw['high'] - w['close']) / w['close'] * 100)
+        if fw['low']:
+            max_dd = min(max_dd, (fw['low'] - w['close']) / w['close'] * 100)
+
+    pma = ((w['close'] - ma30) / ma30 * 100) if ma30 else None
+
+    return {
+        'date': w['date'],
+        'price': w['close'],
+        'price_vs_ma30': pma,
+        'returns': returns,
+        'max_gain_12w': max_gain,
+        'max_drawdown_12w': max_dd,
+        'is_false_positive': max_gain < 5.0,
+    }
+
+
 def run_full_production_sim(all_data, detector, start_date, end_date):
     """Ejecutar simulación para todas las acciones"""
     all_signals = []
@@ -345,6 +355,29 @@ def run_full_production_sim(all_data, detector, start_date, end_date):
     return sorted(all_signals, key=lambda x: x['date'])
 
 
+def run_replay_baseline(all_data, start_date, end_date):
+    """
+    BUY que habría emitido producción: replay del cron semanal con el
+    código real (aggregator, analyzer y signals) y los mismos weeks_back.
+    """
+    universe = load_replay_universe(db, start_date)
+    result = ProductionReplay(universe, start_date, end_date).run()
+    all_signals = []
+
+    for sig in result.signals:
+        if sig['signal_type'] != 'BUY' or sig['ticker'] not in all_data:
+            continue
+        weeks = all_data[sig['ticker']]
+        idx = next((k for k, w in enumerate(weeks) if w['date'] == sig['week_end_date']), None)
+        if idx is None:
+            continue
+        s = signal_outcome(weeks, idx, sig['ma30'])
+        s['ticker'] = sig['ticker']
+        all_signals.append(s)
+
+    return sorted(all_signals, key=lambda x: x['date'])
+
+
 def print_summary(name, signals):
     """Imprimir resumen de resultados"""
     print(f"\n{'=' * 90}")
@@ -415,12 +448,16 @@ def main():
     end = date(2026, 2, 14)
 
     detectors = [
-        ("BASELINE (simula producción)", BaselineDetector()),
         ("V4: Equilibrada", ImprovedDetectorV4()),
         ("V5: Slope 1w ajustado + filtros", ImprovedDetectorV5()),
     ]
 
     results = []
+    name = "BASELINE (replay producción)"
+    print(f"\nEjecutando: {name}...")
+    signals = run_replay_baseline(all_data, start, end)
+    results.append((name, print_summary(name, signals)))
+
     for name, det in detectors:
         print(f"\nEjecutando: {name}...")
         signals = run_full_production_sim(all_data, det, start, end)
@@ -99,6 +99,148 @@ CREATE TABLE IF NOT EXISTS signals (
     INDEX idx_stock_signal (stock_id, signal_date)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- ============================================
+-- Tabla: provisional_weekly
+-- Vela parcial de la semana en curso + etapa/señal provisional
+-- (una fila por acción; se sustituye al cerrar la semana)
+-- ============================================
+CREATE TABLE IF NOT EXISTS provisional_weekly (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    stock_id INT NOT NULL,
+    week_end_date DATE NOT NULL,
+    as_of_date DATE NOT NULL,
+    days INT,
+    open DECIMAL(12,4),
+    high DECIMAL(12,4),
+    low DECIMAL(12,4),
+    close DECIMAL(12,4),
+    volume BIGINT,
+    ma30 DECIMAL(12,4),
+    ma30_slope DECIMAL(8,4),
+    stage TINYINT,
+    stage_prev TINYINT,
+    signal_type ENUM('BUY', 'SHORT'),
+    mrs DECIMAL(10,4),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_provisional_stock (stock_id),
+    FOREIGN KEY (stock_id) REFERENCES stocks(id) ON DELETE CASCADE,
+    INDEX idx_provisional_week (week_end_date),
+    INDEX idx_provisional_signal (signal_type)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- Tabla: stock_latest
+-- Estado actual de cada acción (snapshot materializado)
+-- (una fila por acción; se regenera en daily_update y weekly_process)
+-- Instalaciones existentes:
+--   ALTER TABLE stock_latest ADD COLUMN rs_rank DECIMAL(5,2) AFTER weeks_in_stage;
+-- ============================================
+CREATE TABLE IF NOT EXISTS stock_latest (
+    stock_id INT PRIMARY KEY,
+    week_end_date DATE,
+    stage TINYINT,
+    close DECIMAL(12,4),
+    ma30 DECIMAL(12,4),
+    ma30_slope DECIMAL(8,4),
+    mrs DECIMAL(10,4),
+    distance_ma30 DECIMAL(10,4),
+    weeks_in_stage INT,
+    rs_rank DECIMAL(5,2),
+    last_daily_date DATE,
+    last_daily_close DECIMAL(12,4),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (stock_id) REFERENCES stocks(id) ON DELETE CASCADE,
+    INDEX idx_latest_stage_slope (stage, ma30_slope),
+    INDEX idx_latest_slope (ma30_slope),
+    INDEX idx_latest_week (week_end_date),
+    INDEX idx_latest_daily (last_daily_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- Tabla: pipeline_events
+-- Eventos de los procesos de cron (fases, progreso, señales nuevas)
+-- La web los emite por SSE; se conservan 7 días
+-- ============================================
+CREATE TABLE IF NOT EXISTS pipeline_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    source VARCHAR(20) NOT NULL,
+    event_type VARCHAR(20) NOT NULL,
+    payload TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_event_created (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- Tabla: market_breadth
+-- Amplitud de mercado semanal por exchange ('ALL' = total)
+-- (la calcula weekly_process.py de forma incremental)
+-- ============================================
+CREATE TABLE IF NOT EXISTS market_breadth (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    week_end_date DATE NOT NULL,
+    exchange VARCHAR(50) NOT NULL,
+    total INT NOT NULL,
+    stage1 INT NOT NULL DEFAULT 0,
+    stage2 INT NOT NULL DEFAULT 0,
+    stage3 INT NOT NULL DEFAULT 0,
+    stage4 INT NOT NULL DEFAULT 0,
+    above_ma30 INT NOT NULL DEFAULT 0,
+    pct_above_ma30 DECIMAL(6,2),
+    new_highs INT NOT NULL DEFAULT 0,
+    new_lows INT NOT NULL DEFAULT 0,
+    stage2_entries INT NOT NULL DEFAULT 0,
+    stage4_entries INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_breadth_week_exchange (week_end_date, exchange),
+    INDEX idx_breadth_exchange_week (exchange, week_end_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- Tabla: weekly_rs_rank
+-- Percentiles semanales de fuerza relativa (13/26/52 semanas y MRS)
+-- frente a todas las acciones activas (la calcula weekly_process.py)
+-- ============================================
+CREATE TABLE IF NOT EXISTS weekly_rs_rank (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    stock_id INT NOT NULL,
+    week_end_date DATE NOT NULL,
+    ret_13w DECIMAL(10,4),
+    ret_26w DECIMAL(10,4),
+    ret_52w DECIMAL(10,4),
+    mrs DECIMAL(10,4),
+    rank_13w DECIMAL(5,2),
+    rank_26w DECIMAL(5,2),
+    rank_52w DECIMAL(5,2),
+    rank_mrs DECIMAL(5,2),
+    rs_rank DECIMAL(5,2),
+    FOREIGN KEY (stock_id) REFERENCES stocks(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_rs_stock_week (stock_id, week_end_date),
+    INDEX idx_rs_week_rank (week_end_date, rs_rank)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- Tabla: pipeline_tasks
+-- Estado de las tareas del orquestador (python -m app.pipeline run)
+-- Una fila por tarea y acción (stock_id NULL = tarea global)
+-- ============================================
+CREATE TABLE IF NOT EXISTS pipeline_tasks (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    run_id VARCHAR(32) NOT NULL,
+    mode VARCHAR(10) NOT NULL,
+    task VARCHAR(20) NOT NULL,
+    stock_id INT,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    started_at DATETIME,
+    finished_at DATETIME,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (stock_id) REFERENCES stocks(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_pipeline_task (run_id, task, stock_id),
+    INDEX idx_pipeline_status (run_id, status),
+    INDEX idx_pipeline_created (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- ============================================
 -- Verificación
 -- ============================================
@@ -16,6 +16,9 @@ sys.path.insert(0, '/home/stanweinstein')
 from app.database import SessionLocal, Stock, WeeklyData, Signal
 from app.analyzer import WeinsteinAnalyzer
 from app.signals import SignalGenerator
+from app.snapshot import refresh_stock_latest
+from app.breadth import update_market_breadth
+from app.rs_rank import update_rs_ranks
 import logging
 from datetime import datetime
 
@@ -84,6 +87,10 @@ def main():
                 logger.error(f"  ✗ Error analizando {stock.ticker}: {e}")
                 failed_analysis.append(stock.ticker)
         
+        # Ranking de fuerza relativa histórico (filtro BUY_MIN_RS_RANK)
+        n_ranks = update_rs_ranks(db, full=True)
+        logger.info(f"\n✓ Ranking de fuerza relativa: {n_ranks} filas")
+
         # ==========================================
         # FASE 2: GENERACIÓN DE SEÑALES
         # ==========================================
@@ -153,6 +160,10 @@ def main():
         logger.info(f"  Semanas con etapa:        {weeks_with_stage}")
         logger.info(f"  Total señales en BD:      {total_signals_db}")
         
+        # Snapshot del estado actual y amplitud de mercado histórica
+        refresh_stock_latest(db)
+        update_market_breadth(db, full=True)
+
         # Distribución de etapas
         logger.info("\n📈 Distribución de acciones por etapa actual:")
         for stage in [1, 2, 3, 4]:
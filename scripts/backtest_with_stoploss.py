@@ -15,9 +15,10 @@ Uso:
 import sys
 sys.path.insert(0, '/home/stanweinstein')
 
-from datetime import datetime, timedelta
-from app.database import SessionLocal, Stock, Signal, DailyData, WeeklyData
-from sqlalchemy import and_
+from datetime import datetime
+from app.database import SessionLocal, Signal
+from app.backtest.data import load_universe
+from app.backtest.simulator import TradeSimulator, StopLoss, StageExit, BelowMA30Exit
 import logging
 
 # Configurar logging
@@ -46,155 +47,34 @@ class WeinsteinBacktestWithStopLoss:
         self.trailing_stop_pct = trailing_stop_pct
         self.results = []
     
-    def get_daily_prices_after_entry(self, stock_id: int, entry_date, days: int = 400):
+    def simulate_trades_with_stops(self, signals):
         """
-        Obtener precios diarios después de la entrada
-        """
-        end_date = entry_date + timedelta(days=days)
-        
-        prices = self.db.query(DailyData).filter(
-            and_(
-                DailyData.stock_id == stock_id,
-                DailyData.date > entry_date,
-                DailyData.date <= end_date
-            )
-        ).order_by(DailyData.date.asc()).all()
-        
-        return prices
-    
-    def get_weekly_data_after_entry(self, stock_id: int, entry_date):
-        """
-        Obtener datos semanales después de la entrada
-        Para detectar cambios de etapa
-        """
-        weekly = self.db.query(WeeklyData).filter(
-            and_(
-                WeeklyData.stock_id == stock_id,
-                WeeklyData.week_end_date > entry_date
-            )
-        ).order_by(WeeklyData.week_end_date.asc()).all()
-        
-        return weekly
-    
-    def simulate_trade_with_stops(self, signal):
-        """
-        Simular una operación completa con stops
+        Simular todas las operaciones a la vez sobre el universo en memoria.
+        Reglas de salida: stop inicial y trailing, etapa 3/4 o cierre semanal
+        bajo MA30 (400 días como máximo).
         
         Returns:
-            dict con resultado de la operación
+            Lista de dicts con el resultado de cada operación
         """
-        stock = self.db.query(Stock).filter(Stock.id == signal.stock_id).first()
-        
-        if not stock:
-            return None
-        
-        entry_price = float(signal.price)
-        entry_date = signal.signal_date
-        
-        # Stop loss inicial (X% por debajo)
-        initial_stop = entry_price * (1 - self.initial_stop_pct / 100)
-        
-        # Variables de tracking
-        highest_price = entry_price
-        trailing_stop = initial_stop
-        current_stop = initial_stop
-        
-        exit_reason = None
-        exit_date = None
-        exit_price = None
-        
-        # Obtener precios diarios y semanales
-        daily_prices = self.get_daily_prices_after_entry(signal.stock_id, entry_date)
-        weekly_data = self.get_weekly_data_after_entry(signal.stock_id, entry_date)
-        
-        # Crear dict de etapas semanales para búsqueda rápida
-        weekly_stages = {}
-        for week in weekly_data:
-            weekly_stages[week.week_end_date] = {
-                'stage': week.stage,
-                'ma30': float(week.ma30) if week.ma30 else None,
-                'close': float(week.close)
-            }
-        
-        # Simular día a día
-        for day in daily_prices:
-            price = float(day.close)
-            low = float(day.low)
-            date = day.date
-            
-            # Actualizar máximo histórico
-            if price > highest_price:
-                highest_price = price
-                
-                # Actualizar trailing stop (X% desde máximo)
-                trailing_stop = highest_price * (1 - self.trailing_stop_pct / 100)
-                
-                # El stop siempre sube, nunca baja
-                if trailing_stop > current_stop:
-                    current_stop = trailing_stop
-            
-            # REGLA 1: Stop Loss alcanzado (el mínimo del día toca el stop)
-            if low <= current_stop:
-                exit_reason = 'STOP_LOSS'
-                exit_date = date
-                exit_price = current_stop  # Ejecuta al precio del stop
-                break
-            
-            # REGLA 2: Cambio de etapa a 3 o 4 (verificar datos semanales)
-            # Buscar la última semana disponible hasta esta fecha
-            last_week_date = None
-            for week_date in sorted(weekly_stages.keys()):
-                if week_date <= date:
-                    last_week_date = week_date
-            
-            if last_week_date and last_week_date in weekly_stages:
-                week_info = weekly_stages[last_week_date]
-                
-                # Si cambia a Etapa 3 o 4, salir
-                if week_info['stage'] in [3, 4]:
-                    exit_reason = f"STAGE_CHANGE_TO_{week_info['stage']}"
-                    exit_date = date
-                    exit_price = price
-                    break
-                
-                # REGLA 3: Precio cierra por debajo de MA30 en semanal
-                if week_info['ma30'] and week_info['close'] < week_info['ma30']:
-                    exit_reason = 'BELOW_MA30'
-                    exit_date = date
-                    exit_price = price
-                    break
-        
-        # Si no se activó ninguna salida, mantener hasta hoy
-        if not exit_date:
-            if daily_prices:
-                last_day = daily_prices[-1]
-                exit_reason = 'HOLD'
-                exit_date = last_day.date
-                exit_price = float(last_day.close)
-            else:
-                return None
-        
-        # Calcular retornos
-        absolute_return = exit_price - entry_price
-        percent_return = (absolute_return / entry_price) * 100
-        days_held = (exit_date - entry_date).days
-        
-        return {
-            'ticker': stock.ticker,
-            'name': stock.name,
-            'entry_date': entry_date,
-            'entry_price': entry_price,
-            'initial_stop': initial_stop,
-            'exit_date': exit_date,
-            'exit_price': exit_price,
-            'exit_reason': exit_reason,
-            'highest_price': highest_price,
-            'final_stop': current_stop,
-            'days_held': days_held,
-            'return_pct': percent_return,
-            'return_abs': absolute_return,
-            'winner': percent_return > 0
-        }
+        universe = load_universe(
+            self.db, stock_ids={s.stock_id for s in signals},
+            daily_start=min(s.signal_date for s in signals)
+        )
+        simulator = TradeSimulator(universe, max_days=400, staged_weeks_only=False)
+        rules = [
+            StopLoss(self.initial_stop_pct, self.trailing_stop_pct),
+            StageExit(prefix='STAGE_CHANGE_TO_'),
+            BelowMA30Exit(factor=1.0),
+        ]
+        entries = [
+            {'signal_type': 'BUY', 'stock_id': s.stock_id, 'week_end_date': s.signal_date,
+             'price': float(s.price), 'ma30': float(s.ma30) if s.ma30 else None}
+            for s in signals
+        ]
+        trades = simulator.simulate_signals(entries, rules)
+        for trade in trades:
+            trade['return_abs'] = trade['exit_price'] - trade['entry_price']
+        return trades
     
     def run_backtest(self, signal_type: str = 'BUY'):
         """Ejecutar backtest con stop loss"""
@@ -217,22 +97,12 @@ class WeinsteinBacktestWithStopLoss:
         
         logger.info(f"\nTotal señales {signal_type}: {len(signals)}\n")
         
-        # Procesar cada señal
-        for idx, signal in enumerate(signals, 1):
-            logger.info(f"[{idx}/{len(signals)}] Simulando operación...")
-            
-            result = self.simulate_trade_with_stops(signal)
-            
-            if result:
-                self.results.append(result)
-                
-                # Log básico
-                ticker = result['ticker']
-                ret = result['return_pct']
-                reason = result['exit_reason']
-                days = result['days_held']
-                
-                logger.info(f"  {ticker}: {ret:+.2f}% en {days}d (salida: {reason})")
+        # Simular todas las operaciones
+        self.results = self.simulate_trades_with_stops(signals)
+        
+        for idx, result in enumerate(self.results, 1):
+            logger.info(f"[{idx}/{len(self.results)}] {result['ticker']}: {result['return_pct']:+.2f}% "
+                        f"en {result['days_held']}d (salida: {result['exit_reason']})")
         
         return self.results
     
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concurrencia de la API web
+Lanza peticiones concurrentes contra los endpoints de consulta y, en paralelo,
+mide la latencia de /api/health (no toca la BD): si las consultas bloquean el
+event loop, la latencia de health crece con la carga.
+
+Ejecutar contra la versión anterior y la actual con los mismos parámetros
+para comparar (--json guarda el resultado).
+
+Uso:
+    python scripts/bench_web_concurrency.py --password Weinstein
+    python scripts/bench_web_concurrency.py --url http://localhost:8000 -c 20 -n 400
+    python scripts/bench_web_concurrency.py --ticker SAN.MC --json bench.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(values, pct):
+    """Percentil (interpolación al más cercano) de una lista de latencias."""
+    if not values:
+        return None
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def summarize(latencies):
+    """p50/p95/p99/max en milisegundos."""
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else None,
+    }
+
+
+async def login(client, password):
+    """Iniciar sesión (cookie de sesión en el cliente)."""
+    try:
+        r = await client.post('/login', data={'password': password})
+    except httpx.HTTPError as e:
+        print(f"✗ No se pudo conectar con {client.base_url}: {e}")
+        sys.exit(1)
+    if r.status_code != 303:
+        print(f"✗ Login fallido (HTTP {r.status_code})")
+        sys.exit(1)
+
+
+async def run_load(client, endpoints, total, concurrency, latencies, errors):
+    """Lanzar `total` peticiones repartidas entre endpoints con `concurrency` en vuelo."""
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(endpoints[i % len(endpoints)])
+
+    async def worker():
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                r = await client.get(path)
+                if r.status_code != 200:
+                    errors[path] += 1
+            except httpx.HTTPError:
+                errors[path] += 1
+                continue
+            latencies[path].append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run_probe(client, stop, interval, probe_latencies):
+    """Medir /api/health periódicamente mientras dura la carga."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get('/api/health')
+            probe_latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def main_async(args):
+    endpoints = [
+        '/api/dashboard/stats',
+        '/api/stocks?limit=100',
+        f'/api/stock/{args.ticker}',
+        '/api/signals?days=30',
+        '/api/watchlist',
+    ]
+
+    limits = httpx.Limits(max_connections=args.concurrency + 5)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        await login(client, args.password)
+
+        # Calentamiento (caches, pool de conexiones)
+        for path in endpoints:
+            await client.get(path)
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        probe_latencies = []
+        stop = asyncio.Event()
+
+        probe = asyncio.create_task(run_probe(client, stop, args.probe_interval, probe_latencies))
+        start = time.perf_counter()
+        await run_load(client, endpoints, args.requests, args.concurrency, latencies, errors)
+        duration = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    result = {
+        'url': args.url,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'duration_s': round(duration, 2),
+        'throughput_rps': round(len(all_latencies) / duration, 1) if duration else None,
+        'errors': sum(errors.values()),
+        'overall': summarize(all_latencies),
+        'health_probe': summarize(probe_latencies),
+        'endpoints': {path: summarize(values) for path, values in latencies.items()},
+    }
+
+    print("=" * 78)
+    print(f"BENCHMARK CONCURRENCIA — {args.url}  (c={args.concurrency}, n={args.requests})")
+    print("=" * 78)
+    print(f"{'Endpoint':32s} {'n':>5s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}")
+    print("-" * 78)
+    rows = list(result['endpoints'].items()) + [
+        ('TOTAL', result['overall']), ('/api/health (sonda)', result['health_probe'])
+    ]
+    for path, s in rows:
+        if not s['count']:
+            continue
+        print(f"{path[:32]:32s} {s['count']:5d} {s['p50_ms']:8.1f} {s['p95_ms']:8.1f} "
+              f"{s['p99_ms']:8.1f} {s['max_ms']:8.1f}")
+    print("-" * 78)
+    print(f"Duración: {result['duration_s']} s  |  Throughput: {result['throughput_rps']} req/s  "
+          f"|  Errores: {result['errors']}")
+    print("=" * 78)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Resultado guardado en {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de concurrencia de la API web')
+    parser.add_argument('--url', default='http://localhost:8000', help='URL base (incluye BASE_PATH)')
+    parser.add_argument('--password', default='Weinstein', help='Contraseña de acceso')
+    parser.add_argument('-c', '--concurrency', type=int, default=20, help='Peticiones simultáneas')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='Total de peticiones')
+    parser.add_argument('--ticker', default='SPY', help='Ticker para /api/stock/{ticker}')
+    parser.add_argument('--probe-interval', type=float, default=0.05, help='Segundos entre sondas de health')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Timeout por petición (s)')
+    parser.add_argument('--json', help='Guardar resultado en fichero JSON')
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
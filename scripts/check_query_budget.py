@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Comprobación de regresiones en el número de consultas SQL
+Compara las consultas por llamada de cada fase (descarga, guardado,
+agregación, análisis, señales...) de un informe de rendimiento (data/perf/)
+con una referencia. Termina con código 1 si alguna fase supera la referencia
+en más de la tolerancia: un N+1 nuevo aparece como más consultas por acción
+aunque el tiempo total apenas cambie.
+
+La referencia es un JSON guardado con --update o directamente otro informe
+(--against). Las fases nuevas o sin referencia se muestran pero no fallan.
+
+Uso:
+    python scripts/check_query_budget.py --update                 # guardar referencia con el último informe
+    python scripts/check_query_budget.py                          # último informe vs referencia
+    python scripts/check_query_budget.py --report 20250104-003000-full --tolerance 0.05
+    python scripts/check_query_budget.py --against 20241228-003000-full
+"""
+import sys
+sys.path.insert(0, '/home/stanweinstein')
+
+import os
+import json
+import argparse
+
+from app.perf import list_reports, load_report
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_budget.json')
+
+# Tolerancia relativa por defecto sobre las consultas por llamada
+DEFAULT_TOLERANCE = 0.10
+
+
+def queries_per_call(report: dict) -> dict:
+    """{fase: consultas por llamada} de un informe de rendimiento"""
+    return {
+        phase: round(stats['queries'] / stats['count'], 2)
+        for phase, stats in report.get('phases', {}).items()
+        if stats.get('count')
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Filas (fase, referencia, actual, estado) con estado 'OK', 'REGRESION',
+    'MEJORA' o 'NUEVA'.
+    """
+    rows = []
+    for phase in sorted(set(current) | set(baseline)):
+        cur = current.get(phase)
+        base = baseline.get(phase)
+        if cur is None:
+            continue
+        if base is None:
+            status = 'NUEVA'
+        elif cur > base * (1 + tolerance):
+            status = 'REGRESION'
+        elif cur < base * (1 - tolerance):
+            status = 'MEJORA'
+        else:
+            status = 'OK'
+        rows.append((phase, base, cur, status))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regresiones de consultas SQL por fase')
+    parser.add_argument('--report', help='Informe a comprobar (por defecto el más reciente)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Fichero JSON de referencia')
+    parser.add_argument('--against', help='Usar otro informe como referencia en vez del fichero')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Tolerancia relativa (0.10 = 10%%)')
+    parser.add_argument('--update', action='store_true', help='Guardar el informe como nueva referencia')
+    args = parser.parse_args()
+
+    name = args.report
+    if not name:
+        reports = list_reports()
+        if not reports:
+            print("❌ No hay informes de rendimiento en data/perf/")
+            sys.exit(2)
+        name = reports[0]['name']
+
+    report = load_report(name)
+    if report is None:
+        print(f"❌ Informe no encontrado: {name}")
+        sys.exit(2)
+    current = queries_per_call(report)
+
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump({'report': name, 'queries_per_call': current}, f, indent=2, sort_keys=True)
+        print(f"✓ Referencia guardada en {args.baseline} ({name}, {len(current)} fases)")
+        return
+
+    if args.against:
+        reference = load_report(args.against)
+        if reference is None:
+            print(f"❌ Informe de referencia no encontrado: {args.against}")
+            sys.exit(2)
+        baseline, baseline_name = queries_per_call(reference), args.against
+    else:
+        if not os.path.exists(args.baseline):
+            print(f"❌ No existe {args.baseline}; ejecutar con --update para crearla")
+            sys.exit(2)
+        with open(args.baseline) as f:
+            data = json.load(f)
+        baseline, baseline_name = data['queries_per_call'], data.get('report', args.baseline)
+
+    print(f"Informe: {name}  |  Referencia: {baseline_name}  |  Tolerancia: {args.tolerance:.0%}\n")
+    print(f"  {'Fase':<20} {'Referencia':>11} {'Actual':>9}  Estado")
+    rows = compare(current, baseline, args.tolerance)
+    for phase, base, cur, status in rows:
+        base_txt = f"{base:.2f}" if base is not None else '-'
+        print(f"  {phase:<20} {base_txt:>11} {cur:>9.2f}  {status}")
+
+    regressions = [r for r in rows if r[3] == 'REGRESION']
+    if regressions:
+        print(f"\n❌ {len(regressions)} fase(s) con más consultas por llamada que la referencia")
+        sys.exit(1)
+    print("\n✓ Sin regresiones en el número de consultas")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,8 +11,8 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from collections import defaultdict
-from app.database import SessionLocal, Stock, WeeklyData
-from sqlalchemy import and_, func
+from app.database import SessionLocal, Stock, WeeklyData, StockLatest
+from sqlalchemy import and_
 
 
 def run_diagnostics():
@@ -28,18 +28,7 @@ def run_diagnostics():
     print("\n1. DISTRIBUCIÓN DE ETAPAS (semana más reciente por acción)")
     print("-" * 65)
 
-    subq = db.query(
-        WeeklyData.stock_id,
-        func.max(WeeklyData.week_end_date).label('max_date')
-    ).group_by(WeeklyData.stock_id).subquery()
-
-    latest = db.query(WeeklyData).join(
-        subq,
-        and_(
-            WeeklyData.stock_id == subq.c.stock_id,
-            WeeklyData.week_end_date == subq.c.max_date
-        )
-    ).all()
+    latest = db.query(StockLatest).filter(StockLatest.week_end_date.isnot(None)).all()
 
     stage_counts = defaultdict(int)
     null_stage = 0
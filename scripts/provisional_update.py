@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Script de vista previa intrasemanal
+Se ejecuta cada noche tras daily_update.py para:
+- Construir la vela parcial de la semana en curso
+- Calcular MA30/pendiente y etapa provisionales
+- Evaluar las reglas BUY/SHORT sobre la semana parcial
+
+Los resultados se guardan en provisional_weekly; el proceso semanal
+los sustituye al cerrar la semana.
+
+Uso:
+    python scripts/provisional_update.py
+"""
+import sys
+sys.path.insert(0, '/home/stanweinstein')
+
+from app.database import SessionLocal
+from app.provisional import ProvisionalAnalyzer
+from app.data_version import bump_data_version
+from app.events import PipelineEvents
+import logging
+from datetime import datetime
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/var/log/stanweinstein/provisional_update.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Función principal de la vista previa intrasemanal"""
+    start_time = datetime.now()
+
+    logger.info("=" * 60)
+    logger.info(f"SEMANA PROVISIONAL - {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("=" * 60)
+
+    db = SessionLocal()
+    events = PipelineEvents('provisional')
+
+    try:
+        events.phase_start('provisional')
+        provisional = ProvisionalAnalyzer(db)
+        result = provisional.process_all_stocks()
+        events.phase_end('provisional', success=result['success'], signals=result['signals'])
+
+        # Invalidar cachés de la web
+        version = bump_data_version('provisional')
+        logger.info(f"✓ Versión de datos publicada: {version}")
+        events.finished((datetime.now() - start_time).total_seconds(), version=version)
+
+        duration = (datetime.now() - start_time).total_seconds()
+
+        logger.info("\n" + "=" * 60)
+        logger.info("RESUMEN SEMANA PROVISIONAL")
+        logger.info("=" * 60)
+        logger.info(f"Semana:            {result['week_end_date']}")
+        logger.info(f"Procesadas:        {result['success']}/{result['total']}")
+        logger.info(f"Sin datos/cerrada: {result['skipped']}")
+        logger.info(f"Señales:           {result['signals']}")
+        logger.info(f"Con errores:       {result['failed']}")
+        logger.info(f"Duración:          {duration:.1f} segundos")
+
+        if result['failed_tickers']:
+            logger.warning(f"\n⚠ Acciones con errores ({result['failed']}):")
+            for ticker in result['failed_tickers']:
+                logger.warning(f"  - {ticker}")
+
+        logger.info("=" * 60)
+
+    except Exception as e:
+        logger.error(f"✗ Error crítico en semana provisional: {e}")
+        events.failed(str(e))
+        sys.exit(1)
+    finally:
+        db.close()
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 """
-Añade SPY (S&P 500 ETF) a la base de datos como índice de referencia de mercado.
-Carga histórico diario, agrega a semanal y calcula etapas.
+Añade un índice de referencia de mercado (benchmark) a la base de datos.
+Por defecto SPY (S&P 500 ETF); con --ticker se añaden los benchmarks por
+mercado de BENCHMARKS_BY_SUFFIX (^IBEX, ^FTSE...). Carga histórico diario,
+agrega a semanal y calcula etapas.
 
 Uso:
     python scripts/setup_market_index.py
+    python scripts/setup_market_index.py --ticker ^IBEX --name "IBEX 35"
+    python scripts/setup_market_index.py --all
 """
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import argparse
 import logging
 from datetime import datetime, date, timedelta
 import pandas as pd
@@ -17,44 +22,81 @@ import pandas as pd
 from app.database import SessionLocal, Stock, DailyData, WeeklyData
 from app.aggregator import WeeklyAggregator
 from app.analyzer import WeinsteinAnalyzer
+from app.data_collector import DataCollector
+from app.config import BENCHMARK_DEFAULT, BENCHMARKS_BY_SUFFIX
 from sqlalchemy import and_
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-def insert_spy(db):
-    """Inserta SPY en la tabla stocks si no existe."""
-    spy = db.query(Stock).filter(Stock.ticker == 'SPY').first()
-    if spy:
-        logger.info(f"SPY ya existe en BD (id={spy.id})")
-        return spy
-
-    spy = Stock(
-        ticker='SPY',
-        name='SPDR S&P 500 ETF Trust',
+# Nombres de los benchmarks habituales (el resto usa el ticker como nombre)
+INDEX_NAMES = {
+    'SPY': 'SPDR S&P 500 ETF Trust',
+    '^IBEX': 'IBEX 35',
+    '^FTSE': 'FTSE 100',
+    '^GDAXI': 'DAX',
+    '^FCHI': 'CAC 40',
+    '^OMX': 'OMX Stockholm 30',
+    '^STOXX50E': 'Euro Stoxx 50',
+}
+
+
+def insert_index(db, ticker, name=None):
+    """Inserta el índice en la tabla stocks (exchange='INDEX') si no existe."""
+    index = db.query(Stock).filter(Stock.ticker == ticker).first()
+    if index:
+        if index.exchange != 'INDEX':
+            index.exchange = 'INDEX'
+            db.commit()
+        logger.info(f"{ticker} ya existe en BD (id={index.id})")
+        return index
+
+    index = Stock(
+        ticker=ticker,
+        name=name or INDEX_NAMES.get(ticker, ticker),
         exchange='INDEX',
         active=True
     )
-    db.add(spy)
+    db.add(index)
     db.commit()
-    db.refresh(spy)
-    logger.info(f"✓ SPY insertado (id={spy.id})")
-    return spy
+    db.refresh(index)
+    logger.info(f"✓ {ticker} insertado (id={index.id})")
+    return index
+
+
+def load_index_daily(db, index, years_back=3):
+    """
+    Descarga el histórico diario del índice.
+    Los símbolos de índice (^IBEX...) se descargan con DataCollector
+    (fuentes de DATA_SOURCES con fallback); SPY con TwelveData.
+    """
+    if not index.ticker.startswith('^'):
+        return load_spy_daily(db, index.id, years_back, symbol=index.ticker)
+
+    start_date = (datetime.now() - timedelta(days=365 * years_back)).strftime('%Y-%m-%d')
+    logger.info(f"Descargando {index.ticker} desde {start_date}...")
+
+    collector = DataCollector(db)
+    data_dict = collector.download_stock_data(index.ticker, start_date)
+    if not data_dict:
+        logger.error(f"No se pudieron descargar datos de {index.ticker}")
+        return 0
+    return collector.save_daily_data(index.id, index.ticker, data_dict)
 
 
-def load_spy_daily(db, spy_id, years_back=3):
-    """Descarga datos diarios de SPY con TwelveData e inserta en daily_data."""
+def load_spy_daily(db, spy_id, years_back=3, symbol='SPY'):
+    """Descarga datos diarios de SPY (u otro ETF) con TwelveData e inserta en daily_data."""
     import requests
     from app.config import TWELVEDATA_API_KEY
 
     start_date = (datetime.now() - timedelta(days=365 * years_back)).strftime('%Y-%m-%d')
 
-    logger.info(f"Descargando SPY vía TwelveData desde {start_date}...")
+    logger.info(f"Descargando {symbol} vía TwelveData desde {start_date}...")
 
     url = "https://api.twelvedata.com/time_series"
     params = {
-        'symbol': 'SPY',
+        'symbol': symbol,
         'interval': '1day',
         'outputsize': 5000,   # máximo para obtener todo el histórico de una vez
         'start_date': start_date,
@@ -101,38 +143,38 @@ def load_spy_daily(db, spy_id, years_back=3):
         inserted += 1
 
     db.commit()
-    logger.info(f"✓ {inserted} días de SPY insertados en daily_data")
+    logger.info(f"✓ {inserted} días de {symbol} insertados en daily_data")
     return inserted
 
 
-def aggregate_spy_weekly(db, spy_id):
-    """Agrega datos diarios de SPY a weekly_data y calcula MA30."""
-    logger.info("Agregando SPY a datos semanales (histórico completo)...")
+def aggregate_index_weekly(db, index):
+    """Agrega datos diarios del índice a weekly_data y calcula MA30."""
+    logger.info(f"Agregando {index.ticker} a datos semanales (histórico completo)...")
     aggregator = WeeklyAggregator(db)
     # weeks_back=160 cubre ~3 años de histórico
-    weeks = aggregator.aggregate_stock_weekly_data(spy_id, weeks_back=160)
-    logger.info(f"✓ {weeks} semanas agregadas para SPY")
+    weeks = aggregator.aggregate_stock_weekly_data(index.id, weeks_back=160)
+    logger.info(f"✓ {weeks} semanas agregadas para {index.ticker}")
     return weeks
 
 
-def analyze_spy_stages(db, spy_id):
-    """Calcula etapas Weinstein para SPY."""
-    logger.info("Calculando etapas Weinstein para SPY (histórico completo)...")
+def analyze_index_stages(db, index):
+    """Calcula etapas Weinstein para el índice."""
+    logger.info(f"Calculando etapas Weinstein para {index.ticker} (histórico completo)...")
     analyzer = WeinsteinAnalyzer(db)
     # weeks_back=160 cubre todo el histórico disponible
-    processed = analyzer.analyze_stock_stages(spy_id, weeks_back=160)
-    logger.info(f"✓ {processed} semanas analizadas para SPY")
+    processed = analyzer.analyze_stock_stages(index.id, weeks_back=160)
+    logger.info(f"✓ {processed} semanas analizadas para {index.ticker}")
     return processed
 
 
-def print_spy_summary(db, spy_id):
-    """Muestra resumen de los últimos 10 datos semanales de SPY."""
+def print_index_summary(db, index):
+    """Muestra resumen de los últimos 10 datos semanales del índice."""
     weekly = db.query(WeeklyData).filter(
-        WeeklyData.stock_id == spy_id
+        WeeklyData.stock_id == index.id
     ).order_by(WeeklyData.week_end_date.desc()).limit(10).all()
 
     print("\n" + "="*65)
-    print("RESUMEN SPY — Últimas 10 semanas")
+    print(f"RESUMEN {index.ticker} — Últimas 10 semanas")
     print("="*65)
     print(f"{'Semana':12s}  {'Close':8s}  {'MA30':8s}  {'Slope':8s}  {'Stage':6s}")
     print("-"*65)
@@ -150,24 +192,45 @@ def print_spy_summary(db, spy_id):
         stage_names = {1: 'Base/Acumulación', 2: 'Avance alcista',
                        3: 'Techo/Distribución', 4: 'Declive bajista'}
         stage_name = stage_names.get(current.stage, 'Desconocida')
-        print(f"\n  SPY hoy → Etapa {current.stage}: {stage_name}")
+        print(f"\n  {index.ticker} hoy → Etapa {current.stage}: {stage_name}")
+
+
+def setup_index(db, ticker, name=None, years_back=3):
+    """Alta completa de un índice: stock, histórico diario, semanal y etapas."""
+    print("="*65)
+    print(f"CONFIGURACIÓN ÍNDICE DE MERCADO ({ticker})")
+    print("="*65)
+
+    index = insert_index(db, ticker, name)
+    load_index_daily(db, index, years_back=years_back)
+    aggregate_index_weekly(db, index)
+    analyze_index_stages(db, index)
+    print_index_summary(db, index)
+
+    print(f"\n✓ {ticker} configurado correctamente.")
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Añadir índices de referencia de mercado')
+    parser.add_argument('--ticker', default=BENCHMARK_DEFAULT,
+                        help=f'Ticker del índice (default: {BENCHMARK_DEFAULT})')
+    parser.add_argument('--name', default=None, help='Nombre descriptivo del índice')
+    parser.add_argument('--years', type=int, default=3, help='Años de histórico (default: 3)')
+    parser.add_argument('--all', action='store_true',
+                        help='Configurar BENCHMARK_DEFAULT y todos los de BENCHMARKS_BY_SUFFIX')
+    args = parser.parse_args()
+
+    if args.all:
+        tickers = [BENCHMARK_DEFAULT] + sorted(set(BENCHMARKS_BY_SUFFIX.values()))
+    else:
+        tickers = [args.ticker]
+
     db = SessionLocal()
     try:
-        print("="*65)
-        print("CONFIGURACIÓN ÍNDICE DE MERCADO (SPY)")
-        print("="*65)
-
-        spy = insert_spy(db)
-        load_spy_daily(db, spy.id, years_back=3)
-        aggregate_spy_weekly(db, spy.id)
-        analyze_spy_stages(db, spy.id)
-        print_spy_summary(db, spy.id)
-
-        print("\n✓ SPY configurado correctamente.")
-        print("  Puedes usarlo como filtro de mercado en el backtest.\n")
+        for ticker in tickers:
+            setup_index(db, ticker, args.name if not args.all else None, args.years)
+
+        print("\n  Se usarán como filtro de mercado y MRS en señales y backtest.\n")
 
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -10,20 +10,53 @@ import sys
 sys.path.insert(0, '/home/stanweinstein')
 
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from typing import Optional, List
-from datetime import datetime, timedelta, date as date_type
-from sqlalchemy import and_, func, desc
-
-from app.database import SessionLocal, Stock, WeeklyData, Signal, DailyData, Position
+from datetime import datetime, timedelta, timezone, date as date_type
+from email.utils import format_datetime
+import hashlib
+import hmac
+import time
+import base64
+import json
+from decimal import Decimal
+from functools import partial, wraps
+import anyio
+from sqlalchemy import func, desc
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from sqlalchemy.orm import sessionmaker, joinedload
+
+from app.database import create_pooled_engine, Stock, WeeklyData, Signal, Position, ProvisionalWeekly, StockLatest
+from app.config import WEB_DB_WORKERS, WEB_DB_POOL_SIZE, WEB_DB_MAX_OVERFLOW, METRICS_TOKEN
 from app.analyzer import WeinsteinAnalyzer
 from app.signals import SignalGenerator
+from app.benchmarks import get_benchmark_matrix
+from app.prices import get_latest_prices
+from app.search import get_search_index
+from app.screener import get_screener, SORT_FIELDS, SCREENER_SIGNAL_DAYS
+from app.breadth import get_breadth_series, get_breadth_exchanges
 from app.auth import verify_password, save_password
+from app.cache import VersionedLRUCache, MISSING
+from app.data_version import bump_data_version, get_data_version
+from app.events import latest_event_id, fetch_events
+from app.perf import list_reports, load_report
+from app.db_stats import get_db_stats, reset_db_stats
+from app.metrics import RequestMetrics, format_metric, render_metrics
+from app import export
+
+import logging
+logger = logging.getLogger(__name__)
 
 # Base path: "/sw" en producción (detrás de proxy), "" en local
 import os
@@ -43,23 +76,248 @@ app = FastAPI(
 class AuthMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         path = request.url.path
-        # Permitir rutas públicas
-        if path == "/login" or path.startswith("/static"):
+        # Permitir rutas públicas (/metrics tiene su propio control de acceso)
+        if path == "/login" or path == "/metrics" or path.startswith("/static"):
             return await call_next(request)
         # Verificar sesión
         if not request.session.get("authenticated"):
             return RedirectResponse(url=f"{BASE_PATH}/login", status_code=302)
         return await call_next(request)
 
+
+# Peticiones por ruta, latencias y en curso (expuestas en /metrics)
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (sin BaseHTTPMiddleware: no copia la respuesta) que mide
+    cada petición. La ruta se etiqueta con la plantilla que resolvió el
+    router (/api/stock/{ticker}); las no resueltas van a '<sin_ruta>'.
+    Los streams SSE se cuentan pero no entran en el histograma ni en curso.
+    """
+    STREAM_PATHS = ('/api/events/stream',)
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stream = scope['path'] in self.STREAM_PATHS
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        if not stream:
+            request_metrics.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            if route is not None:
+                route_path = route.path
+            elif scope['path'].startswith('/static'):
+                route_path = '/static'
+            else:
+                route_path = '<sin_ruta>'
+            if stream:
+                request_metrics.count(scope['method'], route_path, status)
+            else:
+                request_metrics.finish(scope['method'], route_path, status, time.perf_counter() - start)
+
+# ============================================
+# PETICIONES CONDICIONALES (ETag / Last-Modified)
+# ============================================
+
+# Endpoints JSON cuyo contenido solo cambia con la versión de datos
+CONDITIONAL_PATHS = (
+    '/api/stock/', '/api/stocks', '/api/dashboard/stats',
+    '/api/signals', '/api/watchlist',
+)
+
+
+def make_etag(version: str, request: Request) -> str:
+    """
+    ETag débil: versión de datos + ruta + parámetros + día (los filtros de
+    "últimos N días" cambian al cambiar la fecha aunque no haya datos nuevos).
+    """
+    raw = f"{version}|{request.url.path}|{request.url.query}|{date_type.today()}"
+    return 'W/"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match (lista separada por comas o '*')."""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ConditionalGetMiddleware(BaseHTTPMiddleware):
+    """
+    Añade ETag y Last-Modified (derivados de la versión de datos del pipeline)
+    a los GET de CONDITIONAL_PATHS y responde 304 a If-None-Match sin
+    ejecutar el endpoint ni tocar la BD.
+    """
+    async def dispatch(self, request: Request, call_next):
+        if request.method != 'GET' or not request.url.path.startswith(CONDITIONAL_PATHS):
+            return await call_next(request)
+
+        data_version = get_data_version()
+        headers = {
+            'ETag': make_etag(data_version['version'], request),
+            # El navegador guarda la respuesta pero revalida siempre
+            'Cache-Control': 'private, no-cache',
+        }
+        if data_version['updated_at']:
+            updated_at = datetime.fromisoformat(data_version['updated_at']).astimezone(timezone.utc)
+            headers['Last-Modified'] = format_datetime(updated_at, usegmt=True)
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and etag_matches(if_none_match, headers['ETag']):
+            return Response(status_code=304, headers=headers)
+
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
+
+
+# ============================================
+# COMPRESIÓN (gzip) de las respuestas /api
+# ============================================
+
+class ApiGZipMiddleware:
+    """
+    GZipMiddleware de Starlette aplicado solo a /api (JSON grande y muy
+    repetitivo); las páginas HTML, los estáticos y el stream SSE (que
+    quedaría retenido en el buffer del compresor) pasan sin tocar.
+    """
+    EXCLUDED_PATHS = ('/api/events/stream',)
+
+    def __init__(self, app, minimum_size: int = 1000):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] == 'http' and scope['path'].startswith('/api/')
+                and scope['path'] not in self.EXCLUDED_PATHS):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
 # Orden: AuthMiddleware se añade después → se ejecuta después de SessionMiddleware
+# ConditionalGetMiddleware solo ve peticiones autenticadas; la compresión es
+# la capa más interna (los 304 no llevan cuerpo). MetricsMiddleware es la más
+# externa: mide también sesión, redirecciones de login y compresión
+app.add_middleware(ApiGZipMiddleware)
+app.add_middleware(ConditionalGetMiddleware)
 app.add_middleware(AuthMiddleware)
 app.add_middleware(SessionMiddleware, secret_key="weinstein-session-secret-k3y-2024")
+app.add_middleware(MetricsMiddleware)
 
 # Montar archivos estáticos y templates
 app.mount("/static", StaticFiles(directory="web/static"), name="static")
 templates = Jinja2Templates(directory="web/templates")
 
 
+# ============================================
+# ACCESO A BASE DE DATOS (fuera del event loop)
+# ============================================
+
+# Engine propio de la web: una conexión por hilo de BD, con margen de overflow
+engine = create_pooled_engine(pool_size=WEB_DB_POOL_SIZE, max_overflow=WEB_DB_MAX_OVERFLOW)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Hilos dedicados a consultas (independientes del threadpool general de Starlette)
+_db_limiter = None
+
+
+def _get_db_limiter() -> anyio.CapacityLimiter:
+    """Limitador de hilos de BD (se crea dentro del event loop)."""
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = anyio.CapacityLimiter(WEB_DB_WORKERS)
+    return _db_limiter
+
+
+def run_in_db_pool(func):
+    """
+    Ejecutar un endpoint síncrono (SQLAlchemy + PyMySQL bloqueantes) en el
+    pool de hilos de BD, sin bloquear el event loop. Como mucho
+    WEB_DB_WORKERS consultas simultáneas; el resto espera su turno.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await anyio.to_thread.run_sync(
+            partial(func, *args, **kwargs), limiter=_get_db_limiter()
+        )
+    return wrapper
+
+
+# Caché de respuestas: se vacía cuando el pipeline publica datos nuevos
+response_cache = VersionedLRUCache(max_entries=256)
+
+
+def _json_default(value):
+    """
+    Tipos que orjson no serializa por sí mismo (DECIMAL de MySQL), convertidos
+    como jsonable_encoder: entero si no tiene decimales, si no float.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def render_json(content) -> bytes:
+    """
+    JSON compacto en UTF-8: orjson si está instalado (varias veces más rápido),
+    si no el codificador de Starlette. Las claves no str (p. ej. las etapas
+    1-4 de /api/dashboard/stats) se convierten a texto en los dos.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def cached_endpoint(func):
+    """
+    Cachear la respuesta JSON de un endpoint de solo lectura por endpoint,
+    parámetros y día (los filtros "últimos N días" dependen de la fecha).
+    Se guarda el JSON ya serializado; los aciertos se sirven sin pasar por
+    el pool de BD. Las respuestas de error (JSONResponse) no se cachean.
+    """
+    @wraps(func)
+    async def wrapper(**kwargs):
+        key = (func.__name__, tuple(sorted(kwargs.items())), date_type.today())
+        body = response_cache.get(key)
+        if body is MISSING:
+            version = response_cache.current_version()
+            result = await func(**kwargs)
+            if isinstance(result, Response):
+                return result
+            body = render_json(result)
+            response_cache.set(key, body, version=version)
+        return Response(content=body, media_type='application/json')
+    return wrapper
+
+
+
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Página de login"""
@@ -75,7 +333,8 @@ async def login_page(request: Request):
 @app.post("/login", response_class=HTMLResponse)
 async def login_post(request: Request, password: str = Form(...)):
     """Procesar login"""
-    if verify_password(password):
+    # bcrypt es costoso en CPU: fuera del event loop
+    if await anyio.to_thread.run_sync(verify_password, password):
         request.session["authenticated"] = True
         return RedirectResponse(url=f"{BASE_PATH}/", status_code=303)
     return templates.TemplateResponse("login.html", {
@@ -111,7 +370,7 @@ async def change_password(
     confirm_password: str = Form(...)
 ):
     """Cambiar contraseña"""
-    if not verify_password(current_password):
+    if not await anyio.to_thread.run_sync(verify_password, current_password):
         return templates.TemplateResponse("admin.html", {
             "request": request,
             "base_path": BASE_PATH,
@@ -135,7 +394,7 @@ async def change_password(
             "success": None
         })
 
-    save_password(new_password)
+    await anyio.to_thread.run_sync(save_password, new_password)
     return templates.TemplateResponse("admin.html", {
         "request": request,
         "base_path": BASE_PATH,
@@ -170,7 +429,8 @@ def detect_exchange(ticker: str) -> str:
 
 
 @app.get("/api/admin/stocks")
-async def api_admin_stocks():
+@run_in_db_pool
+def api_admin_stocks():
     """Lista todas las acciones (activas e inactivas)"""
     db = SessionLocal()
     try:
@@ -195,7 +455,8 @@ async def api_admin_stocks():
 
 
 @app.post("/api/admin/stocks")
-async def api_admin_stock_create(data: StockCreate):
+@run_in_db_pool
+def api_admin_stock_create(data: StockCreate):
     """Crear nueva accion"""
     db = SessionLocal()
     try:
@@ -217,6 +478,7 @@ async def api_admin_stock_create(data: StockCreate):
         db.add(stock)
         db.commit()
         db.refresh(stock)
+        bump_data_version('admin')
 
         return {
             "id": stock.id,
@@ -233,7 +495,8 @@ async def api_admin_stock_create(data: StockCreate):
 
 
 @app.put("/api/admin/stocks/{stock_id}")
-async def api_admin_stock_update(stock_id: int, data: StockUpdate):
+@run_in_db_pool
+def api_admin_stock_update(stock_id: int, data: StockUpdate):
     """Editar accion existente"""
     db = SessionLocal()
     try:
@@ -249,6 +512,7 @@ async def api_admin_stock_update(stock_id: int, data: StockUpdate):
             stock.active = data.active
 
         db.commit()
+        bump_data_version('admin')
         return {
             "id": stock.id,
             "ticker": stock.ticker,
@@ -264,7 +528,8 @@ async def api_admin_stock_update(stock_id: int, data: StockUpdate):
 
 
 @app.delete("/api/admin/stocks/{stock_id}")
-async def api_admin_stock_delete(stock_id: int):
+@run_in_db_pool
+def api_admin_stock_delete(stock_id: int):
     """Eliminar accion y todos sus datos historicos"""
     db = SessionLocal()
     try:
@@ -275,6 +540,7 @@ async def api_admin_stock_delete(stock_id: int):
         ticker = stock.ticker
         db.delete(stock)
         db.commit()
+        bump_data_version('admin')
         return {"message": f"Accion {ticker} eliminada correctamente"}
     except Exception as e:
         db.rollback()
@@ -283,6 +549,39 @@ async def api_admin_stock_delete(stock_id: int):
         db.close()
 
 
+@app.get("/api/admin/perf")
+def api_admin_perf_reports():
+    """Informes de rendimiento de los procesos batch (data/perf/)"""
+    return {"reports": list_reports()}
+
+
+@app.get("/api/admin/perf/{name}")
+def api_admin_perf_report(name: str):
+    """Informe de rendimiento de una ejecucion"""
+    report = load_report(name)
+    if report is None:
+        return JSONResponse(status_code=404, content={"error": "Informe no encontrado"})
+    return report
+
+
+@app.get("/api/admin/db-stats")
+def api_admin_db_stats(top: int = 25):
+    """Consultas SQL del proceso web por huella y espera de pool (DB_STATS_ENABLED)"""
+    stats = get_db_stats(max(1, min(top, 200)))
+    if stats is None:
+        return JSONResponse(status_code=404, content={"error": "Instrumentacion desactivada (DB_STATS_ENABLED)"})
+    return stats
+
+
+@app.post("/api/admin/db-stats/reset")
+def api_admin_db_stats_reset():
+    """Poner a cero las estadisticas de consultas del proceso web"""
+    if get_db_stats(1) is None:
+        return JSONResponse(status_code=404, content={"error": "Instrumentacion desactivada (DB_STATS_ENABLED)"})
+    reset_db_stats()
+    return {"success": True}
+
+
 # ============================================
 # UTILIDADES
 # ============================================
@@ -360,7 +659,9 @@ async def portfolio_page(request: Request):
 # ============================================
 
 @app.get("/api/dashboard/stats")
-async def get_dashboard_stats():
+@cached_endpoint
+@run_in_db_pool
+def get_dashboard_stats():
     """
     Obtener estadísticas para el dashboard
 
@@ -376,22 +677,11 @@ async def get_dashboard_stats():
         # Total acciones activas
         total_stocks = db.query(Stock).filter(Stock.active == True).count()
 
-        # Distribución por etapas (última semana de cada acción)
-        subq = db.query(
-            WeeklyData.stock_id,
-            func.max(WeeklyData.week_end_date).label('max_date')
-        ).group_by(WeeklyData.stock_id).subquery()
-
+        # Distribución por etapas (última semana de cada acción, snapshot stock_latest)
         stage_distribution = db.query(
-            WeeklyData.stage,
-            func.count(WeeklyData.stage).label('count')
-        ).join(
-            subq,
-            and_(
-                WeeklyData.stock_id == subq.c.stock_id,
-                WeeklyData.week_end_date == subq.c.max_date
-            )
-        ).group_by(WeeklyData.stage).all()
+            StockLatest.stage,
+            func.count(StockLatest.stage).label('count')
+        ).group_by(StockLatest.stage).all()
 
         # Formatear distribución
         stages = {
@@ -417,33 +707,27 @@ async def get_dashboard_stats():
             'STAGE_CHANGE': sum(1 for s in signals_last_week if s.signal_type == 'STAGE_CHANGE')
         }
 
-        # Última actualización
-        last_update = db.query(func.max(DailyData.date)).scalar()
+        # Última actualización (diaria y semanal)
+        last_update, last_weekly_date = db.query(
+            func.max(StockLatest.last_daily_date),
+            func.max(StockLatest.week_end_date)
+        ).one()
+        last_daily_date = last_update
 
-        # Acciones no actualizadas - DIARIO
-        last_daily_date = last_update  # ya calculado arriba
+        # Acciones activas no actualizadas - DIARIO
         if last_daily_date:
-            daily_subq = db.query(
-                DailyData.stock_id,
-                func.max(DailyData.date).label('max_date')
-            ).join(Stock).filter(Stock.active == True).group_by(DailyData.stock_id).subquery()
-
-            outdated_daily = db.query(func.count()).select_from(daily_subq).filter(
-                daily_subq.c.max_date < last_daily_date
+            outdated_daily = db.query(func.count(StockLatest.stock_id)).join(Stock).filter(
+                Stock.active == True,
+                StockLatest.last_daily_date < last_daily_date
             ).scalar()
         else:
             outdated_daily = 0
 
-        # Acciones no actualizadas - SEMANAL
-        last_weekly_date = db.query(func.max(WeeklyData.week_end_date)).scalar()
+        # Acciones activas no actualizadas - SEMANAL
         if last_weekly_date:
-            weekly_subq = db.query(
-                WeeklyData.stock_id,
-                func.max(WeeklyData.week_end_date).label('max_date')
-            ).join(Stock).filter(Stock.active == True).group_by(WeeklyData.stock_id).subquery()
-
-            outdated_weekly = db.query(func.count()).select_from(weekly_subq).filter(
-                weekly_subq.c.max_date < last_weekly_date
+            outdated_weekly = db.query(func.count(StockLatest.stock_id)).join(Stock).filter(
+                Stock.active == True,
+                StockLatest.week_end_date < last_weekly_date
             ).scalar()
         else:
             outdated_weekly = 0
@@ -463,83 +747,172 @@ async def get_dashboard_stats():
         db.close()
 
 
+@app.get("/api/breadth")
+@cached_endpoint
+@run_in_db_pool
+def get_market_breadth(exchange: str = 'ALL', weeks: int = 104):
+    """
+    Amplitud de mercado semanal (tabla market_breadth)
+
+    Args:
+        exchange: Mercado (NASDAQ, NYSE, BME...) o ALL para el total
+        weeks: Semanas hacia atrás
+    """
+    db = SessionLocal()
+
+    try:
+        return {
+            'exchange': exchange.upper(),
+            'exchanges': get_breadth_exchanges(db),
+            'series': get_breadth_series(db, exchange.upper(), min(max(weeks, 1), 1040))
+        }
+
+    finally:
+        db.close()
+
+
 # ============================================
 # API ENDPOINTS - ACCIONES
 # ============================================
 
+def _encode_cursor(slope, stock_id: int) -> str:
+    """Cursor opaco con la clave de ordenación de la última fila de la página."""
+    raw = json.dumps([str(slope) if slope is not None else None, stock_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """(pendiente, stock_id) de un cursor; ValueError si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        slope, stock_id = json.loads(raw)
+        return (Decimal(slope) if slope is not None else None), int(stock_id)
+    except (ValueError, TypeError, ArithmeticError):
+        raise ValueError(f"Cursor inválido: {cursor}")
+
+
 @app.get("/api/stocks")
-async def get_stocks(
+@cached_endpoint
+@run_in_db_pool
+def get_stocks(
     stage: Optional[int] = None,
     search: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    total: str = 'exact'
 ):
     """
     Obtener lista de acciones con filtros
 
+    Orden: pendiente MA30 descendente (sin pendiente al final) y stock_id.
+    Paginación por cursor (keyset): cada respuesta incluye `next_cursor`
+    para pedir la página siguiente; `offset` se mantiene por compatibilidad.
+
     Args:
         stage: Filtrar por etapa (1, 2, 3, 4)
-        search: Buscar por ticker o nombre
+        search: Prefijo de ticker o de una palabra del nombre
         limit: Número máximo de resultados
-        offset: Desplazamiento para paginación
+        offset: Desplazamiento (solo sin cursor)
+        cursor: `next_cursor` de la página anterior
+        total: 'exact' (COUNT), 'approx' (índice en memoria) o 'none'
     """
+    if total not in ('exact', 'approx', 'none'):
+        return JSONResponse(status_code=400, content={"error": "total debe ser exact, approx o none"})
+
+    after = None
+    if cursor:
+        try:
+            after = _decode_cursor(cursor)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+
     db = SessionLocal()
 
     try:
-        # Subconsulta para última semana
-        subq = db.query(
-            WeeklyData.stock_id,
-            func.max(WeeklyData.week_end_date).label('max_date')
-        ).group_by(WeeklyData.stock_id).subquery()
-
-        # Query base
-        query = db.query(Stock, WeeklyData).join(
-            WeeklyData, Stock.id == WeeklyData.stock_id
-        ).join(
-            subq,
-            and_(
-                WeeklyData.stock_id == subq.c.stock_id,
-                WeeklyData.week_end_date == subq.c.max_date
-            )
-        ).filter(Stock.active == True)
+        # Query base: última semana de cada acción (snapshot stock_latest)
+        query = db.query(Stock, StockLatest).join(
+            StockLatest, Stock.id == StockLatest.stock_id
+        ).filter(
+            Stock.active == True,
+            StockLatest.week_end_date.isnot(None)
+        )
 
         # Filtros
         if stage is not None:
-            query = query.filter(WeeklyData.stage == stage)
+            query = query.filter(StockLatest.stage == stage)
 
+        search_ids = None
         if search:
-            search_term = f"%{search.upper()}%"
-            query = query.filter(
-                (Stock.ticker.like(search_term)) |
-                (Stock.name.like(search_term))
-            )
+            index = get_search_index(db)
+            search_ids = [s['id'] for s in index.search(search, limit=None)]
+            query = query.filter(Stock.id.in_(search_ids))
+
+        # Total (antes de aplicar el cursor)
+        if total == 'exact':
+            total_count = query.count()
+        elif total == 'approx':
+            total_count = len(search_ids) if search_ids is not None else get_search_index(db).count(stage)
+        else:
+            total_count = None
+
+        # Keyset: filas posteriores a (pendiente, stock_id) del cursor
+        if after is not None:
+            after_slope, after_id = after
+            if after_slope is None:
+                query = query.filter(
+                    StockLatest.ma30_slope.is_(None),
+                    StockLatest.stock_id > after_id
+                )
+            else:
+                query = query.filter(
+                    (StockLatest.ma30_slope < after_slope) |
+                    ((StockLatest.ma30_slope == after_slope) & (StockLatest.stock_id > after_id)) |
+                    StockLatest.ma30_slope.is_(None)
+                )
 
         # Ordenar por pendiente MA30 descendente (más fuertes primero)
-        query = query.order_by(desc(WeeklyData.ma30_slope))
+        query = query.order_by(
+            StockLatest.ma30_slope.is_(None),
+            desc(StockLatest.ma30_slope),
+            StockLatest.stock_id
+        )
+        if after is None and offset:
+            query = query.offset(offset)
 
-        # Paginación
-        total = query.count()
-        results = query.offset(offset).limit(limit).all()
+        # Una fila de más para saber si hay página siguiente
+        results = query.limit(limit + 1).all()
+        has_more = len(results) > limit
+        results = results[:limit]
 
         # Formatear resultados
         stocks = []
-        for stock, weekly in results:
+        for stock, latest in results:
             stocks.append({
                 'ticker': stock.ticker,
                 'name': stock.name,
                 'exchange': stock.exchange,
-                'stage': weekly.stage,
-                'price': float(weekly.close),
-                'ma30': float(weekly.ma30) if weekly.ma30 else None,
-                'ma30_slope': float(weekly.ma30_slope) if weekly.ma30_slope else None,
-                'week_end_date': weekly.week_end_date.isoformat(),
-                'distance_from_ma30': ((float(weekly.close) - float(weekly.ma30)) / float(weekly.ma30) * 100) if weekly.ma30 else None
+                'stage': latest.stage,
+                'price': float(latest.close),
+                'ma30': float(latest.ma30) if latest.ma30 else None,
+                'ma30_slope': float(latest.ma30_slope) if latest.ma30_slope else None,
+                'week_end_date': latest.week_end_date.isoformat(),
+                'distance_from_ma30': float(latest.distance_ma30) if latest.distance_ma30 is not None else None,
+                'mrs': float(latest.mrs) if latest.mrs is not None else None,
+                'weeks_in_stage': latest.weeks_in_stage,
+                'rs_rank': float(latest.rs_rank) if latest.rs_rank is not None else None
             })
 
+        next_cursor = None
+        if has_more and results:
+            last = results[-1][1]
+            next_cursor = _encode_cursor(last.ma30_slope, last.stock_id)
+
         return {
-            'total': total,
+            'total': total_count,
             'limit': limit,
-            'offset': offset,
+            'offset': offset if after is None else None,
+            'next_cursor': next_cursor,
             'stocks': stocks
         }
 
@@ -547,14 +920,180 @@ async def get_stocks(
         db.close()
 
 
+@app.get("/api/stocks/search")
+@run_in_db_pool
+def search_stocks(q: str = '', limit: int = 10):
+    """
+    Autocompletado de acciones por prefijo de ticker o de palabra del nombre
+    (índice en memoria, sin consultas a BD salvo al recargarlo)
+
+    Args:
+        q: Texto buscado
+        limit: Número máximo de resultados
+    """
+    db = SessionLocal()
+
+    try:
+        index = get_search_index(db)
+        results = index.search(q, limit=min(max(limit, 1), 50))
+        return {
+            'query': q,
+            'results': [
+                {
+                    'ticker': s['ticker'],
+                    'name': s['name'],
+                    'exchange': s['exchange'],
+                    'stage': s['stage'],
+                }
+                for s in results
+            ]
+        }
+
+    finally:
+        db.close()
+
+
+def _split_param(value: Optional[str]) -> list:
+    """Parámetro de lista separado por comas ("1,2" → ['1', '2'])."""
+    return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+
+@app.get("/api/screener")
+@cached_endpoint
+@run_in_db_pool
+def screen_stocks(
+    stage: Optional[str] = None,
+    exchange: Optional[str] = None,
+    min_slope: Optional[float] = None,
+    max_slope: Optional[float] = None,
+    min_distance: Optional[float] = None,
+    max_distance: Optional[float] = None,
+    min_mrs: Optional[float] = None,
+    max_mrs: Optional[float] = None,
+    min_weeks: Optional[int] = None,
+    max_weeks: Optional[int] = None,
+    min_volume_ratio: Optional[float] = None,
+    max_volume_ratio: Optional[float] = None,
+    min_rs_rank: Optional[float] = None,
+    max_rs_rank: Optional[float] = None,
+    signal: Optional[str] = None,
+    signal_days: int = 30,
+    sort: str = '-ma30_slope',
+    limit: int = 100
+):
+    """
+    Screener con filtros combinables (todos deben cumplirse) sobre el
+    snapshot en memoria de app/screener.py
+
+    Args:
+        stage: Etapas separadas por comas (ej: 1,2)
+        exchange: Mercados separados por comas (ej: NASDAQ,NYSE)
+        min_*/max_*: Rangos (incluidos) de pendiente MA30, distancia a MA30 (%),
+            MRS, semanas en la etapa, ratio de volumen y percentil de fuerza relativa
+        signal: Tipos de señal separados por comas (BUY, SELL, STAGE_CHANGE...)
+        signal_days: Antigüedad máxima de la señal en días
+        sort: Campos separados por comas; prefijo "-" = descendente (ej: -mrs,ticker)
+        limit: Número máximo de resultados
+    """
+    try:
+        stages = [int(v) for v in _split_param(stage)]
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "stage debe ser una lista de enteros"})
+
+    sort_keys = []
+    for key in _split_param(sort):
+        field = key.lstrip('-')
+        if field not in SORT_FIELDS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"sort admite: {', '.join(SORT_FIELDS)}"}
+            )
+        sort_keys.append((field, key.startswith('-')))
+
+    if not 0 <= signal_days <= SCREENER_SIGNAL_DAYS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"signal_days debe estar entre 0 y {SCREENER_SIGNAL_DAYS}"}
+        )
+
+    ranges = {
+        'ma30_slope': (min_slope, max_slope),
+        'distance_ma30': (min_distance, max_distance),
+        'mrs': (min_mrs, max_mrs),
+        'weeks_in_stage': (min_weeks, max_weeks),
+        'volume_ratio': (min_volume_ratio, max_volume_ratio),
+        'rs_rank': (min_rs_rank, max_rs_rank),
+    }
+
+    db = SessionLocal()
+
+    try:
+        screener = get_screener(db)
+        total, results = screener.screen(
+            stages=stages,
+            exchanges=_split_param(exchange),
+            ranges={field: r for field, r in ranges.items() if r != (None, None)},
+            signal_types=_split_param(signal),
+            signal_days=signal_days,
+            sort=sort_keys,
+            limit=min(max(limit, 1), 5000)
+        )
+
+        return {
+            'total': total,
+            'universe': screener.size,
+            'stocks': [
+                {
+                    'ticker': s['ticker'],
+                    'name': s['name'],
+                    'exchange': s['exchange'],
+                    'stage': s['stage'],
+                    'price': s['close'],
+                    'ma30': s['ma30'],
+                    'ma30_slope': s['ma30_slope'],
+                    'week_end_date': s['week_end_date'].isoformat(),
+                    'distance_from_ma30': s['distance_ma30'],
+                    'mrs': s['mrs'],
+                    'weeks_in_stage': s['weeks_in_stage'],
+                    'volume_ratio': s['volume_ratio'],
+                    'rs_rank': s['rs_rank'],
+                }
+                for s in results
+            ]
+        }
+
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+@run_in_db_pool
+def warm_screener():
+    """Cargar el snapshot del screener al arrancar (si la BD no responde, se carga en la primera petición)."""
+    db = SessionLocal()
+    try:
+        get_screener(db)
+    except Exception as e:
+        logger.warning(f"⚠ Screener no precargado: {e}")
+    finally:
+        db.close()
+
+
 @app.get("/api/stock/{ticker}")
-async def get_stock_detail(ticker: str):
+@cached_endpoint
+@run_in_db_pool
+def get_stock_detail(ticker: str, format: str = 'rows'):
     """
     Obtener detalle completo de una acción
 
     Args:
         ticker: Símbolo de la acción (ej: AAPL)
+        format: 'rows' (history como lista de dicts) o 'columnar'
+                (history como arrays paralelos, una clave por columna)
     """
+    if format not in ('rows', 'columnar'):
+        return JSONResponse(status_code=400, content={"error": "format debe ser rows o columnar"})
+
     db = SessionLocal()
 
     try:
@@ -583,27 +1122,27 @@ async def get_stock_detail(ticker: str):
         # Historial: 104 semanas de display + 52 de warmup para MRS (Mansfield RS)
         DISPLAY_WEEKS = 104
         MRS_WARMUP = 52
-        history_all = db.query(WeeklyData).filter(
+        history_all = db.query(
+            WeeklyData.week_end_date, WeeklyData.open, WeeklyData.high, WeeklyData.low,
+            WeeklyData.close, WeeklyData.volume, WeeklyData.ma30, WeeklyData.stage
+        ).filter(
             WeeklyData.stock_id == stock.id
         ).order_by(desc(WeeklyData.week_end_date)).limit(DISPLAY_WEEKS + MRS_WARMUP).all()
         history_all.reverse()  # Orden cronológico
 
-        # Mansfield Relative Strength (MRS) vs SPY
+        # Mansfield Relative Strength (MRS) vs benchmark de la acción (SPY, ^IBEX...)
         # MRS = (rs_ratio / MA52_rs_ratio - 1) × 100  — oscila alrededor de 0
-        spy_stock = db.query(Stock).filter(Stock.ticker == 'SPY').first()
+        benchmarks = get_benchmark_matrix(db)
+        benchmark = benchmarks.benchmark_for(stock.ticker)
+        bench_closes = benchmarks.closes(benchmark)
         mrs_by_date = {}
-        if spy_stock:
-            spy_rows = db.query(WeeklyData).filter(
-                WeeklyData.stock_id == spy_stock.id
-            ).order_by(desc(WeeklyData.week_end_date)).limit(DISPLAY_WEEKS + MRS_WARMUP).all()
-            spy_closes_full = {w.week_end_date.isoformat(): float(w.close) for w in spy_rows}
-
-            # RS ratio semanal (stock/SPY) para todas las semanas disponibles
+        if bench_closes:
+            # RS ratio semanal (acción/benchmark) para todas las semanas disponibles
             rs_list = []
             for w in history_all:
                 date_str = w.week_end_date.isoformat()
-                spy_c = spy_closes_full.get(date_str)
-                rs_list.append((date_str, float(w.close) / spy_c if spy_c else None))
+                bench_c = bench_closes.get(w.week_end_date)
+                rs_list.append((date_str, float(w.close) / bench_c if bench_c else None))
 
             # MRS con ventana deslizante de 52 semanas
             for i, (date_str, rs) in enumerate(rs_list):
@@ -622,19 +1161,20 @@ async def get_stock_detail(ticker: str):
             Signal.stock_id == stock.id
         ).order_by(desc(Signal.signal_date)).limit(10).all()
 
-        return {
-            'ticker': stock.ticker,
-            'name': stock.name,
-            'exchange': stock.exchange,
-            'current': {
-                'stage': latest_week.stage,
-                'price': float(latest_week.close),
-                'ma30': float(latest_week.ma30) if latest_week.ma30 else None,
-                'ma30_slope': float(latest_week.ma30_slope) if latest_week.ma30_slope else None,
-                'week_end_date': latest_week.week_end_date.isoformat(),
-                'distance_from_ma30': ((float(latest_week.close) - float(latest_week.ma30)) / float(latest_week.ma30) * 100) if latest_week.ma30 else None
-            },
-            'history': [
+        if format == 'columnar':
+            history_payload = {
+                'week_end_date': [w.week_end_date.isoformat() for w in history],
+                'open': [float(w.open) if w.open else None for w in history],
+                'high': [float(w.high) if w.high else None for w in history],
+                'low': [float(w.low) if w.low else None for w in history],
+                'close': [float(w.close) for w in history],
+                'volume': [int(w.volume) if w.volume else None for w in history],
+                'ma30': [float(w.ma30) if w.ma30 else None for w in history],
+                'stage': [w.stage for w in history],
+                'mrs': [mrs_by_date.get(w.week_end_date.isoformat()) for w in history],
+            }
+        else:
+            history_payload = [
                 {
                     'week_end_date': w.week_end_date.isoformat(),
                     'open': float(w.open) if w.open else None,
@@ -647,7 +1187,23 @@ async def get_stock_detail(ticker: str):
                     'mrs': mrs_by_date.get(w.week_end_date.isoformat()),
                 }
                 for w in history
-            ],
+            ]
+
+        return {
+            'ticker': stock.ticker,
+            'name': stock.name,
+            'exchange': stock.exchange,
+            'benchmark': benchmark,
+            'format': format,
+            'current': {
+                'stage': latest_week.stage,
+                'price': float(latest_week.close),
+                'ma30': float(latest_week.ma30) if latest_week.ma30 else None,
+                'ma30_slope': float(latest_week.ma30_slope) if latest_week.ma30_slope else None,
+                'week_end_date': latest_week.week_end_date.isoformat(),
+                'distance_from_ma30': ((float(latest_week.close) - float(latest_week.ma30)) / float(latest_week.ma30) * 100) if latest_week.ma30 else None
+            },
+            'history': history_payload,
             'signals': [
                 {
                     'date': s.signal_date.isoformat(),
@@ -669,7 +1225,9 @@ async def get_stock_detail(ticker: str):
 # ============================================
 
 @app.get("/api/signals")
-async def get_signals(
+@cached_endpoint
+@run_in_db_pool
+def get_signals(
     signal_type: Optional[str] = None,
     days: int = 30,
     limit: int = 50,
@@ -733,27 +1291,87 @@ async def get_signals(
         db.close()
 
 
+@app.get("/api/signals/provisional")
+@cached_endpoint
+@run_in_db_pool
+def get_provisional_signals(include_all: bool = False):
+    """
+    Vista previa de la semana en curso (calculada cada noche desde datos diarios)
+
+    Args:
+        include_all: False = solo señales y cambios de etapa; True = todas las acciones
+    """
+    db = SessionLocal()
+
+    try:
+        query = db.query(ProvisionalWeekly, Stock).join(
+            Stock, ProvisionalWeekly.stock_id == Stock.id
+        ).filter(Stock.active == True)
+
+        if not include_all:
+            query = query.filter(
+                (ProvisionalWeekly.signal_type.isnot(None)) |
+                (ProvisionalWeekly.stage != ProvisionalWeekly.stage_prev)
+            )
+
+        results = query.order_by(
+            ProvisionalWeekly.signal_type.desc(), Stock.ticker
+        ).all()
+
+        rows = []
+        for prov, stock in results:
+            rows.append({
+                'ticker': stock.ticker,
+                'name': stock.name,
+                'week_end_date': prov.week_end_date.isoformat(),
+                'as_of_date': prov.as_of_date.isoformat(),
+                'days': prov.days,
+                'type': prov.signal_type,
+                'stage_from': prov.stage_prev,
+                'stage_to': prov.stage,
+                'price': float(prov.close),
+                'ma30': float(prov.ma30) if prov.ma30 else None,
+                'ma30_slope': float(prov.ma30_slope) if prov.ma30_slope else None,
+                'mrs': float(prov.mrs) if prov.mrs is not None else None,
+            })
+
+        return {
+            'total': len(rows),
+            'signals': rows
+        }
+
+    finally:
+        db.close()
+
+
 # ============================================
 # API ENDPOINTS - WATCHLIST (Etapa 2)
 # ============================================
 
 @app.get("/api/watchlist")
-async def get_watchlist():
+@cached_endpoint
+@run_in_db_pool
+def get_watchlist(sort: str = 'slope'):
     """
     Obtener acciones en Etapa 2 (tendencia alcista)
-    Ordenadas por fuerza (pendiente MA30)
+    Ordenadas por fuerza: pendiente MA30, percentil de fuerza relativa o MRS
+
+    Args:
+        sort: slope, rs_rank o mrs
     """
+    if sort not in ('slope', 'rs_rank', 'mrs'):
+        return JSONResponse(status_code=400, content={"error": "sort debe ser slope, rs_rank o mrs"})
+
     db = SessionLocal()
 
     try:
         analyzer = WeinsteinAnalyzer(db)
         stocks = analyzer.get_stocks_by_stage(2)
 
-        # Ordenar por pendiente (más fuerte primero)
+        # Ordenar por el criterio elegido (más fuerte primero, sin dato al final)
         stocks_sorted = sorted(
             stocks,
-            key=lambda x: x['slope'] or 0,
-            reverse=True
+            key=lambda x: (x[sort] is None, -(x[sort] or 0))
         )
 
         return {
@@ -844,32 +1462,25 @@ def _position_closed_dict(pos: Position) -> dict:
 
 def _get_current_price(db, stock_id: int) -> float:
     """Obtener último precio diario disponible de un stock"""
-    latest = db.query(DailyData).filter(
-        DailyData.stock_id == stock_id
-    ).order_by(desc(DailyData.date)).first()
-    if latest:
-        return float(latest.close)
-    # fallback a precio semanal
-    latest_w = db.query(WeeklyData).filter(
-        WeeklyData.stock_id == stock_id
-    ).order_by(desc(WeeklyData.week_end_date)).first()
-    if latest_w:
-        return float(latest_w.close)
-    return 0.0
+    return get_latest_prices(db, [stock_id]).get(stock_id, 0.0)
 
 
 @app.get("/api/portfolio")
-async def api_portfolio_open():
+@run_in_db_pool
+def api_portfolio_open():
     """Posiciones abiertas con P&L actual"""
     db = SessionLocal()
     try:
-        positions = db.query(Position).filter(
+        positions = db.query(Position).options(joinedload(Position.stock)).filter(
             Position.status == 'OPEN'
         ).order_by(Position.entry_date.desc()).all()
 
+        # Últimos precios de todas las posiciones en una sola consulta
+        prices = get_latest_prices(db, [pos.stock_id for pos in positions])
+
         result = []
         for pos in positions:
-            current_price = _get_current_price(db, pos.stock_id)
+            current_price = prices.get(pos.stock_id, 0.0)
             result.append(_position_with_pnl(pos, current_price))
         return {"positions": result, "total": len(result)}
     except Exception as e:
@@ -879,7 +1490,8 @@ async def api_portfolio_open():
 
 
 @app.post("/api/portfolio")
-async def api_portfolio_create(data: PositionCreate):
+@run_in_db_pool
+def api_portfolio_create(data: PositionCreate):
     """Abrir nueva posición (compra)"""
     db = SessionLocal()
     try:
@@ -919,7 +1531,8 @@ async def api_portfolio_create(data: PositionCreate):
 
 
 @app.put("/api/portfolio/{position_id}")
-async def api_portfolio_update(position_id: int, data: PositionUpdate):
+@run_in_db_pool
+def api_portfolio_update(position_id: int, data: PositionUpdate):
     """Actualizar campos de una posición (abiertas y cerradas)"""
     db = SessionLocal()
     try:
@@ -970,7 +1583,8 @@ async def api_portfolio_update(position_id: int, data: PositionUpdate):
 
 
 @app.post("/api/portfolio/{position_id}/close")
-async def api_portfolio_close(position_id: int, data: PositionClose):
+@run_in_db_pool
+def api_portfolio_close(position_id: int, data: PositionClose):
     """Cerrar posición (venta)"""
     db = SessionLocal()
     try:
@@ -1001,11 +1615,12 @@ async def api_portfolio_close(position_id: int, data: PositionClose):
 
 
 @app.get("/api/portfolio/history")
-async def api_portfolio_history():
+@run_in_db_pool
+def api_portfolio_history():
     """Historial de posiciones cerradas"""
     db = SessionLocal()
     try:
-        positions = db.query(Position).filter(
+        positions = db.query(Position).options(joinedload(Position.stock)).filter(
             Position.status == 'CLOSED'
         ).order_by(Position.exit_date.desc()).all()
 
@@ -1019,12 +1634,14 @@ async def api_portfolio_history():
 
 
 @app.get("/api/portfolio/summary")
-async def api_portfolio_summary():
+@run_in_db_pool
+def api_portfolio_summary():
     """Estadísticas globales del portfolio (abiertas + cerradas)"""
     db = SessionLocal()
     try:
         open_positions = db.query(Position).filter(Position.status == 'OPEN').all()
         closed_positions = db.query(Position).filter(Position.status == 'CLOSED').all()
+        prices = get_latest_prices(db, [pos.stock_id for pos in open_positions])
 
         # Posiciones abiertas
         total_invested = 0.0
@@ -1032,7 +1649,7 @@ async def api_portfolio_summary():
         open_pnl_pcts = []
 
         for pos in open_positions:
-            current_price = _get_current_price(db, pos.stock_id)
+            current_price = prices.get(pos.stock_id, 0.0)
             entry_price = float(pos.entry_price)
             quantity = float(pos.quantity)
             invested = entry_price * quantity
@@ -1066,7 +1683,8 @@ async def api_portfolio_summary():
 
 
 @app.delete("/api/portfolio/history")
-async def api_portfolio_clear_history():
+@run_in_db_pool
+def api_portfolio_clear_history():
     """Borrar todo el historial de posiciones cerradas"""
     db = SessionLocal()
     try:
@@ -1081,7 +1699,8 @@ async def api_portfolio_clear_history():
 
 
 @app.delete("/api/portfolio/{position_id}")
-async def api_portfolio_delete(position_id: int):
+@run_in_db_pool
+def api_portfolio_delete(position_id: int):
     """Eliminar una posición (abierta o cerrada) sin registrar cierre"""
     db = SessionLocal()
     try:
@@ -1098,6 +1717,220 @@ async def api_portfolio_delete(position_id: int):
         db.close()
 
 
+# ============================================
+# API ENDPOINTS - EXPORTACIÓN (CSV / Parquet en streaming)
+# ============================================
+
+async def _iterate_in_db_pool(chunks):
+    """
+    Recorrer un generador de export en el pool de hilos de BD: cada bloque
+    ocupa un hilo solo mientras se lee y serializa, y una conexión solo
+    mientras se lee (export.iter_chunks). Si el cliente corta la descarga,
+    el generador se cierra.
+    """
+    done = object()
+    try:
+        while True:
+            chunk = await anyio.to_thread.run_sync(next, chunks, done, limiter=_get_db_limiter())
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(chunks.close, limiter=_get_db_limiter())
+
+
+def _check_export_format(format: str) -> Optional[JSONResponse]:
+    """Error si el formato no es válido o falta pyarrow para Parquet."""
+    if format not in export.EXPORT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": "format debe ser csv o parquet"})
+    if format == 'parquet' and not export.parquet_available():
+        return JSONResponse(status_code=501, content={"error": "Parquet no disponible (pyarrow no instalado)"})
+    return None
+
+
+def _export_response(stmt, columns: list, format: str, name: str) -> StreamingResponse:
+    """Respuesta de descarga en streaming (una sesión por bloque de filas)."""
+    media_type, extension = export.EXPORT_FORMATS[format]
+    filename = f"{name}_{date_type.today().isoformat()}.{extension}"
+    return StreamingResponse(
+        _iterate_in_db_pool(export.stream_export(SessionLocal, stmt, columns, format)),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/api/export/stocks")
+@run_in_db_pool
+def export_stocks(stage: Optional[int] = None, search: Optional[str] = None, format: str = 'csv'):
+    """
+    Descargar el listado de acciones (mismos filtros y orden que /api/stocks)
+
+    Args:
+        stage: Filtrar por etapa (1, 2, 3, 4)
+        search: Prefijo de ticker o de una palabra del nombre
+        format: csv o parquet
+    """
+    error = _check_export_format(format)
+    if error:
+        return error
+
+    stock_ids = None
+    if search:
+        db = SessionLocal()
+        try:
+            stock_ids = [s['id'] for s in get_search_index(db).search(search, limit=None)]
+        finally:
+            db.close()
+    stmt = export.stocks_statement(stage=stage, stock_ids=stock_ids)
+    return _export_response(stmt, export.STOCK_COLUMNS, format, 'stocks')
+
+
+@app.get("/api/export/signals")
+@run_in_db_pool
+def export_signals(
+    signal_type: Optional[str] = None,
+    days: int = 30,
+    date: Optional[str] = None,
+    format: str = 'csv'
+):
+    """
+    Descargar el historial de señales (mismos filtros que /api/signals, sin límite)
+
+    Args:
+        signal_type: Filtrar por tipo (BUY, SELL, STAGE_CHANGE)
+        days: Días hacia atrás
+        date: Filtrar por fecha exacta (YYYY-MM-DD)
+        format: csv o parquet
+    """
+    error = _check_export_format(format)
+    if error:
+        return error
+
+    stmt = export.signals_statement(signal_type=signal_type, days=days, date=date)
+    return _export_response(stmt, export.SIGNAL_COLUMNS, format, 'signals')
+
+
+@app.get("/api/export/history/{ticker}")
+@run_in_db_pool
+def export_history(
+    ticker: str,
+    timeframe: str = 'daily',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    format: str = 'csv'
+):
+    """
+    Descargar el histórico de precios de una acción
+
+    Args:
+        ticker: Símbolo de la acción
+        timeframe: daily o weekly
+        start: Fecha inicial (YYYY-MM-DD, incluida)
+        end: Fecha final (YYYY-MM-DD, incluida)
+        format: csv o parquet
+    """
+    if timeframe not in ('daily', 'weekly'):
+        return JSONResponse(status_code=400, content={"error": "timeframe debe ser daily o weekly"})
+    error = _check_export_format(format)
+    if error:
+        return error
+
+    db = SessionLocal()
+    try:
+        stock = db.query(Stock).filter(Stock.ticker == ticker.upper()).first()
+        if not stock:
+            return JSONResponse(status_code=404, content={"error": f"Acción {ticker} no encontrada"})
+        stmt = export.history_statement(stock.id, timeframe=timeframe, start=start, end=end)
+        ticker = stock.ticker
+    finally:
+        db.close()
+
+    columns = export.WEEKLY_COLUMNS if timeframe == 'weekly' else export.DAILY_COLUMNS
+    return _export_response(stmt, columns, format, f"{ticker}_{timeframe}")
+
+
+# ============================================
+# EVENTOS DEL PIPELINE (Server-Sent Events)
+# ============================================
+
+# Cada conexión consulta pipeline_events cada EVENTS_POLL_SECONDS (consulta
+# por clave primaria) y envía un comentario de keep-alive si no hay eventos
+EVENTS_POLL_SECONDS = 2.0
+EVENTS_KEEPALIVE_SECONDS = 15.0
+
+
+def _read_events(after_id: Optional[int]) -> tuple:
+    """(último id, eventos posteriores a after_id); sin after_id solo el último id."""
+    db = SessionLocal()
+    try:
+        if after_id is None:
+            return latest_event_id(db), []
+        events = fetch_events(db, after_id)
+        return (events[-1]['id'] if events else after_id), events
+    finally:
+        db.close()
+
+
+def _format_sse(event: dict) -> str:
+    """Mensaje SSE: id (para reanudar con Last-Event-ID), tipo y datos JSON."""
+    data = {
+        'source': event['source'],
+        'created_at': event['created_at'],
+        **event['payload'],
+    }
+    return (f"id: {event['id']}\n"
+            f"event: {event['event_type']}\n"
+            f"data: {json.dumps(data, default=str)}\n\n")
+
+
+@app.get("/api/events/stream")
+async def events_stream(request: Request):
+    """
+    Progreso de los procesos de cron (fases, acción N/M, duración) y señales
+    nuevas en tiempo real. Al reconectar, EventSource envía Last-Event-ID y
+    se reanuda sin perder eventos.
+    """
+    last_event_id = request.headers.get('last-event-id')
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    async def stream():
+        nonlocal after_id
+        # Sin Last-Event-ID: solo eventos a partir de ahora
+        if after_id is None:
+            after_id, _ = await anyio.to_thread.run_sync(
+                _read_events, None, limiter=_get_db_limiter()
+            )
+        # Reintento del navegador tras un corte (ms)
+        yield "retry: 5000\n\n"
+
+        idle = 0.0
+        while not await request.is_disconnected():
+            after_id, events = await anyio.to_thread.run_sync(
+                _read_events, after_id, limiter=_get_db_limiter()
+            )
+            for event in events:
+                yield _format_sse(event)
+
+            if events:
+                idle = 0.0
+            else:
+                idle += EVENTS_POLL_SECONDS
+                if idle >= EVENTS_KEEPALIVE_SECONDS:
+                    yield ": keep-alive\n\n"
+                    idle = 0.0
+            await anyio.sleep(EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(
+        stream(),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
 # ============================================
 # HEALTH CHECK
 # ============================================
@@ -1112,6 +1945,95 @@ async def health_check():
     }
 
 
+# ============================================
+# MÉTRICAS (Prometheus)
+# ============================================
+
+# Últimas fechas de stock_latest por versión de datos: (versión, {'daily': date, 'weekly': date})
+_freshness_memo = (None, None)
+
+
+def _load_data_dates() -> dict:
+    """Última fecha diaria y última semana cerrada de stock_latest."""
+    db = SessionLocal()
+    try:
+        last_daily, last_week = db.query(
+            func.max(StockLatest.last_daily_date), func.max(StockLatest.week_end_date)
+        ).one()
+        return {'daily': last_daily, 'weekly': last_week}
+    finally:
+        db.close()
+
+
+async def get_data_dates(version: str) -> dict:
+    """Fechas de los datos; solo consulta la BD cuando cambia la versión de datos."""
+    global _freshness_memo
+    memo_version, dates = _freshness_memo
+    if memo_version != version:
+        dates = await anyio.to_thread.run_sync(_load_data_dates, limiter=_get_db_limiter())
+        _freshness_memo = (version, dates)
+    return dates
+
+
+def metrics_allowed(request: Request) -> bool:
+    """
+    /metrics: con METRICS_TOKEN exige 'Authorization: Bearer <token>'; sin él,
+    solo peticiones locales directas (no las que llegan a través del proxy).
+    """
+    if METRICS_TOKEN:
+        auth = request.headers.get('authorization', '')
+        return hmac.compare_digest(auth, f"Bearer {METRICS_TOKEN}")
+    client = request.client.host if request.client else None
+    return client in ('127.0.0.1', '::1') and 'x-forwarded-for' not in request.headers
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Métricas en formato Prometheus: peticiones, pool de BD, cachés y antigüedad de datos"""
+    if not metrics_allowed(request):
+        return JSONResponse(status_code=403, content={"error": "Acceso no permitido"})
+
+    lines = request_metrics.render()
+
+    # Pool de conexiones e hilos de BD
+    pool = engine.pool
+    limiter = _get_db_limiter()
+    lines += format_metric('db_pool_size', 'gauge', 'Conexiones permanentes del pool', [({}, pool.size())])
+    lines += format_metric('db_pool_checked_out', 'gauge', 'Conexiones del pool en uso', [({}, pool.checkedout())])
+    lines += format_metric('db_pool_overflow', 'gauge', 'Conexiones por encima del tamano del pool', [({}, max(0, pool.overflow()))])
+    lines += format_metric('db_pool_max_overflow', 'gauge', 'Maximo de conexiones de overflow', [({}, WEB_DB_MAX_OVERFLOW)])
+    lines += format_metric('db_workers_busy', 'gauge', 'Hilos de BD ocupados', [({}, limiter.borrowed_tokens)])
+    lines += format_metric('db_workers_waiting', 'gauge', 'Peticiones esperando hilo de BD', [({}, limiter.statistics().tasks_waiting)])
+    lines += format_metric('db_workers_total', 'gauge', 'Hilos de BD disponibles', [({}, int(limiter.total_tokens))])
+
+    # Caché de respuestas
+    cache = response_cache.stats()
+    lookups = cache['hits'] + cache['misses']
+    lines += format_metric('cache_hits_total', 'counter', 'Aciertos de cache', [({'cache': 'response'}, cache['hits'])])
+    lines += format_metric('cache_misses_total', 'counter', 'Fallos de cache', [({'cache': 'response'}, cache['misses'])])
+    lines += format_metric('cache_hit_ratio', 'gauge', 'Proporcion de aciertos desde el arranque',
+                           [({'cache': 'response'}, cache['hits'] / lookups if lookups else None)])
+    lines += format_metric('cache_entries', 'gauge', 'Entradas en cache', [({'cache': 'response'}, cache['entries'])])
+
+    # Antigüedad de los datos
+    data_version = get_data_version()
+    dates = await get_data_dates(data_version['version'])
+    today = date_type.today()
+    lines += format_metric('data_last_date_timestamp_seconds', 'gauge', 'Ultima fecha con datos (epoch, 00:00 local)', [
+        ({'dataset': name}, int(time.mktime(d.timetuple())) if d else None) for name, d in dates.items()
+    ])
+    lines += format_metric('data_lag_days', 'gauge', 'Dias desde la ultima fecha con datos', [
+        ({'dataset': name}, (today - d).days if d else None) for name, d in dates.items()
+    ])
+    published_age = None
+    if data_version['updated_at']:
+        published_age = (datetime.now() - datetime.fromisoformat(data_version['updated_at'])).total_seconds()
+    lines += format_metric('data_version_age_seconds', 'gauge', 'Segundos desde la ultima publicacion del pipeline',
+                           [({'source': data_version['source'] or ''}, published_age)])
+
+    return Response(content=render_metrics(lines), media_type='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -205,3 +205,69 @@ async function clearPortfolioHistory() {
         el.style.display = 'block';
     }
 }
+
+/* Rendimiento del pipeline (informes de data/perf/) */
+
+document.addEventListener('DOMContentLoaded', loadPerfReports);
+
+async function loadPerfReports() {
+    const select = document.getElementById('perf-run');
+    const summary = document.getElementById('perf-summary');
+    try {
+        const resp = await fetch(`${BASE_PATH}/api/admin/perf`);
+        const data = await resp.json();
+        const reports = data.reports || [];
+        if (!reports.length) {
+            summary.textContent = 'Sin informes todavía (se generan en cada ejecución del pipeline).';
+            select.style.display = 'none';
+            return;
+        }
+        select.innerHTML = reports.map(r =>
+            `<option value="${esc(r.name)}">${esc(r.run)} (${r.duration_s} s)</option>`
+        ).join('');
+        loadPerfReport(reports[0].name);
+    } catch (e) {
+        summary.textContent = 'Error al cargar informes';
+    }
+}
+
+async function loadPerfReport(name) {
+    const summary = document.getElementById('perf-summary');
+    try {
+        const resp = await fetch(`${BASE_PATH}/api/admin/perf/${encodeURIComponent(name)}`);
+        const r = await resp.json();
+        if (!resp.ok) {
+            summary.textContent = r.error || 'Error al cargar el informe';
+            return;
+        }
+        summary.textContent = `${r.run}: ${r.started_at.replace('T', ' ')} → ${r.finished_at.replace('T', ' ')} (${r.duration_s} s)`;
+
+        const fmt = v => Number(v).toLocaleString('es-ES');
+        document.getElementById('perf-phases-tbody').innerHTML = Object.entries(r.phases).map(([phase, p]) => `
+            <tr>
+                <td><strong>${esc(phase)}</strong></td>
+                <td class="text-right">${fmt(p.count)}</td>
+                <td class="text-right">${fmt(p.total_s)}</td>
+                <td class="text-right">${fmt(p.p50_ms)}</td>
+                <td class="text-right">${fmt(p.p95_ms)}</td>
+                <td class="text-right">${fmt(p.p99_ms)}</td>
+                <td class="text-right">${fmt(p.max_ms)}</td>
+                <td class="text-right">${fmt(p.queries)}</td>
+                <td class="text-right">${fmt(p.rows_written)}</td>
+                <td class="text-right">${p.errors}</td>
+            </tr>
+        `).join('');
+
+        document.getElementById('perf-tickers-tbody').innerHTML = (r.slowest_tickers || []).map(t => `
+            <tr>
+                <td><strong>${esc(t.ticker)}</strong></td>
+                <td class="text-right">${fmt(t.total_ms)}</td>
+                <td>${Object.entries(t.phases).map(([phase, ms]) => `${esc(phase)} ${fmt(ms)}`).join(' · ')}</td>
+                <td class="text-right">${fmt(t.queries)}</td>
+                <td class="text-right">${fmt(t.rows_written)}</td>
+            </tr>
+        `).join('') || '<tr><td colspan="5" class="loading">Sin datos por acción</td></tr>';
+    } catch (e) {
+        summary.textContent = 'Error al cargar el informe';
+    }
+}
@@ -4,13 +4,83 @@ const BASE_PATH = window.BASE_PATH || '';
 
 let signalsDataTable = null;
 
+const PHASE_NAMES = {
+    download: 'Descarga diaria',
+    ingest: 'Descarga diaria',
+    aggregate: 'Agregación semanal',
+    analyze: 'Análisis de etapas',
+    signals: 'Generación de señales',
+    provisional: 'Semana provisional',
+};
+const SOURCE_NAMES = {
+    daily: 'Actualización diaria',
+    weekly: 'Proceso semanal',
+    full: 'Actualización + proceso semanal',
+    provisional: 'Semana provisional',
+};
+
 // Cargar datos al iniciar la página
 document.addEventListener('DOMContentLoaded', function() {
     loadDashboardStats();
     loadRecentSignals();
     loadTopStage2();
+    loadBreadth('ALL');
+    subscribePipelineEvents();
 });
 
+// Progreso de los procesos de cron en directo (/api/events/stream)
+function subscribePipelineEvents() {
+    if (!window.EventSource) return;
+
+    const source = new EventSource(`${BASE_PATH}/api/events/stream`);
+    const status = document.getElementById('pipeline-status');
+    let newSignals = 0;
+
+    const show = (text, cls) => {
+        status.className = `alert ${cls}`;
+        status.textContent = text;
+        status.style.display = 'block';
+    };
+    const parse = e => JSON.parse(e.data);
+
+    source.addEventListener('phase_start', e => {
+        const d = parse(e);
+        show(`⏳ ${SOURCE_NAMES[d.source] || d.source}: ${PHASE_NAMES[d.phase] || d.phase}...`, 'alert-info');
+    });
+
+    source.addEventListener('progress', e => {
+        const d = parse(e);
+        show(`⏳ ${PHASE_NAMES[d.phase] || d.phase}: ${d.done}/${d.total} (${d.ticker})`, 'alert-info');
+    });
+
+    source.addEventListener('phase_end', e => {
+        const d = parse(e);
+        const secs = d.duration_s !== null && d.duration_s !== undefined ? ` en ${d.duration_s} s` : '';
+        show(`✓ ${PHASE_NAMES[d.phase] || d.phase} completada${secs}`, 'alert-info');
+    });
+
+    source.addEventListener('signal', e => {
+        const d = parse(e);
+        newSignals++;
+        show(`🔔 Nueva señal ${d.signal_type}: ${d.ticker} (${newSignals} en este proceso)`, 'alert-info');
+    });
+
+    source.addEventListener('finished', e => {
+        const d = parse(e);
+        show(`✓ ${SOURCE_NAMES[d.source] || d.source} completada en ${d.duration_s} s`, 'alert-success');
+        newSignals = 0;
+        // Datos nuevos publicados: recargar el dashboard
+        loadDashboardStats();
+        loadRecentSignals();
+        loadTopStage2();
+    });
+
+    source.addEventListener('failed', e => {
+        const d = parse(e);
+        show(`✗ ${SOURCE_NAMES[d.source] || d.source} con error: ${d.error}`, 'alert-error');
+    });
+}
+
 // Cargar estadísticas del dashboard
 async function loadDashboardStats() {
     try {
@@ -149,6 +219,77 @@ async function loadRecentSignals() {
     }
 }
 
+// Amplitud de mercado: % de acciones en Etapa 2 / Etapa 4 y sobre la MA30
+let breadthChart = null;
+
+async function loadBreadth(exchange) {
+    try {
+        const response = await fetch(`${BASE_PATH}/api/breadth?exchange=${encodeURIComponent(exchange)}&weeks=156`);
+        const data = await response.json();
+
+        // Botones de mercado
+        const buttons = document.getElementById('breadth-exchanges');
+        buttons.innerHTML = '';
+        data.exchanges.forEach(ex => {
+            const btn = document.createElement('button');
+            btn.className = 'filter-btn' + (ex === data.exchange ? ' active' : '');
+            btn.textContent = ex === 'ALL' ? 'Todos' : ex;
+            btn.addEventListener('click', () => loadBreadth(ex));
+            buttons.appendChild(btn);
+        });
+
+        const container = document.getElementById('breadthChart');
+        if (typeof LightweightCharts === 'undefined' || data.series.length === 0) {
+            container.innerHTML = '<p class="text-center">Sin datos de amplitud</p>';
+            return;
+        }
+
+        if (breadthChart) {
+            breadthChart.remove();
+            breadthChart = null;
+        }
+        container.innerHTML = '';
+
+        breadthChart = LightweightCharts.createChart(container, {
+            autoSize: true,
+            layout: {
+                background: { type: 'solid', color: '#ffffff' },
+                textColor: '#333',
+                fontFamily: "'Segoe UI', sans-serif",
+            },
+            grid: {
+                vertLines: { color: '#f0f0f0' },
+                horzLines: { color: '#f0f0f0' },
+            },
+            rightPriceScale: { borderColor: '#d1d5db' },
+            timeScale: { borderColor: '#d1d5db', timeVisible: false },
+        });
+
+        const lines = [
+            { key: 'pct_stage2', color: '#22c55e', title: '% Etapa 2' },
+            { key: 'pct_stage4', color: '#ef4444', title: '% Etapa 4' },
+            { key: 'pct_above_ma30', color: '#3b82f6', title: '% sobre MA30' },
+        ];
+        lines.forEach(line => {
+            const series = breadthChart.addSeries(LightweightCharts.LineSeries, {
+                color: line.color,
+                lineWidth: 2,
+                title: line.title,
+                priceLineVisible: false,
+                priceFormat: { type: 'custom', formatter: v => `${v.toFixed(1)}%` },
+            });
+            series.setData(data.series
+                .filter(p => p[line.key] !== null)
+                .map(p => ({ time: p.week_end_date, value: p[line.key] })));
+        });
+
+        breadthChart.timeScale().fitContent();
+
+    } catch (error) {
+        console.error('Error cargando amplitud de mercado:', error);
+    }
+}
+
 // Cargar top acciones en Etapa 2
 async function loadTopStage2() {
     try {
@@ -9,6 +9,7 @@ let signalsDT = null;
 document.addEventListener('DOMContentLoaded', function() {
     setupFilters();
     loadSignals();
+    loadProvisional();
 });
 
 function setupFilters() {
@@ -83,6 +84,40 @@ async function loadSignals() {
     }
 }
 
+// Vista previa de la semana en curso (provisional, se recalcula cada noche)
+async function loadProvisional() {
+    try {
+        const response = await fetch(`${BASE_PATH}/api/signals/provisional`);
+        const data = await response.json();
+
+        if (data.signals.length === 0) return;
+
+        const first = data.signals[0];
+        document.getElementById('provisional-as-of').textContent =
+            `Semana ${formatDate(first.week_end_date)} · datos al ${formatDate(first.as_of_date)}`;
+
+        document.getElementById('provisional-tbody').innerHTML = data.signals.map(signal => {
+            const typeBadge = signal.type
+                ? `<span class="badge ${signal.type === 'BUY' ? 'badge-buy' : 'badge-sell'}">${signal.type}</span>`
+                : '<span class="badge badge-stage">Cambio etapa</span>';
+            return `
+            <tr>
+                <td><a href="${BASE_PATH}/stock/${signal.ticker}" class="ticker-link">${signal.ticker}</a></td>
+                <td>${truncate(signal.name, 30)}</td>
+                <td>${typeBadge}</td>
+                <td><span class="badge badge-stage">Etapa ${signal.stage_from} → ${signal.stage_to}</span></td>
+                <td>$${signal.price.toFixed(2)}</td>
+                <td>${signal.ma30 ? '$' + signal.ma30.toFixed(2) : 'N/A'}</td>
+            </tr>`;
+        }).join('');
+
+        document.getElementById('provisional-card').style.display = '';
+
+    } catch (error) {
+        console.error('Error cargando semana provisional:', error);
+    }
+}
+
 function updateStats(signals) {
     const buyCount = signals.filter(s => s.type === 'BUY').length;
     const sellCount = signals.filter(s => s.type === 'SELL').length;
@@ -9,16 +9,32 @@ let ma30Series = null;
 let volumeSeries = null;
 let rsSeries = null;
 let fullHistoryData = null;
+let benchmarkTicker = null;
 
 // Cargar datos al iniciar
 document.addEventListener('DOMContentLoaded', function() {
     loadStockDetail();
 });
 
+// Historial columnar ({columna: [valores]}) → lista de semanas
+function historyFromColumns(columns) {
+    const keys = Object.keys(columns);
+    const length = columns.week_end_date.length;
+    const rows = new Array(length);
+    for (let i = 0; i < length; i++) {
+        const row = {};
+        for (const key of keys) {
+            row[key] = columns[key][i];
+        }
+        rows[i] = row;
+    }
+    return rows;
+}
+
 // Cargar detalle de acción
 async function loadStockDetail() {
     try {
-        const response = await fetch(`${BASE_PATH}/api/stock/${TICKER}`);
+        const response = await fetch(`${BASE_PATH}/api/stock/${TICKER}?format=columnar`);
 
         if (!response.ok) {
             throw new Error(`Error ${response.status}: ${response.statusText}`);
@@ -27,7 +43,9 @@ async function loadStockDetail() {
         const data = await response.json();
 
         // Guardar datos completos para filtrado posterior
+        data.history = historyFromColumns(data.history);
         fullHistoryData = data.history;
+        benchmarkTicker = data.benchmark;
 
         // Mostrar contenido
         document.getElementById('loading').style.display = 'none';
@@ -149,7 +167,7 @@ function createChart(history) {
         }
     );
 
-    // Panel RS: fuerza relativa vs SPY (zona central)
+    // Panel RS: fuerza relativa vs benchmark de la acción (zona central)
     rsSeries = chart.addSeries(
         LightweightCharts.LineSeries,
         {
@@ -223,7 +241,7 @@ function createChart(history) {
     rsSeries.setData(rsData);
     volumeSeries.setData(volumeData);
 
-    // Línea base MRS en 0 (por encima = supera al SPY, por debajo = queda por detrás)
+    // Línea base MRS en 0 (por encima = supera al benchmark, por debajo = queda por detrás)
     if (rsData.length > 0) {
         rsSeries.createPriceLine({
             price: 0,
@@ -260,7 +278,8 @@ function createChart(history) {
         const rs = param.seriesData.get(rsSeries);
         if (rs) {
             const rsColor = rs.value >= 0 ? '#8b5cf6' : '#a78bfa';
-            html += ` <span style="color:${rsColor}">MRS:${rs.value.toFixed(1)}</span>`;
+            const rsLabel = benchmarkTicker ? `MRS vs ${benchmarkTicker}` : 'MRS';
+            html += ` <span style="color:${rsColor}">${rsLabel}:${rs.value.toFixed(1)}</span>`;
         }
         const vol = param.seriesData.get(volumeSeries);
         if (vol) {
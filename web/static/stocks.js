@@ -2,11 +2,15 @@
 
 const BASE_PATH = window.BASE_PATH || '';
 
+const PAGE_SIZE = 500;
+
 let currentStage = 'all';
 let stocksDT = null;
+let searchTimer = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     setupFilters();
+    setupTickerSearch();
     loadStocks();
     loadStats();
 });
@@ -22,6 +26,36 @@ function setupFilters() {
     });
 }
 
+// Autocompletado de ticker (/api/stocks/search) e ir al detalle
+function setupTickerSearch() {
+    const input = document.getElementById('ticker-search');
+    const list = document.getElementById('ticker-suggestions');
+    if (!input) return;
+
+    input.addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        const q = this.value.trim();
+        if (!q) { list.innerHTML = ''; return; }
+        searchTimer = setTimeout(async () => {
+            try {
+                const response = await fetch(`${BASE_PATH}/api/stocks/search?q=${encodeURIComponent(q)}&limit=10`);
+                const data = await response.json();
+                list.innerHTML = data.results.map(s =>
+                    `<option value="${s.ticker}">${truncate(s.name || '', 40)}</option>`
+                ).join('');
+            } catch (error) {
+                console.error('Error buscando acciones:', error);
+            }
+        }, 150);
+    });
+
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'Enter' && this.value.trim()) {
+            window.location.href = `${BASE_PATH}/stock/${encodeURIComponent(this.value.trim().toUpperCase())}`;
+        }
+    });
+}
+
 async function loadStats() {
     try {
         const response = await fetch(`${BASE_PATH}/api/dashboard/stats`);
@@ -36,15 +70,29 @@ async function loadStats() {
     }
 }
 
-async function loadStocks() {
-    try {
-        let url = `${BASE_PATH}/api/stocks?limit=2000`;
+// Recorre todas las páginas de /api/stocks siguiendo next_cursor
+async function fetchAllStocks() {
+    const stocks = [];
+    let cursor = null;
+    do {
+        let url = `${BASE_PATH}/api/stocks?limit=${PAGE_SIZE}&total=none`;
         if (currentStage !== 'all') {
             url += `&stage=${currentStage}`;
         }
-
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
         const response = await fetch(url);
-        const data = await response.json();
+        const page = await response.json();
+        stocks.push(...page.stocks);
+        cursor = page.next_cursor;
+    } while (cursor);
+    return stocks;
+}
+
+async function loadStocks() {
+    try {
+        const data = { stocks: await fetchAllStocks() };
 
         if (stocksDT) { stocksDT.destroy(); stocksDT = null; }
 
@@ -10,7 +10,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
 async function loadWatchlist() {
     try {
-        const response = await fetch(`${BASE_PATH}/api/watchlist`);
+        const response = await fetch(`${BASE_PATH}/api/watchlist?sort=rs_rank`);
         const data = await response.json();
 
         document.getElementById('total-stage2').textContent = data.total;
@@ -20,7 +20,7 @@ async function loadWatchlist() {
         const tbody = document.getElementById('watchlist-tbody');
 
         if (data.stocks.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="6" class="text-center">No hay acciones en Etapa 2</td></tr>';
+            tbody.innerHTML = '<tr><td colspan="7" class="text-center">No hay acciones en Etapa 2</td></tr>';
             return;
         }
 
@@ -41,6 +41,7 @@ async function loadWatchlist() {
                 <td>$${stock.ma30 ? stock.ma30.toFixed(2) : 'N/A'}</td>
                 <td class="${distanceClass}">${distanceMA30 !== 'N/A' ? '+' + distanceMA30 + '%' : 'N/A'}</td>
                 <td class="${slopeClass}">${slopePct !== 'N/A' ? '+' + slopePct + '%' : 'N/A'}</td>
+                <td>${stock.rs_rank !== null && stock.rs_rank !== undefined ? stock.rs_rank.toFixed(0) : 'N/A'}</td>
             </tr>`;
         }).join('');
 